@@ -0,0 +1,278 @@
+"""
+Compact speech audio for the kiosks' slow Wi-Fi.
+Answers used to be synthesized as the default tts-1 MP3, stored as full
+files and read back from the audio cache on every 🔊 press. This module:
+  - picks the audio format per client from its User-Agent: Ogg Opus for
+    Chromium and Firefox, AAC for Safari and every iOS browser (WebKit's
+    Opus support is recent and patchy), MP3 when the browser is unknown
+  - asks the TTS API for that format, or, when ffmpeg is installed, asks for
+    WAV and encodes it as mono at a speech bitrate (Opus 24 kbps, AAC 32
+    kbps, MP3 48 kbps), which is several times smaller than the API's
+    music-quality defaults
+  - keeps recently played clips in memory, so a replay does not read the
+    audio cache again
+  - records payload bytes and time-to-ready per format, with an estimate of
+    playback start over the kiosk link (AUDIO_LINK_KBPS)
+
+Run `python audio_delivery.py answer.wav` to compare the formats' sizes and
+encoding times for a clip (needs ffmpeg).
+"""
+
+from collections import OrderedDict
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+# auto (pick per client), mp3, opus or aac
+TTS_AUDIO_FORMAT = os.getenv('TTS_AUDIO_FORMAT', 'auto').lower()
+# Re-encode speech at the bitrates below when ffmpeg is installed
+TTS_TRANSCODE = os.getenv('TTS_TRANSCODE', 'true').lower() == 'true'
+# Link speed assumed for playback-start estimates (kilobits per second)
+AUDIO_LINK_KBPS = float(os.getenv('AUDIO_LINK_KBPS', '1000'))
+# Recently played clips kept in memory per process
+AUDIO_MEMORY_CACHE_BYTES = int(float(os.getenv('AUDIO_MEMORY_CACHE_MB', '16')) * 1024 * 1024)
+
+# Format name -> MIME type for the player, TTS API response_format and ffmpeg encoder arguments
+AUDIO_FORMATS = {
+    'mp3': {'mime': 'audio/mpeg', 'api_format': 'mp3',
+            'encoder': ['-c:a', 'libmp3lame', '-b:a', os.getenv('TTS_MP3_BITRATE', '48k'), '-f', 'mp3']},
+    'opus': {'mime': 'audio/ogg', 'api_format': 'opus',
+             'encoder': ['-c:a', 'libopus', '-b:a', os.getenv('TTS_OPUS_BITRATE', '24k'), '-application', 'voip',
+                         '-f', 'ogg']},
+    'aac': {'mime': 'audio/aac', 'api_format': 'aac',
+            'encoder': ['-c:a', 'aac', '-b:a', os.getenv('TTS_AAC_BITRATE', '32k'), '-f', 'adts']},
+}
+
+DEFAULT_FORMAT = 'mp3'
+
+def negotiate_format(user_agent='', preferred=None):
+    """
+    Picks the speech format a client plays well.
+
+    Args:
+        user_agent (str): The client's User-Agent header
+        preferred (str): Forced format (default TTS_AUDIO_FORMAT; "auto" negotiates)
+
+    Returns:
+        str: A key of AUDIO_FORMATS
+    """
+    preferred = (preferred or TTS_AUDIO_FORMAT).lower()
+    if preferred in AUDIO_FORMATS:
+        return preferred
+    agent = (user_agent or '').lower()
+    if 'iphone' in agent or 'ipad' in agent or 'ipod' in agent:
+        return 'aac'
+    if 'safari' in agent and not any(name in agent for name in ('chrome', 'chromium', 'android')):
+        return 'aac'
+    if any(name in agent for name in ('chrome', 'chromium', 'firefox', 'android')):
+        return 'opus'
+    return DEFAULT_FORMAT
+
+def mime_type(audio_format):
+    """MIME type to hand the audio player for a format."""
+    return AUDIO_FORMATS.get(audio_format, AUDIO_FORMATS[DEFAULT_FORMAT])['mime']
+
+def transcoding_available():
+    """True if speech is re-encoded locally (TTS_TRANSCODE and ffmpeg on the PATH)."""
+    return TTS_TRANSCODE and shutil.which('ffmpeg') is not None
+
+def transcode(audio, audio_format, timeout=20):
+    """
+    Encodes audio (any format ffmpeg reads) as mono speech in the given format.
+
+    Returns:
+        bytes or None: Encoded audio, or None if ffmpeg failed
+    """
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0', '-ac', '1'] + \
+        AUDIO_FORMATS[audio_format]['encoder'] + ['pipe:1']
+    try:
+        completed = subprocess.run(command, input=audio, capture_output=True, timeout=timeout, check=True)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"✗ Could not encode speech as {audio_format}: {e}")
+        return None
+    return completed.stdout or None
+
+def synthesize(create, audio_format):
+    """
+    Gets speech in a format from a TTS call.
+
+    Args:
+        create (callable): Makes the TTS call with extra keyword arguments
+                           (response_format) and returns the response
+        audio_format (str): A key of AUDIO_FORMATS
+
+    Returns:
+        bytes: Audio in that format
+    """
+    if transcoding_available():
+        encoded = transcode(create(response_format='wav').content, audio_format)
+        if encoded is not None:
+            return encoded
+    if audio_format == DEFAULT_FORMAT:
+        # Same request as before formats were negotiated
+        return create().content
+    return create(response_format=AUDIO_FORMATS[audio_format]['api_format']).content
+
+# Layer III bitrates (kbps) by bitrate index, for MPEG-1 and MPEG-2/2.5
+_MP3_BITRATES = {
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+# ADTS sampling frequency index -> Hz
+_AAC_SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350]
+
+def mp3_duration_seconds(audio):
+    """Length of a constant-bitrate MP3 clip from its first frame header, or None if it cannot be read."""
+    offset = 0
+    if audio[:3] == b'ID3' and len(audio) >= 10:
+        offset = 10 + ((audio[6] << 21) | (audio[7] << 14) | (audio[8] << 7) | audio[9])
+    # Only padding may sit between the tag and the first frame; a sync found further in is chance
+    while offset < len(audio) and audio[offset] == 0:
+        offset += 1
+    if offset + 3 >= len(audio) or audio[offset] != 0xFF or audio[offset + 1] & 0xE0 != 0xE0:
+        return None
+    version = (audio[offset + 1] >> 3) & 3
+    layer = (audio[offset + 1] >> 1) & 3
+    bitrate_index = audio[offset + 2] >> 4
+    if layer != 1 or version == 1 or bitrate_index in (0, 15):
+        return None
+    kbps = _MP3_BITRATES[3 if version == 3 else 2][bitrate_index]
+    return (len(audio) - offset) * 8 / (kbps * 1000)
+
+def ogg_opus_duration_seconds(audio):
+    """Length of an Ogg Opus clip from its last page's granule position (48 kHz, minus pre-skip), or None."""
+    head = audio.find(b'OpusHead')
+    last_page = audio.rfind(b'OggS')
+    if not audio.startswith(b'OggS') or head < 0 or last_page < 0 or last_page + 14 > len(audio):
+        return None
+    pre_skip = int.from_bytes(audio[head + 10:head + 12], 'little')
+    granule = int.from_bytes(audio[last_page + 6:last_page + 14], 'little')
+    if granule == 0xFFFFFFFFFFFFFFFF or granule <= pre_skip:
+        return None
+    return (granule - pre_skip) / 48000
+
+def adts_duration_seconds(audio):
+    """Length of an ADTS AAC clip by walking its frame headers (1024 samples per raw block), or None."""
+    offset, seconds = 0, 0.0
+    while offset + 7 <= len(audio):
+        header = audio[offset:offset + 7]
+        if header[0] != 0xFF or header[1] & 0xF6 != 0xF0:
+            return None
+        rate_index = (header[2] >> 2) & 0xF
+        frame_length = ((header[3] & 3) << 11) | (header[4] << 3) | (header[5] >> 5)
+        if rate_index >= len(_AAC_SAMPLE_RATES) or frame_length < 7:
+            return None
+        seconds += ((header[6] & 3) + 1) * 1024 / _AAC_SAMPLE_RATES[rate_index]
+        offset += frame_length
+    return seconds or None
+
+def audio_duration_seconds(audio, audio_format):
+    """
+    Playing time of a clip, read from the container of its format.
+
+    Returns:
+        float or None: Seconds, or None if the clip does not parse as that format
+    """
+    if audio_format == 'opus':
+        return ogg_opus_duration_seconds(audio)
+    if audio_format == 'aac':
+        return adts_duration_seconds(audio)
+    return mp3_duration_seconds(audio)
+
+class RecentAudio:
+    """In-memory LRU of recently played clips, bounded by total bytes."""
+
+    def __init__(self, max_bytes=AUDIO_MEMORY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._clips = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            audio = self._clips.get(key)
+            if audio is not None:
+                self._clips.move_to_end(key)
+            return audio
+
+    def set(self, key, audio):
+        if len(audio) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._clips.pop(key, None)
+            self._bytes -= len(previous) if previous is not None else 0
+            self._clips[key] = audio
+            self._bytes += len(audio)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._clips.popitem(last=False)
+                self._bytes -= len(evicted)
+
+class AudioDeliveryStats:
+    """Payload bytes and time-to-ready of delivered speech, per format and source."""
+
+    def __init__(self, link_kbps=AUDIO_LINK_KBPS):
+        self.link_kbps = link_kbps
+        self._lock = threading.Lock()
+        self._formats = {}
+
+    def record(self, audio_format, payload_bytes, ready_seconds, source):
+        """
+        Records one delivered clip.
+
+        Args:
+            audio_format (str): Format delivered
+            payload_bytes (int): Size of the clip
+            ready_seconds (float): Time until the clip was ready to send
+            source (str): "memory", "cache" or "synthesized"
+        """
+        with self._lock:
+            totals = self._formats.setdefault(audio_format, {'clips': 0, 'bytes': 0, 'ready_seconds': 0.0,
+                                                             'memory': 0, 'cache': 0, 'synthesized': 0})
+            totals['clips'] += 1
+            totals['bytes'] += payload_bytes
+            totals['ready_seconds'] += ready_seconds
+            totals[source] += 1
+
+    def snapshot(self):
+        """Per format: clips, sources, mean bytes, mean time-to-ready and estimated playback start (ms)."""
+        with self._lock:
+            formats = {name: dict(totals) for name, totals in self._formats.items()}
+        report = {}
+        for name, totals in formats.items():
+            mean_bytes = totals['bytes'] / totals['clips']
+            ready_ms = totals['ready_seconds'] / totals['clips'] * 1000
+            report[name] = {
+                'clips': totals['clips'],
+                'sources': {source: totals[source] for source in ('memory', 'cache', 'synthesized')},
+                'mean_bytes': round(mean_bytes),
+                'mean_ready_ms': round(ready_ms, 1),
+                # Players start once the (small) clip has arrived
+                'est_start_ms': round(ready_ms + mean_bytes * 8 / self.link_kbps, 1)
+            }
+        return {'link_kbps': self.link_kbps, 'transcoding': transcoding_available(), 'formats': report}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare speech formats for an audio clip (needs ffmpeg)')
+    parser.add_argument('clip', help='Speech clip, e.g. a WAV or MP3 from the TTS API')
+    parser.add_argument('--link-kbps', type=float, default=AUDIO_LINK_KBPS)
+    args = parser.parse_args()
+
+    if shutil.which('ffmpeg') is None:
+        raise SystemExit("ffmpeg is not installed")
+    with open(args.clip, 'rb') as f:
+        source = f.read()
+    print(f"{'source':6s} {len(source):9d} bytes  transfer {len(source) * 8 / args.link_kbps:7.1f} ms")
+    for name in AUDIO_FORMATS:
+        started = time.perf_counter()
+        encoded = transcode(source, name)
+        elapsed = (time.perf_counter() - started) * 1000
+        if encoded is None:
+            print(f"{name:6s} failed")
+            continue
+        print(f"{name:6s} {len(encoded):9d} bytes  transfer {len(encoded) * 8 / args.link_kbps:7.1f} ms  "
+              f"encode {elapsed:6.1f} ms")
@@ -0,0 +1,191 @@
+"""
+Concurrency-safe helpers for the on-disk caches.
+Provides atomic write-then-rename, an inter-process file lock, compact JSON
+or gzip-compressed encoding, and an mtime-checked in-memory copy so several
+Streamlit worker processes can share one cache file without re-parsing it
+on every call or ever seeing a half-written file.
+"""
+
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl  # POSIX
+except ImportError:
+    fcntl = None
+    import msvcrt  # Windows
+
+# Supported cache encodings
+ENCODING_JSON = 'json'
+ENCODING_GZIP = 'gzip'
+ENCODINGS = (ENCODING_JSON, ENCODING_GZIP)
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Parsed copies of cache files: path -> (mtime_ns, size, value)
+_memory_copies = {}
+_memory_lock = threading.Lock()
+
+def atomic_write_bytes(path, data):
+    """
+    Writes bytes to a file atomically: data goes to a temporary file in the
+    same directory which then replaces the target in one rename, so readers
+    only ever see the old or the new file.
+
+    Args:
+        path (str): Destination file path
+        data (bytes): File content
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def encode_json(data, encoding=ENCODING_JSON):
+    """
+    Serializes data as compact JSON, optionally gzip-compressed.
+
+    Args:
+        data: JSON-serializable value
+        encoding (str): 'json' or 'gzip'
+
+    Returns:
+        bytes: Encoded content
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown cache encoding: {encoding}")
+    raw = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if encoding == ENCODING_GZIP:
+        return gzip.compress(raw, compresslevel=6)
+    return raw
+
+def decode_json(raw):
+    """Parses content written by encode_json; the encoding is detected from the gzip magic bytes."""
+    if raw[:2] == GZIP_MAGIC:
+        raw = gzip.decompress(raw)
+    return json.loads(raw.decode('utf-8'))
+
+def write_json(path, data, encoding=ENCODING_JSON):
+    """Atomically writes data to path and refreshes the in-memory copy."""
+    atomic_write_bytes(path, encode_json(data, encoding))
+    with _memory_lock:
+        _memory_copies.pop(os.path.abspath(path), None)
+
+def read_json(path):
+    """
+    Reads a JSON cache file, reusing the parsed copy from memory while the
+    file's mtime and size are unchanged. The returned value is shared between
+    callers and must be treated as read-only.
+
+    Args:
+        path (str): Cache file path
+
+    Returns:
+        The parsed content, or None if the file does not exist
+    """
+    key = os.path.abspath(path)
+    try:
+        stat = os.stat(key)
+    except FileNotFoundError:
+        with _memory_lock:
+            _memory_copies.pop(key, None)
+        return None
+
+    with _memory_lock:
+        cached = _memory_copies.get(key)
+    if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+
+    with open(key, 'rb') as f:
+        value = decode_json(f.read())
+    with _memory_lock:
+        _memory_copies[key] = (stat.st_mtime_ns, stat.st_size, value)
+    return value
+
+def forget(path):
+    """Drops the in-memory copy of a cache file."""
+    with _memory_lock:
+        _memory_copies.pop(os.path.abspath(path), None)
+
+class FileLock:
+    """
+    Exclusive inter-process lock backed by a lock file (flock on POSIX,
+    msvcrt.locking on Windows). Usable as a context manager.
+    """
+
+    def __init__(self, path, timeout=None, poll_interval=0.2):
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._file = None
+
+    def _try_lock(self):
+        """Attempts to take the lock without blocking."""
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, timeout=None):
+        """
+        Acquires the lock, waiting up to `timeout` seconds (None waits forever).
+
+        Returns:
+            bool: True if the lock was acquired
+        """
+        timeout = self.timeout if timeout is None else timeout
+        self._file = open(self.path, 'a+')
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._try_lock():
+            if deadline is not None and time.monotonic() >= deadline:
+                self._file.close()
+                self._file = None
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def release(self):
+        """Releases the lock if held."""
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+    @property
+    def locked(self):
+        """True while this instance holds the lock."""
+        return self._file is not None
+
+    def __enter__(self):
+        if not self.acquire():
+            raise TimeoutError(f"Timed out waiting for lock: {self.path}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -0,0 +1,23 @@
+"""
+Chatbot core, independent of Streamlit: ChatEngine answers questions for
+explicit ChatSession objects, and chat_engine.server exposes it over
+HTTP/WebSocket.
+"""
+
+from chat_engine.engine import (ChatEngine, build_engine, sanitize_markdown, sanitize_followup_questions,
+                                UPSTREAM_UNAVAILABLE_MESSAGE)
+from chat_engine.prompts import load_example_questions, load_system_prompts, get_schedule_context
+from chat_engine.session import ChatSession, SessionRepository
+
+__all__ = [
+    'ChatEngine',
+    'ChatSession',
+    'SessionRepository',
+    'build_engine',
+    'get_schedule_context',
+    'load_example_questions',
+    'load_system_prompts',
+    'sanitize_followup_questions',
+    'sanitize_markdown',
+    'UPSTREAM_UNAVAILABLE_MESSAGE'
+]
@@ -0,0 +1,603 @@
+"""
+UI-independent chat engine: prompt routing, context building, completions,
+follow-up questions, transcription and text-to-speech for explicit
+ChatSession objects. The Streamlit app, the Gradio experiment, the HTTP/WebSocket
+server and the load tests all drive the same engine.
+"""
+
+from datetime import datetime
+import asyncio
+import os
+import re
+import time
+
+from audio_delivery import AudioDeliveryStats, RecentAudio, synthesize, DEFAULT_FORMAT
+from event_search import EventIndex, numpy_available, INDEX_DIR
+from ics_export import calendar_answer_text, calendar_entry, calendar_ics, calendar_request
+from event_parser import parse_events
+from intent_classifier import classify_intent
+from name_matcher import get_name_matcher
+from schedule_query import ScheduleQueryEngine
+from temporal_parser import resolve as resolve_dates
+from prompt_builder import build_chat_prompt, prefix_stats, update_totals
+from request_dispatcher import calls_for
+from resilient_client import UpstreamUnavailableError
+from schedule_compactor import compaction_report
+from shared_store import get_store, get_audio_store, hashed_key, AUDIO_CACHE_TTL_SECONDS
+from tracing import get_tracer
+from usage_meter import (UsageMeter, metered_chat_completion, metered_chat_stream, metered_transcription,
+                         metered_speech, wav_duration_seconds, BudgetExceededError, BUDGET_EXHAUSTED_MESSAGE)
+
+from chat_engine.prompts import (load_system_prompts, get_schedule_context, get_schedule_text, get_window_context,
+                                 load_text_file, static_schedule, transcribe_prompt_path, SCHEDULE_COMPACT)
+from chat_engine.session import ChatSession, SessionRepository
+
+CHAT_MODEL = "gpt-4.1-mini"
+TRANSCRIPTION_MODEL = "whisper-1"
+TTS_MODEL = "tts-1"
+TTS_VOICE = "nova"  # Using 'nova' voice which is clear and friendly
+MAX_COMPLETION_TOKENS = 500
+
+# Answer simple schedule lookups from the parsed schedule without a model call
+SCHEDULE_FAST_PATH = os.getenv('SCHEDULE_FAST_PATH', 'true').lower() == 'true'
+
+# Match loosely described activities to events (needs NumPy; see event_search)
+EVENT_SEARCH = os.getenv('EVENT_SEARCH', 'true').lower() == 'true'
+# Questions the intent rules leave on the default prompt go to the schedule
+# prompt when an event matches at least this well
+EVENT_ROUTE_SCORE = float(os.getenv('EVENT_ROUTE_SCORE', '0.6'))
+
+# Answer "add this to my calendar" questions with a local .ics file instead of a model tutorial
+CALENDAR_EXPORT = os.getenv('CALENDAR_EXPORT', 'true').lower() == 'true'
+
+# Rewrite mangled event, place and instructor names ("tie chee") before routing
+NAME_MATCHING = os.getenv('NAME_MATCHING', 'true').lower() == 'true'
+
+# Resolve "tonight", "next Friday", ... locally and list that window's events with the turn
+SCHEDULE_DATE_WINDOWS = os.getenv('SCHEDULE_DATE_WINDOWS', 'true').lower() == 'true'
+
+# Shown when the OpenAI service and every fallback are unavailable
+UPSTREAM_UNAVAILABLE_MESSAGE = ("I'm sorry, I can't reach the assistant service right now. "
+                                "Please try again in a minute or ask the front desk for help.")
+VOICE_UNAVAILABLE_MESSAGE = "Voice input is unavailable right now. Please type your question instead."
+AUDIO_UNAVAILABLE_MESSAGE = "Audio playback is unavailable right now because the usage limit was reached."
+
+FOLLOWUP_INSTRUCTION = ("Generate three follow-up questions that the user may want to ask within 10 words "
+                        "based on this response:")
+
+# Remove markdown formatting from text
+def sanitize_markdown(text):
+    """Removes common Markdown symbols from the given text."""
+    # Remove bold/italic markers (* or _)
+    text = re.sub(r'[*_]+', '', text)
+    return text
+
+# Clean up follow-up questions formatting
+def sanitize_followup_questions(questions):
+    """Removes leading numbers and formatting from questions."""
+    sanitized = []
+    for question in questions:
+        # Remove leading numbers and whitespace
+        sanitized.append(question.lstrip("1234567890. ").strip())
+    return sanitized
+
+class ChatEngine:
+    """Chat pipeline shared by every UI; holds no per-resident state itself."""
+
+    def __init__(self, client, usage_meter=None, tracer=None, system_prompts=None, schedule_provider=None,
+                 dispatcher=None, on_error=print, sessions=None, audio_cache=None, schedule_query=None,
+                 event_search=None, clock=datetime.now):
+        """
+        Args:
+            client: OpenAI-compatible client (usually a ResilientOpenAI)
+            usage_meter (UsageMeter): Shared usage meter
+            tracer (Tracer): Tracer for chat turns (process-wide by default)
+            system_prompts (dict): Prompt text by key (default: the prompts/ files)
+            schedule_provider (callable): Returns the current schedule text or
+                None; with the default prompts the static events file is used
+            dispatcher (RequestDispatcher): Request queue behind the client, for stats
+            on_error (callable): Called with a message when routing fails
+            sessions (SessionRepository): Shared session storage, so any
+                replica can continue a session (None: sessions live in the UI only)
+            audio_cache: Key-value store for synthesized speech shared by replicas
+            schedule_query (ScheduleQueryEngine): Fast path for simple schedule
+                lookups (default: enabled unless SCHEDULE_FAST_PATH=false)
+            event_search (EventIndex): Semantic event index for loosely described
+                activities (None: no event search; build_engine creates one)
+            clock (callable): Current local time, for the date context, relative
+                dates and calendar requests
+        """
+        self.client = client
+        self.usage_meter = usage_meter or UsageMeter()
+        self.tracer = tracer or get_tracer()
+        self.dispatcher = dispatcher
+        self.on_error = on_error
+        self.clock = clock
+        self.sessions = sessions
+        self.audio_cache = audio_cache
+        self.recent_audio = RecentAudio()
+        self.audio_stats = AudioDeliveryStats()
+        if schedule_query is None and SCHEDULE_FAST_PATH:
+            schedule_query = ScheduleQueryEngine(clock=clock)
+        self.schedule_query = schedule_query
+        self.event_search = event_search
+        if system_prompts is None:
+            schedule_provider = schedule_provider or static_schedule
+        self._system_prompts = system_prompts
+        self.schedule_provider = schedule_provider
+
+    @property
+    def system_prompts(self):
+        """Prompt text by key; the prompt files are read on the first question, not at startup."""
+        if self._system_prompts is None:
+            self._system_prompts = load_system_prompts()
+        return self._system_prompts
+
+    def new_session(self, session_id=None):
+        """Creates a session with an empty first conversation."""
+        session = ChatSession(session_id)
+        session.new_conversation()
+        return session
+
+    # Select the system prompt key based on user input
+    def select_prompt_key(self, user_input):
+        """Determines which system prompt key to use based on the classified intent of the user input."""
+        try:
+            intent = classify_intent(user_input)
+            # Fall back to the broader prompt if the intent's own prompt isn't configured
+            if self.system_prompts.get(intent["prompt"]):
+                return intent["prompt"]
+            return intent["fallback_prompt"]
+        except Exception as e:
+            self.on_error(f"Error in prompt selection: {str(e)}")
+            return "default"
+
+    def system_prompt(self, prompt_key):
+        """
+        Returns the prompt text for a key, with the current schedule for
+        schedule/menu questions. It does not depend on the question, so the
+        prefix stays cacheable; date windows go in context_data.
+        """
+        prompt = self.system_prompts[prompt_key]
+        if prompt_key == "schedule_menu" and self.schedule_provider is not None:
+            prompt = prompt + "\n\n" + get_schedule_context(self.schedule_provider)
+        return prompt
+
+    # Select appropriate system prompt based on user input
+    def select_prompt_by_context(self, user_input):
+        """Determines which system prompt to use based on the classified intent of the user input."""
+        return self.system_prompt(self.select_prompt_key(user_input))
+
+    def canonicalize_names(self, input_text):
+        """
+        Rewrites schedule names mangled by transcription (see name_matcher).
+
+        Returns:
+            dict: 'text' (the question with names fixed) and 'replacements'
+        """
+        unchanged = {'text': input_text, 'replacements': []}
+        if not NAME_MATCHING or self.schedule_provider is None:
+            return unchanged
+        with self.tracer.span("name_matching") as span:
+            try:
+                result = get_name_matcher(get_schedule_text(self.schedule_provider)).canonicalize(input_text)
+            except Exception as e:
+                self.on_error(f"Error in name matching: {str(e)}")
+                result = unchanged
+            span["replacements"] = len(result['replacements'])
+        return result
+
+    def date_window(self, input_text, now=None):
+        """Resolves the date expression in a schedule question (see temporal_parser), or None."""
+        if not SCHEDULE_DATE_WINDOWS:
+            return None
+        with self.tracer.span("date_resolution") as span:
+            window = resolve_dates(input_text, now or self.clock())
+            span["window"] = window['label'] if window else None
+        return window
+
+    def find_events(self, input_text):
+        """Returns the events that best match a loosely described activity (see EventIndex.search)."""
+        if self.event_search is None or self.schedule_provider is None:
+            return []
+        with self.tracer.span("event_search") as span:
+            try:
+                self.event_search.update(get_schedule_text(self.schedule_provider))
+                matches = self.event_search.search(input_text)
+            except Exception as e:
+                self.on_error(f"Error in event search: {str(e)}")
+                matches = []
+            span["matches"] = len(matches)
+        return matches
+
+    # Generate context information for the current session
+    def context_data(self, session, event_matches=None, window=None, name_replacements=None):
+        """Creates context data about the current session for the AI."""
+        # Minute resolution: identical questions within the same minute produce identical prompts
+        current_date = self.clock()
+        context = f"""
+=== CURRENT DATE AND TIME ===
+Today's Date: {current_date.strftime("%A %B %d, %Y")}
+Current Time: {current_date.strftime("%I:%M %p")}
+Day of Week: {current_date.strftime("%A")}
+Session length: {len(session.history)} messages
+"""
+        if name_replacements:
+            context += "\n=== NAMES IN THE QUESTION ===\n" + "\n".join(
+                f"\"{original}\" probably means \"{name}\"" for original, name in name_replacements) + "\n"
+        if window is not None:
+            context += f"\n=== DATES IN THE QUESTION ===\n\"{window['phrase']}\" means {window['label']}\n"
+            events = get_window_context(self.schedule_provider, window) if self.schedule_provider is not None else None
+            if events:
+                context += f"\n=== EVENTS ON THOSE DATES ===\n{events}\n"
+        if event_matches:
+            context += "\n=== EVENTS THAT MAY MATCH THE QUESTION ===\n" + "\n".join(
+                f"- {match['title']}" + (f" ({match['location']})" if match['location'] else "")
+                for match in event_matches) + "\n"
+        return context
+
+    def reply(self, session, input_text, on_answer=None, on_delta=None):
+        """
+        Answers a question in the session's current conversation.
+
+        Appends the question and the answer (or an apology/error message) to
+        the conversation and sets session.followups.
+
+        Args:
+            session (ChatSession): Resident session
+            input_text (str): The question
+            on_answer (callable): Called with the answer text before follow-up
+                                  questions are generated, so a UI can show it early
+            on_delta (callable): If given, the answer is streamed and this is
+                                 called with each piece of raw (unsanitized) text
+
+        Returns:
+            dict: 'text' of the answer, 'followups', 'prompt_key', budget
+                  'level', 'error' (None on success), 'fast_path' (True if
+                  answered from the schedule without a model call) and
+                  'calendar' (calendar entries offered as an .ics file, or None)
+        """
+        history = session.history
+        history.append({"role": "user", "text": input_text})
+        result = {'text': None, 'followups': [], 'prompt_key': None, 'level': None, 'error': None,
+                  'fast_path': False, 'calendar': None}
+
+        with self.tracer.trace("chat_turn", session=session.usage_session_id) as trace, \
+                calls_for(session.usage_session_id):
+            try:
+                budget = self.usage_meter.check_budget(session.usage_session_id)
+                result['level'] = budget["level"]
+
+                # Routing and retrieval see the question with schedule names fixed;
+                # the history keeps the resident's own words
+                names = self.canonicalize_names(input_text)
+                query_text = names['text']
+
+                with self.tracer.span("prompt_selection") as span:
+                    prompt_key = self.select_prompt_key(query_text)
+                    span["prompt"] = prompt_key
+
+                # Loosely described activities ("the balance class") are matched to
+                # events; a strong match sends an unclassified question to the schedule
+                event_matches = []
+                if prompt_key in ("schedule_menu", "default"):
+                    event_matches = self.find_events(query_text)
+                    if (prompt_key == "default" and event_matches and event_matches[0]['score'] >= EVENT_ROUTE_SCORE
+                            and self.system_prompts.get("schedule_menu")):
+                        prompt_key = "schedule_menu"
+                    if prompt_key != "schedule_menu":
+                        event_matches = []
+                result['prompt_key'] = prompt_key
+
+                # Simple schedule lookups and calendar requests are answered straight from
+                # the schedule (no model call, so they work even once the budget is used up)
+                fast_answer = self.calendar_answer(history, query_text)
+                if fast_answer is not None:
+                    result['calendar'] = fast_answer['calendar']
+                else:
+                    fast_answer = self.fast_path_answer(prompt_key, query_text)
+                if fast_answer is not None:
+                    trace["attributes"]["fast_path"] = fast_answer['kind']
+                    message = {"role": "assistant", "text": fast_answer['text']}
+                    if result['calendar']:
+                        message["calendar"] = result['calendar']
+                    history.append(message)
+                    result['text'] = fast_answer['text']
+                    result['fast_path'] = True
+                    session.followups = fast_answer['followups']
+                    if on_answer is not None:
+                        on_answer(fast_answer['text'])
+                    result['followups'] = list(session.followups)
+                    return result
+
+                # Check usage budgets before calling the model
+                if not budget["chat"]:
+                    raise BudgetExceededError(BUDGET_EXHAUSTED_MESSAGE)
+                window = self.date_window(query_text) if prompt_key == "schedule_menu" else None
+                system_prompt = self.system_prompt(prompt_key)
+
+                # Order messages from most to least stable: instructions, earlier turns,
+                # per-turn context, then the new question (keeps the prefix cacheable)
+                with self.tracer.span("context_building"):
+                    context = self.context_data(session, event_matches, window, names['replacements'])
+                    prompt = build_chat_prompt(system_prompt, history, context)
+                    conversation_id = session.current_conversation_id
+                    prompt_stats = prefix_stats(prompt, session.prompt_prefix_hashes.get(conversation_id))
+                    session.prompt_prefix_hashes[conversation_id] = prompt["message_hashes"]
+
+                # Generate response
+                completion_kwargs = dict(
+                    model=CHAT_MODEL,
+                    messages=prompt["messages"],
+                    # Shorter answers once a budget is nearly used up
+                    max_completion_tokens=budget["max_completion_tokens"] or MAX_COMPLETION_TOKENS,
+                )
+                with self.tracer.span("chat_completion", model=CHAT_MODEL, stream=on_delta is not None):
+                    answer_text = self.stream_completion(session, prompt_key, on_delta, completion_kwargs) \
+                        if on_delta is not None else None
+                    response = None
+                    if answer_text is None:
+                        response = metered_chat_completion(self.client, self.usage_meter, session.usage_session_id,
+                                                           prompt_key, **completion_kwargs)
+                        answer_text = response.choices[0].message.content
+                session.last_prompt_stats = prompt_stats
+                update_totals(session.prompt_cache_totals, prompt_stats, getattr(response, "usage", None))
+                with self.tracer.span("sanitize_markdown"):
+                    bot_response = sanitize_markdown(answer_text)
+                history.append({"role": "assistant", "text": bot_response})
+                result['text'] = bot_response
+                if on_answer is not None:
+                    on_answer(bot_response)
+
+                # Generate follow-up questions (skipped when running on a degraded budget)
+                if budget["followups"]:
+                    with self.tracer.span("followup_generation"):
+                        session.followups = self.generate_followups(session, bot_response)
+                else:
+                    session.followups = []
+
+            except BudgetExceededError as e:
+                trace["attributes"]["budget_exceeded"] = True
+                result['text'] = str(e)
+                result['error'] = 'budget_exceeded'
+
+            except UpstreamUnavailableError as e:
+                trace["error"] = str(e)
+                result['text'] = UPSTREAM_UNAVAILABLE_MESSAGE
+                result['error'] = 'upstream_unavailable'
+
+            except Exception as e:
+                trace["error"] = str(e)
+                result['text'] = f"Error: {e}"
+                result['error'] = 'error'
+
+            if result['error']:
+                history.append({"role": "assistant", "text": result['text']})
+                session.followups = []
+
+        result['followups'] = list(session.followups)
+        return result
+
+    def stream_completion(self, session, prompt_key, on_delta, completion_kwargs):
+        """
+        Streams the answer to on_delta.
+
+        Returns:
+            str or None: The raw answer, or None if the upstream failed before
+                         sending anything (the caller then makes a plain call,
+                         which can still be answered by the fallbacks)
+        """
+        delivered = []
+
+        def deliver(piece):
+            delivered.append(piece)
+            on_delta(piece)
+
+        try:
+            return metered_chat_stream(self.client, self.usage_meter, session.usage_session_id, prompt_key, deliver,
+                                       **completion_kwargs)
+        except UpstreamUnavailableError:
+            if delivered:
+                raise
+            return None
+
+    def fast_path_answer(self, prompt_key, input_text):
+        """Returns the schedule fast-path answer for a schedule question, or None to ask the model."""
+        if self.schedule_query is None or prompt_key != "schedule_menu" or self.schedule_provider is None:
+            return None
+        with self.tracer.span("schedule_fast_path") as span:
+            answer = self.schedule_query.answer(input_text, get_schedule_text(self.schedule_provider))
+            span["hit"] = answer is not None
+        return answer
+
+    def calendar_answer(self, history, input_text, now=None):
+        """
+        Answers a calendar/reminder question with an .ics file for the
+        event(s) meant (see ics_export), or returns None to ask the model.
+        """
+        if not CALENDAR_EXPORT or self.schedule_provider is None:
+            return None
+        with self.tracer.span("calendar_export") as span:
+            # "the event" refers to the previous answer
+            recent = next((message['text'] for message in reversed(history[:-1])
+                           if message['role'] == 'assistant'), '')
+            request = calendar_request(input_text, get_schedule_text(self.schedule_provider), recent,
+                                       now or self.clock())
+            span["events"] = len(request['entries']) if request else 0
+        if request is None:
+            return None
+        return {'text': calendar_answer_text(request), 'followups': [], 'kind': 'calendar',
+                'calendar': request['entries']}
+
+    def calendar_file(self, day, uid=None):
+        """
+        The .ics file for the events on a day (or one of them), for download links.
+
+        Args:
+            day (date): Event day
+            uid (str): Calendar entry UID (None: every event that day)
+
+        Returns:
+            tuple or None: (entries, iCalendar text), or None if nothing matches
+        """
+        if self.schedule_provider is None:
+            return None
+        entries = [calendar_entry(event) for event in parse_events(get_schedule_text(self.schedule_provider), day.year)
+                   if event['date'] == day and not event['cancelled']]
+        if uid is not None:
+            entries = [entry for entry in entries if entry['uid'] == uid]
+        return (entries, calendar_ics(entries)) if entries else None
+
+    # Generate follow-up questions using GPT
+    def generate_followups(self, session, response):
+        """Creates relevant follow-up questions based on the assistant's response."""
+        prompt = [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": FOLLOWUP_INSTRUCTION},
+            {"role": "assistant", "content": response}
+        ]
+        try:
+            completion = metered_chat_completion(
+                self.client, self.usage_meter, session.usage_session_id, "followups", kind="followups",
+                model=CHAT_MODEL,
+                messages=prompt,
+                max_completion_tokens=MAX_COMPLETION_TOKENS,
+            )
+            followup_text = completion.choices[0].message.content.strip()
+            raw_questions = followup_text.split("\n")  # Split lines
+            return sanitize_followup_questions(raw_questions)
+        except Exception as e:
+            return [f"Error generating follow-up questions: {e}"]
+
+    def transcribe(self, session, audio_bytes, filename="question.wav"):
+        """
+        Transcribes recorded audio with elderly-friendly prompting.
+
+        Raises:
+            BudgetExceededError: If voice input is over budget
+        """
+        if not self.usage_meter.check_budget(session.usage_session_id)["transcription"]:
+            raise BudgetExceededError(VOICE_UNAVAILABLE_MESSAGE)
+        with self.tracer.span("transcription"), calls_for(session.usage_session_id):
+            transcript = metered_transcription(
+                self.client, self.usage_meter, session.usage_session_id, wav_duration_seconds(audio_bytes),
+                model=TRANSCRIPTION_MODEL,
+                file=(filename, audio_bytes),
+                prompt=load_text_file(transcribe_prompt_path)
+            )
+        return transcript.text.strip()
+
+    def speak(self, session, text, audio_format=DEFAULT_FORMAT):
+        """
+        Converts text to speech. Audio already synthesized for the same text
+        and format (by any replica sharing the audio cache) is reused without
+        a new request or any usage charge; recently played clips come from
+        memory.
+
+        Args:
+            session (ChatSession): Resident session
+            text (str): Text to speak
+            audio_format (str): "mp3", "opus" or "aac" (see audio_delivery.negotiate_format)
+
+        Returns:
+            bytes: Audio in that format
+
+        Raises:
+            BudgetExceededError: If text-to-speech is over budget
+        """
+        started = time.perf_counter()
+        # MP3 keeps the cache key it had before other formats existed
+        cache_key = hashed_key('tts', TTS_MODEL, TTS_VOICE, text) if audio_format == DEFAULT_FORMAT else \
+            hashed_key('tts', TTS_MODEL, TTS_VOICE, audio_format, text)
+        audio, source = self.recent_audio.get(cache_key), 'memory'
+        if audio is None:
+            audio, source = self._cached_audio(cache_key), 'cache'
+        if audio is None:
+            audio, source = self._synthesize(session, text, audio_format, cache_key), 'synthesized'
+        self.recent_audio.set(cache_key, audio)
+        self.audio_stats.record(audio_format, len(audio), time.perf_counter() - started, source)
+        return audio
+
+    def _synthesize(self, session, text, audio_format, cache_key):
+        """Makes the metered TTS call(s) for speak() and stores the result in the audio cache."""
+        if not self.usage_meter.check_budget(session.usage_session_id)["tts"]:
+            raise BudgetExceededError(AUDIO_UNAVAILABLE_MESSAGE)
+
+        def create(**kwargs):
+            return metered_speech(self.client, self.usage_meter, session.usage_session_id,
+                                  model=TTS_MODEL, voice=TTS_VOICE, input=text, **kwargs)
+
+        with self.tracer.span("text_to_speech", characters=len(text), format=audio_format), \
+                calls_for(session.usage_session_id):
+            audio = synthesize(create, audio_format)
+        if self.audio_cache is not None:
+            try:
+                self.audio_cache.set(cache_key, audio, ttl=AUDIO_CACHE_TTL_SECONDS)
+            except Exception as e:
+                print(f"✗ Could not cache speech audio: {e}")
+        return audio
+
+    def _cached_audio(self, cache_key):
+        """Returns cached speech audio, or None (also when the cache is unreachable)."""
+        if self.audio_cache is None:
+            return None
+        try:
+            return self.audio_cache.get(cache_key)
+        except Exception as e:
+            print(f"✗ Speech audio cache unavailable: {e}")
+            return None
+
+    # Async variants for asyncio servers; the blocking calls run in worker threads
+    async def areply(self, session, input_text):
+        """Async reply()."""
+        return await asyncio.to_thread(self.reply, session, input_text)
+
+    async def atranscribe(self, session, audio_bytes, filename="question.wav"):
+        """Async transcribe()."""
+        return await asyncio.to_thread(self.transcribe, session, audio_bytes, filename)
+
+    async def aspeak(self, session, text, audio_format=DEFAULT_FORMAT):
+        """Async speak()."""
+        return await asyncio.to_thread(self.speak, session, text, audio_format)
+
+    def stats(self):
+        """Client, queue, fast-path, event search, schedule, speech delivery and usage stats (aggregates only)."""
+        return {
+            'client': self.client.stats() if hasattr(self.client, 'stats') else {},
+            'queue': self.dispatcher.stats() if self.dispatcher is not None else {},
+            'fast_path': self.schedule_query.stats() if self.schedule_query is not None else {},
+            'event_search': self.event_search.stats() if self.event_search is not None else {},
+            'schedule': compaction_report(get_schedule_text(self.schedule_provider)) if SCHEDULE_COMPACT else {},
+            'audio': self.audio_stats.snapshot(),
+            'usage': self.usage_meter.summary(per_session=False)
+        }
+
+def build_engine(api_key, base_url=None, schedule_provider=None, tracer=None, store=None, audio_store=None,
+                 event_index_dir=None):
+    """
+    Creates a ChatEngine with the process's shared request dispatcher,
+    resilient OpenAI client and usage meter. Sessions, fallback answers and
+    speech audio go to the shared stores (STORE_BACKEND), so replicas behind
+    a load balancer stay consistent.
+
+    Args:
+        api_key (str): OpenAI API key
+        base_url (str): Optional API base URL (default: OPENAI_BASE_URL or OpenAI)
+        schedule_provider (callable): Current schedule text provider (default: static file)
+        tracer (Tracer): Tracer (default: process-wide)
+        store: Key-value store for sessions, answers and usage budgets (default: shared_store.get_store())
+        audio_store: Key-value store for speech audio (default: shared_store.get_audio_store())
+        event_index_dir (str): Where the event search index is kept (default:
+            EVENT_INDEX_DIR); search is on if NumPy is installed, unless EVENT_SEARCH=false
+    """
+    from request_dispatcher import RequestDispatcher
+    from resilient_client import build_resilient_client
+
+    tracer = tracer or get_tracer()
+    store = store or get_store()
+    audio_store = audio_store or get_audio_store()
+    dispatcher = RequestDispatcher(tracer=tracer)
+    client = build_resilient_client(api_key, base_url=base_url, dispatcher=dispatcher, store=store)
+    event_search = EventIndex(event_index_dir or INDEX_DIR) if EVENT_SEARCH and numpy_available() else None
+    return ChatEngine(client, UsageMeter(store=store), tracer, schedule_provider=schedule_provider, dispatcher=dispatcher,
+                      sessions=SessionRepository(store), audio_cache=audio_store, event_search=event_search)
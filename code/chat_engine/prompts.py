@@ -0,0 +1,165 @@
+"""
+Prompt files and schedule context for the chat engine.
+"""
+
+import os
+import sys
+
+from event_parser import format_clock, parse_events
+from schedule_compactor import compact_events, compact_schedule
+from temporal_parser import describe_days, in_window
+
+# Determine base path (same layout rules as streamlit_gpt.py)
+if getattr(sys, 'frozen', False):
+    # Running as compiled executable
+    base_path = os.path.dirname(sys.executable)
+else:
+    # Running from code/chat_engine/
+    base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Define prompt file paths
+prompt_dir = os.path.join(base_path, "prompts")
+default_prompt_path = os.path.join(prompt_dir, "default_prompt.txt")
+retirement_prompt_path = os.path.join(prompt_dir, "retirement_assistant_prompt.txt")
+schedule_prompt_path = os.path.join(prompt_dir, "schedule_menu_prompt.txt")
+questions_path = os.path.join(prompt_dir, "example_questions.txt")
+transcribe_prompt_path = os.path.join(prompt_dir, "transcribe_prompt.txt")
+health_prompt_path = os.path.join(prompt_dir, "health_wellness_prompt.txt")
+tech_help_prompt_path = os.path.join(prompt_dir, "tech_help_prompt.txt")
+events_path = os.path.join(prompt_dir, "events.txt")
+
+# Send the schedule with shared descriptions and weekly rules folded (see schedule_compactor)
+SCHEDULE_COMPACT = os.getenv('SCHEDULE_COMPACT', 'true').lower() == 'true'
+
+# The current date and time are sent per turn (see ChatEngine.context_data) so
+# this block stays identical between turns and can be served from the prompt cache
+SCHEDULE_HEADER = """
+=== COMMUNITY EVENTS AND SCHEDULE ===
+"""
+
+def load_text_file(filepath):
+    """Loads text content from a file."""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        print(f"✗ File not found: {filepath}")
+        return f"Error loading file: {filepath}"
+    except Exception as e:
+        print(f"✗ Error reading file {filepath}: {str(e)}")
+        return f"Error loading content: {str(e)}"
+
+def load_system_prompts():
+    """Loads the system prompts by key (the schedule is appended per request)."""
+    return {
+        "default": load_text_file(default_prompt_path),
+        "retirement_assistant": load_text_file(retirement_prompt_path),
+        "health_wellness": load_text_file(health_prompt_path),
+        "tech_help": load_text_file(tech_help_prompt_path),
+        "schedule_menu": load_text_file(schedule_prompt_path)
+    }
+
+def load_example_questions():
+    """Loads the example questions shown on the welcome screen."""
+    return [q.strip() for q in load_text_file(questions_path).split('\n') if q.strip()]
+
+def static_schedule():
+    """Returns the static events file."""
+    return load_text_file(events_path)
+
+def get_schedule_text(schedule_provider=None):
+    """
+    Gets the current schedule text from a provider, or the static file.
+
+    Args:
+        schedule_provider (callable): Returns the current schedule text, or
+                                      None if nothing is available yet (e.g.
+                                      the scraper has not finished its first run)
+
+    Returns:
+        str: Schedule text
+    """
+    if schedule_provider is not None:
+        try:
+            community_context = schedule_provider()
+            if community_context is not None:
+                return community_context
+        except Exception as e:
+            print(f"Schedule provider failed, falling back to static file: {e}")
+    return static_schedule()
+
+def window_schedule(schedule, window):
+    """
+    Renders only the events in a resolved date window (see temporal_parser).
+
+    Args:
+        schedule (str): Schedule text (events.txt layout)
+        window (dict): Resolved window from temporal_parser.resolve
+
+    Returns:
+        str or None: The events in the window, or None if the schedule
+                     cannot be parsed (the caller sends all of it instead)
+    """
+    events = parse_events(schedule or '', window['days'][0].year)
+    if not events:
+        return None
+    first, last = events[0]['date'], events[-1]['date']
+    if all(day < first or day > last for day in window['days']):
+        return (f"The schedule only covers {describe_days([first, last])}, so it has no events for "
+                f"{window['label']}.")
+    selected = [event for event in events if in_window(event, window)]
+    if not selected:
+        return f"No events are scheduled for {window['label']}."
+
+    lines = [f"Only the events for {window['label']} are listed below."]
+    if len(window['days']) > 1:
+        # Several days repeat the same classes, so fold them like the full schedule
+        return '\n'.join(lines + [compact_events(selected)])
+    current_day = None
+    for event in selected:
+        if event['date'] != current_day:
+            current_day = event['date']
+            lines.append(current_day.strftime('%A %b %d, %Y').upper())
+        line = f"- {format_clock(event['start'])}"
+        if event['end']:
+            line += f" to {format_clock(event['end'])}"
+        line += f": {event['title']}" + (" - CANCELLED" if event['cancelled'] else "")
+        if event['location']:
+            line += f", {event['location']}"
+        if event['description']:
+            line += " - " + event['description'].replace('\n', ' ')
+        lines.append(line)
+    return '\n'.join(lines)
+
+def get_window_context(schedule_provider, window):
+    """
+    Lists the events in a resolved date window for the per-turn context.
+
+    The full schedule stays in the system prompt so that prefix is identical
+    from turn to turn and can be served from the prompt cache.
+
+    Args:
+        schedule_provider (callable): Current schedule text provider (see get_schedule_text)
+        window (dict): Resolved window from temporal_parser.resolve
+
+    Returns:
+        str or None: The window's events, or None if the schedule cannot be parsed
+    """
+    return window_schedule(get_schedule_text(schedule_provider), window)
+
+def get_schedule_context(schedule_provider=None, compact=None):
+    """
+    Gets schedule/events information from a provider or the static file.
+
+    Args:
+        schedule_provider (callable): Current schedule text provider (see get_schedule_text)
+        compact (bool): Compact the schedule (default: SCHEDULE_COMPACT); text
+                        the event parser cannot read is always sent as is
+
+    Returns:
+        str: Schedule block for the schedule/menu prompt
+    """
+    schedule = get_schedule_text(schedule_provider)
+    if SCHEDULE_COMPACT if compact is None else compact:
+        schedule = compact_schedule(schedule)
+    return SCHEDULE_HEADER + schedule
@@ -0,0 +1,291 @@
+"""
+Headless HTTP/WebSocket API for the chat engine (Tornado, which ships with Streamlit).
+
+Endpoints:
+    POST /api/sessions                          -> {"session_id": ...}
+    GET  /api/sessions/<id>                     -> session state
+    POST /api/sessions/<id>/messages            {"text": ...} -> reply
+    POST /api/sessions/<id>/conversations       -> starts a new conversation
+    POST /api/sessions/<id>/transcriptions      raw WAV body -> {"text": ...}
+    POST /api/sessions/<id>/speech[?format=]    {"text": ...} -> MP3, Ogg Opus or AAC audio
+    WS   /api/sessions/<id>/ws                  send {"text": ...}, receive replies
+    GET  /calendar/<YYYY-MM-DD>.ics[?event=<uid>] -> .ics file for a day's events (or one)
+    GET  /healthz                               -> engine stats (aggregates only)
+
+The /api routes need "Authorization: Bearer <CHAT_API_TOKEN>" (browsers'
+WebSockets may pass ?token= instead) and are refused while no token is set.
+A session id is the resident's credential: it is never logged or reported,
+metering uses the session's separate usage id.
+
+Usage (from code/):
+    CHAT_API_TOKEN=... python -m chat_engine.server --port 8600
+"""
+
+from datetime import date
+from urllib.parse import urlparse
+import asyncio
+import hmac
+import json
+import os
+
+import tornado.web
+import tornado.websocket
+
+from audio_delivery import mime_type, negotiate_format
+from ics_export import calendar_filename
+
+# Shared secret for the /api routes (unset: the API refuses every request)
+CHAT_API_TOKEN = os.getenv('CHAT_API_TOKEN', '')
+# Extra origins allowed to open the WebSocket, comma-separated (same host is always allowed)
+CHAT_API_ORIGINS = [origin.strip().rstrip('/') for origin in os.getenv('CHAT_API_ORIGINS', '').split(',')
+                    if origin.strip()]
+
+def token_matches(expected, presented):
+    """True if a token is configured and the presented one equals it (constant time)."""
+    return bool(expected) and bool(presented) and hmac.compare_digest(presented.encode(), expected.encode())
+
+def presented_token(handler):
+    """The bearer token of a request (Authorization header, or ?token= for WebSockets)."""
+    header = handler.request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):].strip()
+    if isinstance(handler, tornado.websocket.WebSocketHandler):
+        return handler.get_query_argument('token', '')
+    return ''
+
+class SessionStore:
+    """
+    Sessions for the server, with one lock per session so turns do not
+    interleave. With a SessionRepository every read and write goes to the
+    shared store, so any replica can serve any session; otherwise sessions
+    are in-memory in this process. (Locks are per process: a load balancer
+    should still keep a session's concurrent requests on one replica.)
+    """
+
+    def __init__(self, repository=None):
+        self.repository = repository
+        self.sessions = {}
+        self.locks = {}
+
+    def create(self, engine):
+        session = engine.new_session()
+        self.save(session)
+        return session
+
+    def get(self, session_id):
+        if self.repository is not None:
+            return self.repository.load(session_id)
+        return self.sessions.get(session_id)
+
+    def save(self, session):
+        if self.repository is not None:
+            self.repository.save(session)
+        else:
+            self.sessions[session.session_id] = session
+
+    def lock(self, session_id):
+        return self.locks.setdefault(session_id, asyncio.Lock())
+
+class _Handler(tornado.web.RequestHandler):
+    """Base handler with JSON helpers, session lookup and the API token check."""
+
+    requires_token = True
+
+    def initialize(self, engine, store, api_token):
+        self.engine = engine
+        self.store = store
+        self.api_token = api_token
+
+    def prepare(self):
+        if self.requires_token and not token_matches(self.api_token, presented_token(self)):
+            raise tornado.web.HTTPError(401, reason="Missing or wrong API token")
+
+    def write_json(self, body, status=200):
+        self.set_status(status)
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps(body, default=str))
+
+    def json_body(self):
+        try:
+            return json.loads(self.request.body or b'{}')
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Body must be JSON")
+
+    def session_or_404(self, session_id):
+        session = self.store.get(session_id)
+        if session is None:
+            raise tornado.web.HTTPError(404, reason="Unknown session")
+        return session
+
+class HealthHandler(_Handler):
+    requires_token = False
+
+    def get(self):
+        self.write_json({'status': 'ok', 'stats': self.engine.stats()})
+
+class SessionsHandler(_Handler):
+    def post(self):
+        session = self.store.create(self.engine)
+        self.write_json({'session_id': session.session_id}, status=201)
+
+class SessionHandler(_Handler):
+    def get(self, session_id):
+        self.write_json(self.session_or_404(session_id).to_dict())
+
+class ConversationsHandler(_Handler):
+    async def post(self, session_id):
+        self.session_or_404(session_id)
+        async with self.store.lock(session_id):
+            session = self.session_or_404(session_id)
+            conversation_id = session.new_conversation()
+            self.store.save(session)
+        self.write_json({'conversation_id': conversation_id}, status=201)
+
+class MessagesHandler(_Handler):
+    async def post(self, session_id):
+        self.session_or_404(session_id)
+        text = str(self.json_body().get('text', '')).strip()
+        if not text:
+            raise tornado.web.HTTPError(400, reason="Missing text")
+        async with self.store.lock(session_id):
+            session = self.session_or_404(session_id)
+            reply = await self.engine.areply(session, text)
+            self.store.save(session)
+        self.write_json(reply)
+
+class TranscriptionsHandler(_Handler):
+    async def post(self, session_id):
+        session = self.session_or_404(session_id)
+        try:
+            text = await self.engine.atranscribe(session, self.request.body)
+        except Exception as e:
+            self.write_json({'error': str(e)}, status=503)
+            return
+        self.write_json({'text': text})
+
+class SpeechHandler(_Handler):
+    async def post(self, session_id):
+        session = self.session_or_404(session_id)
+        text = str(self.json_body().get('text', '')).strip()
+        if not text:
+            raise tornado.web.HTTPError(400, reason="Missing text")
+        # ?format=mp3|opus|aac, otherwise picked from the User-Agent (see audio_delivery)
+        audio_format = negotiate_format(self.request.headers.get('User-Agent', ''),
+                                        self.get_query_argument('format', None))
+        try:
+            audio = await self.engine.aspeak(session, text, audio_format)
+        except Exception as e:
+            self.write_json({'error': str(e)}, status=503)
+            return
+        self.set_header('Content-Type', mime_type(audio_format))
+        self.finish(audio)
+
+class CalendarHandler(_Handler):
+    requires_token = False
+
+    def get(self, day):
+        try:
+            day = date.fromisoformat(day)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Bad date")
+        calendar = self.engine.calendar_file(day, self.get_query_argument('event', None))
+        if calendar is None:
+            raise tornado.web.HTTPError(404, reason="No events")
+        entries, ics = calendar
+        self.set_header('Content-Type', 'text/calendar; charset=utf-8')
+        self.set_header('Content-Disposition', f'attachment; filename="{calendar_filename(entries)}"')
+        self.finish(ics)
+
+class ChatSocket(tornado.websocket.WebSocketHandler):
+    """Chat over a WebSocket: each {"text": ...} message gets a {"type": "reply", ...} message back."""
+
+    def initialize(self, engine, store, api_token):
+        self.engine = engine
+        self.store = store
+        self.api_token = api_token
+
+    def prepare(self):
+        if not token_matches(self.api_token, presented_token(self)):
+            raise tornado.web.HTTPError(401, reason="Missing or wrong API token")
+
+    def check_origin(self, origin):
+        # Same host (Tornado's default) or an origin listed in CHAT_API_ORIGINS
+        if super().check_origin(origin):
+            return True
+        parsed = urlparse(origin)
+        return f"{parsed.scheme}://{parsed.netloc}" in CHAT_API_ORIGINS
+
+    def open(self, session_id):
+        self.session_id = session_id
+        if self.store.get(session_id) is None:
+            self.close(code=4404, reason="Unknown session")
+
+    async def on_message(self, message):
+        try:
+            text = str(json.loads(message).get('text', '')).strip()
+        except (ValueError, AttributeError):
+            text = ''
+        if not text:
+            await self.write_message({'type': 'error', 'error': 'Send {"text": ...}'})
+            return
+        await self.write_message({'type': 'thinking'})
+        async with self.store.lock(self.session_id):
+            session = self.store.get(self.session_id)
+            if session is None:
+                await self.write_message({'type': 'error', 'error': 'Unknown session'})
+                return
+            reply = await self.engine.areply(session, text)
+            self.store.save(session)
+        await self.write_message(dict(reply, type='reply'))
+
+def make_app(engine, store=None, api_token=None):
+    """
+    Builds the Tornado application.
+
+    Args:
+        engine (ChatEngine): Engine to serve
+        store: Session store (default: the engine's shared session
+               repository, or in-memory if it has none)
+        api_token (str): Bearer token for the /api routes (default: CHAT_API_TOKEN)
+    """
+    args = {'engine': engine, 'store': store or SessionStore(engine.sessions),
+            'api_token': CHAT_API_TOKEN if api_token is None else api_token}
+    return tornado.web.Application([
+        (r"/healthz", HealthHandler, args),
+        (r"/calendar/(\d{4}-\d{2}-\d{2})\.ics", CalendarHandler, args),
+        (r"/api/sessions", SessionsHandler, args),
+        (r"/api/sessions/([\w-]+)", SessionHandler, args),
+        (r"/api/sessions/([\w-]+)/conversations", ConversationsHandler, args),
+        (r"/api/sessions/([\w-]+)/messages", MessagesHandler, args),
+        (r"/api/sessions/([\w-]+)/transcriptions", TranscriptionsHandler, args),
+        (r"/api/sessions/([\w-]+)/speech", SpeechHandler, args),
+        (r"/api/sessions/([\w-]+)/ws", ChatSocket, args),
+    ])
+
+async def serve(engine, port, host="0.0.0.0", store=None, api_token=None):
+    """Serves the API until cancelled."""
+    app = make_app(engine, store, api_token)
+    app.listen(port, address=host)
+    print(f"✓ Chat engine API listening on http://{host}:{port}")
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+    from chat_engine.engine import build_engine
+
+    parser = argparse.ArgumentParser(description='Serve the chat engine over HTTP/WebSocket')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--host', default='0.0.0.0')
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise SystemExit("OPENAI_API_KEY is not set")
+    # Read after load_dotenv, so a token in .env counts
+    api_token = os.getenv("CHAT_API_TOKEN", "")
+    if not api_token:
+        print("✗ CHAT_API_TOKEN is not set: the /api routes will refuse every request")
+    asyncio.run(serve(build_engine(api_key), args.port, args.host, api_token=api_token))
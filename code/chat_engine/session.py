@@ -0,0 +1,108 @@
+"""
+Per-resident chat state, independent of any UI.
+
+A session id is a bearer credential: whoever has it (the app's ?sid= URL
+parameter) can load the resident's conversations. Never log it or put it in
+metrics or traces; those use the separate, non-secret usage_session_id.
+"""
+
+from datetime import datetime
+import os
+import uuid
+
+# How long an idle session is kept in the shared store
+SESSION_TTL_SECONDS = float(os.getenv('SESSION_TTL_SECONDS', str(30 * 24 * 3600)))
+
+class ChatSession:
+    """One resident's conversations, suggested follow-ups and prompt-cache bookkeeping."""
+
+    def __init__(self, session_id=None, usage_session_id=None):
+        self.session_id = session_id or uuid.uuid4().hex
+        # Identifies this resident in usage accounting and traces (not a secret)
+        self.usage_session_id = usage_session_id or uuid.uuid4().hex
+        self.conversations = {}             # conversation id -> [{"role", "text"}, ...]
+        self.current_conversation_id = None
+        self.followups = []                 # Suggested follow-up questions for the last answer
+        self.prompt_prefix_hashes = {}      # Message fingerprints of the last request per conversation
+        self.last_prompt_stats = None       # Prefix-cache stats of the last request
+        self.prompt_cache_totals = {}       # Running prefix-cache totals for this session
+
+    @property
+    def history(self):
+        """Messages of the current conversation (started on first use)."""
+        if self.current_conversation_id is None:
+            self.new_conversation()
+        return self.conversations[self.current_conversation_id]
+
+    def new_conversation(self):
+        """Starts a new conversation with a timestamp ID and makes it current."""
+        conversation_id = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        suffix = 2
+        while conversation_id in self.conversations:
+            conversation_id = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ({suffix})"
+            suffix += 1
+        self.conversations[conversation_id] = []
+        self.current_conversation_id = conversation_id
+        self.followups = []
+        return conversation_id
+
+    def switch_conversation(self, conversation_id):
+        """Makes an existing conversation current."""
+        if conversation_id not in self.conversations:
+            raise KeyError(f"Unknown conversation: {conversation_id}")
+        self.current_conversation_id = conversation_id
+
+    def to_dict(self):
+        """JSON-serializable copy of the session."""
+        return {
+            'session_id': self.session_id,
+            'usage_session_id': self.usage_session_id,
+            'conversations': self.conversations,
+            'current_conversation_id': self.current_conversation_id,
+            'followups': self.followups,
+            'prompt_prefix_hashes': self.prompt_prefix_hashes,
+            'last_prompt_stats': self.last_prompt_stats,
+            'prompt_cache_totals': self.prompt_cache_totals
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuilds a session from to_dict output."""
+        usage_session_id = data.get('usage_session_id')
+        if usage_session_id == data['session_id']:
+            # Stored before the two were separated: the old usage id is the credential
+            usage_session_id = None
+        session = cls(data['session_id'], usage_session_id)
+        session.conversations = data.get('conversations', {})
+        session.current_conversation_id = data.get('current_conversation_id')
+        session.followups = data.get('followups', [])
+        session.prompt_prefix_hashes = data.get('prompt_prefix_hashes', {})
+        session.last_prompt_stats = data.get('last_prompt_stats')
+        session.prompt_cache_totals = data.get('prompt_cache_totals', {})
+        return session
+
+class SessionRepository:
+    """
+    Saves sessions in a shared key-value store (see shared_store) so any
+    replica can continue a resident's conversations.
+    """
+
+    def __init__(self, store, ttl=SESSION_TTL_SECONDS):
+        self.store = store
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(session_id):
+        return f"session:{session_id}"
+
+    def load(self, session_id):
+        """Returns the stored session, or None if it is unknown or expired."""
+        data = self.store.get_json(self._key(session_id))
+        return None if data is None else ChatSession.from_dict(data)
+
+    def save(self, session):
+        """Stores the session (and restarts its TTL)."""
+        self.store.set_json(self._key(session.session_id), session.to_dict(), ttl=self.ttl)
+
+    def delete(self, session_id):
+        self.store.delete(self._key(session_id))
@@ -0,0 +1,159 @@
+"""
+Parser for the community events schedule text (prompts/events.txt, or the
+scraped site text in the same layout):
+
+    FRIDAY OCT 31, 2025
+
+    Tai Chi with Gene
+    <description>
+    8:00 AM to 9:00 AM
+    Location: Studio X
+
+Each event becomes a dict with its date, title, start/end times, location,
+description and whether it is cancelled. Parsing is cached per schedule
+text, so re-parsing the same schedule on every question costs nothing.
+"""
+
+from datetime import date, datetime, time
+from functools import lru_cache
+import re
+
+MONTHS = {name: number for number, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}
+
+# "FRIDAY OCT 31, 2025" (sometimes with a leading "." or without the year)
+DAY_HEADER_PATTERN = re.compile(
+    r'^\.?(?P<weekday>monday|tuesday|wednesday|thursday|friday|saturday|sunday)[\s,]+'
+    r'(?P<month>[a-z]{3})[a-z]*\.?\s+(?P<day>\d{1,2})(?:,?\s*(?P<year>\d{4}))?$',
+    re.IGNORECASE
+)
+
+# "8:00 AM to 9:00 AM" (the site sometimes writes "12: PM")
+_CLOCK = r'(\d{1,2})(?::(\d{0,2}))?\s*([AP])\.?M\.?'
+TIME_RANGE_PATTERN = re.compile(r'^' + _CLOCK + r'\s*(?:to|-|–)\s*' + _CLOCK + r'$', re.IGNORECASE)
+TIME_PATTERN = re.compile(r'^' + _CLOCK + r'$', re.IGNORECASE)
+
+LOCATION_PATTERN = re.compile(r'^location:\s*(.+)$', re.IGNORECASE)
+# Short description lines that name the place, e.g. "in Bar/Aqua Vita Lounge" or "Meet in lobby"
+INLINE_LOCATION_PATTERN = re.compile(r'^(?:meet\s+)?in\s+(?:the\s+)?(.{2,60})$', re.IGNORECASE)
+CANCELLED_PATTERN = re.compile(r'\s*-?\s*\bcancell?ed\b\s*', re.IGNORECASE)
+
+def _clock_time(hour, minute, meridiem):
+    hour = int(hour) % 12 + (12 if meridiem.upper() == 'P' else 0)
+    return time(hour, int(minute) if minute else 0)
+
+def parse_day_header(line, default_year=None):
+    """Returns the date of a day header line, or None if the line is not one."""
+    match = DAY_HEADER_PATTERN.match(line.strip())
+    if not match or match.group('month').lower() not in MONTHS:
+        return None
+    year = int(match.group('year') or default_year or date.today().year)
+    try:
+        return date(year, MONTHS[match.group('month').lower()], int(match.group('day')))
+    except ValueError:
+        return None
+
+def _parse_block(lines, day):
+    """Builds an event from the lines of one block (title first)."""
+    title = lines[0]
+    event = {
+        'date': day,
+        'title': CANCELLED_PATTERN.sub(' ', title).strip(' -'),
+        'start': None,
+        'end': None,
+        'location': None,
+        'description': '',
+        'cancelled': bool(CANCELLED_PATTERN.search(title))
+    }
+    description = []
+    for line in lines[1:]:
+        time_range = TIME_RANGE_PATTERN.match(line)
+        single_time = TIME_PATTERN.match(line)
+        location = LOCATION_PATTERN.match(line)
+        if time_range and event['start'] is None:
+            groups = time_range.groups()
+            event['start'], event['end'] = _clock_time(*groups[:3]), _clock_time(*groups[3:])
+        elif single_time and event['start'] is None:
+            event['start'] = _clock_time(*single_time.groups())
+        elif location:
+            event['location'] = location.group(1).strip()
+        else:
+            description.append(line)
+    if event['location'] is None:
+        for line in description:
+            inline = INLINE_LOCATION_PATTERN.match(line)
+            if inline:
+                event['location'] = inline.group(1).strip()
+                description.remove(line)
+                break
+    event['description'] = '\n'.join(description)
+    if any(CANCELLED_PATTERN.search(line) for line in description[:1]):
+        event['cancelled'] = True
+    return event
+
+def _blocks(text, default_year=None):
+    """Yields (day, lines) for each blank-line separated block; day is None before the first day header."""
+    day = None
+    block = []
+    for raw_line in (text or '').splitlines():
+        line = raw_line.strip()
+        header = parse_day_header(line, default_year) if line else None
+        if header is not None or not line:
+            if block:
+                yield day, block
+                block = []
+            if header is not None:
+                day = header
+        else:
+            block.append(line)
+    if block:
+        yield day, block
+
+@lru_cache(maxsize=8)
+def parse_schedule(text, default_year=None):
+    """
+    Parses schedule text into events plus the blocks that are not events.
+
+    Args:
+        text (str): Schedule text with day headers and blank-line separated events
+        default_year (int): Year for day headers without one (default: this year)
+
+    Returns:
+        tuple: (events, others) - the event dicts in schedule order (see
+               parse_events) and (day, text) for every other block, e.g. the
+               page header, menus or notes without a time (day is None
+               before the first day header). Cached, so do not modify.
+    """
+    events, others = [], []
+    for day, block in _blocks(text, default_year):
+        event = _parse_block(block, day) if day is not None else None
+        if event is not None and event['start'] is not None:
+            events.append(event)
+        else:
+            others.append((day, '\n'.join(block)))
+    return tuple(events), tuple(others)
+
+def parse_events(text, default_year=None):
+    """
+    Parses schedule text into events.
+
+    Args:
+        text (str): Schedule text with day headers and blank-line separated events
+        default_year (int): Year for day headers without one (default: this year)
+
+    Returns:
+        tuple: Event dicts in schedule order ('date', 'title', 'start', 'end',
+               'location', 'description', 'cancelled'); events without a
+               time are skipped. Cached, so the dicts must not be modified.
+    """
+    return parse_schedule(text, default_year)[0]
+
+def event_datetimes(event):
+    """Returns (start, end) datetimes of an event (end is None if unknown)."""
+    start = datetime.combine(event['date'], event['start'])
+    end = datetime.combine(event['date'], event['end']) if event['end'] else None
+    return start, end
+
+def format_clock(value):
+    """Formats a time like the schedule does: "8:00 AM"."""
+    return value.strftime('%I:%M %p').lstrip('0')
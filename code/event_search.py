@@ -0,0 +1,356 @@
+"""
+Semantic search over the parsed events schedule.
+Residents describe activities loosely ("the balance class", "the bridge
+game", "shopping trip"), which the keyword intent rules cannot map to an
+event. Every event occurrence is embedded on the CPU and the vectors are
+kept in a float32 matrix on disk (event_index/vectors.npy) that is opened
+memory-mapped, so each Streamlit worker shares the same pages instead of
+holding its own copy. A query is scored against the matrix in batches of
+rows with one matrix-vector product per batch (the rows are L2-normalized,
+so the dot product is the cosine similarity).
+
+The index is rebuilt when the schedule text changes, but only events whose
+text is new are embedded; vectors for unchanged events are copied over.
+
+Embeddings come from a sentence-transformers model when EMBEDDING_MODEL is
+set and the package is installed, otherwise from a hashed word and
+character-trigram embedder that needs nothing but NumPy.
+
+Run `python event_search.py "the balance class"` to try a query, or
+`python event_search.py --bench` to time lookups on a year of events.
+"""
+
+from datetime import date
+import importlib.util
+import io
+import json
+import os
+import threading
+import time
+import zlib
+
+from cache_io import FileLock, atomic_write_bytes
+from event_parser import format_clock, parse_events
+from prompt_builder import fingerprint
+from schedule_query import STOPWORDS, tokenize
+
+INDEX_DIR = os.getenv('EVENT_INDEX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'event_index'))
+# sentence-transformers model name, e.g. "all-MiniLM-L6-v2" (empty: hashed n-gram embedder)
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', '')
+HASHING_DIMENSIONS = 512
+# Rows scored per matrix-vector product
+SEARCH_BATCH_ROWS = int(os.getenv('EVENT_SEARCH_BATCH_ROWS', '4096'))
+# Lowest cosine similarity that counts as a match
+MIN_SCORE = float(os.getenv('EVENT_SEARCH_MIN_SCORE', '0.3'))
+EMBED_BATCH_SIZE = 64
+
+def numpy_available():
+    """True if NumPy is installed (semantic search is skipped without it)."""
+    return importlib.util.find_spec('numpy') is not None
+
+def event_document(event):
+    """Text embedded for an event; the title is repeated so it outweighs the description."""
+    return '\n'.join(part for part in (event['title'], event['title'], event['location'] or '',
+                                       event['description']) if part)
+
+class HashingEmbedder:
+    """
+    Embeds text by hashing its words and character trigrams into a fixed
+    number of signed buckets. Misspellings and word forms ("dancing",
+    "dance") share trigrams, so loose descriptions still land near the event.
+    """
+
+    def __init__(self, dimensions=HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def _features(self, text):
+        for word in tokenize(text):
+            if word in STOPWORDS:
+                continue
+            yield 'w:' + word, 1.0
+            padded = f"#{word}#"
+            trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+            for trigram in trigrams:
+                yield 't:' + trigram, 1.0 / len(trigrams)
+
+    def embed(self, texts):
+        """Returns an L2-normalized float32 matrix with one row per text."""
+        import numpy as np
+
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                bucket = zlib.crc32(feature.encode('utf-8'))
+                matrix[row, bucket % self.dimensions] += weight if bucket & 0x80000000 else -weight
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+class SentenceTransformerEmbedder:
+    """Embeds text with a local sentence-transformers model (loaded on first use)."""
+
+    def __init__(self, model_name):
+        self.name = model_name
+        self._model = None
+
+    def embed(self, texts):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.name, device='cpu')
+        return self._model.encode(list(texts), batch_size=EMBED_BATCH_SIZE, normalize_embeddings=True,
+                                  convert_to_numpy=True).astype('float32')
+
+def get_embedder():
+    """The configured embedder (hashed n-grams unless EMBEDDING_MODEL is set and installed)."""
+    if EMBEDDING_MODEL:
+        if importlib.util.find_spec('sentence_transformers') is not None:
+            return SentenceTransformerEmbedder(EMBEDDING_MODEL)
+        print(f"✗ sentence-transformers is not installed, using the hashed embedder instead of {EMBEDDING_MODEL}")
+    return HashingEmbedder()
+
+class EventIndex:
+    """Memory-mapped embedding index over event occurrences, shared by threads and worker processes."""
+
+    def __init__(self, directory=INDEX_DIR, embedder=None, batch_rows=SEARCH_BATCH_ROWS):
+        """
+        Args:
+            directory (str): Where vectors.npy and meta.json are kept
+            embedder: Object with a `name` and `embed(texts)` (default: get_embedder())
+            batch_rows (int): Rows scored per matrix-vector product
+        """
+        self.directory = directory
+        self.embedder = embedder or get_embedder()
+        self.batch_rows = batch_rows
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._matrix = None
+        self._meta = None
+        self._counts = {'searches': 0, 'seconds': 0.0, 'builds': 0, 'embedded': 0, 'reused': 0}
+
+    @property
+    def vectors_path(self):
+        return os.path.join(self.directory, 'vectors.npy')
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _open(self, meta):
+        import numpy as np
+        self._matrix = np.load(self.vectors_path, mmap_mode='r')
+        self._meta = meta
+        self._ordinals = np.array([row[1] for row in meta['rows']], dtype=np.int32)
+        self._fingerprint = meta['fingerprint']
+
+    def update(self, schedule_text, default_year=None):
+        """
+        Makes the index match the schedule text, embedding only events it has
+        not seen before. Cheap when the text is unchanged.
+
+        Args:
+            schedule_text (str): Schedule text (events.txt layout)
+            default_year (int): Year for day headers without one
+
+        Returns:
+            bool: True if the index has any events
+        """
+        key = fingerprint([self.embedder.name, schedule_text or ''])
+        if self._fingerprint == key:
+            return bool(self._meta['rows'])
+        with self._lock:
+            if self._fingerprint == key:
+                return bool(self._meta['rows'])
+            os.makedirs(self.directory, exist_ok=True)
+            with FileLock(os.path.join(self.directory, 'index.lock')):
+                meta = self._read_meta()
+                if meta is not None and meta['fingerprint'] == key and os.path.exists(self.vectors_path):
+                    self._open(meta)  # Another worker already built it
+                else:
+                    self._build(key, schedule_text or '', default_year, meta)
+            return bool(self._meta['rows'])
+
+    def _build(self, key, schedule_text, default_year, previous):
+        """Writes vectors.npy and meta.json for the schedule, reusing vectors of unchanged events."""
+        import numpy as np
+
+        started = time.perf_counter()
+        events = parse_events(schedule_text, default_year)
+        documents, document_index, rows = [], {}, []
+        for event in events:
+            text = event_document(event)
+            if text not in document_index:
+                document_index[text] = len(documents)
+                documents.append({'key': fingerprint(text), 'text': text, 'title': event['title'],
+                                  'location': event['location'], 'description': event['description']})
+            rows.append([document_index[text], event['date'].toordinal(), format_clock(event['start']),
+                         format_clock(event['end']) if event['end'] else None, event['cancelled']])
+
+        # Vectors of documents the previous index already had
+        reusable = {}
+        if previous is not None and previous.get('embedder') == self.embedder.name and os.path.exists(self.vectors_path):
+            old_matrix = np.load(self.vectors_path, mmap_mode='r')
+            for row_number, row in enumerate(previous['rows']):
+                reusable.setdefault(previous['documents'][row[0]]['key'], row_number)
+            reusable = {doc_key: np.array(old_matrix[row_number]) for doc_key, row_number in reusable.items()}
+
+        dimensions = None
+        vectors = [reusable.get(document['key']) for document in documents]
+        missing = [number for number, vector in enumerate(vectors) if vector is None]
+        for start in range(0, len(missing), EMBED_BATCH_SIZE):
+            batch = missing[start:start + EMBED_BATCH_SIZE]
+            for number, vector in zip(batch, self.embedder.embed([documents[number]['text'] for number in batch])):
+                vectors[number] = vector
+        if vectors:
+            dimensions = len(vectors[0])
+        document_vectors = np.array(vectors, dtype=np.float32).reshape(len(vectors), dimensions or 0)
+        matrix = document_vectors[[row[0] for row in rows]] if rows else document_vectors[:0]
+
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(matrix, dtype=np.float32))
+        atomic_write_bytes(self.vectors_path, buffer.getvalue())
+        for document in documents:
+            del document['text']
+        meta = {'fingerprint': key, 'embedder': self.embedder.name, 'documents': documents, 'rows': rows}
+        atomic_write_bytes(self.meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        self._open(meta)
+
+        self._counts['builds'] += 1
+        self._counts['embedded'] += len(missing)
+        self._counts['reused'] += len(documents) - len(missing)
+        print(f"✓ Event index built: {len(rows)} events, {len(missing)} embedded, "
+              f"{len(documents) - len(missing)} reused in {time.perf_counter() - started:.2f}s")
+
+    def search(self, query, k=3, min_score=MIN_SCORE, after=None):
+        """
+        Finds the events that best match a loose description.
+
+        Args:
+            query (str): e.g. "the balance class"
+            k (int): Most distinct events to return
+            min_score (float): Lowest cosine similarity to return
+            after (date): Only consider occurrences on or after this day
+
+        Returns:
+            list: Dicts with 'title', 'location' and 'description' of the best
+                  matching occurrence, its 'score' and every 'occurrences' of the
+                  title ([(date, start, end, cancelled)], in date order), best
+                  match first; empty if the index is empty
+        """
+        import numpy as np
+
+        if self._matrix is None or not len(self._matrix):
+            return []
+        started = time.perf_counter()
+        query_vector = self.embedder.embed([query])[0]
+        scores = np.empty(len(self._matrix), dtype=np.float32)
+        for start in range(0, len(self._matrix), self.batch_rows):
+            scores[start:start + self.batch_rows] = self._matrix[start:start + self.batch_rows] @ query_vector
+        if after is not None:
+            scores[self._ordinals < after.toordinal()] = -1.0
+
+        # Best rows first; keep the first (highest) row per event title
+        candidates = min(len(scores), max(k * 64, 256))
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        results, seen = [], set()
+        rows, documents = self._meta['rows'], self._meta['documents']
+        for row_number in top:
+            score = float(scores[row_number])
+            if score < min_score or len(results) >= k:
+                break
+            document = documents[rows[row_number][0]]
+            if document['title'] in seen:
+                continue
+            seen.add(document['title'])
+            occurrences = [(date.fromordinal(row[1]), row[2], row[3], row[4]) for row in rows
+                           if documents[row[0]]['title'] == document['title']
+                           and (after is None or row[1] >= after.toordinal())]
+            results.append({'title': document['title'], 'location': document['location'],
+                            'description': document['description'], 'score': round(score, 3),
+                            'occurrences': occurrences})
+        with self._lock:
+            self._counts['searches'] += 1
+            self._counts['seconds'] += time.perf_counter() - started
+        return results
+
+    def stats(self):
+        """Index size, builds, vectors embedded/reused and mean search time."""
+        with self._lock:
+            searches = self._counts['searches']
+            return {
+                'embedder': self.embedder.name,
+                'events': len(self._meta['rows']) if self._meta else 0,
+                'builds': self._counts['builds'],
+                'embedded': self._counts['embedded'],
+                'reused': self._counts['reused'],
+                'searches': searches,
+                'mean_ms': round(self._counts['seconds'] / searches * 1000, 3) if searches else 0.0
+            }
+
+def year_of_events(schedule_text, weeks=52):
+    """Repeats a schedule's days week after week, for benchmarking a year-long index."""
+    from datetime import timedelta
+    events = parse_events(schedule_text)
+    lines = []
+    for week in range(weeks):
+        day = None
+        for event in events:
+            event_day = event['date'] + timedelta(weeks=week)
+            if event_day != day:
+                day = event_day
+                lines.append(day.strftime('%A %b %d, %Y').upper())
+                lines.append('')
+            block = [f"{event['title']}{' - CANCELLED' if event['cancelled'] else ''}", event['description'],
+                     format_clock(event['start']) + (f" to {format_clock(event['end'])}" if event['end'] else ''),
+                     f"Location: {event['location']}" if event['location'] else '']
+            lines.extend([line for line in block if line] + [''])
+    return '\n'.join(lines)
+
+if __name__ == "__main__":
+    import argparse
+    import statistics
+    import tempfile
+
+    parser = argparse.ArgumentParser(description='Search the events schedule by loose description')
+    parser.add_argument('query', nargs='*')
+    parser.add_argument('--events', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                         'prompts', 'events.txt'))
+    parser.add_argument('--bench', action='store_true', help='Time lookups on a year of events')
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.events, 'r', encoding='utf-8') as f:
+        schedule = f.read()
+
+    if args.bench:
+        queries = ["the balance class", "the bridge game", "shopping trip", "exercise in the pool",
+                   "dancing", "blood pressure", "meditation", "painting"]
+        with tempfile.TemporaryDirectory() as directory:
+            index = EventIndex(directory)
+            year = year_of_events(schedule)
+            started = time.perf_counter()
+            index.update(year)
+            build_seconds = time.perf_counter() - started
+            timings = []
+            for run in range(args.runs):
+                started = time.perf_counter()
+                index.search(queries[run % len(queries)])
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            print(f"Events indexed:  {index.stats()['events']} ({index.stats()['embedded']} embedded)")
+            print(f"Build:           {build_seconds:.2f}s")
+            print(f"Lookup p50:      {statistics.median(timings):.3f} ms")
+            print(f"Lookup p95:      {timings[int(len(timings) * 0.95) - 1]:.3f} ms")
+    else:
+        index = EventIndex()
+        index.update(schedule)
+        for result in index.search(' '.join(args.query) or "the balance class"):
+            when = ', '.join(f"{day:%a %b} {day.day} {start}" for day, start, _, _ in result['occurrences'][:3])
+            print(f"{result['score']:.3f}  {result['title']} ({result['location'] or 'no location'}): {when}")
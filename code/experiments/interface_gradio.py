@@ -1,12 +1,24 @@
+import os
+import sys
+
 import gradio as gr
+from dotenv import load_dotenv
+
+# The chat engine lives in code/chat_engine
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chat_engine import build_engine
+
+load_dotenv()
+engine = build_engine(os.getenv("OPENAI_API_KEY"))
 
-# Placeholder function for chatbot response
-def chatbot(user_input, history):
+# Chatbot response from the shared chat engine (one engine session per browser tab)
+def chatbot(user_input, history, session):
+    if session is None:
+        session = engine.new_session()
     history.append(("User", user_input))
-    # Replace with model-generated response
-    bot_response = f"This is a response to '{user_input}'"
+    bot_response = engine.reply(session, user_input)["text"]
     history.append(("Assistant", bot_response))
-    return history, history
+    return history, history, session
 
 # Set up Gradio interface
 with gr.Blocks(css=".chatbot-box {padding: 10px; border-radius: 5px; font-size: 14px; color: black; background-color: white;}") as demo:
@@ -19,6 +31,7 @@ with gr.Blocks(css=".chatbot-box {padding: 10px; border-radius: 5px; font-size:
 
     # Chatbot display
     chatbot_box = gr.Chatbot(label="Chat", elem_classes="chatbot-box")
+    engine_session = gr.State(None)
 
     with gr.Row():
         user_input = gr.Textbox(label="Type here...")
@@ -36,7 +49,8 @@ with gr.Blocks(css=".chatbot-box {padding: 10px; border-radius: 5px; font-size:
         return gr.HTML.update(value=f"<style>{styles}</style>"), history
 
     # Button actions
-    submit_button.click(chatbot, inputs=[user_input, chatbot_box], outputs=[chatbot_box, chatbot_box])
+    submit_button.click(chatbot, inputs=[user_input, chatbot_box, engine_session],
+                        outputs=[chatbot_box, chatbot_box, engine_session])
     apply_styles_button = gr.Button("Apply Styles")
     apply_styles_button.click(apply_styles, inputs=[chatbot_box, bg_color, font_color, font_size], outputs=[gr.HTML(), chatbot_box])
 
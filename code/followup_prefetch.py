@@ -0,0 +1,287 @@
+"""
+Speculative answers for the suggested follow-up questions.
+After each answer the app shows three follow-up questions as buttons, and a
+click used to run the whole reply pipeline from scratch while the resident
+waited. The prefetcher answers the displayed follow-ups in the background,
+each on a private copy of the session, so a click can show a finished answer
+at once:
+  - every set of follow-ups has a token cap; each call first reserves its
+    estimated size (prompt plus the completion limit) against the cap, so
+    jobs running in parallel cannot overshoot it together, and nothing is
+    prefetched unless the budget level is "ok"
+  - asking anything else (typing, voice, an example question, a new
+    conversation) cancels the set: queued questions are dropped and calls
+    not yet sent are refused (a call already in flight finishes, unused)
+  - a click takes the prefetched turn into the real session if the
+    conversation has not moved on; a question still being answered is
+    waited for instead of being asked twice
+
+Prefetch calls are metered under the resident's usage session (prompt type
+"prefetch:<key>"), and stats() reports the hit rate and the tokens spent on
+answers nobody asked for.
+"""
+
+import copy
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+from prompt_builder import estimate_tokens
+from tracing import Tracer
+
+# Answer displayed follow-ups in the background (off by default: it spends tokens on guesses)
+PREFETCH_FOLLOWUPS = os.getenv('PREFETCH_FOLLOWUPS', 'false').lower() == 'true'
+# Tokens (prompt + completion) one set of follow-ups may spend on prefetching
+PREFETCH_TOKEN_CAP = int(os.getenv('PREFETCH_TOKEN_CAP', '6000'))
+# Follow-up questions answered at the same time, across all sessions
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', '4'))
+# Longest wait for a clicked question that is still being prefetched
+PREFETCH_JOIN_TIMEOUT = float(os.getenv('PREFETCH_JOIN_TIMEOUT', '30'))
+
+class PrefetchCancelledError(Exception):
+    """Raised instead of a model call once a prefetch set is cancelled or over its cap."""
+
+class _PrefetchSet:
+    """The follow-ups prefetched for one answer of one session."""
+
+    def __init__(self, session, token_cap):
+        self.conversation_id = session.current_conversation_id
+        self.history_length = len(session.history)
+        self.token_cap = token_cap
+        self.tokens = 0
+        self.reserved = 0  # Estimated tokens of calls in flight
+        self.cancelled = False
+        self.jobs = {}  # question -> {'future', 'session', 'result', 'tokens', 'reserved', 'capped', 'taken', 'settled'}
+
+    def stale_for(self, session):
+        """True if the session has moved on since the set was started."""
+        return (session.current_conversation_id != self.conversation_id
+                or len(session.history) != self.history_length)
+
+    def release(self, job):
+        """Returns a job's reservation once its call was recorded or failed (call with the lock held)."""
+        self.reserved -= job['reserved']
+        job['reserved'] = 0
+
+class _SetMeter:
+    """Usage meter view for one prefetch job: refuses calls past the set's cap, tallies its tokens."""
+
+    def __init__(self, meter, prefetch_set, job, lock):
+        self.meter = meter
+        self.prefetch_set = prefetch_set
+        self.job = job
+        self.lock = lock
+
+    def check_budget(self, session_id):
+        budget = self.meter.check_budget(session_id)
+        if self.prefetch_set.cancelled or self.prefetch_set.tokens >= self.prefetch_set.token_cap:
+            budget = dict(budget, chat=False, followups=False)
+        return budget
+
+    def record(self, kind, model, session_id, prompt_type=None, prompt_tokens=0, completion_tokens=0, **kwargs):
+        tokens = (prompt_tokens or 0) + (completion_tokens or 0)
+        with self.lock:
+            self.job['tokens'] += tokens
+            self.prefetch_set.tokens += tokens
+            self.prefetch_set.release(self.job)
+        self.meter.record(kind, model, session_id, f"prefetch:{prompt_type or kind}",
+                          prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, **kwargs)
+
+class _SetClient:
+    """
+    Client view for one prefetch job: reserves each call's estimated tokens
+    against the set's cap and refuses calls once the set is cancelled or the
+    reservation would not fit.
+    """
+
+    def __init__(self, client, prefetch_set, job, lock):
+        self._client = client
+        self._set = prefetch_set
+        self._job = job
+        self._lock = lock
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    @property
+    def chat(self):
+        return _Namespace(completions=_Namespace(create=self._create))
+
+    def _create(self, **kwargs):
+        estimate = sum(estimate_tokens(str(message.get('content') or '')) for message in kwargs.get('messages') or [])
+        estimate += kwargs.get('max_completion_tokens') or kwargs.get('max_tokens') or 0
+        with self._lock:
+            if self._set.cancelled:
+                raise PrefetchCancelledError("Follow-up prefetch cancelled")
+            if self._set.tokens + self._set.reserved + estimate > self._set.token_cap:
+                self._job['capped'] = True
+                raise PrefetchCancelledError("Follow-up prefetch over its token cap")
+            self._set.reserved += estimate
+            self._job['reserved'] += estimate
+        try:
+            return self._client.chat.completions.create(**kwargs)
+        except BaseException:
+            with self._lock:
+                self._set.release(self._job)
+            raise
+
+class _Namespace:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+class FollowupPrefetcher:
+    """Answers the follow-up questions shown to a resident before they are clicked."""
+
+    def __init__(self, engine, token_cap=PREFETCH_TOKEN_CAP, workers=PREFETCH_WORKERS):
+        """
+        Args:
+            engine (ChatEngine): Engine whose replies are prefetched
+            token_cap (int): Tokens one set of follow-ups may spend
+            workers (int): Follow-ups answered concurrently
+        """
+        self.engine = engine
+        self.token_cap = token_cap
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self._lock = threading.Lock()
+        self._sets = {}  # session id -> _PrefetchSet
+        # Prefetch turns are kept out of the residents' latency histograms
+        self._tracer = Tracer(log_file='')
+        self.counters = {'sets': 0, 'prefetched': 0, 'hits': 0, 'joined': 0, 'misses': 0, 'cancelled': 0,
+                         'capped': 0, 'failed': 0, 'tokens': 0, 'used_tokens': 0, 'wasted_tokens': 0}
+
+    def start(self, session):
+        """
+        Starts answering the session's current follow-ups (cancels any earlier set).
+
+        Returns:
+            int: Number of questions queued
+        """
+        self.cancel(session)
+        questions = [question for question in session.followups
+                     if question and not question.startswith("Error generating follow-up questions")]
+        if not questions or self.engine.usage_meter.check_budget(session.usage_session_id)['level'] != 'ok':
+            return 0
+        prefetch_set = _PrefetchSet(session, self.token_cap)
+        snapshot = copy.deepcopy(session.to_dict())
+        with self._lock:
+            self._sets[session.session_id] = prefetch_set
+            self.counters['sets'] += 1
+            for question in questions:
+                job = {'session': type(session).from_dict(copy.deepcopy(snapshot)), 'result': None, 'tokens': 0,
+                       'reserved': 0, 'capped': False, 'taken': False, 'settled': False}
+                prefetch_set.jobs[question] = job
+                job['future'] = self._executor.submit(self._answer, prefetch_set, question, job)
+        return len(questions)
+
+    def _answer(self, prefetch_set, question, job):
+        if prefetch_set.cancelled:
+            return None
+        engine = copy.copy(self.engine)
+        engine.client = _SetClient(self.engine.client, prefetch_set, job, self._lock)
+        engine.usage_meter = _SetMeter(self.engine.usage_meter, prefetch_set, job, self._lock)
+        engine.tracer = self._tracer
+        engine.on_error = lambda message: None
+        try:
+            result = engine.reply(job['session'], question)
+        except Exception as e:
+            print(f"✗ Follow-up prefetch failed: {e}")
+            result = {'error': 'error'}
+        # Follow-ups refused by the cap come back as an error line; show none instead
+        followups = job['session'].followups
+        if followups and followups[0].startswith("Error generating follow-up questions"):
+            job['session'].followups = []
+            result['followups'] = []
+        with self._lock:
+            self.counters['tokens'] += job['tokens']
+            if result['error'] is None:
+                job['result'] = result
+                self.counters['prefetched'] += 1
+            elif prefetch_set.cancelled:
+                pass
+            elif result['error'] == 'budget_exceeded' or job['capped']:
+                self.counters['capped'] += 1
+            else:
+                self.counters['failed'] += 1
+            if prefetch_set.cancelled:
+                self._settle(job, finished=True)
+        return job['result']
+
+    def _settle(self, job, finished=False):
+        """Counts an unused job's tokens as wasted once its set is retired (call with the lock held)."""
+        if job['settled'] or not (finished or job['future'].done()):
+            return
+        job['settled'] = True
+        if not job['taken']:
+            self.counters['wasted_tokens'] += job['tokens']
+
+    def cancel(self, session):
+        """Cancels the session's prefetch set, e.g. because the resident asked something else."""
+        with self._lock:
+            prefetch_set = self._sets.pop(session.session_id, None)
+            if prefetch_set is None:
+                return
+            prefetch_set.cancelled = True
+            for job in prefetch_set.jobs.values():
+                if job['future'].cancel():
+                    self.counters['cancelled'] += 1
+                self._settle(job)
+
+    def take(self, session, question):
+        """
+        Moves the prefetched answer to a clicked follow-up into the session.
+
+        Args:
+            session (ChatSession): Resident session (unchanged if there is no usable answer)
+            question (str): The clicked follow-up question
+
+        Returns:
+            dict or None: The reply result (see ChatEngine.reply), or None if
+                          the question has to be answered normally
+        """
+        with self._lock:
+            prefetch_set = self._sets.get(session.session_id)
+            job = prefetch_set.jobs.get(question) if prefetch_set is not None else None
+            usable = job is not None and not prefetch_set.stale_for(session)
+            ready = usable and job['future'].done()
+        if usable and not ready:
+            try:
+                job['future'].result(timeout=PREFETCH_JOIN_TIMEOUT)
+                usable = not prefetch_set.stale_for(session)
+            except Exception:
+                usable = False
+        result = job['result'] if usable else None
+
+        with self._lock:
+            if result is None:
+                self.counters['misses'] += 1
+            else:
+                job['taken'] = True
+                self.counters['hits' if ready else 'joined'] += 1
+                self.counters['used_tokens'] += job['tokens']
+        # The other follow-ups of the set will not be clicked any more
+        self.cancel(session)
+        if result is None:
+            return None
+
+        prefetched = job['session']
+        session.history.extend(prefetched.history[prefetch_set.history_length:])
+        session.followups = list(prefetched.followups)
+        session.prompt_prefix_hashes = prefetched.prompt_prefix_hashes
+        session.last_prompt_stats = prefetched.last_prompt_stats
+        session.prompt_cache_totals = prefetched.prompt_cache_totals
+        return dict(result, followups=list(session.followups), prefetched=True)
+
+    def stats(self):
+        """Prefetch counters, hit rate and wasted tokens for admin views."""
+        with self._lock:
+            counters = dict(self.counters)
+            counters['active_sets'] = len(self._sets)
+        clicks = counters['hits'] + counters['joined'] + counters['misses']
+        counters['hit_rate'] = round((counters['hits'] + counters['joined']) / clicks, 3) if clicks else 0.0
+        counters['wasted_fraction'] = round(counters['wasted_tokens'] / counters['tokens'], 3) \
+            if counters['tokens'] else 0.0
+        return counters
+
+    def shutdown(self):
+        """Stops the worker threads (queued questions are dropped)."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,260 @@
+"""
+Calendar (.ics) files for schedule events, built locally.
+Asking how to set a phone reminder for an event used to produce a long
+model-written tutorial. Instead, the engine recognises calendar/reminder
+questions, finds the event(s) meant (named in the question, in the answer
+just given, or everything on the day asked about) and offers an .ics file
+with a reminder that the phone's calendar app can import in one tap.
+
+Files are built from small JSON-serializable calendar entries (title,
+date, times, location), so entries can be kept in the chat history and the
+file rebuilt on any replica. Built files are cached per event and per day.
+
+When PUBLIC_BASE_URL is set, the HTTP server serves the same files at
+/calendar/<YYYY-MM-DD>.ics (optionally ?event=<uid>) and the Streamlit app
+shows a QR code for that link (needs the optional `qrcode` package).
+"""
+
+from datetime import datetime, timedelta
+from functools import lru_cache
+import hashlib
+import importlib.util
+import io
+import os
+
+from event_parser import format_clock, parse_events
+from schedule_query import STOPWORDS, tokenize
+from temporal_parser import resolve as resolve_dates
+
+# Minutes before the event the phone reminds the resident
+REMINDER_MINUTES = int(os.getenv('CALENDAR_REMINDER_MINUTES', '30'))
+# Olson time zone of the community (empty: floating local times, which phones show as-is)
+CALENDAR_TIMEZONE = os.getenv('CALENDAR_TIMEZONE', '')
+# Where the HTTP server is reachable from residents' phones, for QR links (empty: no links)
+PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL', '').rstrip('/')
+# Length assumed for events listed without an end time
+DEFAULT_EVENT_DURATION = timedelta(hours=1)
+# More named events than this is too vague to guess; the model answers instead
+MAX_NAMED_EVENTS = 3
+
+PRODID = "-//RetireNet//Community Calendar//EN"
+
+# Words that make a question a calendar/reminder request
+CALENDAR_WORDS = {token for word in ['calendar', 'calendars', 'reminder', 'reminders', 'remind', 'ics', 'alarm']
+                  for token in tokenize(word)}
+
+def calendar_entry(event):
+    """
+    JSON-serializable calendar entry for a parsed event (see event_parser).
+
+    Returns:
+        dict: 'uid', 'title', 'date' (YYYY-MM-DD), 'start' and 'end' (HH:MM,
+              end may be None) and 'location'
+    """
+    entry = {
+        'title': event['title'],
+        'date': event['date'].isoformat(),
+        'start': event['start'].strftime('%H:%M'),
+        'end': event['end'].strftime('%H:%M') if event['end'] else None,
+        'location': event['location']
+    }
+    identity = f"{entry['title']}|{entry['date']}|{entry['start']}".encode('utf-8')
+    entry['uid'] = hashlib.sha256(identity).hexdigest()[:16]
+    return entry
+
+def escape_text(value):
+    """Escapes a TEXT value (RFC 5545 section 3.3.11)."""
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def fold_line(line):
+    """Folds a content line to 75 octets per physical line (RFC 5545 section 3.1)."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    pieces, current = [], b''
+    for char in line:
+        encoded_char = char.encode('utf-8')
+        if len(current) + len(encoded_char) > (75 if not pieces else 74):
+            pieces.append(current.decode('utf-8'))
+            current = b''
+        current += encoded_char
+    pieces.append(current.decode('utf-8'))
+    return '\r\n '.join(pieces)
+
+def _local_time(entry, field):
+    moment = datetime.strptime(f"{entry['date']} {entry[field]}", '%Y-%m-%d %H:%M')
+    return moment.strftime('%Y%m%dT%H%M%S')
+
+@lru_cache(maxsize=512)
+def _vevent(uid, title, day, start, end, location):
+    """VEVENT lines for one entry (cached per event)."""
+    entry = {'date': day, 'start': start, 'end': end}
+    if end is None:
+        moment = datetime.strptime(f"{day} {start}", '%Y-%m-%d %H:%M') + DEFAULT_EVENT_DURATION
+        entry['end'] = moment.strftime('%H:%M')
+    zone = f";TZID={CALENDAR_TIMEZONE}" if CALENDAR_TIMEZONE else ''
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}@retirenet",
+        f"DTSTAMP:{day.replace('-', '')}T000000Z",
+        f"DTSTART{zone}:{_local_time(entry, 'start')}",
+        f"DTEND{zone}:{_local_time(entry, 'end')}",
+        f"SUMMARY:{escape_text(title)}",
+    ]
+    if location:
+        lines.append(f"LOCATION:{escape_text(location)}")
+    if REMINDER_MINUTES > 0:
+        lines += ["BEGIN:VALARM", "ACTION:DISPLAY", f"DESCRIPTION:{escape_text(title)}",
+                  f"TRIGGER:-PT{REMINDER_MINUTES}M", "END:VALARM"]
+    lines.append("END:VEVENT")
+    return tuple(fold_line(line) for line in lines)
+
+def _entry_key(entry):
+    return (entry['uid'], entry['title'], entry['date'], entry['start'], entry.get('end'), entry.get('location'))
+
+@lru_cache(maxsize=128)
+def _calendar(keys):
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN", "METHOD:PUBLISH"]
+    for key in keys:
+        lines.extend(_vevent(*key))
+    lines.append("END:VCALENDAR")
+    return '\r\n'.join(lines) + '\r\n'
+
+def calendar_ics(entries):
+    """
+    Builds an .ics file for one or more calendar entries (cached per set of entries).
+
+    Args:
+        entries (list): Calendar entries (see calendar_entry)
+
+    Returns:
+        str: iCalendar text with CRLF line endings
+    """
+    return _calendar(tuple(_entry_key(entry) for entry in entries))
+
+def calendar_filename(entries):
+    """"tai-chi-with-gene-2025-10-31.ics", or "events-2025-10-31.ics" for several events."""
+    if len(entries) == 1:
+        slug = '-'.join(tokenize(entries[0]['title'])) or 'event'
+        return f"{slug}-{entries[0]['date']}.ics"
+    return f"events-{entries[0]['date']}.ics"
+
+def calendar_url(entries):
+    """Link to the .ics file on the HTTP server, or None without PUBLIC_BASE_URL."""
+    if not PUBLIC_BASE_URL or not entries:
+        return None
+    url = f"{PUBLIC_BASE_URL}/calendar/{entries[0]['date']}.ics"
+    return url + f"?event={entries[0]['uid']}" if len(entries) == 1 else url
+
+def qr_available():
+    """True if the optional qrcode package is installed."""
+    return importlib.util.find_spec('qrcode') is not None
+
+def qr_png(url):
+    """PNG bytes of a QR code for a URL, or None without the qrcode package."""
+    if not url or not qr_available():
+        return None
+    import qrcode
+    buffer = io.BytesIO()
+    qrcode.make(url).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def _activity_tokens(title):
+    """Words that name an event ("Tai Chi with Gene" -> {"tai", "chi"})."""
+    activity = title.partition(' with ')[0]
+    return {token for token in tokenize(activity) if token not in STOPWORDS}
+
+def _named_titles(events, text):
+    words = set(tokenize(text))
+    titles = []
+    for event in events:
+        tokens = _activity_tokens(event['title'])
+        if tokens and tokens <= words and event['title'] not in titles:
+            titles.append(event['title'])
+    # "Tai Chi with Gene" and "Tai Chi with Kelly": keep the ones whose instructor is named too
+    specific = [title for title in titles if set(tokenize(title)) - STOPWORDS <= words]
+    return specific or titles
+
+def calendar_request(question, schedule_text, recent_text='', now=None):
+    """
+    Works out which events a calendar/reminder question is about.
+
+    Args:
+        question (str): The resident's question
+        schedule_text (str): Schedule text (events.txt layout)
+        recent_text (str): The previous answer, for "the event" / "that class"
+        now (datetime): Current time (default: now)
+
+    Returns:
+        dict or None: 'entries' (calendar entries) and 'day' (True if they
+                      are everything on a day the question asked about);
+                      None if this is not a calendar question or no event fits
+    """
+    if not set(tokenize(question)) & CALENDAR_WORDS:
+        return None
+    now = now or datetime.now()
+    events = parse_events(schedule_text or '', now.year)
+    if not events:
+        return None
+
+    window = resolve_dates(question, now)
+    titles = _named_titles(events, question) or _named_titles(events, recent_text or '')
+    if len(titles) > MAX_NAMED_EVENTS:
+        return None
+    if not titles:
+        if window is None:
+            return None
+        selected = [event for event in events if event['date'] in window['days'] and not event['cancelled']]
+        return {'entries': [calendar_entry(event) for event in selected], 'day': True} if selected else None
+
+    selected = []
+    for title in titles:
+        occurrences = [event for event in events if event['title'] == title and not event['cancelled']]
+        if window is not None:
+            occurrences = [event for event in occurrences if event['date'] in window['days']]
+        else:
+            occurrences = [event for event in occurrences
+                           if datetime.combine(event['date'], event['start']) >= now][:1]
+        selected.extend(occurrences)
+    if not selected:
+        return None
+    return {'entries': [calendar_entry(event) for event in selected], 'day': False}
+
+def describe_entry(entry):
+    """"Tai Chi with Gene on Friday, October 31 at 8:00 AM in Studio X"."""
+    moment = datetime.strptime(f"{entry['date']} {entry['start']}", '%Y-%m-%d %H:%M')
+    text = f"{entry['title']} on {moment.strftime('%A, %B')} {moment.day} at {format_clock(moment.time())}"
+    return text + (f" in {entry['location']}" if entry['location'] else '')
+
+def calendar_answer_text(request):
+    """The chat answer offering the calendar file(s)."""
+    entries = request['entries']
+    reminder = f" with a reminder {REMINDER_MINUTES} minutes before" if REMINDER_MINUTES > 0 else ''
+    how = (f"Tap \"Add to calendar\" below, then open the file on your phone and it will be added to "
+           f"your calendar{reminder}.")
+    if len(entries) == 1:
+        return f"Here is a calendar file for {describe_entry(entries[0])}. {how}"
+    intro = "Here is a calendar file with every event on that day:" if request['day'] else \
+        "Here is a calendar file with these events:"
+    return '\n'.join([intro] + [f"- {describe_entry(entry)}" for entry in entries] + [how])
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build an .ics file for a calendar question')
+    parser.add_argument('question', nargs='+')
+    parser.add_argument('--events', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                         'prompts', 'events.txt'))
+    parser.add_argument('--now', help='Current time as "YYYY-MM-DD HH:MM" (default: now)')
+    args = parser.parse_args()
+
+    with open(args.events, 'r', encoding='utf-8') as f:
+        schedule = f.read()
+    now = datetime.strptime(args.now, "%Y-%m-%d %H:%M") if args.now else None
+    request = calendar_request(' '.join(args.question), schedule, now=now)
+    if request is None:
+        print("(not a calendar question, or no matching event)")
+    else:
+        print(calendar_answer_text(request))
+        print()
+        print(calendar_ics(request['entries']))
@@ -0,0 +1,196 @@
+"""
+Intent classifier for routing user questions to a system prompt.
+Keywords and phrases for each intent are loaded from prompts/intents.json and
+compiled into a single word-boundary regular expression, so a question is
+scanned once and "app" no longer matches inside "happy". Each match adds the
+keyword's weight to its intent; the top intent's share of the total weight is
+reported as the confidence. Questions with a low confidence, or backed only by
+a single weak keyword such as "when", go to the default prompt.
+
+Run `python intent_classifier.py --benchmark` to measure accuracy and speed on
+the labelled queries in test/intent_queries.jsonl.
+"""
+
+from functools import lru_cache
+import json
+import os
+import re
+import sys
+import time
+
+# Determine base path (same layout rules as streamlit_gpt.py)
+if getattr(sys, 'frozen', False):
+    base_path = os.path.dirname(sys.executable)
+else:
+    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INTENTS_CONFIG_PATH = os.path.join(base_path, "prompts", "intents.json")
+BENCHMARK_PATH = os.path.join(base_path, "test", "intent_queries.jsonl")
+
+# Curly quotes from voice transcripts and phone keyboards
+_QUOTE_TRANSLATION = str.maketrans({'’': "'", '‘': "'", '“': '"', '”': '"'})
+
+def normalize_text(text):
+    """Lower-cases text, straightens quotes and collapses whitespace."""
+    return ' '.join(text.translate(_QUOTE_TRANSLATION).lower().split())
+
+class IntentClassifier:
+    """Weighted keyword classifier backed by one precompiled word-boundary regex."""
+
+    def __init__(self, config):
+        self.default_intent = config.get('default_intent', 'default')
+        self.min_confidence = config.get('min_confidence', 0.4)
+        self.min_score = config.get('min_score', 0.0)
+        self.smoothing = config.get('smoothing', 1.0)
+        self.intents = config['intents']
+
+        # phrase -> [(intent, weight), ...]; a phrase may count for several intents
+        self.phrase_weights = {}
+        for intent, spec in self.intents.items():
+            for phrase, weight in spec['keywords'].items():
+                key = normalize_text(phrase)
+                self.phrase_weights.setdefault(key, []).append((intent, float(weight)))
+
+        # Longest phrases first so "tai chi" wins over a shorter overlapping match
+        phrases = sorted(self.phrase_weights, key=len, reverse=True)
+        alternation = '|'.join(re.escape(phrase).replace(r'\ ', r'\s+') for phrase in phrases)
+        self.pattern = re.compile(r"(?<![\w'])(?:" + alternation + r")(?![\w-])")
+
+    def prompt_for(self, intent):
+        """Returns (prompt key, fallback prompt key) for an intent."""
+        if intent == self.default_intent or intent not in self.intents:
+            return 'default', 'default'
+        spec = self.intents[intent]
+        return spec['prompt'], spec.get('fallback_prompt', 'default')
+
+    def classify(self, text):
+        """
+        Classifies a question.
+
+        Args:
+            text (str): User input
+
+        Returns:
+            dict: 'intent', 'confidence' (0-1), 'prompt', 'fallback_prompt',
+                  'scores' per intent and the matched 'keywords'
+        """
+        scores = {}
+        matched = []
+        for match in self.pattern.finditer(normalize_text(text)):
+            phrase = ' '.join(match.group(0).split())
+            matched.append(phrase)
+            for intent, weight in self.phrase_weights[phrase]:
+                scores[intent] = scores.get(intent, 0.0) + weight
+
+        intent, confidence = self.default_intent, 0.0
+        if scores:
+            best = max(scores, key=scores.get)
+            confidence = scores[best] / (sum(scores.values()) + self.smoothing)
+            if confidence >= self.min_confidence and scores[best] >= self.min_score:
+                intent = best
+
+        prompt, fallback_prompt = self.prompt_for(intent)
+        return {
+            'intent': intent,
+            'confidence': round(confidence, 3),
+            'prompt': prompt,
+            'fallback_prompt': fallback_prompt,
+            'scores': scores,
+            'keywords': matched
+        }
+
+def load_intent_config(path=INTENTS_CONFIG_PATH):
+    """Loads the intents configuration file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+@lru_cache(maxsize=4)
+def get_classifier(path=INTENTS_CONFIG_PATH):
+    """Returns a compiled classifier for the config file (compiled once per process)."""
+    return IntentClassifier(load_intent_config(path))
+
+def classify_intent(text):
+    """Classifies text with the default intents configuration."""
+    return get_classifier().classify(text)
+
+def load_labelled_queries(path=BENCHMARK_PATH):
+    """Loads {"text": ..., "intent": ...} records from a JSON-lines file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def legacy_route(text):
+    """The substring keyword scan this classifier replaced, kept for benchmark comparison."""
+    schedule_menu_keywords = ['menu', 'dining', 'breakfast', 'lunch', 'dinner', 'schedule', 'activity', 'activities', "today", "class", "event", "when", "where"]
+    health_tech_keywords = ['health', 'app', 'phone', 'vitamin', 'diet', 'exercise', 'install', 'setup', 'computer']
+    if any(keyword in text.lower() for keyword in schedule_menu_keywords):
+        return "schedule_menu"
+    if any(keyword in text.lower() for keyword in health_tech_keywords):
+        return "retirement_assistant"
+    return "default"
+
+def run_benchmark(queries, classifier, repeat=200):
+    """
+    Measures routing accuracy and classification speed.
+
+    Args:
+        queries (list): Labelled queries from load_labelled_queries
+        classifier (IntentClassifier): Classifier under test
+        repeat (int): Timing passes over the query set
+
+    Returns:
+        dict: Intent accuracy, prompt accuracy for the new and legacy
+              routers, per-query timings and misclassified queries
+    """
+    errors = []
+    intent_correct = prompt_correct = legacy_correct = 0
+    for query in queries:
+        result = classifier.classify(query['text'])
+        expected_prompt = classifier.prompt_for(query['intent'])[1]
+        if result['intent'] == query['intent']:
+            intent_correct += 1
+        else:
+            errors.append((query['text'], query['intent'], result['intent'], result['confidence']))
+        if result['fallback_prompt'] == expected_prompt:
+            prompt_correct += 1
+        if legacy_route(query['text']) == expected_prompt:
+            legacy_correct += 1
+
+    def time_per_call(func):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for query in queries:
+                func(query['text'])
+        return (time.perf_counter() - started) / (repeat * len(queries)) * 1e6
+
+    return {
+        'queries': len(queries),
+        'intent_accuracy': intent_correct / len(queries),
+        'prompt_accuracy': prompt_correct / len(queries),
+        'legacy_prompt_accuracy': legacy_correct / len(queries),
+        'microseconds_per_query': time_per_call(classifier.classify),
+        'legacy_microseconds_per_query': time_per_call(legacy_route),
+        'errors': errors
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Classify questions or benchmark the intent classifier')
+    parser.add_argument('text', nargs='*', help='Question to classify')
+    parser.add_argument('--config', default=INTENTS_CONFIG_PATH)
+    parser.add_argument('--benchmark', nargs='?', const=BENCHMARK_PATH, metavar='JSONL',
+                       help='Run the labelled-query benchmark')
+    args = parser.parse_args()
+
+    classifier = IntentClassifier(load_intent_config(args.config))
+    if args.benchmark:
+        report = run_benchmark(load_labelled_queries(args.benchmark), classifier)
+        print(f"Queries:          {report['queries']}")
+        print(f"Intent accuracy:  {report['intent_accuracy']:.1%}")
+        print(f"Prompt accuracy:  {report['prompt_accuracy']:.1%} (legacy keyword scan: {report['legacy_prompt_accuracy']:.1%})")
+        print(f"Speed:            {report['microseconds_per_query']:.1f} µs/query "
+              f"(legacy: {report['legacy_microseconds_per_query']:.1f} µs/query)")
+        for text, expected, got, confidence in report['errors']:
+            print(f"  ✗ {text!r}: expected {expected}, got {got} ({confidence:.2f})")
+    else:
+        print(json.dumps(classifier.classify(' '.join(args.text)), indent=2))
@@ -0,0 +1,296 @@
+"""
+End-to-end load test for the Streamlit app against the local mock OpenAI server.
+Starts mock_openai_server.py, points the app at it through OPENAI_BASE_URL and
+drives N concurrent simulated sessions through scripted conversations: typed
+questions, example and follow-up button clicks and voice turns. Sessions run
+either through the Streamlit UI (AppTest harness, one per virtual resident) or
+headless against the shared ChatEngine (--target engine). Reports throughput, turn latency
+percentiles, memory per session and failure rates, and exits non-zero when a
+threshold is exceeded so regressions are caught before deploying.
+
+Usage:
+    python load_test.py --sessions 20 --latency-ms 800 --error-rate 0.02
+    python load_test.py --sessions 50 --max-p95-ms 4000 --max-failure-rate 0.05 --json report.json
+    python load_test.py --target engine --sessions 200
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import os
+import time
+import tracemalloc
+import wave
+
+from mock_openai_server import DEFAULT_CONFIG, start_mock_server
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_gpt.py")
+
+# Each step is (action, argument):
+#   "text": type a question and press Enter
+#   "example": click example question N on the welcome screen
+#   "followup": click suggested follow-up N
+#   "voice": record a question (see run_voice_turn)
+DEFAULT_SCRIPTS = [
+    [("text", "What's for lunch today?"), ("followup", 0), ("text", "And dinner?")],
+    [("example", 0), ("followup", 1), ("voice", "Is Tai Chi on tomorrow?")],
+    [("voice", "When and where is the Yoga class?"), ("text", "Who leads it?"), ("followup", 2)],
+    [("text", "How do I make the text bigger on my phone?"), ("text", "Thanks, what about on my tablet?")]
+]
+
+def _silent_wav(seconds=2.0, rate=16000):
+    """Returns a silent mono WAV clip, standing in for a recorded question."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(bytes(int(seconds * rate) * 2))
+    return buffer.getvalue()
+
+def percentile(values, fraction):
+    """Returns the given percentile (0-1) of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))]
+
+def _last_assistant_text(app):
+    """Returns the text of the newest assistant message in a session."""
+    for message in reversed(app.session_state["chat_session"].history):
+        if message["role"] == "assistant":
+            return message["text"]
+    return ""
+
+def run_voice_turn(app, question, client):
+    """
+    Runs a voice turn. AppTest cannot feed st.audio_input, so the recorded
+    clip is sent to the transcription endpoint the way handle_audio_input
+    does, and the transcript is submitted through the input form.
+    """
+    transcript = client.audio.transcriptions.create(
+        model="whisper-1", file=("question.wav", _silent_wav(), "audio/wav"), language="en")
+    submit_text(app, transcript.text or question)
+
+def submit_text(app, text):
+    """Types text into the input form and presses Enter."""
+    app.text_input[0].input(text)
+    next(button for button in app.button if button.label == "Enter").click().run()
+
+def run_session(session_number, script, client, timeout):
+    """
+    Drives one simulated session through a scripted conversation.
+
+    Returns:
+        dict: Per-turn latencies, failures and the steps that could not run
+    """
+    from streamlit.testing.v1 import AppTest
+
+    result = {'session': session_number, 'turns': [], 'failures': [], 'skipped': [], 'attempted': 0}
+    app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    started = time.perf_counter()
+    app.run()
+    result['startup_seconds'] = time.perf_counter() - started
+
+    for action, argument in script:
+        started = time.perf_counter()
+        try:
+            if action in ("text", "voice"):
+                result['attempted'] += 1
+            if action == "text":
+                submit_text(app, argument)
+            elif action == "voice":
+                run_voice_turn(app, argument, client)
+            else:
+                key = f"{action}_{argument}"
+                if key not in [button.key for button in app.button]:
+                    result['skipped'].append(key)
+                    continue
+                result['attempted'] += 1
+                app.button(key=key).click().run()
+        except Exception as e:
+            result['failures'].append(f"{action}: {type(e).__name__}: {e}")
+            continue
+        elapsed = time.perf_counter() - started
+
+        answer = _last_assistant_text(app)
+        if app.exception:
+            result['failures'].append(f"{action}: {app.exception[0].value}")
+        elif answer.startswith("Error:"):
+            result['failures'].append(f"{action}: {answer}")
+        result['turns'].append({'action': action, 'seconds': elapsed})
+    return result
+
+def run_engine_session(session_number, script, engine, example_questions):
+    """
+    Drives one headless ChatEngine session through a scripted conversation.
+
+    Returns:
+        dict: Same shape as run_session
+    """
+    result = {'session': session_number, 'turns': [], 'failures': [], 'skipped': [], 'attempted': 0}
+    started = time.perf_counter()
+    session = engine.new_session()
+    result['startup_seconds'] = time.perf_counter() - started
+
+    for action, argument in script:
+        if action == "example":
+            question = example_questions[argument] if argument < len(example_questions) else None
+        elif action == "followup":
+            question = session.followups[argument] if argument < len(session.followups) else None
+        else:
+            question = argument
+        if question is None:
+            result['skipped'].append(f"{action}_{argument}")
+            continue
+
+        result['attempted'] += 1
+        started = time.perf_counter()
+        try:
+            if action == "voice":
+                question = engine.transcribe(session, _silent_wav()) or question
+            reply = engine.reply(session, question)
+        except Exception as e:
+            result['failures'].append(f"{action}: {type(e).__name__}: {e}")
+            continue
+        if reply['error']:
+            result['failures'].append(f"{action}: {reply['text']}")
+        result['turns'].append({'action': action, 'seconds': time.perf_counter() - started})
+    return result
+
+def run_load_test(sessions, scripts=DEFAULT_SCRIPTS, concurrency=None, timeout=120, target="ui", store=None,
+                  audio_store=None, event_index_dir=None, **mock_config):
+    """
+    Runs the load test against a freshly started mock server.
+
+    Args:
+        sessions (int): Number of simulated sessions
+        scripts (list): Conversations, assigned to sessions round-robin
+        concurrency (int): Sessions run at once (default: all)
+        timeout (float): Per-run AppTest timeout in seconds
+        target (str): "ui" (Streamlit AppTest) or "engine" (headless ChatEngine)
+        store: Session/answer store for the engine target (default: shared_store.get_store())
+        audio_store: Speech audio store for the engine target (default: shared_store.get_audio_store())
+        event_index_dir (str): Event search index directory for the engine target (default: EVENT_INDEX_DIR)
+        **mock_config: Overrides for the mock server (latency_ms, error_rate, ...)
+
+    Returns:
+        dict: Throughput, latency percentiles, memory and failure report
+    """
+    server, base_url = start_mock_server(**mock_config)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "mock"
+    if target == "engine":
+        from chat_engine import build_engine, load_example_questions
+
+        engine = build_engine("mock", base_url=base_url, store=store, audio_store=audio_store,
+                              event_index_dir=event_index_dir)
+        example_questions = load_example_questions()
+        run = lambda number: run_engine_session(number, scripts[number % len(scripts)], engine, example_questions)
+    else:
+        from openai import OpenAI
+
+        voice_client = OpenAI(api_key="mock", base_url=base_url)
+        run = lambda number: run_session(number, scripts[number % len(scripts)], voice_client, timeout)
+
+    tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency or sessions) as executor:
+        results = list(executor.map(run, range(sessions)))
+    wall_seconds = time.perf_counter() - started
+    memory_after, memory_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    server.shutdown()
+    fast_path = engine.stats()['fast_path'] if target == "engine" else None
+
+    latencies = [turn['seconds'] for result in results for turn in result['turns']]
+    failures = [failure for result in results for failure in result['failures']]
+    attempted = sum(result['attempted'] for result in results)
+    by_action = {}
+    for result in results:
+        for turn in result['turns']:
+            by_action.setdefault(turn['action'], []).append(turn['seconds'])
+
+    return {
+        'target': target,
+        'sessions': sessions,
+        'concurrency': concurrency or sessions,
+        'mock_config': dict(DEFAULT_CONFIG, **mock_config),
+        'wall_seconds': round(wall_seconds, 2),
+        'turns': len(latencies),
+        'throughput_turns_per_second': round(len(latencies) / wall_seconds, 3) if wall_seconds else 0.0,
+        'latency_ms': {name: round(percentile(latencies, fraction) * 1000, 1)
+                       for name, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))},
+        'latency_ms_by_action': {action: {'count': len(values),
+                                          'p50': round(percentile(values, 0.50) * 1000, 1),
+                                          'p95': round(percentile(values, 0.95) * 1000, 1)}
+                                 for action, values in sorted(by_action.items())},
+        'startup_ms_p50': round(percentile([result['startup_seconds'] for result in results], 0.5) * 1000, 1),
+        'memory_per_session_kb': round((memory_after - memory_before) / sessions / 1024, 1),
+        'peak_memory_mb': round(memory_peak / 1024 / 1024, 1),
+        'failures': len(failures),
+        'failure_rate': round(len(failures) / attempted, 4) if attempted else 0.0,
+        'failure_samples': failures[:10],
+        'skipped_steps': sum(len(result['skipped']) for result in results),
+        'fast_path': fast_path,
+        'mock_requests': dict(server.stats)
+    }
+
+def check_thresholds(report, max_p95_ms=None, max_failure_rate=None):
+    """Returns a list of threshold violations (empty if the run passed)."""
+    violations = []
+    if max_p95_ms is not None and report['latency_ms']['p95'] > max_p95_ms:
+        violations.append(f"p95 latency {report['latency_ms']['p95']} ms > {max_p95_ms} ms")
+    if max_failure_rate is not None and report['failure_rate'] > max_failure_rate:
+        violations.append(f"failure rate {report['failure_rate']:.1%} > {max_failure_rate:.1%}")
+    return violations
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='Load-test the chatbot against a local mock OpenAI server')
+    parser.add_argument('--target', choices=['ui', 'engine'], default='ui',
+                        help='Drive the Streamlit UI (AppTest) or the headless chat engine')
+    parser.add_argument('--sessions', type=int, default=10, help='Simulated sessions')
+    parser.add_argument('--concurrency', type=int, default=None, help='Sessions run at once (default: all)')
+    parser.add_argument('--scripts', help='JSON file with a list of conversations of [action, argument] steps')
+    parser.add_argument('--timeout', type=float, default=120, help='Per-run AppTest timeout in seconds')
+    parser.add_argument('--max-p95-ms', type=float, help='Fail if p95 turn latency exceeds this')
+    parser.add_argument('--max-failure-rate', type=float, help='Fail if the failure rate exceeds this (0-1)')
+    parser.add_argument('--json', help='Write the report to this file')
+    for key, value in DEFAULT_CONFIG.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    scripts = DEFAULT_SCRIPTS
+    if args.scripts:
+        with open(args.scripts, 'r', encoding='utf-8') as f:
+            scripts = [[tuple(step) for step in script] for script in json.load(f)]
+
+    report = run_load_test(args.sessions, scripts, args.concurrency, args.timeout, args.target,
+                           **{key: getattr(args, key) for key in DEFAULT_CONFIG})
+    print(f"Sessions:     {report['sessions']} ({report['concurrency']} concurrent), {report['turns']} turns "
+          f"in {report['wall_seconds']} s")
+    print(f"Throughput:   {report['throughput_turns_per_second']} turns/s")
+    print("Latency:      " + ", ".join(f"{name} {value} ms" for name, value in report['latency_ms'].items()))
+    for action, stats in report['latency_ms_by_action'].items():
+        print(f"  {action:<9} n={stats['count']:<4} p50 {stats['p50']} ms, p95 {stats['p95']} ms")
+    print(f"Memory:       {report['memory_per_session_kb']} KB/session (peak {report['peak_memory_mb']} MB)")
+    print(f"Failures:     {report['failures']} ({report['failure_rate']:.1%}), skipped steps: {report['skipped_steps']}")
+    for failure in report['failure_samples']:
+        print(f"  ✗ {failure}")
+    print(f"Mock calls:   {report['mock_requests']}")
+    if report['fast_path']:
+        print(f"Fast path:    {report['fast_path']['hit_rate']:.1%} of {report['fast_path']['questions']} "
+              f"schedule questions answered without the model")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    violations = check_thresholds(report, args.max_p95_ms, args.max_failure_rate)
+    for violation in violations:
+        print(f"✗ {violation}")
+    sys.exit(1 if violations else 0)
@@ -0,0 +1,220 @@
+"""
+Local stand-in for the OpenAI endpoints the chatbot uses.
+Serves /v1/chat/completions (plain and streaming), /v1/audio/transcriptions
+and /v1/audio/speech with configurable latency, jitter, per-token streaming
+delay and error rates, so the app can be load-tested offline. Point the app at
+it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 and any OPENAI_API_KEY.
+
+Usage:
+    python mock_openai_server.py --port 8787 --latency-ms 800 --error-rate 0.02
+"""
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+DEFAULT_CONFIG = {
+    'latency_ms': 600,          # Base latency before the first byte
+    'jitter_ms': 200,           # Uniform random extra latency
+    'token_delay_ms': 15,       # Delay between streamed chunks
+    'error_rate': 0.0,          # Fraction of requests answered with HTTP 500
+    'rate_limit_rate': 0.0,     # Fraction of requests answered with HTTP 429
+    'transcription_ms_per_kb': 2.0,
+    'speech_ms_per_char': 1.0,
+    'answer_words': 60          # Length of canned chat answers
+}
+
+# Filler vocabulary for canned answers
+_WORDS = ("the community calendar shows a friendly class in Studio X this afternoon with plenty of "
+          "room for everyone please bring water and comfortable shoes our staff will help you").split()
+
+def _estimate_tokens(text):
+    """Rough token estimate (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+def canned_answer(messages, words):
+    """Builds a deterministic answer that echoes the last user message."""
+    question = next((message['content'] for message in reversed(messages) if message.get('role') == 'user'), '')
+    rng = random.Random(question)
+    body = ' '.join(rng.choice(_WORDS) for _ in range(words))
+    return f"You asked: {question.strip()} Here is what I found. {body.capitalize()}."
+
+def canned_followups():
+    """Follow-up questions in the numbered format the app expects."""
+    return "1. What time does it start?\n2. Where is it held?\n3. Do I need to sign up?"
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Request handler; the server instance carries the config and counters."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _count(self, key):
+        with self.server.stats_lock:
+            self.server.stats[key] = self.server.stats.get(key, 0) + 1
+
+    def _sleep(self, extra_ms=0.0):
+        config = self.server.config
+        delay_ms = config['latency_ms'] + random.uniform(0, config['jitter_ms']) + extra_ms
+        time.sleep(delay_ms / 1000.0)
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _maybe_fail(self):
+        """Answers with an injected 429/500 if the dice say so. Returns True if it failed."""
+        config = self.server.config
+        roll = random.random()
+        if roll < config['rate_limit_rate']:
+            self._count('rate_limited')
+            self._send_json(429, {'error': {'message': 'Rate limit reached (mock)', 'type': 'rate_limit_exceeded'}})
+            return True
+        if roll < config['rate_limit_rate'] + config['error_rate']:
+            self._count('errors')
+            self._send_json(500, {'error': {'message': 'Internal server error (mock)', 'type': 'server_error'}})
+            return True
+        return False
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        path = self.path.split('?')[0].rstrip('/')
+        self._count('requests')
+
+        if path.endswith('/chat/completions'):
+            self._count('chat')
+            self._sleep()
+            if not self._maybe_fail():
+                self._chat(json.loads(body or b'{}'))
+        elif path.endswith('/audio/transcriptions'):
+            self._count('transcriptions')
+            self._sleep(len(body) / 1024.0 * self.server.config['transcription_ms_per_kb'])
+            if not self._maybe_fail():
+                self._transcription(body)
+        elif path.endswith('/audio/speech'):
+            self._count('speech')
+            request = json.loads(body or b'{}')
+            self._sleep(len(request.get('input', '')) * self.server.config['speech_ms_per_char'])
+            if not self._maybe_fail():
+                self._speech(request)
+        else:
+            self._send_json(404, {'error': {'message': f'Unknown endpoint {path}'}})
+
+    def _chat(self, request):
+        messages = request.get('messages', [])
+        first_user = next((message['content'] for message in messages if message.get('role') == 'user'), '')
+        if first_user.startswith('Generate three follow-up questions'):
+            answer = canned_followups()
+        else:
+            answer = canned_answer(messages, self.server.config['answer_words'])
+        prompt_tokens = sum(_estimate_tokens(str(message.get('content', ''))) for message in messages)
+        completion_tokens = _estimate_tokens(answer)
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        model = request.get('model', 'mock')
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'prompt_tokens_details': {'cached_tokens': 0}
+        }
+
+        if not request.get('stream'):
+            self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': answer}}],
+                'usage': usage
+            })
+            return
+
+        # Server-sent events, one chunk per word
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def send_chunk(delta, finish_reason=None, include_usage=False):
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            if include_usage:
+                chunk['choices'] = []
+                chunk['usage'] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        send_chunk({'role': 'assistant', 'content': ''})
+        for piece in re.findall(r'\S+\s*', answer):
+            time.sleep(self.server.config['token_delay_ms'] / 1000.0)
+            send_chunk({'content': piece})
+        send_chunk({}, finish_reason='stop')
+        if (request.get('stream_options') or {}).get('include_usage'):
+            send_chunk({}, include_usage=True)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _transcription(self, body):
+        # The multipart body is not parsed; the mock returns a fixed question
+        self._send_json(200, {'text': 'When and where is the Yoga class?'})
+
+    def _speech(self, request):
+        # Roughly 1 KB of fake audio per 10 characters
+        payload = b'\xff\xf3' + bytes(max(1, len(request.get('input', '')) * 100))
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def start_mock_server(port=0, host='127.0.0.1', **config):
+    """
+    Starts the mock server on a daemon thread.
+
+    Args:
+        port (int): Port to listen on (0 picks a free port)
+        host (str): Interface to bind
+        **config: Overrides for DEFAULT_CONFIG
+
+    Returns:
+        tuple: (server, base_url); server.stats holds request counters and
+               server.config can be changed while it runs
+    """
+    server = ThreadingHTTPServer((host, port), MockOpenAIHandler)
+    server.daemon_threads = True
+    server.config = dict(DEFAULT_CONFIG, **config)
+    server.stats = {}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name="mock-openai", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Local mock of the OpenAI chat, transcription and TTS endpoints')
+    parser.add_argument('--port', type=int, default=8787)
+    for key, value in DEFAULT_CONFIG.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+    server, base_url = start_mock_server(port=args.port, **config)
+    print(f"Mock OpenAI listening at {base_url} (Ctrl+C to stop)")
+    print(f"  export OPENAI_BASE_URL={base_url} OPENAI_API_KEY=mock")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(server.stats)
@@ -0,0 +1,252 @@
+"""
+Phonetic and edit-distance matching of event, location and instructor names.
+Voice transcripts mangle activity names ("tie chee", "duplicate bridges",
+"peel tech", "ma john"), which then miss the intent rules, the fast path and
+event search. The matcher builds, once per schedule text, a symmetric-delete
+index over phonetic keys of every name in the schedule and rewrites
+transcript spans whose keys are (nearly) the same as a name's key to that
+name.
+
+A phonetic key keeps consonant sounds and collapses each vowel group to
+"A", so "taichi" and "tie chee" both become TAXA while "touch" (TAX) stays
+apart. Keys of short names must match exactly; longer keys allow one or
+two edits.
+
+Run `python name_matcher.py "when is tie chee"` to canonicalize a
+transcript against prompts/events.txt, or `--bench` to time it.
+"""
+
+from functools import lru_cache
+import re
+
+from event_parser import parse_events
+from schedule_query import STOPWORDS, tokenize
+
+# Longest transcript span (in words) compared against names
+MAX_SPAN_WORDS = 3
+# Words that may not start or end a matched span
+EDGE_WORDS = STOPWORDS | {'with', 'on', 'about', 'by', 'from', 'like', 'go', 'play', 'join', 'try', 'see'}
+
+# Spelling-to-sound rules applied in order before vowels are collapsed
+PHONETIC_RULES = [(re.compile(pattern), replacement) for pattern, replacement in [
+    (r'ph', 'f'), (r'ck', 'k'), (r'sch', 'sk'), (r'tch', 'ch'), (r'dge', 'j'), (r'ch|sh', 'X'), (r'th', '0'),
+    (r'c(?=[eiy])', 's'), (r'[cq]', 'k'), (r'x', 'ks'), (r'z', 's'), (r'g(?=[eiy])', 'j'), (r'^kn', 'n'),
+    (r'^wr', 'r'), (r'h', ''), (r'w(?![aeiouy])', ''), (r'[aeiouy]+', 'A'), (r'(.)\1+', r'\1')
+]]
+
+def phonetic_key(text):
+    """Sound-alike key of a name: "Tai Chi" and "tie chee" -> "TAXA"."""
+    key = ''.join(re.findall(r'[a-z]', (text or '').lower()))
+    for pattern, replacement in PHONETIC_RULES:
+        key = pattern.sub(replacement, key)
+    return key.upper()
+
+# Shorter keys ("JAN" for John, Jean and Gene) match too many ordinary words
+MIN_KEY_LENGTH = 4
+
+def max_distance(key):
+    """Edits allowed between keys: none for short keys, one or two for longer ones."""
+    return 0 if len(key) <= 4 else 1 if len(key) <= 8 else 2
+
+def levenshtein(a, b):
+    """Edit distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+def deletions(key, depth):
+    """The key and every string made by deleting up to `depth` characters from it."""
+    variants, frontier = {key}, {key}
+    for _ in range(depth):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+class DeletionIndex:
+    """
+    Symmetric-delete index over strings: every key is stored under its
+    deletion variants, so keys within a few edits of a query are found with
+    a handful of dict lookups on the query's own deletion variants (then
+    checked with the real edit distance) instead of a scan.
+    """
+
+    def __init__(self, max_edits=2):
+        self.max_edits = max_edits
+        self._variants = {}
+        self._items = {}
+
+    @property
+    def size(self):
+        return len(self._items)
+
+    def add(self, key, item):
+        """Adds an item under a key (items sharing a key are kept together)."""
+        if key not in self._items:
+            for variant in deletions(key, self.max_edits if max_distance(key) else 0):
+                self._variants.setdefault(variant, set()).add(key)
+        self._items.setdefault(key, []).append(item)
+
+    def get(self, key):
+        """Items stored under exactly this key."""
+        return self._items.get(key, [])
+
+    def search(self, key, limit):
+        """Returns [(distance, key, items)] for keys within `limit` edits, closest first."""
+        candidates = set()
+        for variant in deletions(key, min(limit, self.max_edits)):
+            candidates |= self._variants.get(variant, set())
+        found = []
+        for candidate in candidates:
+            if abs(len(candidate) - len(key)) <= limit:
+                distance = levenshtein(key, candidate)
+                if distance <= limit:
+                    found.append((distance, candidate, self._items[candidate]))
+        return sorted(found)
+
+def schedule_names(events):
+    """
+    Names worth recognising in a schedule: titles, the activity part of
+    "<activity> with <instructor>", the parts of "Shopping: Costco",
+    instructors and locations.
+
+    Returns:
+        dict: name -> (kind, number of events mentioning it)
+    """
+    names = {}
+
+    def add(name, kind):
+        name = name.strip(' -:,()')
+        if len(re.sub(r'[^a-z]', '', name.lower())) >= 4:
+            previous = names.get(name)
+            names[name] = (previous[0] if previous else kind, (previous[1] if previous else 0) + 1)
+
+    for event in events:
+        title = event['title']
+        add(title, 'event')
+        activity, _, instructor = title.partition(' with ')
+        if instructor:
+            add(activity, 'event')
+            add(re.sub(r'\s*\(.*\)$', '', instructor), 'instructor')
+        for part in re.split(r'[:/]', activity):
+            add(part, 'event')
+        if event['location']:
+            add(event['location'], 'location')
+    return names
+
+class NameMatcher:
+    """Canonicalizes mangled names in a transcript against the names in one schedule."""
+
+    def __init__(self, events):
+        self.names = schedule_names(events)
+        self.index = DeletionIndex()
+        self._exact = {}
+        for name in self.names:
+            self.index.add(phonetic_key(name), name)
+            self._exact.setdefault(' '.join(tokenize(name)), name)
+
+    def _pick(self, candidates):
+        # Prefer the name mentioned by the most events, then the shortest
+        return max(candidates, key=lambda name: (self.names[name][1], -len(name)))
+
+    def _best(self, words):
+        """The schedule name a span of words sounds like, or None."""
+        key = phonetic_key(' '.join(words))
+        if len(key) < MIN_KEY_LENGTH:
+            return None
+        exact = self.index.get(key)
+        if exact:
+            return self._pick(exact)
+        if max_distance(key) == 0:
+            return None
+        matches = self.index.search(key, max_distance(key))
+        if not matches:
+            return None
+        return self._pick([name for match in matches if match[0] == matches[0][0] for name in match[2]])
+
+    def canonicalize(self, text):
+        """
+        Rewrites mangled schedule names in text.
+
+        Args:
+            text (str): Question or voice transcript
+
+        Returns:
+            dict: 'text' with names replaced and 'replacements'
+                  ([(original span, schedule name)], in text order)
+        """
+        words = list(re.finditer(r"[A-Za-z0-9']+", text or ''))
+        folded = [(tokenize(match.group(0)) or [''])[0] for match in words]
+        taken = [False] * len(words)
+        replacements = []
+        for size in range(min(MAX_SPAN_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                end = start + size
+                span = folded[start:end]
+                if any(taken[start:end]) or span[0] in EDGE_WORDS or span[-1] in EDGE_WORDS:
+                    continue
+                name = self._exact.get(' '.join(span))
+                if name is not None:
+                    taken[start:end] = [True] * size
+                    # Already a schedule name, apart from case or plurals
+                    original = text[words[start].start():words[end - 1].end()]
+                    if original.lower() != name.lower():
+                        replacements.append((words[start].start(), words[end - 1].end(), name))
+                    continue
+                name = self._best(span)
+                if name is None:
+                    continue
+                taken[start:end] = [True] * size
+                replacements.append((words[start].start(), words[end - 1].end(), name))
+
+        replacements.sort()
+        pieces, position = [], 0
+        for start, end, name in replacements:
+            pieces.extend([text[position:start], name])
+            position = end
+        pieces.append((text or '')[position:])
+        return {'text': ''.join(pieces),
+                'replacements': [(text[start:end], name) for start, end, name in replacements]}
+
+@lru_cache(maxsize=4)
+def get_name_matcher(schedule_text, default_year=None):
+    """The matcher for a schedule text (built once per text)."""
+    return NameMatcher(parse_events(schedule_text or '', default_year))
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description='Canonicalize schedule names in a transcript')
+    parser.add_argument('text', nargs='*')
+    parser.add_argument('--events', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                         'prompts', 'events.txt'))
+    parser.add_argument('--bench', action='store_true', help='Time canonicalization of sample transcripts')
+    args = parser.parse_args()
+
+    with open(args.events, 'r', encoding='utf-8') as f:
+        schedule = f.read()
+    started = time.perf_counter()
+    matcher = get_name_matcher(schedule)
+    print(f"Index: {len(matcher.names)} names, {matcher.index.size} keys, "
+          f"built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    if args.bench:
+        samples = ["When is tie chee today?", "Where do they play duplicate bridges?",
+                   "Is peel tech open on Monday?", "What time is ma john?", "What's for lunch today?"]
+        runs = 2000
+        started = time.perf_counter()
+        for run in range(runs):
+            matcher.canonicalize(samples[run % len(samples)])
+        print(f"Canonicalize: {(time.perf_counter() - started) / runs * 1e6:.1f} µs per transcript")
+    else:
+        result = matcher.canonicalize(' '.join(args.text))
+        print(result['text'])
+        for original, name in result['replacements']:
+            print(f"  {original!r} -> {name!r}")
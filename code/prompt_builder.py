@@ -0,0 +1,160 @@
+"""
+Prompt assembly for chat completions, laid out for provider prefix caching.
+Segments are ordered from most stable (instructions, schedule) to least
+stable (current time, the new question) so consecutive turns share the
+longest possible identical prefix, which the provider can serve from its
+prompt cache. Every segment and message is fingerprinted so the cacheable
+prefix length can be measured and reported per request.
+"""
+
+import hashlib
+import json
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+# Segment stability levels (lower = changes less often, placed earlier)
+STABILITY_STATIC = 0    # System instructions
+STABILITY_DAILY = 1     # Schedule / reference data
+STABILITY_SESSION = 2   # Earlier turns of the conversation (append-only)
+STABILITY_TURN = 3      # Current time, session length
+STABILITY_INPUT = 4     # The new user message
+
+# OpenAI only caches prompts of at least this many tokens
+MIN_CACHEABLE_TOKENS = 1024
+
+def estimate_tokens(text):
+    """Counts tokens with tiktoken when installed, otherwise estimates ~4 characters per token."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, len(text) // 4) if text else 0
+
+def fingerprint(value):
+    """Returns a short, stable hash of a JSON-serializable value."""
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+def make_segment(name, stability, messages):
+    """
+    Creates a prompt segment.
+
+    Args:
+        name (str): Segment name for stats (e.g. "instructions")
+        stability (int): One of the STABILITY_* levels
+        messages (list): Chat messages ({"role", "content"}) in the segment
+
+    Returns:
+        dict: Segment with its fingerprint and token estimate
+    """
+    return {
+        'name': name,
+        'stability': stability,
+        'messages': messages,
+        'fingerprint': fingerprint(messages),
+        'tokens': sum(estimate_tokens(message['content']) for message in messages)
+    }
+
+def assemble(segments):
+    """
+    Orders segments from most to least stable and flattens them into messages.
+
+    Args:
+        segments (list): Segments from make_segment (order among equal
+                         stability levels is preserved)
+
+    Returns:
+        dict: 'messages' for the API call, the ordered 'segments', a
+              fingerprint per message and per-message token estimates
+    """
+    ordered = sorted(segments, key=lambda segment: segment['stability'])
+    messages = [message for segment in ordered for message in segment['messages']]
+    return {
+        'messages': messages,
+        'segments': [{key: segment[key] for key in ('name', 'stability', 'fingerprint', 'tokens')}
+                     for segment in ordered],
+        'message_hashes': [fingerprint(message) for message in messages],
+        'message_tokens': [estimate_tokens(message['content']) for message in messages]
+    }
+
+def build_chat_prompt(system_prompt, history, turn_context, reference_context=None):
+    """
+    Builds the prefix-cache-friendly message list for a chat turn:
+    [instructions, reference data, earlier turns, turn context, new message].
+
+    Args:
+        system_prompt (str): Instructions for the selected prompt
+        history (list): Conversation so far as {"role", "text"} dicts, ending
+                        with the new user message
+        turn_context (str): Volatile per-turn context (current time, etc.)
+        reference_context (str): Optional stable reference data (schedule)
+
+    Returns:
+        dict: Output of assemble
+    """
+    segments = [make_segment('instructions', STABILITY_STATIC, [{"role": "system", "content": system_prompt}])]
+    if reference_context:
+        segments.append(make_segment('reference', STABILITY_DAILY, [{"role": "system", "content": reference_context}]))
+
+    earlier, latest = history[:-1], history[-1:]
+    segments.append(make_segment('history', STABILITY_SESSION,
+                                 [{"role": message["role"], "content": message["text"]} for message in earlier]))
+    segments.append(make_segment('turn_context', STABILITY_TURN, [{"role": "system", "content": turn_context}]))
+    segments.append(make_segment('input', STABILITY_INPUT,
+                                 [{"role": message["role"], "content": message["text"]} for message in latest]))
+    return assemble(segments)
+
+def prefix_stats(prompt, previous_hashes):
+    """
+    Measures how much of this prompt repeats the previous request's prefix.
+
+    Args:
+        prompt (dict): Output of assemble
+        previous_hashes (list): 'message_hashes' of the previous request
+
+    Returns:
+        dict: Shared prefix length in messages and tokens, total tokens and
+              whether the shared prefix is long enough to be cached
+    """
+    shared = 0
+    for current, previous in zip(prompt['message_hashes'], previous_hashes or []):
+        if current != previous:
+            break
+        shared += 1
+    prefix_tokens = sum(prompt['message_tokens'][:shared])
+    total_tokens = sum(prompt['message_tokens'])
+    return {
+        'shared_messages': shared,
+        'total_messages': len(prompt['messages']),
+        'cacheable_prefix_tokens': prefix_tokens,
+        'total_tokens': total_tokens,
+        'cache_eligible': prefix_tokens >= MIN_CACHEABLE_TOKENS,
+        'segments': prompt['segments']
+    }
+
+def cached_tokens_from_usage(usage):
+    """Extracts the provider-reported cached prompt tokens from a completion's usage (0 if absent)."""
+    details = getattr(usage, 'prompt_tokens_details', None) if usage is not None else None
+    return getattr(details, 'cached_tokens', 0) or 0
+
+def update_totals(totals, stats, usage=None):
+    """
+    Adds one request's prefix stats (and reported usage) to running totals.
+
+    Args:
+        totals (dict): Running totals, updated in place
+        stats (dict): Output of prefix_stats
+        usage: Optional usage object from the completion response
+
+    Returns:
+        dict: The updated totals
+    """
+    totals['requests'] = totals.get('requests', 0) + 1
+    totals['estimated_prompt_tokens'] = totals.get('estimated_prompt_tokens', 0) + stats['total_tokens']
+    totals['cacheable_prefix_tokens'] = totals.get('cacheable_prefix_tokens', 0) + stats['cacheable_prefix_tokens']
+    if usage is not None:
+        totals['prompt_tokens'] = totals.get('prompt_tokens', 0) + (getattr(usage, 'prompt_tokens', 0) or 0)
+        totals['cached_tokens'] = totals.get('cached_tokens', 0) + cached_tokens_from_usage(usage)
+    return totals
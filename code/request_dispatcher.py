@@ -0,0 +1,356 @@
+"""
+Shared request dispatcher for upstream OpenAI calls.
+Streamlit runs every session's script in its own thread; instead of each one
+calling OpenAI directly, calls are handed to one asyncio loop running on a
+background thread, which:
+  - caps the number of concurrent upstream calls (OPENAI_MAX_CONCURRENCY), and
+    the calls made for any one resident (OPENAI_MAX_PER_USER), so one busy
+    kiosk cannot take every slot; a streamed answer keeps its slots until it
+    has been read
+  - paces them with a token bucket (OPENAI_RATE_PER_SECOND, OPENAI_RATE_BURST)
+  - coalesces identical in-flight chat requests (single-flight), so a burst of
+    "what's for lunch?" right after an announcement makes one upstream call
+  - measures how long each call waited in the queue
+DispatchedOpenAI wraps an OpenAI client so the rest of the app keeps calling
+chat.completions.create / audio.*.create as before. The chat engine names the
+resident a call is for with calls_for(usage id).
+"""
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import SimpleNamespace
+import asyncio
+import copy
+import os
+import threading
+import time
+
+from prompt_builder import fingerprint
+from tracing import LatencyHistogram
+
+MAX_CONCURRENCY = int(os.getenv('OPENAI_MAX_CONCURRENCY', '8'))
+RATE_PER_SECOND = float(os.getenv('OPENAI_RATE_PER_SECOND', '5'))
+RATE_BURST = int(os.getenv('OPENAI_RATE_BURST', '10'))
+# Upstream calls one resident may have running or queued for a slot at once (0: no per-resident limit)
+MAX_PER_USER = int(os.getenv('OPENAI_MAX_PER_USER', '2'))
+
+# Longest a caller waits for queue + call when the request has no timeout of its own
+DEFAULT_WAIT_SECONDS = 120
+
+class TokenBucket:
+    """Asyncio token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self._lock = None
+
+    async def acquire(self):
+        """Waits until a token is available and takes it (first come, first served)."""
+        if self.rate <= 0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# Usage id of the resident the current thread is calling for (None: not attributed)
+_call_owner = ContextVar('call_owner', default=None)
+
+@contextmanager
+def calls_for(owner):
+    """Attributes upstream calls made inside the block to a resident, for the per-resident limit."""
+    token = _call_owner.set(owner)
+    try:
+        yield
+    finally:
+        _call_owner.reset(token)
+
+class HeldStream:
+    """
+    A streamed response that keeps its dispatcher slots until it has been
+    read to the end or closed (the upstream is busy for that whole time).
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        try:
+            yield from self._stream
+        finally:
+            self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def close(self):
+        """Frees the slots (and closes the underlying stream if it can be)."""
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        try:
+            if hasattr(self._stream, 'close'):
+                self._stream.close()
+        finally:
+            self._release()
+
+    def __del__(self):
+        self.close()
+
+def _without_usage(response):
+    """Copy of a shared response with usage cleared, so coalesced callers are not billed twice."""
+    try:
+        shared = copy.copy(response)
+        shared.usage = None
+        return shared
+    except Exception:
+        return response
+
+class RequestDispatcher:
+    """Runs blocking upstream calls on a background asyncio loop with limits and single-flight."""
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, rate_per_second=RATE_PER_SECOND, burst=RATE_BURST,
+                 tracer=None, max_per_user=MAX_PER_USER):
+        """
+        Args:
+            max_concurrency (int): Upstream calls allowed at once
+            rate_per_second (float): Sustained call rate (0 disables rate limiting)
+            burst (int): Calls allowed back-to-back before pacing starts
+            tracer (Tracer): Optional tracer that receives "dispatch_queue_wait" samples
+            max_per_user (int): Calls one resident may have at once (0 disables the limit)
+        """
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self._owners = {}  # owner -> [asyncio.Semaphore, calls holding or waiting for it]
+        self.tracer = tracer
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.queue_wait = LatencyHistogram()
+        self._stats_lock = threading.Lock()
+        self._stats = {'submitted': 0, 'coalesced': 0, 'completed': 0, 'failed': 0,
+                       'timed_out': 0, 'queued': 0, 'in_flight': 0, 'max_queued': 0, 'streaming': 0}
+        self._inflight = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="openai-call")
+
+        self.loop = asyncio.new_event_loop()
+        self._semaphore = None
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="request-dispatcher",
+                                        daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.loop.call_soon(ready.set)
+        self.loop.run_forever()
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+            if key == 'queued':
+                self._stats['max_queued'] = max(self._stats['max_queued'], self._stats['queued'])
+
+    def stats(self):
+        """Returns counters and the queue-wait histogram (ms)."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_wait'] = self.queue_wait.snapshot()
+        return stats
+
+    async def _acquire(self, owner):
+        """Takes the resident's slot (if limited), then a global slot and a rate token."""
+        owner_slot = None
+        if owner is not None and self.max_per_user > 0:
+            owner_slot = self._owners.setdefault(owner, [asyncio.Semaphore(self.max_per_user), 0])
+            owner_slot[1] += 1
+        acquired = []
+        try:
+            if owner_slot is not None:
+                await owner_slot[0].acquire()
+                acquired.append(owner_slot[0])
+            await self._semaphore.acquire()
+            acquired.append(self._semaphore)
+            await self.bucket.acquire()
+        except BaseException:
+            for semaphore in acquired:
+                semaphore.release()
+            self._forget_owner(owner, owner_slot)
+            raise
+        return owner_slot
+
+    def _forget_owner(self, owner, owner_slot):
+        if owner_slot is None:
+            return
+        owner_slot[1] -= 1
+        if owner_slot[1] == 0:
+            self._owners.pop(owner, None)
+
+    def _release(self, owner, owner_slot):
+        """Frees the slots taken by _acquire (call on the dispatcher loop)."""
+        self._count('in_flight', -1)
+        self._semaphore.release()
+        if owner_slot is not None:
+            owner_slot[0].release()
+            self._forget_owner(owner, owner_slot)
+
+    def _release_from_any_thread(self, owner, owner_slot):
+        def release():
+            self._count('streaming', -1)
+            self._release(owner, owner_slot)
+        try:
+            self.loop.call_soon_threadsafe(release)
+        except RuntimeError:
+            pass  # Dispatcher closed
+
+    async def _execute(self, fn, kwargs, submitted_at, owner=None):
+        """Waits for concurrency slots and a rate token, then runs fn in the worker pool."""
+        self._count('queued')
+        started = False
+        try:
+            owner_slot = await self._acquire(owner)
+            started = True
+            self._count('queued', -1)
+            waited = time.monotonic() - submitted_at
+            self.queue_wait.add(waited)
+            if self.tracer is not None:
+                self.tracer.observe("dispatch_queue_wait", waited)
+            self._count('in_flight')
+            try:
+                result = await self.loop.run_in_executor(self._executor, lambda: fn(**kwargs))
+            except BaseException as e:
+                if isinstance(e, Exception):
+                    self._count('failed')
+                self._release(owner, owner_slot)
+                raise
+            self._count('completed')
+            if kwargs.get('stream'):
+                # The upstream stays busy until the answer has been read
+                self._count('streaming')
+                return HeldStream(result, lambda: self._release_from_any_thread(owner, owner_slot))
+            self._release(owner, owner_slot)
+            return result
+        finally:
+            if not started:
+                self._count('queued', -1)
+
+    async def run(self, fn, kwargs=None, key=None, submitted_at=None, owner=None):
+        """
+        Runs fn(**kwargs) under the dispatcher's limits (call from the dispatcher loop).
+
+        Args:
+            fn (callable): Blocking function to run
+            kwargs (dict): Keyword arguments for fn
+            key (str): Single-flight key; concurrent calls with the same key share one run
+            submitted_at (float): time.monotonic() when the caller asked (for queue wait)
+            owner (str): Resident the call is for (per-resident limit; None: not limited)
+
+        Returns:
+            fn's result (coalesced callers get a copy with usage cleared)
+        """
+        self._count('submitted')
+        submitted_at = submitted_at or time.monotonic()
+        if key is not None and key in self._inflight:
+            self._count('coalesced')
+            return _without_usage(await asyncio.shield(self._inflight[key]))
+
+        task = self.loop.create_task(self._execute(fn, kwargs or {}, submitted_at, owner))
+        if key is not None:
+            self._inflight[key] = task
+            task.add_done_callback(lambda finished: self._inflight.pop(key, None))
+        # Shielded so a caller giving up does not cancel the call for coalesced callers
+        return await asyncio.shield(task)
+
+    def call(self, fn, kwargs=None, key=None, timeout=None, owner=None):
+        """
+        Runs fn(**kwargs) from any thread and blocks until it finishes or `timeout` passes.
+
+        Raises:
+            TimeoutError: If the call did not finish in time (queue wait included)
+        """
+        wait_seconds = timeout or DEFAULT_WAIT_SECONDS
+        future = asyncio.run_coroutine_threadsafe(
+            self.run(fn, kwargs, key=key, submitted_at=time.monotonic(), owner=owner), self.loop)
+        try:
+            return future.result(wait_seconds)
+        except FutureTimeoutError:
+            future.cancel()
+            self._count('timed_out')
+            raise TimeoutError(f"Dispatched call did not finish within {wait_seconds:.1f}s")
+
+    def wrap(self, client):
+        """Returns a DispatchedOpenAI proxy for an OpenAI client."""
+        return DispatchedOpenAI(client, self)
+
+    def close(self):
+        """Cancels outstanding calls and stops the loop and the worker pool."""
+        def shutdown():
+            for task in asyncio.all_tasks(self.loop):
+                task.cancel()
+            self.loop.call_soon(self.loop.stop)
+        self.loop.call_soon_threadsafe(shutdown)
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False)
+
+def chat_request_key(kwargs):
+    """Single-flight key for a chat request (None for streaming requests, which are not shared)."""
+    if kwargs.get('stream'):
+        return None
+    try:
+        return fingerprint({name: value for name, value in kwargs.items() if name != 'timeout'})
+    except TypeError:
+        return None
+
+class DispatchedOpenAI:
+    """OpenAI client proxy that routes calls through a RequestDispatcher."""
+
+    def __init__(self, client, dispatcher, hedge=False):
+        """
+        Args:
+            client: OpenAI client
+            dispatcher (RequestDispatcher): Dispatcher to route calls through
+            hedge (bool): Calls are hedged duplicates (see hedged())
+        """
+        self.client = client
+        self.dispatcher = dispatcher
+        self.is_hedge = hedge
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.audio = SimpleNamespace(
+            transcriptions=SimpleNamespace(create=self._dispatch(lambda: client.audio.transcriptions.create)),
+            speech=SimpleNamespace(create=self._dispatch(lambda: client.audio.speech.create)))
+
+    def hedged(self):
+        """
+        View for hedged duplicates (see resilient_client): they are never
+        coalesced, which would just join the slow call they are meant to race,
+        and are not held to the resident's slots, which that call occupies.
+        """
+        return DispatchedOpenAI(self.client, self.dispatcher, hedge=True)
+
+    def _owner(self):
+        return None if self.is_hedge else _call_owner.get()
+
+    def _chat(self, **kwargs):
+        key = None if self.is_hedge else chat_request_key(kwargs)
+        return self.dispatcher.call(self.client.chat.completions.create, kwargs, key=key,
+                                    timeout=kwargs.get('timeout'), owner=self._owner())
+
+    def _dispatch(self, resolve):
+        def create(**kwargs):
+            return self.dispatcher.call(resolve(), kwargs, timeout=kwargs.get('timeout'), owner=self._owner())
+        return create
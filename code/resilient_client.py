@@ -0,0 +1,419 @@
+"""
+Fault-tolerant wrapper around the OpenAI client.
+ResilientOpenAI exposes the same chat.completions.create,
+audio.transcriptions.create and audio.speech.create calls as the OpenAI client
+(so the metered wrappers work unchanged) and adds:
+  - an overall deadline per call, split across attempts, so a slow upstream
+    call can no longer block a session's script thread indefinitely
+  - retries with exponential backoff and full jitter on 429/5xx, timeouts and
+    connection errors (honouring Retry-After)
+  - optional hedging: a duplicate chat request is sent if the first has not
+    answered after OPENAI_HEDGE_AFTER_SECONDS, and the faster one wins
+  - a circuit breaker per endpoint that stops calling a degraded upstream and
+    fails chat over to a local OpenAI-compatible model (LOCAL_MODEL_BASE_URL)
+    or to a recent answer to the same question
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from types import SimpleNamespace
+import contextvars
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+# Overall deadline per call, in seconds, by endpoint
+DEFAULT_DEADLINES = {
+    'chat': float(os.getenv('OPENAI_DEADLINE_SECONDS', '30')),
+    'transcription': float(os.getenv('OPENAI_TRANSCRIPTION_DEADLINE_SECONDS', '45')),
+    'speech': float(os.getenv('OPENAI_SPEECH_DEADLINE_SECONDS', '30'))
+}
+
+# Longest single attempt; later attempts get whatever is left of the deadline
+ATTEMPT_TIMEOUT_SECONDS = float(os.getenv('OPENAI_ATTEMPT_TIMEOUT_SECONDS', '20'))
+
+MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '3'))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# Send a duplicate chat request after this many seconds (0 disables hedging)
+HEDGE_AFTER_SECONDS = float(os.getenv('OPENAI_HEDGE_AFTER_SECONDS', '0'))
+
+# Circuit breaker: open after this many consecutive upstream failures, probe again after the cooldown
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('OPENAI_BREAKER_FAILURES', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('OPENAI_BREAKER_RESET_SECONDS', '30'))
+
+# Optional local OpenAI-compatible server (Ollama, vLLM, llama.cpp...) used when the upstream is down
+LOCAL_MODEL_BASE_URL = os.getenv('LOCAL_MODEL_BASE_URL', '')
+LOCAL_MODEL_NAME = os.getenv('LOCAL_MODEL_NAME', 'llama3.1')
+LOCAL_MODEL_API_KEY = os.getenv('LOCAL_MODEL_API_KEY', 'local')
+
+# Recent chat answers kept for fallback (schedule answers go stale, so they expire)
+ANSWER_CACHE_SIZE = 256
+ANSWER_CACHE_MAX_AGE_SECONDS = 6 * 3600
+CACHED_ANSWER_NOTE = ("\n\n*The assistant is having trouble reaching its service right now, "
+                      "so this is a recent answer to the same question.*")
+
+class UpstreamUnavailableError(Exception):
+    """Raised when the upstream failed and no fallback could answer."""
+
+def is_retryable(error):
+    """True for rate limits, server errors, timeouts and connection errors."""
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in RETRY_STATUSES
+    return isinstance(error, (TimeoutError, ConnectionError)) or \
+        type(error).__name__ in ('APITimeoutError', 'APIConnectionError')
+
+def retry_after_seconds(error):
+    """Returns the Retry-After delay the server asked for, if any."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS):
+    """Exponential backoff with full jitter for the given retry number (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open)."""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probing = False
+
+    @property
+    def state(self):
+        """Current state: closed, open or half_open."""
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_seconds else 'open'
+
+    def allow(self):
+        """Returns True if a call may go upstream (one probe at a time when half-open)."""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            # A failed probe re-opens the breaker straight away
+            if self._probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    self.times_opened += 1
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+class AnswerCache:
+    """
+    Small LRU of chat answers keyed by the conversation that produced them:
+    the system prompt plus every user and assistant turn, so the same
+    question after a different history is a different entry. The per-turn
+    context (current time) is left out so a fallback can still match.
+
+    With a shared store (see shared_store), answers to a conversation's
+    first question are also written there so a replica can fall back on
+    answers another replica received. Answers that depend on earlier,
+    personal turns stay in this process only.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, max_age_seconds=ANSWER_CACHE_MAX_AGE_SECONDS, store=None):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.store = store
+        self._lock = threading.Lock()
+        self._answers = OrderedDict()
+
+    @staticmethod
+    def turns(messages):
+        """The system prompt and the user/assistant turns, with normalized text."""
+        messages = list(messages or [])
+        kept = messages[:1] if messages and messages[0].get('role') == 'system' else []
+        kept += [message for message in messages if message.get('role') in ('user', 'assistant')]
+        return [(message.get('role'), ' '.join(str(message.get('content', '')).lower().split())) for message in kept]
+
+    @classmethod
+    def key(cls, messages):
+        """Fingerprint of the conversation (see turns), or '' if it has no question."""
+        turns = cls.turns(messages)
+        if not any(role == 'user' and text for role, text in turns):
+            return ''
+        return hashlib.sha256(json.dumps(turns, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def shareable(cls, messages):
+        """True if the conversation is a single question, with no personal history to leak."""
+        return [role for role, _ in cls.turns(messages) if role != 'system'] == ['user']
+
+    @staticmethod
+    def _store_key(key):
+        return 'answer:' + key
+
+    def get(self, messages):
+        key = self.key(messages)
+        with self._lock:
+            entry = self._answers.get(key)
+            if entry is not None:
+                answer, stored_at = entry
+                if time.monotonic() - stored_at <= self.max_age_seconds:
+                    self._answers.move_to_end(key)
+                    return answer
+                del self._answers[key]
+        if self.store is None or not key or not self.shareable(messages):
+            return None
+        try:
+            raw = self.store.get(self._store_key(key))
+        except Exception as e:
+            print(f"✗ Shared answer cache unavailable: {e}")
+            return None
+        return None if raw is None else raw.decode('utf-8')
+
+    def put(self, messages, answer):
+        key = self.key(messages)
+        if not key or not answer:
+            return
+        with self._lock:
+            self._answers[key] = (answer, time.monotonic())
+            self._answers.move_to_end(key)
+            while len(self._answers) > self.max_entries:
+                self._answers.popitem(last=False)
+        if self.store is not None and self.shareable(messages):
+            try:
+                self.store.set(self._store_key(key), answer.encode('utf-8'), ttl=self.max_age_seconds)
+            except Exception as e:
+                print(f"✗ Shared answer cache unavailable: {e}")
+
+def _completion_from_text(text, model):
+    """Builds a minimal chat-completion-shaped response for fallback answers."""
+    message = SimpleNamespace(role='assistant', content=text)
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')],
+                           usage=None, model=model)
+
+class _Endpoint:
+    """Proxy exposing create() for one client endpoint."""
+
+    def __init__(self, owner, name, resolve):
+        self._owner = owner
+        self._name = name
+        self._resolve = resolve
+
+    def create(self, **kwargs):
+        return self._owner._call(self._name, self._resolve, kwargs)
+
+class ResilientOpenAI:
+    """OpenAI client wrapper with deadlines, retries, hedging, circuit breaking and fallbacks."""
+
+    def __init__(self, client, fallback_client=None, fallback_model=LOCAL_MODEL_NAME, deadlines=None,
+                 max_retries=MAX_RETRIES, hedge_after=HEDGE_AFTER_SECONDS, answer_cache=None, sleep=time.sleep):
+        """
+        Args:
+            client: OpenAI client (construct it with max_retries=0; retries happen here)
+            fallback_client: Optional OpenAI-compatible client for a local model
+            fallback_model (str): Model name to request from the fallback client
+            deadlines (dict): Overall deadline per endpoint in seconds
+            max_retries (int): Retries after the first attempt
+            hedge_after (float): Seconds before a hedged duplicate chat request (0 disables)
+            answer_cache (AnswerCache): Store of recent answers for fallback
+            sleep (callable): Sleep function (replaceable in tests)
+        """
+        self.client = client
+        self.fallback_client = fallback_client
+        self.fallback_model = fallback_model
+        self.deadlines = dict(DEFAULT_DEADLINES, **(deadlines or {}))
+        self.max_retries = max_retries
+        self.hedge_after = hedge_after
+        self.answer_cache = answer_cache if answer_cache is not None else AnswerCache()
+        self.sleep = sleep
+        self.breakers = {name: CircuitBreaker() for name in self.deadlines}
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+        self._hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="openai-hedge")
+
+        self.chat = SimpleNamespace(completions=_Endpoint(self, 'chat', lambda c: c.chat.completions.create))
+        self.audio = SimpleNamespace(
+            transcriptions=_Endpoint(self, 'transcription', lambda c: c.audio.transcriptions.create),
+            speech=_Endpoint(self, 'speech', lambda c: c.audio.speech.create))
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] = self._stats.get(key, 0) + amount
+
+    def stats(self):
+        """Returns call counters and the state of each circuit breaker."""
+        with self._stats_lock:
+            counters = dict(self._stats)
+        return {
+            'counters': counters,
+            'breakers': {name: {'state': breaker.state, 'times_opened': breaker.times_opened}
+                         for name, breaker in self.breakers.items()}
+        }
+
+    def _attempt(self, resolve, kwargs, timeout, hedge):
+        """One attempt, optionally hedged with a duplicate request."""
+        create = resolve(self.client)
+        call_kwargs = dict(kwargs, timeout=timeout)
+        if not hedge:
+            return create(**call_kwargs)
+
+        # The pool threads keep the caller's context (the resident the call is for)
+        first = self._hedge_pool.submit(contextvars.copy_context().run, create, **call_kwargs)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+        self._count('hedges')
+        # A dispatched client must not coalesce the duplicate with the call it races
+        hedged = self.client.hedged() if hasattr(self.client, 'hedged') else self.client
+        second = self._hedge_pool.submit(resolve(hedged), **call_kwargs)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"Hedged request exceeded {timeout:.1f}s")
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _call(self, endpoint, resolve, kwargs):
+        """Runs a call with deadline, retries, breaker and fallback."""
+        self._count(f'{endpoint}_calls')
+        breaker = self.breakers[endpoint]
+        deadline = time.monotonic() + kwargs.pop('deadline', self.deadlines[endpoint])
+        hedge = endpoint == 'chat' and self.hedge_after > 0 and not kwargs.get('stream')
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                self._count(f'{endpoint}_short_circuited')
+                last_error = UpstreamUnavailableError(f"OpenAI {endpoint} circuit is open")
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                response = self._attempt(resolve, kwargs, min(ATTEMPT_TIMEOUT_SECONDS, remaining), hedge)
+            except Exception as e:
+                last_error = e
+                if not is_retryable(e):
+                    # Bad requests are the caller's problem, not an upstream outage
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                self._count(f'{endpoint}_failures')
+                if attempt == self.max_retries:
+                    break
+                delay = retry_after_seconds(e) or backoff_delay(attempt)
+                if time.monotonic() + delay >= deadline:
+                    break
+                self._count(f'{endpoint}_retries')
+                self.sleep(delay)
+                continue
+
+            breaker.record_success()
+            if endpoint == 'chat' and not kwargs.get('stream'):
+                try:
+                    self.answer_cache.put(kwargs.get('messages'), response.choices[0].message.content)
+                except (AttributeError, IndexError):
+                    pass
+            return response
+
+        if endpoint == 'chat':
+            fallback = self._chat_fallback(kwargs)
+            if fallback is not None:
+                return fallback
+        self._count(f'{endpoint}_gave_up')
+        if isinstance(last_error, UpstreamUnavailableError):
+            raise last_error
+        message = f"OpenAI {endpoint} unavailable: {last_error or 'deadline exceeded'}"
+        raise UpstreamUnavailableError(message) from last_error
+
+    def _chat_fallback(self, kwargs):
+        """Answers from the local model or the answer cache; returns None if neither can."""
+        if self.fallback_client is not None and not kwargs.get('stream'):
+            local_kwargs = dict(kwargs, model=self.fallback_model)
+            # Local servers generally only understand max_tokens
+            if 'max_completion_tokens' in local_kwargs:
+                local_kwargs['max_tokens'] = local_kwargs.pop('max_completion_tokens')
+            try:
+                response = self.fallback_client.chat.completions.create(**local_kwargs)
+                self._count('fallback_local')
+                return response
+            except Exception as e:
+                print(f"✗ Local model fallback failed: {e}")
+
+        cached = self.answer_cache.get(kwargs.get('messages'))
+        if cached is not None and not kwargs.get('stream'):
+            self._count('fallback_cache')
+            return _completion_from_text(cached + CACHED_ANSWER_NOTE, 'answer-cache')
+        return None
+
+class LazyOpenAI:
+    """
+    OpenAI client that is only created (and the openai package, with httpx
+    and pydantic, only imported) when it is first used, so building the
+    engine does not slow down the app's first render.
+    """
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(**self._kwargs)
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self._get_client(), name)
+
+def build_resilient_client(api_key, base_url=None, dispatcher=None, store=None):
+    """
+    Creates the upstream client (without its own retries) wrapped in
+    ResilientOpenAI, plus the local fallback client if LOCAL_MODEL_BASE_URL is set.
+    With a RequestDispatcher, every upstream attempt (retries and hedges
+    included) goes through its concurrency and rate limits; with a shared
+    store, fallback answers are shared between replicas.
+    """
+    upstream = LazyOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+    if dispatcher is not None:
+        upstream = dispatcher.wrap(upstream)
+    fallback = None
+    if LOCAL_MODEL_BASE_URL:
+        fallback = LazyOpenAI(api_key=LOCAL_MODEL_API_KEY, base_url=LOCAL_MODEL_BASE_URL, max_retries=0)
+    return ResilientOpenAI(upstream, fallback_client=fallback, answer_cache=AnswerCache(store=store))
@@ -0,0 +1,218 @@
+"""
+Compact rendering of the events schedule for the schedule/menu prompt.
+prompts/events.txt lists every occurrence of every class with its full
+description, so the same blurbs (Tai Chi, Line Dancing, Water Fitness, ...)
+are repeated for each day. The compactor:
+  - moves descriptions that occur more than once into a definitions section
+    and refers to them by short IDs ([D1], [D2], ...)
+  - collapses events held in the same weekly slot (same title, time,
+    location and description on the same weekday) into one recurrence rule,
+    listing the dates in the range where they are cancelled or not held
+  - lists everything else day by day, as before
+Text that is not an event (the scraped page header, section headings, menu
+tables, notes without a time) is passed through unchanged: what comes before
+the first day header stays at the top, the rest is kept under its day.
+
+Run `python schedule_compactor.py` to see the before/after token counts for
+prompts/events.txt (add --show to print the compact schedule).
+"""
+
+from functools import lru_cache
+
+from event_parser import format_clock, parse_schedule
+from prompt_builder import estimate_tokens
+
+# Descriptions shorter than this stay inline (an ID would not save anything)
+MIN_SHARED_DESCRIPTION_CHARS = 40
+
+def _short_date(day):
+    return f"{day.strftime('%b')} {day.day}"
+
+def _weekday_list(weekdays):
+    """"Mondays", "Mondays and Fridays", "Mondays, Wednesdays and Fridays"."""
+    names = [f"{weekday}s" for weekday in weekdays]
+    return names[0] if len(names) == 1 else ', '.join(names[:-1]) + ' and ' + names[-1]
+
+def _time_range(event):
+    return format_clock(event['start']) + (f" to {format_clock(event['end'])}" if event['end'] else '')
+
+def _slot(event):
+    """Title, time and place of an event, which a weekly rule repeats."""
+    return (event['title'], event['start'], event['end'], event['location'])
+
+@lru_cache(maxsize=8)
+def compact_schedule(text, default_year=None):
+    """
+    Renders schedule text compactly (see the module docstring).
+
+    Args:
+        text (str): Schedule text (events.txt layout)
+        default_year (int): Year for day headers without one
+
+    Returns:
+        str: Compact schedule, or the text unchanged if no events could be parsed
+    """
+    events, others = parse_schedule(text or '', default_year)
+    if not events:
+        return text
+    parts = [block for day, block in others if day is None]
+    parts.append(compact_events(events))
+    notes = [(day, block) for day, block in others if day is not None]
+    if notes:
+        lines = ["OTHER NOTES BY DAY:"]
+        current_day = None
+        for day, block in notes:
+            if day != current_day:
+                current_day = day
+                lines.append(day.strftime('%A %b %d, %Y').upper())
+            lines.append(block)
+        parts.append('\n'.join(lines))
+    return '\n\n'.join(parts)
+
+def compact_events(events):
+    """
+    Renders parsed events compactly (see the module docstring).
+
+    Args:
+        events (sequence): Event dicts from event_parser.parse_events, in schedule order
+
+    Returns:
+        str: Compact schedule
+    """
+    # Descriptions shared by several events get IDs, in order of first appearance
+    counts = {}
+    for event in events:
+        if event['description']:
+            counts[event['description']] = counts.get(event['description'], 0) + 1
+    description_ids = {}
+    for event in events:
+        description = event['description']
+        if (counts.get(description, 0) > 1 and len(description) >= MIN_SHARED_DESCRIPTION_CHARS
+                and description not in description_ids):
+            description_ids[description] = f"D{len(description_ids) + 1}"
+
+    def describe(event):
+        description = event['description']
+        if not description:
+            return ''
+        if description in description_ids:
+            return f" [{description_ids[description]}]"
+        return ' - ' + description.replace('\n', ' ')
+
+    # Weekly rules: the same slot and description on the same weekday at least twice
+    schedule_days = sorted({event['date'] for event in events})
+    dates_by_slot = {}
+    for event in events:
+        if not event['cancelled']:
+            key = _slot(event) + (event['description'],)
+            dates_by_slot.setdefault(key, {}).setdefault(event['date'].strftime('%A'), []).append(event['date'])
+
+    rules = []
+    covered = set()  # (slot, date) handled by a rule
+    for key, by_weekday in dates_by_slot.items():
+        weekdays = [weekday for weekday, dates in by_weekday.items() if len(dates) > 1]
+        if not weekdays:
+            continue
+        dates = sorted(date for weekday in weekdays for date in by_weekday[weekday])
+        first, last = dates[0], dates[-1]
+        expected = [day for day in schedule_days
+                    if first <= day <= last and day.strftime('%A') in weekdays]
+        rules.append({'key': key, 'first': first, 'last': last, 'dates': set(dates), 'expected': expected,
+                      'cancelled': []})
+        covered.update((key[:4], date) for date in dates)
+
+    # Cancelled occurrences of a rule's slot become exceptions of that rule
+    leftovers = []
+    for event in events:
+        if (_slot(event), event['date']) in covered:
+            continue
+        rule = None
+        if event['cancelled']:
+            rule = next((rule for rule in rules if rule['key'][:4] == _slot(event)
+                         and event['date'] in rule['expected'] and event['date'] not in rule['dates']), None)
+        if rule is not None:
+            rule['cancelled'].append(event['date'])
+        else:
+            leftovers.append(event)
+
+    lines = []
+    if description_ids:
+        lines.append("EVENT DESCRIPTIONS (referenced below as [D1], [D2], ...):")
+        lines.extend(f"[{description_id}] {description.replace(chr(10), ' ')}"
+                     for description, description_id in description_ids.items())
+        lines.append('')
+
+    if rules:
+        lines.append("WEEKLY EVENTS (held every listed weekday from the first to the last date shown, "
+                     "except where noted):")
+        for rule in sorted(rules, key=lambda rule: (rule['key'][1], rule['key'][0])):
+            title, start, end, location, description = rule['key']
+            weekdays = [day.strftime('%A') for day in sorted({day.weekday(): day for day in rule['dates']}.values(),
+                                                               key=lambda day: day.weekday())]
+            event = {'start': start, 'end': end, 'description': description}
+            line = f"- {title}: {_weekday_list(weekdays)}, {_time_range(event)}"
+            if location:
+                line += f", {location}"
+            line += describe(event)
+            notes = [f"{_short_date(rule['first'])} to {_short_date(rule['last'])}"]
+            if rule['cancelled']:
+                notes.append("cancelled " + ', '.join(_short_date(day) for day in sorted(rule['cancelled'])))
+            missing = [day for day in rule['expected'] if day not in rule['dates'] and day not in rule['cancelled']]
+            if missing:
+                notes.append("not held " + ', '.join(_short_date(day) for day in missing))
+            lines.append(f"{line} ({'; '.join(notes)})")
+        lines.append('')
+
+    if leftovers:
+        lines.append("OTHER EVENTS BY DAY:")
+        current_day = None
+        for event in leftovers:
+            if event['date'] != current_day:
+                current_day = event['date']
+                lines.append(current_day.strftime('%A %b %d, %Y').upper())
+            line = f"- {_time_range(event)}: {event['title']}"
+            if event['cancelled']:
+                line += " - CANCELLED"
+            if event['location']:
+                line += f", {event['location']}"
+            lines.append(line + describe(event))
+
+    return '\n'.join(lines).strip()
+
+def compaction_report(text, default_year=None):
+    """
+    Token counts of the schedule before and after compaction.
+
+    Returns:
+        dict: 'raw_tokens', 'compact_tokens', 'saved_fraction', 'raw_chars'
+              and 'compact_chars'
+    """
+    compact = compact_schedule(text, default_year)
+    raw_tokens, compact_tokens = estimate_tokens(text or ''), estimate_tokens(compact or '')
+    return {
+        'raw_tokens': raw_tokens,
+        'compact_tokens': compact_tokens,
+        'saved_fraction': round(1 - compact_tokens / raw_tokens, 3) if raw_tokens else 0.0,
+        'raw_chars': len(text or ''),
+        'compact_chars': len(compact or '')
+    }
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Compact the events schedule and report token counts')
+    parser.add_argument('--events', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                         'prompts', 'events.txt'))
+    parser.add_argument('--show', action='store_true', help='Print the compact schedule')
+    args = parser.parse_args()
+
+    with open(args.events, 'r', encoding='utf-8') as f:
+        schedule = f.read()
+    if args.show:
+        print(compact_schedule(schedule))
+        print()
+    report = compaction_report(schedule)
+    print(f"Raw schedule:     {report['raw_tokens']} tokens ({report['raw_chars']} chars)")
+    print(f"Compact schedule: {report['compact_tokens']} tokens ({report['compact_chars']} chars)")
+    print(f"Saved:            {report['saved_fraction']:.1%}")
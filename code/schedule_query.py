@@ -0,0 +1,234 @@
+"""
+Deterministic fast path for simple schedule lookups.
+Questions like "When and where is the Yoga class?" or "What's on today?" have
+exact answers in the parsed events schedule (see event_parser), so they are
+answered from templates in well under a millisecond instead of a model call.
+
+Only high-confidence questions are answered: the question must ask when/where
+something is (or what is on a given day), every content word must match the
+event title, and at most MAX_TITLES distinct events may match. Anything else
+(costs, menus, "who", vague times of day, unknown events or dates) returns
+None so the caller falls back to the model.
+
+Run `python schedule_query.py "When is Tai Chi?"` to try a question against
+prompts/events.txt.
+"""
+
+from datetime import datetime, timedelta
+import re
+import threading
+import time
+
+from event_parser import event_datetimes, format_clock, parse_events
+from intent_classifier import normalize_text
+
+# Most distinct events one answer may list before the question counts as ambiguous
+MAX_TITLES = 3
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+WHEN_WORDS = {'when', 'time', 'times', 'start', 'starts', 'begin', 'begins', 'end', 'ends', 'finish'}
+WHERE_WORDS = {'where', 'location', 'room', 'place'}
+LISTING_WORDS = {'schedule', 'happening', 'going', 'on', 'event', 'events', 'activity', 'activities', 'calendar'}
+
+# Words that carry no event name
+STOPWORDS = WHEN_WORDS | WHERE_WORDS | LISTING_WORDS | set(WEEKDAYS) | {
+    'what', 'whats', 's', 'is', 'are', 'was', 'the', 'a', 'an', 'and', 'or', 'of', 'for', 'to', 'at', 'in',
+    'does', 'do', 'did', 'it', 'its', 'class', 'session', 'held', 'there', 'any', 'community', 'my', 'i',
+    'me', 'we', 'can', 'could', 'please', 'tell', 'will', 'be', 'have', 'has', 'today', 'todays', 'tomorrow',
+    'tomorrows', 'this', 'next', 'else', 'again', 'still', 'cancelled', 'canceled', 'meet', 'meeting', 'us'
+}
+
+# Questions the templates cannot answer faithfully
+UNSUPPORTED_WORDS = {
+    'who', 'why', 'how', 'cost', 'price', 'fee', 'much', 'bring', 'wear', 'should', 'sign', 'register',
+    'menu', 'lunch', 'dinner', 'breakfast', 'brunch', 'food', 'eat', 'meal', 'week', 'weekend', 'month',
+    'tonight', 'morning', 'afternoon', 'evening', 'not', 'without', 'last', 'yesterday', 'ago'
+}
+
+def tokenize(text):
+    """Lower-case word tokens with simple plural folding ("classes" -> "class")."""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", normalize_text(text)):
+        if len(word) > 4 and word.endswith('es') and word[-3] in 'sxh':
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+# The word lists are matched against folded tokens ("activities" -> "activitie")
+WHEN_WORDS, WHERE_WORDS, LISTING_WORDS, STOPWORDS, UNSUPPORTED_WORDS = (
+    {token for word in words for token in tokenize(word)}
+    for words in (WHEN_WORDS, WHERE_WORDS, LISTING_WORDS, STOPWORDS, UNSUPPORTED_WORDS))
+
+def day_phrase(day, today):
+    """"today", "tomorrow" or "on Monday, November 3"."""
+    if day == today:
+        return 'today'
+    if day == today + timedelta(days=1):
+        return 'tomorrow'
+    return f"on {day.strftime('%A, %B')} {day.day}"
+
+def _time_range(event):
+    if event['end'] is None:
+        return f"at {format_clock(event['start'])}"
+    return f"from {format_clock(event['start'])} to {format_clock(event['end'])}"
+
+class ScheduleQueryEngine:
+    """Answers simple when/where/what's-on questions from the schedule and counts its hit rate."""
+
+    def __init__(self, max_titles=MAX_TITLES, clock=datetime.now):
+        self.max_titles = max_titles
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._counts = {'questions': 0, 'hits': 0, 'seconds': 0.0, 'misses': {}}
+        self._title_tokens = {}
+
+    def answer(self, question, schedule_text, now=None):
+        """
+        Answers a schedule question if it can be answered with confidence.
+
+        Args:
+            question (str): The resident's question
+            schedule_text (str): Schedule text (events.txt layout)
+            now (datetime): Current time (default: the engine's clock)
+
+        Returns:
+            dict or None: 'text', 'followups', 'kind' ("event" or "day") and
+                          the matched 'events'; None to fall back to the model
+        """
+        started = time.perf_counter()
+        result, reason = self._answer(question, schedule_text, now or self.clock())
+        with self._lock:
+            self._counts['questions'] += 1
+            self._counts['seconds'] += time.perf_counter() - started
+            if result is not None:
+                self._counts['hits'] += 1
+            else:
+                self._counts['misses'][reason] = self._counts['misses'].get(reason, 0) + 1
+        return result
+
+    def _answer(self, question, schedule_text, now):
+        """Returns (answer or None, miss reason)."""
+        events = parse_events(schedule_text or '', now.year)
+        if not events:
+            return None, 'no_schedule'
+        tokens = tokenize(question)
+        words = set(tokens)
+        if words & UNSUPPORTED_WORDS:
+            return None, 'unsupported'
+
+        today = now.date()
+        target = None
+        if 'today' in words:
+            target = today
+        elif 'tomorrow' in words:
+            target = today + timedelta(days=1)
+        else:
+            weekdays = [day for day in WEEKDAYS if day in words]
+            if len(weekdays) > 1:
+                return None, 'unsupported'
+            if weekdays:
+                target = today + timedelta(days=(WEEKDAYS.index(weekdays[0]) - today.weekday()) % 7)
+
+        content = [token for token in tokens if token not in STOPWORDS]
+        if content:
+            if not words & (WHEN_WORDS | WHERE_WORDS):
+                return None, 'unsupported'
+            return self._event_answer(events, content, target, now)
+        if target is not None and words & LISTING_WORDS:
+            return self._day_answer(events, target, today)
+        return None, 'unsupported'
+
+    def _tokens_for(self, title):
+        tokens = self._title_tokens.get(title)
+        if tokens is None:
+            tokens = self._title_tokens[title] = set(tokenize(title))
+        return tokens
+
+    def _event_answer(self, events, content, target, now):
+        """When/where for the events whose titles contain every content word."""
+        titles = []
+        for event in events:
+            if event['title'] not in titles and all(token in self._tokens_for(event['title']) for token in content):
+                titles.append(event['title'])
+        if not titles:
+            return None, 'no_match'
+        if len(titles) > self.max_titles:
+            return None, 'ambiguous'
+
+        today = now.date()
+        sentences, matched, days = [], [], []
+        for title in titles:
+            occurrences = [event for event in events if event['title'] == title]
+            if target is not None:
+                occurrences = [event for event in occurrences if event['date'] == target]
+            else:
+                upcoming = [event for event in occurrences if (event_datetimes(event)[1] or
+                                                                event_datetimes(event)[0]) >= now]
+                occurrences = [event for event in upcoming if event['date'] == upcoming[0]['date']] if upcoming else []
+                # If the next one is cancelled, also give the next one that is on
+                if occurrences and all(event['cancelled'] for event in occurrences):
+                    occurrences += next(([event] for event in upcoming if not event['cancelled']), [])
+            if not occurrences:
+                continue
+            days.append(occurrences[0]['date'])
+            matched.extend(occurrences)
+            for event in occurrences:
+                when = f"{day_phrase(event['date'], today)} {_time_range(event)}"
+                if event['cancelled']:
+                    sentences.append(f"{title} {when} is cancelled.")
+                elif event['location']:
+                    sentences.append(f"{title} is {when} in {event['location']}.")
+                else:
+                    sentences.append(f"{title} is {when} (no location is listed).")
+        if not sentences:
+            return None, 'not_scheduled'
+        followups = [f"What else is on {day_phrase(day, today).removeprefix('on ')}?" for day in sorted(set(days))]
+        return {'text': '\n'.join(sentences), 'followups': followups[:3], 'kind': 'event', 'events': matched}, None
+
+    def _day_answer(self, events, target, today):
+        """Everything on one day, in time order."""
+        day_events = sorted((event for event in events if event['date'] == target), key=lambda event: event['start'])
+        if not day_events:
+            return None, 'not_scheduled'
+        lines = [f"Here's the schedule for {day_phrase(target, today).removeprefix('on ')}:"]
+        for event in day_events:
+            times = format_clock(event['start']) + (f" to {format_clock(event['end'])}" if event['end'] else '')
+            details = ' (cancelled)' if event['cancelled'] else (f" ({event['location']})" if event['location'] else '')
+            lines.append(f"- {times}: {event['title']}{details}")
+        next_day = target + timedelta(days=1)
+        followups = []
+        if any(event['date'] == next_day for event in events):
+            followups.append(f"What's on {day_phrase(next_day, today).removeprefix('on ')}?")
+        return {'text': '\n'.join(lines), 'followups': followups, 'kind': 'day', 'events': day_events}, None
+
+    def stats(self):
+        """Questions seen, fast-path hits, hit rate, misses by reason and mean time per question."""
+        with self._lock:
+            questions = self._counts['questions']
+            return {
+                'questions': questions,
+                'hits': self._counts['hits'],
+                'hit_rate': round(self._counts['hits'] / questions, 3) if questions else 0.0,
+                'misses': dict(self._counts['misses']),
+                'mean_ms': round(self._counts['seconds'] / questions * 1000, 3) if questions else 0.0
+            }
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Answer a schedule question without the model')
+    parser.add_argument('question', nargs='+')
+    parser.add_argument('--events', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                         'prompts', 'events.txt'))
+    parser.add_argument('--now', help='Current time as "YYYY-MM-DD HH:MM" (default: now)')
+    args = parser.parse_args()
+
+    with open(args.events, 'r', encoding='utf-8') as f:
+        schedule = f.read()
+    now = datetime.strptime(args.now, "%Y-%m-%d %H:%M") if args.now else None
+    engine = ScheduleQueryEngine()
+    result = engine.answer(' '.join(args.question), schedule, now)
+    print(result['text'] if result else f"(falls back to the model: {engine.stats()['misses']})")
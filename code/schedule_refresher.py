@@ -0,0 +1,279 @@
+"""
+Background refresher for the retirement community data.
+Re-scrapes the community website on a schedule (nightly and at meal-time
+cutovers by default) so residents never wait on a Selenium scrape.
+Readers always get the last good snapshot while a refresh is running.
+
+Can run inside the Streamlit process as a daemon thread, or as its own
+process (`python schedule_refresher.py`) that keeps the shared cache file
+fresh while the app only re-reads it.
+"""
+
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+
+import web_scrapper
+
+# Times of day (24h, local time) to refresh: nightly plus meal-time cutovers
+DEFAULT_REFRESH_TIMES = "02:00,06:30,10:30,16:00"
+REFRESH_TIMES = os.getenv('SCRAPER_REFRESH_TIMES', DEFAULT_REFRESH_TIMES)
+
+# "thread" refreshes inside the app; "process" means an external refresher
+# process owns scraping and the app only reloads the cache file
+REFRESH_MODE = os.getenv('SCRAPER_REFRESH_MODE', 'thread').lower()
+
+# How often to look for a newer cache file written by another process (seconds)
+RELOAD_INTERVAL_SECONDS = 60
+
+def parse_refresh_times(spec):
+    """
+    Parses a comma-separated list of "HH:MM" times.
+
+    Args:
+        spec (str): Times such as "02:00,06:30,10:30"
+
+    Returns:
+        list: Sorted (hour, minute) tuples
+    """
+    times = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        hour, minute = part.split(':')
+        hour, minute = int(hour), int(minute)
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            raise ValueError(f"Invalid refresh time: {part}")
+        times.append((hour, minute))
+    if not times:
+        raise ValueError("At least one refresh time is required")
+    return sorted(set(times))
+
+def next_refresh_time(now, refresh_times):
+    """
+    Finds the next scheduled refresh strictly after `now`.
+
+    Args:
+        now (datetime): Current time
+        refresh_times (list): (hour, minute) tuples from parse_refresh_times
+
+    Returns:
+        datetime: Next refresh time
+    """
+    for hour, minute in refresh_times:
+        candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate > now:
+            return candidate
+    hour, minute = refresh_times[0]
+    tomorrow = now + timedelta(days=1)
+    return tomorrow.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+class CommunityDataRefresher:
+    """
+    Keeps the last good community data snapshot in memory and refreshes it in
+    the background (stale-while-revalidate).
+    """
+
+    def __init__(self, refresh_times=REFRESH_TIMES, mode=REFRESH_MODE):
+        self.refresh_times = parse_refresh_times(refresh_times)
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._snapshot = None
+        self._context = None
+        self._last_reload_check = 0.0
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._status = {
+            'state': 'idle',            # idle | refreshing
+            'outcome': None,            # success | unchanged | failed
+            'error': None,
+            'started_at': None,
+            'finished_at': None,
+            'duration_seconds': None,
+            'changed_sections': [],
+            'snapshot_scraped_at': None,
+            'next_refresh_at': None,
+            'refresh_count': 0,
+            'failure_count': 0
+        }
+
+    def _set_snapshot(self, snapshot):
+        """Swaps in a new snapshot and its formatted prompt context."""
+        context = web_scrapper.format_scraped_content_for_prompt(snapshot)
+        with self._lock:
+            self._snapshot = snapshot
+            self._context = context
+            self._status['snapshot_scraped_at'] = snapshot.get('scraped_at')
+
+    def _load_snapshot_from_cache(self):
+        """Loads the last cached snapshot, even if expired, so readers have something to serve."""
+        cached = web_scrapper.load_cache(allow_expired=True)
+        if cached is not None and 'error' not in cached:
+            self._set_snapshot(cached)
+        return cached
+
+    def _ensure_loaded(self):
+        """
+        Loads the cached snapshot on first use (from the background thread
+        once it starts, or from the first reader), so creating the refresher
+        never delays the app's first render.
+        """
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._load_snapshot_from_cache()
+                self._loaded = True
+
+    def get_snapshot(self):
+        """Returns the last good snapshot (or None if nothing has been scraped yet)."""
+        self._ensure_loaded()
+        self._maybe_reload()
+        with self._lock:
+            return self._snapshot
+
+    def get_context(self):
+        """Returns the last good snapshot formatted for the system prompt, or None."""
+        self._ensure_loaded()
+        self._maybe_reload()
+        with self._lock:
+            return self._context
+
+    def status(self):
+        """Returns a copy of the refresh status (outcome, duration, timestamps)."""
+        with self._lock:
+            return dict(self._status)
+
+    def needs_refresh(self):
+        """Returns True if there is no snapshot or it is older than the cache duration."""
+        self._ensure_loaded()
+        with self._lock:
+            snapshot = self._snapshot
+        return snapshot is None or not web_scrapper.is_cache_fresh(snapshot)
+
+    def _maybe_reload(self):
+        """In process mode, picks up a newer cache file written by the external refresher."""
+        if self.mode != 'process':
+            return
+        now = time.monotonic()
+        if now - self._last_reload_check < RELOAD_INTERVAL_SECONDS:
+            return
+        self._last_reload_check = now
+        cached = web_scrapper.load_cache(allow_expired=True)
+        with self._lock:
+            current = self._snapshot
+        if cached is not None and 'error' not in cached and (
+                current is None or cached.get('scraped_at') != current.get('scraped_at')):
+            self._set_snapshot(cached)
+
+    def refresh_now(self):
+        """
+        Scrapes the website and swaps in the new snapshot if the scrape succeeded.
+        Concurrent calls are collapsed: if a refresh is already running this
+        returns immediately.
+
+        Returns:
+            dict: Refresh status after the attempt
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return self.status()
+        try:
+            started = time.perf_counter()
+            with self._lock:
+                self._status['state'] = 'refreshing'
+                self._status['started_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            outcome, error, changed = 'failed', None, []
+            try:
+                # Takes the inter-process scrape lock; if another process just
+                # refreshed, its snapshot is returned without a diff
+                data, diff = web_scrapper.refresh_community_data()
+                if 'error' in data:
+                    error = data['error']
+                else:
+                    if diff is not None:
+                        changed = web_scrapper.changed_section_keys(diff)
+                    outcome = 'success' if changed else 'unchanged'
+                    self._set_snapshot(data)
+            except Exception as e:
+                error = str(e)
+
+            with self._lock:
+                self._status.update({
+                    'state': 'idle',
+                    'outcome': outcome,
+                    'error': error,
+                    'finished_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    'duration_seconds': round(time.perf_counter() - started, 2),
+                    'changed_sections': changed,
+                    'refresh_count': self._status['refresh_count'] + 1,
+                    'failure_count': self._status['failure_count'] + (outcome == 'failed')
+                })
+            if error:
+                print(f"✗ Background refresh failed, keeping last good snapshot: {error}")
+            return self.status()
+        finally:
+            self._refresh_lock.release()
+
+    def trigger_refresh(self):
+        """Wakes the background thread to refresh as soon as possible."""
+        self._wake.set()
+
+    def _run(self):
+        """Background loop: refresh when stale, then sleep until the next scheduled time."""
+        refresh_due = self.needs_refresh()
+        while not self._stop.is_set():
+            if refresh_due:
+                self.refresh_now()
+            next_run = next_refresh_time(datetime.now(), self.refresh_times)
+            with self._lock:
+                self._status['next_refresh_at'] = next_run.strftime("%Y-%m-%d %H:%M:%S")
+            wait_seconds = max(0.0, (next_run - datetime.now()).total_seconds())
+            self._wake.wait(timeout=wait_seconds)
+            self._wake.clear()
+            refresh_due = True
+
+    def start(self):
+        """Starts the background refresh thread (no-op in process mode or if already running)."""
+        if self.mode == 'process' or (self._thread and self._thread.is_alive()):
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="community-data-refresher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        """Stops the background thread after its current refresh finishes."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Refresh community data on a schedule')
+    parser.add_argument('--times', default=REFRESH_TIMES,
+                       help=f'Comma-separated HH:MM refresh times (default: {REFRESH_TIMES})')
+    parser.add_argument('--once', action='store_true',
+                       help='Refresh once and exit')
+    args = parser.parse_args()
+
+    refresher = CommunityDataRefresher(refresh_times=args.times, mode='thread')
+    if args.once:
+        print(refresher.refresh_now())
+        exit(0)
+
+    print(f"⟳ Refreshing community data at {args.times} (Ctrl+C to stop)")
+    refresher.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        refresher.stop()
@@ -0,0 +1,279 @@
+"""
+Record/replay benchmark for the web scraper.
+Records rendered page sources from the live site once, then replays them from
+a local HTTP server so every stage of the scraper (browser start, load, waits,
+parse, format) can be timed offline and compared against a saved baseline.
+Replays use a local chromedriver, serve pages without their scripts and
+block every host but 127.0.0.1, so they never touch the network.
+
+Usage:
+    python scraper_bench.py record [--url URL] [--name NAME]
+    python scraper_bench.py serve [--port PORT]
+    python scraper_bench.py bench [--iterations N] [--skip-browser] [--save-baseline]
+"""
+
+from datetime import datetime
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+
+import web_scrapper
+
+# Where recorded page sources and the baseline timings live
+SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), 'scraper_snapshots')
+MANIFEST_FILE = 'manifest.json'
+BASELINE_FILE = 'baseline.json'
+
+STAGES = ['browser_start', 'load', 'waits', 'parse', 'format']
+
+# A stage regresses if its median exceeds the baseline median by this fraction
+DEFAULT_TOLERANCE = 0.25
+# ...and by at least this many seconds (keeps sub-millisecond stages from flapping)
+MIN_REGRESSION_SECONDS = 0.005
+
+def load_manifest(snapshot_dir=SNAPSHOT_DIR):
+    """Loads the list of recorded snapshots (empty if nothing was recorded yet)."""
+    path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def record_snapshot(url=web_scrapper.web_link, name=None, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Renders a live page with the scraper's browser settings and saves its
+    page source for offline replay.
+
+    Args:
+        url (str): Page to record
+        name (str): Snapshot name (defaults to a timestamp)
+        snapshot_dir (str): Directory to store snapshots in
+
+    Returns:
+        dict: Manifest entry for the new snapshot
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    name = name or datetime.now().strftime("%Y%m%d-%H%M%S")
+    driver = web_scrapper.create_driver()
+    try:
+        driver.get(url)
+        web_scrapper.log_in_if_configured(driver)
+        web_scrapper.wait_for_dynamic_content(driver)
+        page_source = driver.page_source
+    finally:
+        driver.quit()
+
+    filename = f"{name}.html"
+    with open(os.path.join(snapshot_dir, filename), 'w', encoding='utf-8') as f:
+        f.write(page_source)
+
+    entry = {
+        'name': name,
+        'file': filename,
+        'url': url,
+        'recorded_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'bytes': len(page_source.encode('utf-8'))
+    }
+    manifest = [item for item in load_manifest(snapshot_dir) if item['name'] != name]
+    manifest.append(entry)
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✓ Recorded {url} as {filename} ({entry['bytes']} bytes)")
+    return entry
+
+# Recorded pages are already rendered; their scripts would only re-render them or call out
+SCRIPT_PATTERN = re.compile(r'<script\b[^>]*>.*?</script\s*>|<script\b[^>]*/>', re.IGNORECASE | re.DOTALL)
+
+def strip_scripts(html):
+    """Removes <script> elements from a recorded page."""
+    return SCRIPT_PATTERN.sub('', html)
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    """Static file handler that does not log every request and serves pages without their scripts."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if not path.endswith('.html') or not os.path.isfile(path):
+            return super().do_GET()
+        with open(path, 'r', encoding='utf-8') as f:
+            body = strip_scripts(f.read()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def serve_snapshots(snapshot_dir=SNAPSHOT_DIR, port=0):
+    """
+    Serves recorded snapshots from a local HTTP server on a background thread.
+
+    Args:
+        snapshot_dir (str): Directory with recorded snapshots
+        port (int): Port to bind on 127.0.0.1 (0 picks a free port)
+
+    Returns:
+        tuple: (server, base_url); call server.shutdown() when done
+    """
+    handler = partial(_QuietHandler, directory=snapshot_dir)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever, name="snapshot-server", daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def _timed(timings, stage, func, *args, **kwargs):
+    """Runs func and appends its duration to timings[stage]."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    timings[stage].append(time.perf_counter() - started)
+    return result
+
+def run_benchmark(snapshot_dir=SNAPSHOT_DIR, iterations=3, skip_browser=False):
+    """
+    Times each scraper stage over every recorded snapshot.
+
+    Args:
+        snapshot_dir (str): Directory with recorded snapshots
+        iterations (int): Passes over the snapshots
+        skip_browser (bool): Only time parse and format, reading the files
+                             directly (no Chrome needed)
+
+    Returns:
+        dict: Stage name -> list of durations in seconds
+    """
+    manifest = load_manifest(snapshot_dir)
+    if not manifest:
+        raise FileNotFoundError(f"No snapshots recorded in {snapshot_dir}; run 'record' first")
+
+    timings = {stage: [] for stage in STAGES}
+    server, base_url = (None, None) if skip_browser else serve_snapshots(snapshot_dir)
+    try:
+        for _ in range(iterations):
+            for entry in manifest:
+                if skip_browser:
+                    with open(os.path.join(snapshot_dir, entry['file']), 'r', encoding='utf-8') as f:
+                        page_source = f.read()
+                else:
+                    driver = _timed(timings, 'browser_start', web_scrapper.create_driver, offline=True)
+                    try:
+                        _timed(timings, 'load', driver.get, f"{base_url}/{entry['file']}")
+                        _timed(timings, 'waits', web_scrapper.wait_for_dynamic_content, driver)
+                        page_source = driver.page_source
+                    finally:
+                        driver.quit()
+                scraped = _timed(timings, 'parse', web_scrapper.parse_page_source, page_source, entry['url'])
+                _timed(timings, 'format', web_scrapper.format_scraped_content_for_prompt, scraped)
+    finally:
+        if server:
+            server.shutdown()
+    return {stage: durations for stage, durations in timings.items() if durations}
+
+def summarize(timings):
+    """Returns median/p95/max per stage in seconds."""
+    summary = {}
+    for stage, durations in timings.items():
+        ordered = sorted(durations)
+        summary[stage] = {
+            'runs': len(ordered),
+            'median': statistics.median(ordered),
+            'p95': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+            'max': ordered[-1]
+        }
+    return summary
+
+def find_regressions(summary, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares stage medians with a baseline.
+
+    Args:
+        summary (dict): Output of summarize
+        baseline (dict): Previously saved summary
+        tolerance (float): Allowed fractional slowdown
+
+    Returns:
+        list: (stage, baseline median, current median) for regressed stages
+    """
+    regressions = []
+    for stage, stats in summary.items():
+        if stage not in baseline:
+            continue
+        limit = baseline[stage]['median'] * (1 + tolerance)
+        if stats['median'] > limit and stats['median'] - baseline[stage]['median'] > MIN_REGRESSION_SECONDS:
+            regressions.append((stage, baseline[stage]['median'], stats['median']))
+    return regressions
+
+def print_summary(summary, baseline=None):
+    """Prints a per-stage timing table, with the baseline median if available."""
+    print(f"{'stage':<15}{'runs':>6}{'median':>12}{'p95':>12}{'max':>12}{'baseline':>12}")
+    for stage in STAGES:
+        if stage not in summary:
+            continue
+        stats = summary[stage]
+        base = f"{baseline[stage]['median'] * 1000:.1f}ms" if baseline and stage in baseline else '-'
+        print(f"{stage:<15}{stats['runs']:>6}{stats['median'] * 1000:>10.1f}ms"
+              f"{stats['p95'] * 1000:>10.1f}ms{stats['max'] * 1000:>10.1f}ms{base:>12}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Record, replay and benchmark the web scraper offline')
+    parser.add_argument('--dir', default=SNAPSHOT_DIR, help='Snapshot directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='Record a rendered page from the live site')
+    record_parser.add_argument('--url', default=web_scrapper.web_link)
+    record_parser.add_argument('--name', default=None)
+
+    serve_parser = subparsers.add_parser('serve', help='Serve recorded snapshots locally')
+    serve_parser.add_argument('--port', type=int, default=8765)
+
+    bench_parser = subparsers.add_parser('bench', help='Time each scraper stage over the snapshots')
+    bench_parser.add_argument('--iterations', type=int, default=3)
+    bench_parser.add_argument('--skip-browser', action='store_true',
+                              help='Only time parse and format (no Chrome required)')
+    bench_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                              help=f'Allowed slowdown vs baseline (default: {DEFAULT_TOLERANCE:.0%})')
+    bench_parser.add_argument('--save-baseline', action='store_true',
+                              help='Save this run as the new baseline')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record_snapshot(url=args.url, name=args.name, snapshot_dir=args.dir)
+    elif args.command == 'serve':
+        server, base_url = serve_snapshots(args.dir, args.port)
+        print(f"Serving {args.dir} at {base_url} (Ctrl+C to stop)")
+        for entry in load_manifest(args.dir):
+            print(f"  {base_url}/{entry['file']}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        summary = summarize(run_benchmark(args.dir, args.iterations, args.skip_browser))
+        baseline_path = os.path.join(args.dir, BASELINE_FILE)
+        baseline = None
+        if os.path.exists(baseline_path):
+            with open(baseline_path, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        print_summary(summary, baseline)
+
+        if args.save_baseline:
+            with open(baseline_path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+            print(f"✓ Baseline saved to {baseline_path}")
+        elif baseline:
+            regressions = find_regressions(summary, baseline, args.tolerance)
+            for stage, before, after in regressions:
+                print(f"✗ {stage} regressed: {before * 1000:.1f}ms → {after * 1000:.1f}ms")
+            if regressions:
+                sys.exit(1)
+            print("✓ No stage regressed past the threshold")
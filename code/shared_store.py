@@ -0,0 +1,281 @@
+"""
+Shared key-value backends so several app replicas (Streamlit processes,
+chat engine API servers, on one host or many) see the same sessions, cached
+answers, TTS audio and schedule snapshots.
+
+Backends share one small interface (get/set/add/delete on bytes, with an
+optional TTL, plus JSON helpers, a counter and a lease):
+  - SQLiteStore: a WAL-mode SQLite file, the default; shared by every process
+    on one host
+  - FileBlobStore: one file per key, used for TTS audio next to SQLite
+  - RedisStore: a Redis server shared by replicas on different hosts
+    (STORE_BACKEND=redis, REDIS_URL); `redis` is only imported when used
+
+get_store() and get_audio_store() return the process-wide stores picked by
+the environment.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import cache_io
+
+# sqlite (one host) or redis (several hosts)
+STORE_BACKEND = os.getenv('STORE_BACKEND', 'sqlite').lower()
+STORE_PATH = os.getenv('STORE_PATH', os.path.join(os.path.dirname(__file__), 'shared_store.sqlite3'))
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'audio_cache'))
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+KEY_PREFIX = os.getenv('STORE_KEY_PREFIX', 'retirenet:')
+
+# How long synthesized speech is kept (answers are replayed often; text is the key)
+AUDIO_CACHE_TTL_SECONDS = float(os.getenv('AUDIO_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+
+LEASE_POLL_SECONDS = 0.5
+
+class KeyValueStore:
+    """
+    Base class: subclasses implement get, set, add and delete on bytes values.
+    TTLs are in seconds; None keeps the value until it is deleted.
+    """
+
+    def get(self, key):
+        """Returns the value (bytes) or None if missing or expired."""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """Stores a value, replacing any existing one."""
+        raise NotImplementedError
+
+    def add(self, key, value, ttl=None):
+        """Stores a value only if the key is absent; returns True if stored."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Removes a key (no-op if missing)."""
+        raise NotImplementedError
+
+    def incr(self, key, amount, ttl=None):
+        """
+        Adds to a numeric counter (a missing key counts as 0) and returns the
+        new value; the TTL restarts on every increment. This default is not
+        atomic, so backends shared between processes override it.
+        """
+        value = float(self.get(key) or 0) + amount
+        self.set(key, repr(value).encode(), ttl=ttl)
+        return value
+
+    def get_json(self, key):
+        raw = self.get(key)
+        return None if raw is None else cache_io.decode_json(raw)
+
+    def set_json(self, key, data, ttl=None, encoding=cache_io.ENCODING_JSON):
+        self.set(key, cache_io.encode_json(data, encoding), ttl=ttl)
+
+    def acquire_lease(self, key, ttl, timeout=0.0):
+        """
+        Takes a lease other replicas cannot take until it is released or its
+        TTL runs out (so a crashed holder cannot block everyone).
+
+        Args:
+            key (str): Lease name
+            ttl (float): Seconds the lease is held at most
+            timeout (float): Seconds to wait for the lease
+
+        Returns:
+            str or None: Token to pass to release_lease, or None if not acquired
+        """
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while not self.add(key, token.encode(), ttl=ttl):
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(LEASE_POLL_SECONDS)
+        return token
+
+    def release_lease(self, key, token):
+        """Releases a lease if this token still holds it."""
+        if self.get(key) == token.encode():
+            self.delete(key)
+
+def _expires_at(ttl):
+    return None if ttl is None else time.time() + ttl
+
+class SQLiteStore(KeyValueStore):
+    """Key-value table in a SQLite file (WAL mode, one connection per thread)."""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS kv ("
+                       "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)")
+        self.purge_expired()
+
+    def _connection(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def set(self, key, value, ttl=None):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, _expires_at(ttl)))
+
+    def add(self, key, value, ttl=None):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM kv WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                       (key, time.time()))
+            inserted = db.execute("INSERT OR IGNORE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                                  (key, value, _expires_at(ttl))).rowcount == 1
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return inserted
+
+    def incr(self, key, amount, ttl=None):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                             (key, time.time())).fetchone()
+            value = (float(bytes(row[0])) if row else 0.0) + amount
+            db.execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                       (key, repr(value).encode(), _expires_at(ttl)))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return value
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        """Deletes expired rows; returns how many were removed."""
+        return self._connection().execute(
+            "DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)).rowcount
+
+class FileBlobStore(KeyValueStore):
+    """
+    One file per key in a directory (for large values such as audio), written
+    atomically. TTLs are checked against the file's mtime.
+    """
+
+    def __init__(self, directory=AUDIO_CACHE_DIR, ttl=None):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value, ttl=None):
+        # Per-key TTLs are not kept on disk; the store-wide ttl applies
+        cache_io.atomic_write_bytes(self._path(key), value)
+
+    def add(self, key, value, ttl=None):
+        try:
+            with open(self._path(key), 'xb') as f:
+                f.write(value)
+            return True
+        except FileExistsError:
+            return False
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+class RedisStore(KeyValueStore):
+    """Keys in a Redis server, prefixed so several apps can share one server."""
+
+    def __init__(self, url=REDIS_URL, client=None, prefix=KEY_PREFIX):
+        """
+        Args:
+            url (str): Redis URL (ignored when a client is given)
+            client: redis.Redis-compatible client (get, set with ex/nx, delete,
+                    incrbyfloat, expire)
+            prefix (str): Prefix for every key
+        """
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    @staticmethod
+    def _ex(ttl):
+        # Redis expiries are whole seconds and must be positive
+        return None if ttl is None else max(1, int(round(ttl)))
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, ex=self._ex(ttl))
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(self.prefix + key, value, ex=self._ex(ttl), nx=True))
+
+    def incr(self, key, amount, ttl=None):
+        value = float(self.client.incrbyfloat(self.prefix + key, amount))
+        if ttl is not None:
+            self.client.expire(self.prefix + key, self._ex(ttl))
+        return value
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def _shared(name, factory):
+    with _stores_lock:
+        if name not in _stores:
+            _stores[name] = factory()
+        return _stores[name]
+
+def get_store():
+    """Process-wide store for sessions, cached answers and schedule snapshots (STORE_BACKEND)."""
+    if STORE_BACKEND == 'redis':
+        return _shared('redis', RedisStore)
+    return _shared('sqlite', SQLiteStore)
+
+def get_audio_store():
+    """Process-wide store for TTS audio: Redis with STORE_BACKEND=redis, otherwise files."""
+    if STORE_BACKEND == 'redis':
+        return get_store()
+    return _shared('audio', lambda: FileBlobStore(ttl=AUDIO_CACHE_TTL_SECONDS))
+
+def hashed_key(namespace, *parts):
+    """Builds a fixed-length key from arbitrary text parts."""
+    digest = hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f"{namespace}:{digest}"
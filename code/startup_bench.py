@@ -0,0 +1,135 @@
+"""
+Cold-start benchmark for the Streamlit app.
+Runs the app's first script run in a fresh interpreter under
+`python -X importtime` (via Streamlit's AppTest, no browser needed) and
+reports time-to-first-render, the slowest imports, and whether any of the
+heavy modules that should load on first use (OpenAI, Selenium,
+BeautifulSoup) were imported before the first render.
+
+Usage:
+    python startup_bench.py [--runs N] [--with-scraper] [--max-first-render-ms MS] [--json FILE]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'streamlit_gpt.py')
+
+# Top-level packages that must not be imported before the first render
+DEFERRED_MODULES = ('openai', 'selenium', 'webdriver_manager', 'bs4')
+
+# Runs in the child interpreter: times the first script run and lists the
+# deferred modules that were imported by the end of it
+_CHILD_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app_file!r}, default_timeout={timeout!r})
+started = time.perf_counter()
+app.run()
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'first_render_seconds': elapsed,
+    'exceptions': [str(e.value) for e in app.exception],
+    'deferred_loaded': sorted(name for name in {deferred!r} if name in sys.modules)
+}}))
+"""
+
+def parse_importtime(stderr):
+    """
+    Parses `-X importtime` output.
+
+    Returns:
+        list: (module, self microseconds, cumulative microseconds, depth) per import
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+def run_cold_start(app_file=APP_FILE, with_scraper=False, timeout=60):
+    """
+    Runs one cold start in a fresh interpreter.
+
+    Args:
+        app_file (str): Streamlit script to run
+        with_scraper (bool): Run with USE_WEB_SCRAPER=true
+        timeout (float): AppTest timeout in seconds
+
+    Returns:
+        dict: first_render_seconds, exceptions, deferred_loaded and imports
+    """
+    env = dict(os.environ, USE_WEB_SCRAPER='true' if with_scraper else 'false')
+    env.setdefault('OPENAI_API_KEY', 'startup-bench')  # Nothing is sent before the first question
+    code = _CHILD_SCRIPT.format(app_file=app_file, timeout=timeout, deferred=DEFERRED_MODULES)
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env,
+                               cwd=os.path.dirname(app_file), capture_output=True, text=True,
+                               timeout=timeout * 2)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Cold start failed: {completed.stderr.strip().splitlines()[-1:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['imports'] = parse_importtime(completed.stderr)
+    return result
+
+def summarize(runs, top=15):
+    """Median time-to-first-render over the runs plus the slowest top-level imports of the first run."""
+    first_render = [run['first_render_seconds'] for run in runs]
+    top_level = [entry for entry in runs[0]['imports'] if entry[3] == 0]
+    return {
+        'runs': len(runs),
+        'first_render_ms': {
+            'median': round(statistics.median(first_render) * 1000, 1),
+            'min': round(min(first_render) * 1000, 1),
+            'max': round(max(first_render) * 1000, 1)
+        },
+        'total_import_ms': round(sum(entry[2] for entry in top_level) / 1000, 1),
+        'slowest_imports_ms': [(name, round(cumulative / 1000, 1))
+                               for name, _, cumulative, _ in sorted(top_level, key=lambda entry: -entry[2])[:top]],
+        'deferred_loaded': sorted({name for run in runs for name in run['deferred_loaded']}),
+        'exceptions': sorted({error for run in runs for error in run['exceptions']})
+    }
+
+def check_thresholds(summary, max_first_render_ms=None):
+    """Returns a list of violations (empty if the run passed)."""
+    violations = []
+    if summary['deferred_loaded']:
+        violations.append(f"loaded before first render: {', '.join(summary['deferred_loaded'])}")
+    if summary['exceptions']:
+        violations.append(f"first render raised: {summary['exceptions'][0]}")
+    if max_first_render_ms is not None and summary['first_render_ms']['median'] > max_first_render_ms:
+        violations.append(f"first render {summary['first_render_ms']['median']} ms > {max_first_render_ms} ms")
+    return violations
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Measure the Streamlit app cold start (time-to-first-render)')
+    parser.add_argument('--runs', type=int, default=3, help='Cold starts to run')
+    parser.add_argument('--with-scraper', action='store_true', help='Start with USE_WEB_SCRAPER=true')
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list')
+    parser.add_argument('--max-first-render-ms', type=float, help='Fail if the median first render exceeds this')
+    parser.add_argument('--json', help='Write the summary to this file')
+    args = parser.parse_args()
+
+    summary = summarize([run_cold_start(with_scraper=args.with_scraper) for _ in range(args.runs)], args.top)
+    first_render = summary['first_render_ms']
+    print(f"First render: median {first_render['median']} ms (min {first_render['min']}, "
+          f"max {first_render['max']}) over {summary['runs']} cold starts")
+    print(f"Imports:      {summary['total_import_ms']} ms in total; slowest:")
+    for name, milliseconds in summary['slowest_imports_ms']:
+        print(f"  {name:<40}{milliseconds:>10.1f} ms")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+    violations = check_thresholds(summary, args.max_first_render_ms)
+    for violation in violations:
+        print(f"✗ {violation}")
+    sys.exit(1 if violations else 0)
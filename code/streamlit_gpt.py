@@ -1,31 +1,47 @@
 # To run the app, enter the following command in the terminal:
 # streamlit run streamlit_gpt.py
 
+# Startup is kept light so the first page renders quickly: the OpenAI client,
+# Selenium/BeautifulSoup, the prompt files and the schedule are only loaded
+# when they are first needed (see startup_bench.py for time-to-first-render)
 import streamlit as st
-from datetime import datetime
-from openai import OpenAI
-import re
+import base64
+import functools
+import hmac
 import os
-import sys
-import tempfile
-from dotenv import load_dotenv
-
-# Web scraping disabled by default
-USE_WEB_SCRAPER = os.getenv('USE_WEB_SCRAPER', 'false').lower() == 'true'
-
-if USE_WEB_SCRAPER:
-    try:
-        from web_scrapper import get_community_context
-    except ImportError:
-        USE_WEB_SCRAPER = False
-        print("Warning: Web scraper not available. Using static events file.")
+import time
+from chat_engine import ChatSession, build_engine, load_example_questions
+from audio_delivery import mime_type, negotiate_format
+from followup_prefetch import FollowupPrefetcher, PREFETCH_FOLLOWUPS
+from voice_pipeline import VoicePipeline
+from usage_meter import BudgetExceededError
 
 #########################
 # CONFIGURATION & SETUP #
 #########################
 
-# Load environment variables
-load_dotenv()
+# Load environment variables once per server process (reruns reuse them)
+@st.cache_resource(show_spinner=False)
+def load_environment():
+    """Loads .env into the environment."""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+load_environment()
+
+# Web scraping disabled by default
+@st.cache_resource(show_spinner=False)
+def web_scraper_enabled():
+    """True if USE_WEB_SCRAPER is set and the scraping packages are installed (checked without importing them)."""
+    if os.getenv('USE_WEB_SCRAPER', 'false').lower() != 'true':
+        return False
+    from web_scrapper import scraper_available
+    if not scraper_available():
+        print("Warning: Web scraper not available. Using static events file.")
+        return False
+    return True
+
+USE_WEB_SCRAPER = web_scraper_enabled()
 
 # Get API key from Streamlit secrets or environment variables
 try:
@@ -43,78 +59,65 @@ if not api_key:
         st.warning("Please enter an OpenAI API key to continue.")
         st.stop()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=api_key)
-
-#######################
-# LOAD PROMPT FILES   #
-#######################
-
-# Helper function to load text from files
-def load_text_file(filepath):
-    """Loads text content from a file."""
-    try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            return file.read().strip()
-    except FileNotFoundError:
-        st.error(f"File not found: {filepath}")
-        return f"Error loading file: {filepath}"
-    except Exception as e:
-        st.error(f"Error reading file {filepath}: {str(e)}")
-        return f"Error loading content: {str(e)}"
-
-# Determine base path
-if getattr(sys, 'frozen', False):
-    # Running as compiled executable
-    base_path = os.path.dirname(sys.executable)
-else:
-    # Running as script
-    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-# Define prompt file paths
-prompt_dir = os.path.join(base_path, "prompts")
-default_prompt_path = os.path.join(prompt_dir, "default_prompt.txt")
-retirement_prompt_path = os.path.join(prompt_dir, "retirement_assistant_prompt.txt")
-schedule_prompt_path = os.path.join(prompt_dir, "schedule_menu_prompt.txt")
-questions_path = os.path.join(prompt_dir, "example_questions.txt")
-transcribe_prompt_path = os.path.join(prompt_dir, "transcribe_prompt.txt")
-events_path = os.path.join(prompt_dir, "events.txt")
-
-# Load community events/schedule information
-def get_schedule_context():
-    """Gets schedule/events information from web scraper or static file."""
-    # Add current date information
-    from datetime import datetime
-    current_date = datetime.now()
-    date_header = f"""
-=== CURRENT DATE AND TIME ===
-Today's Date: {current_date.strftime("%A %B %d, %Y")}
-Current Time: {current_date.strftime("%I:%M %p")}
-Day of Week: {current_date.strftime("%A")}
-
-=== COMMUNITY EVENTS AND SCHEDULE ===
-"""
-    
-    if USE_WEB_SCRAPER:
-        try:
-            return date_header + get_community_context()
-        except Exception as e:
-            print(f"Web scraper failed, falling back to static file: {e}")
-            return date_header + load_text_file(events_path)
-    else:
-        # Use static events file by default
-        return date_header + load_text_file(events_path)
-
-# Pre-defined system prompts for different contexts
-SYSTEM_PROMPTS = {
-    "default": load_text_file(default_prompt_path),
-    "retirement_assistant": load_text_file(retirement_prompt_path),
-    "schedule_menu": load_text_file(schedule_prompt_path) + "\n\n" + get_schedule_context()
-}
-
-# Load example questions from file
-example_questions_text = load_text_file(questions_path)
-example_questions = [q.strip() for q in example_questions_text.split('\n') if q.strip()]
+# One background refresher per server process; readers get the last good
+# snapshot while a refresh runs instead of waiting on a Selenium scrape
+@st.cache_resource(show_spinner=False)
+def get_refresher():
+    """Creates and starts the shared community data refresher (the cached snapshot loads in its thread)."""
+    from schedule_refresher import CommunityDataRefresher
+    return CommunityDataRefresher().start()
+
+# One chat engine per server process: every session shares its request queue,
+# resilient OpenAI client (and circuit breaker), usage meter and tracer
+@st.cache_resource(show_spinner=False)
+def get_engine(api_key):
+    """Creates the shared chat engine."""
+    schedule_provider = (lambda: get_refresher().get_context()) if USE_WEB_SCRAPER else None
+    chat_engine = build_engine(api_key, schedule_provider=schedule_provider)
+    chat_engine.on_error = st.error
+    return chat_engine
+
+engine = get_engine(api_key)
+
+# Answers the displayed follow-up questions in the background (PREFETCH_FOLLOWUPS=true)
+@st.cache_resource(show_spinner=False)
+def get_prefetcher():
+    """Creates the shared follow-up prefetcher, or None when prefetching is off."""
+    return FollowupPrefetcher(engine) if PREFETCH_FOLLOWUPS else None
+
+prefetcher = get_prefetcher()
+
+# Hands-free voice turns: the answer streams and is spoken sentence by sentence
+@st.cache_resource(show_spinner=False)
+def get_voice_pipeline():
+    """Creates the shared voice pipeline."""
+    return VoicePipeline(engine)
+
+# Per-stage spans and latency histograms (process-wide)
+tracer = engine.tracer
+script_started_at = time.perf_counter()
+
+# Regions of the page (chat log, input, follow-ups, sidebar settings) are
+# fragments: using a widget reruns only its region, not the whole script.
+# Each region's run time goes into a "fragment_<name>" histogram, comparable
+# with "script_run", the cost of a full rerun.
+def timed_fragment(name):
+    """Decorator: turns a render function into a Streamlit fragment timed in the tracer."""
+    def decorate(render):
+        @functools.wraps(render)
+        def timed(*args, **kwargs):
+            with tracer.span(f"fragment_{name}"):
+                return render(*args, **kwargs)
+        return st.fragment(timed)
+    return decorate
+
+# Load example questions from file (once per server process)
+@st.cache_resource(show_spinner=False)
+def get_example_questions():
+    """Returns the example questions shown on the welcome screen."""
+    return load_example_questions()
+
+example_questions = get_example_questions()
 
 ####################
 # UTILITY FUNCTIONS #
@@ -124,181 +127,70 @@ example_questions = [q.strip() for q in example_questions_text.split('\n') if q.
 def transcribe_audio(audio_bytes):
     """Transcribes audio bytes using OpenAI's Whisper API with elderly-friendly prompting."""
     try:
-        # Create a temporary file to store the audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-            tmp_file.write(audio_bytes)
-            tmp_file_path = tmp_file.name
-
-        # Open the temporary file and transcribe
-        with open(tmp_file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                prompt=load_text_file(transcribe_prompt_path)
-            )
-        
-        # Clean up the temporary file
-        os.unlink(tmp_file_path)
-        
-        return transcript.text.strip()
-    
+        return engine.transcribe(chat_session, audio_bytes)
+    except BudgetExceededError as e:
+        st.warning(str(e))
+        return ""
     except Exception as e:
         st.error(f"Error transcribing audio: {str(e)}")
         return ""
 
+# Speech format this browser plays well (Opus, AAC or MP3), picked once per session
+def client_audio_format():
+    """Returns the negotiated speech format for this browser session."""
+    if "audio_format" not in st.session_state:
+        headers = st.context.headers if hasattr(st, "context") else {}
+        st.session_state["audio_format"] = negotiate_format(headers.get("User-Agent", ""))
+    return st.session_state["audio_format"]
+
 # Convert text to speech using OpenAI TTS API
-def text_to_speech(text, message_index):
-    """Converts text to speech using OpenAI's TTS API and plays it."""
+def text_to_speech(text):
+    """Converts text to speech using OpenAI's TTS API; replays come from the engine's shared audio cache."""
     try:
-        # Generate speech
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice="nova",  # Using 'nova' voice which is clear and friendly
-            input=text
-        )
-        
-        # Save audio to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_file:
-            tmp_file.write(response.content)
-            tmp_file_path = tmp_file.name
-        
-        # Store the audio file path in session state for this message
-        if "audio_files" not in st.session_state:
-            st.session_state["audio_files"] = {}
-        st.session_state["audio_files"][message_index] = tmp_file_path
-        
-        return tmp_file_path
-    
+        return engine.speak(chat_session, text, client_audio_format())
+    except BudgetExceededError as e:
+        st.warning(str(e))
+        return None
     except Exception as e:
         st.error(f"Error generating speech: {str(e)}")
         return None
 
-# Select appropriate system prompt based on user input
-def select_prompt_by_context(user_input: str) -> str:
-    """Determines which system prompt to use based on keywords in user input."""
-    try:
-        schedule_menu_keywords = ['menu', 'dining', 'breakfast', 'lunch', 'dinner', 'schedule', 'activity', 'activities', "today", "class", "event", "when", "where"]
-        health_tech_keywords = ['health', 'app', 'phone', 'vitamin', 'diet', 'exercise', 'install', 'setup', 'computer']
-        
-        if any(keyword in user_input.lower() for keyword in schedule_menu_keywords):
-            return SYSTEM_PROMPTS["schedule_menu"]
-        if any(keyword in user_input.lower() for keyword in health_tech_keywords):
-            return SYSTEM_PROMPTS["retirement_assistant"]
-        return SYSTEM_PROMPTS["default"]
-    except Exception as e:
-        st.error(f"Error in prompt selection: {str(e)}")
-        return SYSTEM_PROMPTS["default"]
-
-# Generate context information for the current session
-def get_context_data() -> str:
-    """Creates context data about the current session for the AI."""
-    try:
-        message_count = len(st.session_state["all_sessions"][st.session_state["current_session_id"]])
-        return f"""
-        Current time: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-        Session length: {message_count} messages
-        """
-    except Exception as e:
-        return f"""
-        Current time: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-        Session length: 0 messages
-        """
-
-# Remove markdown formatting from text
-def sanitize_markdown(text):
-    """Removes common Markdown symbols from the given text."""
-    # Remove bold/italic markers (* or _)
-    text = re.sub(r'[*_]+', '', text)
-    return text
-    
-# Clean up follow-up questions formatting
-def sanitize_followup_questions(questions):
-    """Removes leading numbers and formatting from questions."""
-    sanitized = []
-    for question in questions:
-        # Remove leading numbers and whitespace
-        sanitized.append(question.lstrip("1234567890. ").strip())
-    return sanitized
-
-# Generate follow-up questions using GPT
-def generate_followup_questions(response):
-    """Creates relevant follow-up questions based on the assistant's response."""
-    prompt = [
-        {"role": "system", "content": "You are a helpful assistant."},
-        {"role": "user", "content": "Generate three follow-up questions that the user may want to ask within 10 words based on this response:"},
-        {"role": "assistant", "content": response}
-    ]
-    try:
-        completion = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=prompt,
-            max_completion_tokens=500,
-            # temperature=0.7,
-        )
-        followup_text = completion.choices[0].message.content.strip()
-        raw_questions = followup_text.split("\n")  # Split lines
-        return sanitize_followup_questions(raw_questions)
-    except Exception as e:
-        return [f"Error generating follow-up questions: {e}"]
-
 # Force Streamlit to rerun the app
 def force_rerun():
-    """Forces Streamlit to rerun the app, refreshing the UI."""
+    """Forces Streamlit to rerun the whole app (also from inside a fragment), refreshing the UI."""
     st.rerun()
     
 #######################
 # UI THEME MANAGEMENT #
 #######################
     
-# Update chat display to apply consistent font styling
-def update_chat_display():
-    """Renders the chat history with appropriate styling."""
-    with chat_placeholder.container():
-        for idx, message in enumerate(current_session_history):
-            # Always use custom theme colors for messages, regardless of dark/light mode
-            msg_bg_color = selected_colors['background']
-            msg_text_color = selected_colors['text']
-            
-            if message["role"] == "user":
-                st.markdown(
-                    f"<div class='user-message' style='{selected_font_style} background-color: {msg_bg_color}; color: {msg_text_color}; padding: 8px; border-radius: 5px; margin-bottom: 5px; max-width: 80%;'><strong>👤 User:</strong> {message['text']}</div>",
-                    unsafe_allow_html=True
-                )
-            else:
-                # Render Assistant's response as custom HTML with play button
-                formatted_response = message['text'].replace("\n", "<br>")
-                
-                # Create columns for message and play button
-                col1, col2 = st.columns([0.9, 0.1])
-                
-                with col1:
-                    st.markdown(
-                        f"<div class='assistant-message' style='{selected_font_style} background-color: {msg_bg_color}; color: {msg_text_color}; padding: 8px; border-radius: 5px; margin-bottom: 5px; max-width: 100%;'><strong>🤖 Assistant:</strong> {formatted_response}</div>",
-                        unsafe_allow_html=True
-                    )
-                
-                with col2:
-                    # Add play button for text-to-speech
-                    if st.button("🔊", key=f"play_{idx}", help="Play response audio"):
-                        st.session_state["playing_audio"] = idx
-                
-                # Generate or retrieve audio if this message is selected to play
-                if st.session_state.get("playing_audio") == idx:
-                    audio_path = None
-                    if idx in st.session_state.get("audio_files", {}):
-                        audio_path = st.session_state["audio_files"][idx]
-                    else:
-                        # Show spinner in full width
-                        with st.spinner("🎵 Generating audio..."):
-                            audio_path = text_to_speech(message['text'], idx)
-                    
-                    if audio_path and os.path.exists(audio_path):
-                        # Display audio player with autoplay
-                        with open(audio_path, "rb") as audio_file:
-                            audio_bytes = audio_file.read()
-                            st.audio(audio_bytes, format="audio/mp3", autoplay=True)
-                        # Reset playing state after displaying
-                        st.session_state["playing_audio"] = None
+# Offer the calendar file attached to a calendar/reminder answer
+def render_calendar_download(entries, key):
+    """Shows an "Add to calendar" download (and a QR code when PUBLIC_BASE_URL is set) for calendar entries."""
+    from ics_export import calendar_filename, calendar_ics, calendar_url, qr_png
+    st.download_button("📅 Add to calendar", data=calendar_ics(entries), file_name=calendar_filename(entries),
+                       mime="text/calendar", key=key)
+    qr_code = qr_png(calendar_url(entries))
+    if qr_code:
+        st.image(qr_code, caption="Scan with your phone's camera to add it", width=160)
+
+# Chat bubble for one message (custom theme colors, regardless of dark/light mode)
+def message_html(message):
+    """Returns the styled HTML for a chat message."""
+    msg_bg_color = selected_colors['background']
+    msg_text_color = selected_colors['text']
+    if message["role"] == "user":
+        return f"<div class='user-message' style='{selected_font_style} background-color: {msg_bg_color}; color: {msg_text_color}; padding: 8px; border-radius: 5px; margin-bottom: 5px; max-width: 80%;'><strong>👤 User:</strong> {message['text']}</div>"
+    formatted_response = message['text'].replace("\n", "<br>")  # Replace newlines with <br> for HTML formatting
+    return f"<div class='assistant-message' style='{selected_font_style} background-color: {msg_bg_color}; color: {msg_text_color}; padding: 8px; border-radius: 5px; margin-bottom: 5px; max-width: 100%;'><strong>🤖 Assistant:</strong> {formatted_response}</div>"
+
+# Show the chat while an answer is being finished (follow-ups, saving); the
+# chat log with its 🔊 and calendar buttons is drawn once processing is done
+def show_static_chat():
+    """Renders the chat history without widgets into the answer placeholder."""
+    with answer_chat_placeholder.container():
+        for message in chat_session.history:
+            st.markdown(message_html(message), unsafe_allow_html=True)
 
 ########################
 # SESSION STATE MANAGEMENT #
@@ -309,10 +201,7 @@ def initialize_session_state():
     """Sets up all necessary session state variables with default values."""
     session_defaults = {
         "current_question": None,       # Currently selected example question
-        "current_followups": [],        # Currently active follow-up questions
-        "followup_questions": [],       # All generated follow-up questions
-        "all_sessions": {},             # To store chat sessions
-        "current_session_id": None,     # Current active session ID
+        "chat_session": None,           # Conversations, follow-ups and usage identity (ChatSession)
         "wide_mode": False,             # Layout mode flag
         "theme": "Light",               # Current theme setting
         "font_size": "Medium",          # Current font size setting
@@ -324,22 +213,49 @@ def initialize_session_state():
         "transcription_status": "",     # Status message for transcription
         "current_input": "",            # Current text in input field
         "last_audio_input_processed": 0, # Counter to force audio widget reset
-        "audio_files": {},              # Store generated TTS audio file paths
         "playing_audio": None,          # Track which message audio is playing
+        "voice_mode": False,            # Hands-free voice: spoken questions get spoken answers
     }
     for key, default_value in session_defaults.items():
         if key not in st.session_state:
             st.session_state[key] = default_value
+    if st.session_state["chat_session"] is None:
+        st.session_state["chat_session"] = restore_chat_session()
+
+# Resume the resident's session from the shared store, so a reconnect to any
+# replica behind the load balancer continues the same conversations
+def restore_chat_session():
+    """Loads the session named in the ?sid= URL parameter, or starts a new one."""
+    session_id = st.query_params.get("sid")
+    chat_session = None
+    if session_id and engine.sessions is not None:
+        try:
+            chat_session = engine.sessions.load(session_id)
+        except Exception as e:
+            print(f"✗ Could not restore a session: {e}")  # The sid is a credential; never log it
+    if chat_session is None:
+        chat_session = ChatSession()
+    st.query_params["sid"] = chat_session.session_id
+    return chat_session
+
+def save_chat_session():
+    """Writes the session to the shared store (best effort)."""
+    if engine.sessions is None:
+        return
+    try:
+        engine.sessions.save(chat_session)
+    except Exception as e:
+        print(f"✗ Could not save session {chat_session.usage_session_id}: {e}")
 
 # Function to start a new chat session
 def start_new_session():
     """Creates a new chat session with a unique timestamp ID."""
-    session_id = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    st.session_state["all_sessions"][session_id] = []  # Initialize empty chat history
-    st.session_state["current_session_id"] = session_id
+    if prefetcher is not None:
+        prefetcher.cancel(chat_session)
+    chat_session.new_conversation()  # Empty chat history, no follow-up questions
+    save_chat_session()
     st.session_state["show_example_questions"] = True
     st.session_state["current_question"] = None  # Reset current question
-    st.session_state["current_followups"] = []  # Reset follow-up questions
     st.session_state["is_thinking"] = False
     st.session_state["transcription_status"] = ""  # Clear transcription status
     st.session_state["last_audio_input"] = None  # Clear audio input
@@ -350,46 +266,52 @@ def start_new_session():
 # PROCESSING FUNCTIONS #
 ######################
 
+# Questions come from the example, input and follow-up fragments; a new turn
+# changes every region of the page, so it is answered in a full script run
+def submit_question(text=None, kind="typed", audio_bytes=None):
+    """
+    Queues a question for the next full run and starts that run.
+
+    Args:
+        text (str): Question text (None for a recording)
+        kind (str): "typed", "example", "followup" or "audio"
+        audio_bytes (bytes): The recording, for kind "audio"
+    """
+    if kind != "audio":
+        # Immediate cleanup before processing
+        st.session_state["transcription_status"] = ""
+        st.session_state["last_audio_input"] = None
+        st.session_state["current_input"] = ""
+        st.session_state["last_audio_input_processed"] += 1
+    if kind == "followup":
+        chat_session.followups = []
+    st.session_state["is_thinking"] = kind != "audio"
+    st.session_state["pending_question"] = {"text": text, "kind": kind, "audio": audio_bytes}
+    force_rerun()
+
 # Process user input and generate response
-def process_input(input_text):
-    """Processes user input, calls OpenAI API, and updates chat history."""
-    current_session_history.append({"role": "user", "text": input_text})
+def process_input(input_text, followup=False):
+    """Sends user input to the chat engine, which updates the chat history and follow-ups."""
     st.session_state["is_thinking"] = True
     thinking_placeholder.markdown("## 🤔 **Assistant is thinking... Please wait.**")
 
-    try:
-        # Select appropriate system prompt and get context
-        system_prompt = select_prompt_by_context(input_text)
-        context_data = get_context_data()
-        
-        # Prepare messages for the API call
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "system", "content": context_data}
-        ]
-        
-        # Add conversation history
-        for message in current_session_history:
-            messages.append({"role": message["role"], "content": message["text"]})
-
-        # Generate response
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=messages,
-            max_completion_tokens=500,
-            # temperature=0.7
-        )
-        bot_response = response.choices[0].message.content
-        bot_response = sanitize_markdown(bot_response)
-        current_session_history.append({"role": "assistant", "text": bot_response})
-        update_chat_display()
-
-        # Generate follow-up questions
-        st.session_state["current_followups"] = generate_followup_questions(bot_response)
+    def show_answer(answer):
+        # Render the answer before the follow-up questions are generated
+        with tracer.span("update_chat_display"):
+            show_static_chat()
 
-    except Exception as e:
-        current_session_history.append({"role": "assistant", "text": f"Error: {e}"})
-        st.session_state["current_followups"] = []
+    # A clicked follow-up may already be answered; anything else cancels the prefetch
+    prefetched = None
+    if prefetcher is not None:
+        if followup:
+            prefetched = prefetcher.take(chat_session, input_text)
+        else:
+            prefetcher.cancel(chat_session)
+    if prefetched is None:
+        engine.reply(chat_session, input_text, on_answer=show_answer)
+    save_chat_session()
+    if prefetcher is not None:
+        prefetcher.start(chat_session)
 
     # Complete cleanup after processing
     st.session_state["is_thinking"] = False
@@ -398,11 +320,63 @@ def process_input(input_text):
     st.session_state["last_audio_input"] = None  # Clear audio input
     st.session_state["current_input"] = ""  # Clear current input
     thinking_placeholder.empty()
-    force_rerun()  # Force rerun to update UI
+    # The rest of this run draws the page; it is timed until the script ends
+    st.session_state["answered_at"] = time.perf_counter()
+
+# Answer a recorded question hands-free: the answer streams onto the page and
+# each finished sentence is spoken while the next ones are still being written
+def process_voice_turn(audio_bytes):
+    """Runs a pipelined voice turn and plays the spoken answer clip by clip."""
+    started = time.perf_counter()
+    st.session_state["is_thinking"] = True
+    thinking_placeholder.markdown("## 🎤 **Listening to your question...**")
+    if prefetcher is not None:
+        prefetcher.cancel(chat_session)
+
+    answer_placeholder = st.empty()
+    audio_placeholder = st.empty()
+    answer_text = ""
+    playing_until = 0.0
+    for event in get_voice_pipeline().turn(chat_session, audio_bytes=audio_bytes, started=started,
+                                              audio_format=client_audio_format()):
+        if event["type"] == "transcript":
+            thinking_placeholder.markdown(f"## 🤔 **{event['text']}**")
+        elif event["type"] == "delta":
+            answer_text += event["text"]
+            answer_placeholder.markdown(answer_text)
+        elif event["type"] == "audio" and event["audio"]:
+            # Start each clip when the previous one has finished playing
+            time.sleep(max(0.0, playing_until - time.perf_counter()))
+            audio_placeholder.audio(event["audio"], format=mime_type(event["format"]), autoplay=True)
+            playing_until = time.perf_counter() + event["seconds"]
+        elif event["type"] == "done":
+            if event["timings"]["mouth_to_ear"] is not None:
+                tracer.observe("voice_mouth_to_ear", event["timings"]["mouth_to_ear"])
+            if event["result"]["error"] == "budget_exceeded":
+                st.warning(event["result"]["text"])
+    # Let the last sentence finish before the page is redrawn
+    time.sleep(max(0.0, playing_until - time.perf_counter()))
+    answer_placeholder.empty()
+    audio_placeholder.empty()
+    save_chat_session()
+    if prefetcher is not None:
+        prefetcher.start(chat_session)
+
+    st.session_state["is_thinking"] = False
+    st.session_state["show_example_questions"] = False
+    st.session_state["transcription_status"] = ""
+    st.session_state["last_audio_input"] = None
+    st.session_state["current_input"] = ""
+    st.session_state["last_audio_input_processed"] += 1
+    thinking_placeholder.empty()
+    st.session_state["answered_at"] = time.perf_counter()
 
 # Handle audio input processing
 def handle_audio_input(audio_bytes):
     """Handles audio input by transcribing it and automatically sending it to the chatbot."""
+    if audio_bytes and st.session_state.get("voice_mode", False):
+        process_voice_turn(audio_bytes)
+        return
     if audio_bytes and not st.session_state.get("is_transcribing", False):
         st.session_state["is_transcribing"] = True
         st.session_state["transcription_status"] = "🎤 Transcribing audio... Please wait."
@@ -437,13 +411,14 @@ def handle_audio_input(audio_bytes):
 
 # Call the initialization function
 initialize_session_state()
+chat_session = st.session_state["chat_session"]
 
 # Set page layout dynamically based on mode setting
 layout = "wide" if st.session_state["wide_mode"] else "centered"
 st.set_page_config(layout=layout)
 
 # Start the first session if none exists
-if not st.session_state["all_sessions"]:
+if not chat_session.conversations:
     start_new_session()
 
 #################
@@ -482,8 +457,25 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# Sidebar for settings
-with st.sidebar:
+# Predefined color themes
+COLOR_THEMES = {
+    "White": {"background": "white", "text": "black"},
+    "Light Blue": {"background": "lightblue", "text": "darkblue"},
+    "Light Grey": {"background": "#f0f0f0", "text": "#333333"},
+    "Beige": {"background": "#f5f5dc", "text": "black"},
+    "Dark": {"background": "#2b2b2b", "text": "white"}
+}
+
+def current_color_theme():
+    """Returns the selected custom theme color (defaults to the light/dark theme's own color)."""
+    default_color = st.session_state.get("color_theme", "Dark" if st.session_state["theme"] == "Dark" else "White")
+    return default_color if default_color in COLOR_THEMES else "White"
+
+# Sidebar settings: opening a dropdown or the uploader reruns only the sidebar;
+# settings that restyle the page or switch the conversation rerun everything
+@timed_fragment("sidebar")
+def render_sidebar_settings():
+    """Shows the app settings and the community data refresh status."""
     st.markdown("<h2 style='color: black;'>App Settings</h2>", unsafe_allow_html=True)
 
     # Theme selection - with direct force_rerun call
@@ -503,16 +495,21 @@ with st.sidebar:
         st.session_state["wide_mode"] = wide_mode_selected
         force_rerun()
 
+    # Hands-free voice mode: recorded questions are answered out loud without pressing 🔊
+    # (only read when a recording arrives, so nothing else needs redrawing)
+    st.session_state["voice_mode"] = st.checkbox("Hands-free Voice Mode", value=st.session_state["voice_mode"])
+
     # Start a new session button
     if st.button("Start New Session"):
         start_new_session()
         force_rerun()  # Direct call
 
     # Session selection dropdown
-    session_ids = list(st.session_state["all_sessions"].keys())
-    selected_session_id = st.selectbox("Select Session", session_ids, index=session_ids.index(st.session_state["current_session_id"]))
-    if selected_session_id != st.session_state["current_session_id"]:
-        st.session_state["current_session_id"] = selected_session_id
+    session_ids = list(chat_session.conversations.keys())
+    selected_session_id = st.selectbox("Select Session", session_ids, index=session_ids.index(chat_session.current_conversation_id))
+    if selected_session_id != chat_session.current_conversation_id:
+        chat_session.switch_conversation(selected_session_id)
+        save_chat_session()
         force_rerun()
 
     # Font size selection
@@ -522,52 +519,137 @@ with st.sidebar:
         st.session_state["font_size"] = font_size
         force_rerun()
 
-    # Predefined color themes
-    color_options = {
-        "White": {"background": "white", "text": "black"},
-        "Light Blue": {"background": "lightblue", "text": "darkblue"},
-        "Light Grey": {"background": "#f0f0f0", "text": "#333333"},
-        "Beige": {"background": "#f5f5dc", "text": "black"},
-        "Dark": {"background": "#2b2b2b", "text": "white"}
-    }
-    
-    # Set default color theme based on current theme if not set
-    default_color = st.session_state.get("color_theme", "Dark" if st.session_state["theme"] == "Dark" else "White")
-    if default_color not in color_options:
-        default_color = "White"
-    
-    color_choice = st.selectbox("Custom Theme Color", list(color_options.keys()), 
-                               index=list(color_options.keys()).index(default_color))
-    selected_colors = color_options[color_choice]
+    color_choice = st.selectbox("Custom Theme Color", list(COLOR_THEMES.keys()), 
+                               index=list(COLOR_THEMES.keys()).index(current_color_theme()))
 
     # Update the color theme in session state if changed
-    if color_choice != st.session_state.get("color_theme", default_color):
+    if color_choice != current_color_theme():
         st.session_state["color_theme"] = color_choice
         force_rerun()
 
-    # Upload background image
+    # Upload background image (encoded once per upload, not on every run)
     uploaded_image = st.file_uploader("Upload Background Image", type=["png", "jpg", "jpeg"])
-    if uploaded_image:
-        st.session_state["background_image"] = uploaded_image.getvalue()
+    if uploaded_image and uploaded_image.file_id != st.session_state.get("background_image_id"):
+        st.session_state["background_image_id"] = uploaded_image.file_id
+        st.session_state["background_image"] = base64.b64encode(uploaded_image.getvalue()).decode()
         force_rerun()
 
+    # Community data refresh status
+    if USE_WEB_SCRAPER:
+        refresh_status = get_refresher().status()
+        if refresh_status["state"] == "refreshing":
+            st.caption(f"⟳ Refreshing community data (started {refresh_status['started_at']})")
+        elif refresh_status["outcome"] == "failed":
+            st.caption(f"✗ Last refresh failed after {refresh_status['duration_seconds']}s; "
+                       f"showing data from {refresh_status['snapshot_scraped_at']}")
+        elif refresh_status["outcome"]:
+            st.caption(f"✓ Community data refreshed {refresh_status['finished_at']} "
+                       f"in {refresh_status['duration_seconds']}s")
+        elif refresh_status["snapshot_scraped_at"]:
+            st.caption(f"Community data from {refresh_status['snapshot_scraped_at']}")
+
+with st.sidebar:
+    render_sidebar_settings()
+
+# Hidden admin panel: open the app with ?admin=<ADMIN_PANEL_KEY>; without a key
+# the panel is off, since it shows process-wide stats and traces
+ADMIN_PANEL_KEY = os.getenv("ADMIN_PANEL_KEY", "")
+
+def admin_panel_enabled():
+    """Returns True if ADMIN_PANEL_KEY is set and the admin query parameter matches it."""
+    admin_param = st.query_params.get("admin", "")
+    return bool(ADMIN_PANEL_KEY) and hmac.compare_digest(admin_param.encode(), ADMIN_PANEL_KEY.encode())
+
+@st.fragment(run_every=5)
+def render_admin_panel():
+    """Shows live latency histograms, prompt-cache and usage stats."""
+    with st.expander("🛠 Admin: Performance", expanded=True):
+        snapshot = tracer.snapshot()
+        if snapshot["histograms"]:
+            st.markdown("**Latency by stage (ms)**")
+            st.dataframe(
+                [{"stage": name, "count": stats["count"], "p50": stats["p50_ms"], "p95": stats["p95_ms"],
+                  "p99": stats["p99_ms"], "max": stats["max_ms"], "errors": stats["errors"]}
+                 for name, stats in snapshot["histograms"].items()],
+                hide_index=True
+            )
+        else:
+            st.caption("No requests traced yet.")
+
+        st.markdown("**Prompt cache (this browser session)**")
+        st.json(chat_session.prompt_cache_totals, expanded=False)
+
+        engine_stats = engine.stats()
+        st.markdown("**OpenAI client**")
+        st.json(engine_stats["client"], expanded=False)
+
+        st.markdown("**Request queue**")
+        st.json(engine_stats["queue"], expanded=False)
+
+        fast_path = engine_stats["fast_path"]
+        if fast_path:
+            st.markdown("**Schedule fast path**")
+            st.metric("Answered without the model", f"{fast_path['hit_rate']:.0%}",
+                      help=f"{fast_path['hits']} of {fast_path['questions']} schedule questions, "
+                           f"{fast_path['mean_ms']} ms each")
+            st.json(fast_path["misses"], expanded=False)
+
+        if prefetcher is not None:
+            prefetch = prefetcher.stats()
+            st.markdown("**Follow-up prefetch**")
+            st.metric("Clicked follow-ups answered in advance", f"{prefetch['hit_rate']:.0%}",
+                      help=f"{prefetch['wasted_tokens']} of {prefetch['tokens']} prefetch tokens unused")
+            st.json(prefetch, expanded=False)
+
+        if engine_stats["event_search"]:
+            st.markdown("**Event search**")
+            st.json(engine_stats["event_search"], expanded=False)
+
+        schedule_size = engine_stats["schedule"]
+        if schedule_size:
+            st.markdown("**Schedule context**")
+            st.metric("Schedule tokens per request", schedule_size["compact_tokens"],
+                      delta=schedule_size["compact_tokens"] - schedule_size["raw_tokens"], delta_color="inverse",
+                      help=f"{schedule_size['raw_tokens']} tokens before compaction")
+
+        speech = engine_stats["audio"]
+        if speech["formats"]:
+            st.markdown("**Speech delivery**")
+            st.dataframe(
+                [{"format": name, "clips": stats["clips"], "mean KB": round(stats["mean_bytes"] / 1024, 1),
+                  "ready ms": stats["mean_ready_ms"], f"start ms @ {speech['link_kbps']:g} kbps": stats["est_start_ms"],
+                  "from memory": stats["sources"]["memory"]}
+                 for name, stats in speech["formats"].items()],
+                hide_index=True
+            )
+
+        st.markdown("**Usage**")
+        usage = engine_stats["usage"]
+        st.json({"by_day": usage["by_day"], "by_prompt_type": usage["by_prompt_type"]}, expanded=False)
+
+        if snapshot["recent_traces"]:
+            st.markdown("**Recent traces**")
+            st.json(snapshot["recent_traces"][-5:], expanded=False)
+
+        if st.button("Reset metrics", key="admin_reset_metrics"):
+            tracer.reset()
+
+if admin_panel_enabled():
+    with st.sidebar:
+        render_admin_panel()
+
 ################
 # STYLE SETTINGS #
 ################
 
-# Apply background image if one is uploaded
+# Apply background image if one is uploaded (stored base64-encoded)
 if "background_image" in st.session_state and st.session_state["background_image"]:
-    import base64
-
-    # Convert the uploaded image to a base64 string
-    background_image_base64 = base64.b64encode(st.session_state["background_image"]).decode()
-
     # Add CSS for the background
     st.markdown(
         f"""
         <style>
         .stApp {{
-            background: url("data:image/png;base64,{background_image_base64}") no-repeat center center fixed;
+            background: url("data:image/png;base64,{st.session_state['background_image']}") no-repeat center center fixed;
             background-size: cover;
         }}
         </style>
@@ -600,6 +682,9 @@ font_styles = {
 }
 selected_font_style = font_styles[st.session_state["font_size"]]
 
+# Chat message colors
+selected_colors = COLOR_THEMES[current_color_theme()]
+
 # Custom CSS styling
 if "background_image" not in st.session_state or not st.session_state["background_image"]:
     # Set button styling based on theme
@@ -831,50 +916,10 @@ if "background_image" not in st.session_state or not st.session_state["backgroun
 # Main App Title
 st.title("Retirenet Chatbot")
 
-# Get current session history
-current_session_history = st.session_state["all_sessions"][st.session_state["current_session_id"]]
-
-# Display chat history dynamically
-chat_placeholder = st.empty()
-with chat_placeholder.container():
-    for idx, message in enumerate(current_session_history):
-        # Always use custom theme colors for messages, regardless of dark/light mode
-        msg_bg_color = selected_colors['background']
-        msg_text_color = selected_colors['text']
-        
-        if message["role"] == "user":
-            st.markdown(f"<div class='user-message' style='{selected_font_style} background-color: {msg_bg_color}; color: {msg_text_color}; padding: 8px; border-radius: 5px; margin-bottom: 5px; max-width: 80%;'><strong>👤 User:</strong> {message['text']}</div>", unsafe_allow_html=True)
-        else:
-            formatted_response = message['text'].replace("\n", "<br>")  # Replace newlines with <br> for HTML formatting
-            
-            # Create columns for message and play button
-            col1, col2 = st.columns([0.9, 0.1])
-            
-            with col1:
-                st.markdown(f"<div class='assistant-message' style='{selected_font_style} background-color: {msg_bg_color}; color: {msg_text_color}; padding: 8px; border-radius: 5px; margin-bottom: 5px; max-width: 100%;'><strong>🤖 Assistant:</strong> {formatted_response}</div>", unsafe_allow_html=True)
-            
-            with col2:
-                # Add play button for text-to-speech
-                if st.button("🔊", key=f"play_main_{idx}", help="Play response audio"):
-                    st.session_state["playing_audio"] = idx
-            
-            # Generate or retrieve audio if this message is selected to play
-            if st.session_state.get("playing_audio") == idx:
-                audio_path = None
-                if idx in st.session_state.get("audio_files", {}):
-                    audio_path = st.session_state["audio_files"][idx]
-                else:
-                    # Show spinner in full width
-                    with st.spinner("🎵 Generating audio..."):
-                        audio_path = text_to_speech(message['text'], idx)
-                
-                if audio_path and os.path.exists(audio_path):
-                    # Display audio player with autoplay
-                    with open(audio_path, "rb") as audio_file:
-                        audio_bytes = audio_file.read()
-                        st.audio(audio_bytes, format="audio/mp3", autoplay=True)
-                    # Reset playing state after displaying
-                    st.session_state["playing_audio"] = None
+# While a question is answered the chat is shown without widgets here; the
+# chat log fragment below replaces it once the turn is complete
+answer_chat_placeholder = st.empty()
+chat_log_container = st.container()
 
 # Placeholder for "Thinking..." message
 thinking_placeholder = st.empty()
@@ -885,90 +930,151 @@ if st.session_state.get("is_thinking", False):
 elif st.session_state.get("is_transcribing", False):
     thinking_placeholder.markdown("## 🎤 **Transcribing your voice... Please wait.**")
 
-# Display example questions for new sessions
-if st.session_state.get("show_example_questions", True) and len(current_session_history) == 0:
-    st.markdown("### Example Questions")
-
-    # Render example questions dynamically
-    for i, question in enumerate(example_questions):
-        if st.button(question, key=f"example_{i}"):
-            # Immediate cleanup before processing
-            st.session_state["transcription_status"] = ""
-            st.session_state["last_audio_input"] = None
-            st.session_state["current_input"] = ""
-            st.session_state["last_audio_input_processed"] += 1
-            process_input(question)
+# Answer the question queued by the example, input or follow-up region; the
+# regions below are then drawn with the new turn in this same run
+pending_question = st.session_state.pop("pending_question", None)
+if pending_question is not None:
+    show_static_chat()
+    if pending_question["kind"] == "audio":
+        handle_audio_input(pending_question["audio"])
+    else:
+        process_input(pending_question["text"], followup=pending_question["kind"] == "followup")
+    answer_chat_placeholder.empty()
+    st.session_state["is_thinking"] = False
 
 # Process any selected question
 if st.session_state.get("selected_question"):
     question = st.session_state["selected_question"]
     st.session_state["show_example_questions"] = False  # Hide example questions
     st.session_state["current_question"] = question
-    st.session_state["current_followups"] = []  # Clear follow-up questions
+    chat_session.followups = []  # Clear follow-up questions
     st.session_state["is_thinking"] = True  # Indicate processing
     # Immediate cleanup before processing
     st.session_state["transcription_status"] = ""
     st.session_state["last_audio_input"] = None
     st.session_state["current_input"] = ""
     st.session_state["last_audio_input_processed"] += 1
-    process_input(question)  # Process the question
     st.session_state["selected_question"] = None  # Clear selected question
+    show_static_chat()
+    process_input(question)  # Process the question
+    answer_chat_placeholder.empty()
 
-# Show transcription status if there is one
-if st.session_state.get("transcription_status", ""):
-    st.markdown(f"**{st.session_state['transcription_status']}**")
+# Display chat history; a 🔊 press reruns only the chat log
+@timed_fragment("chat_log")
+def render_chat_log():
+    """Renders the chat history with play and calendar buttons."""
+    for idx, message in enumerate(chat_session.history):
+        if message["role"] == "user":
+            st.markdown(message_html(message), unsafe_allow_html=True)
+            continue
 
-# Voice input button with dynamic key to force reset
-audio_reset_key = f"audio_input_{len(current_session_history)}_{st.session_state.get('last_audio_input_processed', 0)}"
-audio_input = st.audio_input(
-    "Record your question:",
-    key=audio_reset_key,
-    disabled=st.session_state.get("is_thinking", False) or st.session_state.get("is_transcribing", False)
-)
+        # Create columns for message and play button
+        col1, col2 = st.columns([0.9, 0.1])
 
-# Process audio input when new audio is recorded
-if audio_input is not None:
-    audio_bytes = audio_input.read()
-    if audio_bytes != st.session_state.get("last_audio_input"):
-        st.session_state["last_audio_input"] = audio_bytes
-        handle_audio_input(audio_bytes)
-
-# Input form for proper submission handling
-with st.form(key="input_form", clear_on_submit=True):
-    # Get current input value (either from typing or transcription)
-    input_value = st.session_state.get("current_input", "")
-    
-    user_input = st.text_input(
-        "Or type your question:",
-        value=input_value,
-        placeholder="Type your message and press Enter, or use voice input above...",
-        disabled=st.session_state.get("is_thinking", False) or st.session_state.get("is_transcribing", False)
-    )
-    
-    submitted = st.form_submit_button(
-        "Enter",
-        disabled=st.session_state.get("is_thinking", False) or st.session_state.get("is_transcribing", False)
+        with col1:
+            st.markdown(message_html(message), unsafe_allow_html=True)
+
+        with col2:
+            # Add play button for text-to-speech
+            if st.button("🔊", key=f"play_main_{idx}", help="Play response audio"):
+                st.session_state["playing_audio"] = idx
+
+        if message.get("calendar"):
+            render_calendar_download(message["calendar"], key=f"calendar_main_{idx}")
+
+        # Generate or retrieve audio if this message is selected to play
+        if st.session_state.get("playing_audio") == idx:
+            # Show spinner in full width (cached audio comes back immediately)
+            with st.spinner("🎵 Generating audio..."):
+                audio_bytes = text_to_speech(message['text'])
+
+            if audio_bytes:
+                # Display audio player with autoplay
+                st.audio(audio_bytes, format=mime_type(client_audio_format()), autoplay=True)
+                # Reset playing state after displaying
+                st.session_state["playing_audio"] = None
+
+with chat_log_container:
+    render_chat_log()
+
+# Display example questions for new sessions
+@timed_fragment("example_questions")
+def render_example_questions():
+    """Shows the example question buttons."""
+    st.markdown("### Example Questions")
+
+    # Render example questions dynamically
+    for i, question in enumerate(example_questions):
+        if st.button(question, key=f"example_{i}"):
+            submit_question(question, kind="example")
+
+if st.session_state.get("show_example_questions", True) and len(chat_session.history) == 0:
+    render_example_questions()
+
+# Voice and text input; recording or typing reruns only this region until a
+# question is submitted
+@timed_fragment("input")
+def render_input():
+    """Shows the transcription status, the voice recorder and the text input form."""
+    # Show transcription status if there is one
+    if st.session_state.get("transcription_status", ""):
+        st.markdown(f"**{st.session_state['transcription_status']}**")
+
+    input_disabled = st.session_state.get("is_thinking", False) or st.session_state.get("is_transcribing", False)
+
+    # Voice input button with dynamic key to force reset
+    audio_reset_key = f"audio_input_{len(chat_session.history)}_{st.session_state.get('last_audio_input_processed', 0)}"
+    audio_input = st.audio_input(
+        "Record your question:",
+        key=audio_reset_key,
+        disabled=input_disabled
     )
-    
-    if submitted and user_input.strip():
-        # Immediate cleanup before processing
-        st.session_state["transcription_status"] = ""  # Clear transcription status
-        st.session_state["last_audio_input"] = None  # Clear audio input
-        st.session_state["current_input"] = ""  # Clear current input
-        st.session_state["last_audio_input_processed"] += 1  # Force audio widget reset
-        # Process the input
-        process_input(user_input.strip())
+
+    # Process audio input when new audio is recorded
+    if audio_input is not None:
+        audio_bytes = audio_input.read()
+        if audio_bytes != st.session_state.get("last_audio_input"):
+            st.session_state["last_audio_input"] = audio_bytes
+            submit_question(kind="audio", audio_bytes=audio_bytes)
+
+    # Input form for proper submission handling
+    with st.form(key="input_form", clear_on_submit=True):
+        # Get current input value (either from typing or transcription)
+        input_value = st.session_state.get("current_input", "")
+
+        user_input = st.text_input(
+            "Or type your question:",
+            value=input_value,
+            placeholder="Type your message and press Enter, or use voice input above...",
+            disabled=input_disabled
+        )
+
+        submitted = st.form_submit_button(
+            "Enter",
+            disabled=input_disabled
+        )
+
+        if submitted and user_input.strip():
+            submit_question(user_input.strip())
+
+render_input()
 
 # Follow-Up Questions Section
-if st.session_state["current_followups"]:
+@timed_fragment("followups")
+def render_followups():
+    """Shows the suggested follow-up question buttons."""
     st.markdown("### Suggested Follow-Up Questions")
-    for i, followup in enumerate(st.session_state["current_followups"]):
+    for i, followup in enumerate(chat_session.followups):
         if st.button(followup, key=f"followup_{i}"):
-            # Immediate cleanup before processing
-            st.session_state["transcription_status"] = ""
-            st.session_state["last_audio_input"] = None
-            st.session_state["current_input"] = ""
-            st.session_state["last_audio_input_processed"] += 1
-            st.session_state["current_followups"] = []
-            st.session_state["is_thinking"] = True
-            process_input(followup)
+            submit_question(followup, kind="followup")
+
+if chat_session.followups:
+    render_followups()
+
+# Record how long this full script run took (fragment reruns are recorded as
+# fragment_<name>) and, after an answer, how long the page took to draw
+script_run_seconds = time.perf_counter() - script_started_at
+tracer.observe("script_run", script_run_seconds)
+answered_at = st.session_state.pop("answered_at", None)
+if answered_at is not None:
+    tracer.observe("render_after_answer", time.perf_counter() - answered_at)
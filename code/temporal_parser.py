@@ -0,0 +1,177 @@
+"""
+Resolves relative dates and times in a question ("today", "tonight",
+"tomorrow morning", "this afternoon", "next Friday", "this weekend",
+"Nov 7") to concrete days and an optional time-of-day band, so schedule
+questions can be answered from just the events in that window instead of
+asking the model to work out which day "Friday" is.
+
+Conventions:
+  - a bare weekday ("on Friday", "this Friday") is its next occurrence,
+    today included
+  - "next Friday" is the Friday of next week (Monday to Sunday weeks), so
+    on a Wednesday it is nine days away, not two
+  - a time of day without a day ("Is yoga in the morning?") does not
+    resolve, since it usually means "any morning"
+
+Run `python temporal_parser.py "what's on this afternoon?"` to try a phrase.
+"""
+
+from datetime import datetime, time, timedelta
+import re
+
+from event_parser import MONTHS, format_clock
+from intent_classifier import normalize_text
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# Time-of-day bands (start inclusive, end exclusive)
+DAY_PARTS = {
+    'morning': (time(5, 0), time(12, 0)),
+    'afternoon': (time(12, 0), time(17, 0)),
+    'evening': (time(17, 0), time(21, 0)),
+    'night': (time(17, 0), time(23, 59)),
+}
+
+# "in N days" further out than this is read as this many days (the schedule never reaches it anyway)
+MAX_DAYS_AHEAD = 366
+
+NUMBER_WORDS = {'a': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7}
+
+_WEEKDAY = '|'.join(WEEKDAYS)
+# Full or abbreviated month names only, so "mark 3" or "junior 5" are not dates
+_MONTH = (r'(?P<month>jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?'
+          r'|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?')
+
+# Day expressions, tried in order; the first match wins
+DAY_PATTERNS = [
+    ('tonight', re.compile(r'\btonight\b')),
+    ('today', re.compile(r"\b(?:today|todays|this (?:morning|afternoon|evening))\b")),
+    ('tomorrow', re.compile(r"\btomorrows?\b")),
+    ('yesterday', re.compile(r"\byesterdays?\b")),
+    ('in_days', re.compile(r"\bin (?P<count>\d+|" + '|'.join(NUMBER_WORDS) + r") days?\b")),
+    ('weekend', re.compile(r"\b(?P<which>this|next|the)? ?weekend\b")),
+    ('week', re.compile(r"\b(?P<which>this|next) week\b")),
+    ('month_day', re.compile(r"\b" + _MONTH + r" (?P<day>\d{1,2})(?:st|nd|rd|th)?\b")),
+    ('numeric_date', re.compile(r"\b(?P<month>\d{1,2})/(?P<day>\d{1,2})(?:/(?P<year>\d{2,4}))?\b")),
+    # "Mondays" means every Monday, so plurals are left alone
+    ('weekday', re.compile(r"\b(?P<which>this|next|last)? ?(?P<weekday>" + _WEEKDAY + r")\b")),
+]
+
+DAY_PART_PATTERN = re.compile(r'\b(?P<part>morning|afternoon|evening|tonight|night)\b')
+
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+def _weekday_days(match, today):
+    """Days for "Friday", "this Friday", "next Friday" and "last Friday"."""
+    weekday = WEEKDAYS.index(match.group('weekday'))
+    which = match.group('which')
+    if which == 'last':
+        return [today - timedelta(days=(today.weekday() - weekday - 1) % 7 + 1)]
+    if which == 'next':
+        return [_week_start(today) + timedelta(days=7 + weekday)]
+    return [today + timedelta(days=(weekday - today.weekday()) % 7)]
+
+def _calendar_day(year, month, day, today):
+    """A month/day without a year is the next such date (within the last week counts as this year)."""
+    try:
+        candidate = today.replace(year=year, month=month, day=day) if year else today.replace(month=month, day=day)
+    except ValueError:
+        return None
+    if not year and candidate < today - timedelta(days=7):
+        candidate = candidate.replace(year=candidate.year + 1)
+    return candidate
+
+def _days_for(kind, match, today):
+    if kind in ('today', 'tonight'):
+        return [today]
+    if kind == 'tomorrow':
+        return [today + timedelta(days=1)]
+    if kind == 'yesterday':
+        return [today - timedelta(days=1)]
+    if kind == 'in_days':
+        count = match.group('count')
+        return [today + timedelta(days=min(int(count) if count.isdigit() else NUMBER_WORDS[count], MAX_DAYS_AHEAD))]
+    if kind == 'weekend':
+        saturday = _week_start(today) + timedelta(days=5 + (7 if match.group('which') == 'next' else 0))
+        return [day for day in (saturday, saturday + timedelta(days=1)) if day >= today] or [today]
+    if kind == 'week':
+        start = _week_start(today) + timedelta(days=7 if match.group('which') == 'next' else 0)
+        return [start + timedelta(days=offset) for offset in range(7) if start + timedelta(days=offset) >= today]
+    if kind == 'month_day':
+        day = _calendar_day(None, MONTHS[match.group('month')[:3]], int(match.group('day')), today)
+        return [day] if day else []
+    if kind == 'numeric_date':
+        year = match.group('year')
+        year = (2000 + int(year) if len(year) == 2 else int(year)) if year else None
+        if not 1 <= int(match.group('month')) <= 12:
+            return []
+        day = _calendar_day(year, int(match.group('month')), int(match.group('day')), today)
+        return [day] if day else []
+    return _weekday_days(match, today)
+
+def describe_days(days):
+    """"Friday, October 31, 2025" or "Saturday, November 1 to Sunday, November 2, 2025"."""
+    first, last = days[0], days[-1]
+    if first == last:
+        return f"{first.strftime('%A, %B')} {first.day}, {first.year}"
+    return f"{first.strftime('%A, %B')} {first.day} to {last.strftime('%A, %B')} {last.day}, {last.year}"
+
+def resolve(text, now=None):
+    """
+    Resolves the date (and time-of-day) expression in a question.
+
+    Args:
+        text (str): The question
+        now (datetime): Current time (default: now)
+
+    Returns:
+        dict or None: 'days' (sorted dates), 'start_time' and 'end_time'
+                      (a daily band, or None for whole days), 'phrase' (the
+                      matched words) and 'label' for prompts; None if the
+                      question has no date expression
+    """
+    now = now or datetime.now()
+    normalized = normalize_text(text or '').replace("'", '')
+    for kind, pattern in DAY_PATTERNS:
+        match = pattern.search(normalized)
+        if match is None:
+            continue
+        days = sorted(set(_days_for(kind, match, now.date())))
+        if not days:
+            continue
+        phrase = match.group(0).strip()
+        part = 'night' if kind == 'tonight' else None
+        if part is None:
+            part_match = DAY_PART_PATTERN.search(normalized)
+            if part_match:
+                part = 'night' if part_match.group('part') == 'tonight' else part_match.group('part')
+                if part_match.group(0) not in phrase:
+                    phrase = f"{phrase} {part_match.group(0)}"
+        start_time, end_time = DAY_PARTS[part] if part else (None, None)
+        label = describe_days(days)
+        if part:
+            label += f", {part} ({format_clock(start_time)} to {format_clock(end_time)})"
+        return {'days': days, 'start_time': start_time, 'end_time': end_time, 'phrase': phrase, 'label': label}
+    return None
+
+def in_window(event, window):
+    """True if a parsed event (see event_parser) falls in a resolved window."""
+    if event['date'] not in window['days']:
+        return False
+    if window['start_time'] is None:
+        return True
+    end = event['end'] or event['start']
+    return event['start'] < window['end_time'] and (end > window['start_time'] or event['start'] >= window['start_time'])
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Resolve the date expression in a question')
+    parser.add_argument('question', nargs='+')
+    parser.add_argument('--now', help='Current time as "YYYY-MM-DD HH:MM" (default: now)')
+    args = parser.parse_args()
+
+    now = datetime.strptime(args.now, "%Y-%m-%d %H:%M") if args.now else None
+    window = resolve(' '.join(args.question), now)
+    print(f"{window['phrase']!r} -> {window['label']}" if window else "(no date expression)")
@@ -0,0 +1,234 @@
+"""
+Lightweight request tracing for the chat pipeline.
+A trace covers one chat turn and holds timed spans for each stage (prompt
+selection, context building, completion, rendering, follow-ups...). Span
+durations feed in-process latency histograms with p50/p95/p99, finished
+traces can be appended to a JSON-lines log, and an optional HTTP endpoint
+exports the histograms and recent traces as JSON.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import json
+import os
+import threading
+import time
+import uuid
+
+# Optional JSON-lines log of finished traces
+TRACE_LOG_FILE = os.getenv('TRACE_LOG_FILE', '')
+
+# Optional port for the JSON export endpoint (0/empty disables it)
+TRACE_EXPORT_PORT = int(os.getenv('TRACE_EXPORT_PORT', '0') or 0)
+
+# Samples kept per histogram and finished traces kept in memory
+HISTOGRAM_SAMPLES = 2048
+RECENT_TRACES = 50
+
+_current_trace = ContextVar('current_trace', default=None)
+
+class LatencyHistogram:
+    """Keeps the most recent samples of one stage and reports percentiles."""
+
+    def __init__(self, max_samples=HISTOGRAM_SAMPLES):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+
+    def add(self, seconds, error=False):
+        """Adds one duration sample."""
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.errors += 1 if error else 0
+
+    def percentile(self, fraction):
+        """Returns the given percentile (0-1) of the kept samples, in seconds."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def snapshot(self):
+        """Returns count, mean and p50/p95/p99/max in milliseconds."""
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.50) * 1000, 2),
+            'p95_ms': round(self.percentile(0.95) * 1000, 2),
+            'p99_ms': round(self.percentile(0.99) * 1000, 2),
+            'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0.0
+        }
+
+class Tracer:
+    """Collects traces and per-stage latency histograms for one server process."""
+
+    def __init__(self, log_file=TRACE_LOG_FILE):
+        self.log_file = log_file
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.recent = deque(maxlen=RECENT_TRACES)
+
+    def observe(self, name, seconds, error=False):
+        """Adds a duration to the named histogram (usable without a trace)."""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(seconds, error)
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """
+        Starts a trace for one request; spans opened inside attach to it.
+
+        Args:
+            name (str): Trace name (e.g. "chat_turn")
+            **attributes: Extra fields stored with the trace
+        """
+        trace = {
+            'trace_id': uuid.uuid4().hex[:16],
+            'name': name,
+            'started_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            'attributes': attributes,
+            'spans': [],
+            '_start': time.perf_counter()
+        }
+        token = _current_trace.set(trace)
+        error = None
+        try:
+            yield trace
+        except BaseException as e:
+            # Streamlit's rerun/stop are control flow, not failures
+            if isinstance(e, Exception) and type(e).__name__ not in ('RerunException', 'StopException'):
+                error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_trace.reset(token)
+            self._finish(trace, error)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Times one stage. Records into the stage histogram and, if a trace is
+        active, into that trace's span list.
+
+        Args:
+            name (str): Stage name
+            **attributes: Extra fields stored with the span
+        """
+        trace = _current_trace.get()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield attributes
+        except BaseException as e:
+            if isinstance(e, Exception) and type(e).__name__ not in ('RerunException', 'StopException'):
+                error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self.observe(name, duration, error is not None)
+            if trace is not None:
+                span = {'name': name, 'offset_ms': round((start - trace['_start']) * 1000, 2),
+                        'duration_ms': round(duration * 1000, 2)}
+                if attributes:
+                    span['attributes'] = attributes
+                if error:
+                    span['error'] = error
+                trace['spans'].append(span)
+
+    def _finish(self, trace, error):
+        """Closes a trace, records its total duration and exports it."""
+        duration = time.perf_counter() - trace.pop('_start')
+        trace['duration_ms'] = round(duration * 1000, 2)
+        if error:
+            trace['error'] = error
+        self.observe(trace['name'], duration, error is not None)
+        with self._lock:
+            self.recent.append(trace)
+        if self.log_file:
+            try:
+                with self._lock, open(self.log_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(trace, default=str) + '\n')
+            except Exception as e:
+                print(f"✗ Error writing trace log: {e}")
+
+    def snapshot(self):
+        """Returns histogram summaries per stage and the recent traces."""
+        with self._lock:
+            return {
+                'histograms': {name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())},
+                'recent_traces': list(self.recent)
+            }
+
+    def reset(self):
+        """Clears all histograms and recent traces."""
+        with self._lock:
+            self.histograms.clear()
+            self.recent.clear()
+
+class _ExportHandler(BaseHTTPRequestHandler):
+    """Serves /metrics (histograms) and /traces (recent traces) as JSON."""
+
+    tracer = None
+
+    def do_GET(self):
+        snapshot = self.tracer.snapshot()
+        if self.path.rstrip('/') in ('', '/metrics'):
+            body = snapshot['histograms']
+        elif self.path.rstrip('/') == '/traces':
+            body = snapshot['recent_traces']
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_export_server(tracer, port=TRACE_EXPORT_PORT, host='127.0.0.1'):
+    """
+    Serves the tracer's histograms and recent traces over HTTP on a daemon thread.
+
+    Args:
+        tracer (Tracer): Tracer to export
+        port (int): Port to listen on
+        host (str): Interface to bind (localhost by default)
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    handler = type('ExportHandler', (_ExportHandler,), {'tracer': tracer})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="trace-export", daemon=True).start()
+    print(f"✓ Trace export listening on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer():
+    """Returns the process-wide tracer, starting the export endpoint if configured."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+            if TRACE_EXPORT_PORT:
+                try:
+                    start_export_server(_tracer)
+                except OSError as e:
+                    print(f"✗ Could not start trace export on port {TRACE_EXPORT_PORT}: {e}")
+        return _tracer
@@ -0,0 +1,382 @@
+"""
+Usage accounting and budget enforcement for OpenAI calls.
+Every chat completion, transcription and speech call goes through a metered
+wrapper that records tokens, audio seconds, characters and latency, and
+aggregates them per session, per prompt type and per day. Configurable
+per-session and global daily budgets degrade the service gracefully (shorter
+answers, no follow-ups or audio) before blocking calls outright.
+
+The aggregates are per process. Given a shared store (see shared_store),
+the counters the budgets are checked against are also kept there, so the
+budgets cover every replica; without one they apply to each replica alone.
+"""
+
+from datetime import datetime
+import io
+import json
+import os
+import threading
+import time
+import wave
+
+from prompt_builder import estimate_tokens
+
+# Budgets (0 disables a budget)
+SESSION_TOKEN_BUDGET = int(os.getenv('SESSION_TOKEN_BUDGET', '60000'))
+DAILY_TOKEN_BUDGET = int(os.getenv('DAILY_TOKEN_BUDGET', '3000000'))
+SESSION_TTS_CHAR_BUDGET = int(os.getenv('SESSION_TTS_CHAR_BUDGET', '20000'))
+DAILY_TTS_CHAR_BUDGET = int(os.getenv('DAILY_TTS_CHAR_BUDGET', '1000000'))
+DAILY_AUDIO_SECONDS_BUDGET = int(os.getenv('DAILY_AUDIO_SECONDS_BUDGET', '36000'))
+
+# Fraction of a budget after which the service degrades
+DEGRADE_THRESHOLD = float(os.getenv('BUDGET_DEGRADE_THRESHOLD', '0.8'))
+DEGRADED_MAX_COMPLETION_TOKENS = 250
+
+# Per-session totals are dropped after this long without a call (sessions never end explicitly)
+SESSION_USAGE_TTL_SECONDS = float(os.getenv('SESSION_USAGE_TTL_HOURS', '24')) * 3600
+SESSION_PRUNE_INTERVAL_SECONDS = 60
+# Daily counters in the shared store outlive their day by a day
+DAY_USAGE_TTL_SECONDS = 2 * 24 * 3600
+
+# Audio that cannot be parsed as WAV is charged as if encoded at 16 kbps, below
+# what speech codecs normally use, so unreadable audio is over- rather than under-counted
+UNPARSED_AUDIO_BYTES_PER_SECOND = 2000
+
+# Optional JSON-lines log of every metered call
+USAGE_LOG_FILE = os.getenv('USAGE_LOG_FILE', '')
+
+BUDGET_EXHAUSTED_MESSAGE = ("I'm sorry, the assistant has reached its usage limit for now. "
+                            "Please try again later or ask the front desk for help.")
+
+class BudgetExceededError(Exception):
+    """Raised when a call is refused because a usage budget is used up."""
+
+def _empty_totals():
+    """Returns a zeroed usage counter."""
+    return {
+        'calls': 0,
+        'errors': 0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'cached_tokens': 0,
+        'audio_seconds': 0.0,
+        'tts_characters': 0,
+        'latency_seconds': 0.0
+    }
+
+def wav_duration_seconds(audio_bytes):
+    """
+    Returns the duration of WAV audio in seconds. Audio that cannot be parsed
+    as WAV is estimated from its size (see UNPARSED_AUDIO_BYTES_PER_SECOND).
+    """
+    try:
+        with wave.open(io.BytesIO(audio_bytes), 'rb') as wav_file:
+            return wav_file.getnframes() / float(wav_file.getframerate())
+    except Exception:
+        return len(audio_bytes or b'') / UNPARSED_AUDIO_BYTES_PER_SECOND
+
+def _budget_counters(totals):
+    """The usage the budgets are checked against, from a totals dict."""
+    return {
+        'tokens': totals['prompt_tokens'] + totals['completion_tokens'],
+        'tts_characters': totals['tts_characters'],
+        'audio_seconds': totals['audio_seconds']
+    }
+
+class UsageMeter:
+    """Thread-safe usage aggregator shared by all sessions of one server process."""
+
+    def __init__(self, log_file=USAGE_LOG_FILE, store=None, session_ttl_seconds=SESSION_USAGE_TTL_SECONDS):
+        """
+        Args:
+            log_file (str): Optional JSON-lines log of every call
+            store (KeyValueStore): Shared store for the budget counters, so
+                budgets cover every replica (None: this process only)
+            session_ttl_seconds (float): Per-session totals are dropped after
+                this long without a call
+        """
+        self.log_file = log_file
+        self.store = store
+        self.session_ttl_seconds = session_ttl_seconds
+        self._lock = threading.Lock()
+        self.by_session = {}
+        self.by_prompt_type = {}
+        self.by_day = {}
+        self.by_kind = {}
+        self._session_seen = {}
+        self._last_pruned = time.monotonic()
+
+    def record(self, kind, model, session_id, prompt_type=None, prompt_tokens=0, completion_tokens=0,
+               cached_tokens=0, audio_seconds=0.0, tts_characters=0, latency_seconds=0.0, error=None):
+        """
+        Records one API call.
+
+        Args:
+            kind (str): "chat", "followups", "transcription" or "speech"
+            model (str): Model name
+            session_id (str): Resident session the call belongs to
+            prompt_type (str): System prompt key used (chat calls)
+            prompt_tokens, completion_tokens, cached_tokens (int): Reported token usage
+            audio_seconds (float): Seconds of audio transcribed
+            tts_characters (int): Characters sent to text-to-speech
+            latency_seconds (float): Wall-clock duration of the call
+            error (str): Error message if the call failed
+        """
+        entry = {
+            'calls': 1,
+            'errors': 1 if error else 0,
+            'prompt_tokens': prompt_tokens or 0,
+            'completion_tokens': completion_tokens or 0,
+            'cached_tokens': cached_tokens or 0,
+            'audio_seconds': audio_seconds or 0.0,
+            'tts_characters': tts_characters or 0,
+            'latency_seconds': latency_seconds or 0.0
+        }
+        day = datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            for table, key in ((self.by_session, session_id), (self.by_prompt_type, prompt_type or kind),
+                               (self.by_day, day), (self.by_kind, kind)):
+                totals = table.setdefault(key, _empty_totals())
+                for field, value in entry.items():
+                    totals[field] += value
+            self._session_seen[session_id] = time.monotonic()
+            self._prune_sessions()
+        if self.store is not None:
+            self._add_to_store(session_id, day, _budget_counters(entry))
+
+        if self.log_file:
+            record = dict(entry, kind=kind, model=model, session_id=session_id, prompt_type=prompt_type,
+                          error=error, timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            try:
+                with self._lock, open(self.log_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + '\n')
+            except Exception as e:
+                print(f"✗ Error writing usage log: {e}")
+
+    def _prune_sessions(self):
+        """Drops the totals of sessions idle for longer than session_ttl_seconds (call with the lock held)."""
+        now = time.monotonic()
+        if now - self._last_pruned < SESSION_PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_pruned = now
+        for session_id, seen in list(self._session_seen.items()):
+            if now - seen > self.session_ttl_seconds:
+                del self._session_seen[session_id]
+                self.by_session.pop(session_id, None)
+
+    def _add_to_store(self, session_id, day, counters):
+        try:
+            for field, amount in counters.items():
+                if amount:
+                    self.store.incr(f"usage:session:{session_id}:{field}", amount, ttl=self.session_ttl_seconds)
+                    self.store.incr(f"usage:day:{day}:{field}", amount, ttl=DAY_USAGE_TTL_SECONDS)
+        except Exception as e:
+            print(f"✗ Shared usage counters unavailable: {e}")
+
+    def budget_usage(self, session_id):
+        """
+        Returns the 'session' and 'day' counters the budgets are checked
+        against: from the shared store when there is one (every replica's
+        calls), otherwise this process's totals.
+        """
+        usage = {'session': _budget_counters(self.session_totals(session_id)),
+                 'day': _budget_counters(self.day_totals())}
+        if self.store is None:
+            return usage
+        day = datetime.now().strftime("%Y-%m-%d")
+        try:
+            for scope, key in (('session', session_id), ('day', day)):
+                for field, local in usage[scope].items():
+                    raw = self.store.get(f"usage:{scope}:{key}:{field}")
+                    # The store already includes this process's calls; never report less than those
+                    usage[scope][field] = max(local, float(raw) if raw else 0.0)
+        except Exception as e:
+            print(f"✗ Shared usage counters unavailable: {e}")
+        return usage
+
+    def session_totals(self, session_id):
+        """Returns a copy of the usage totals for a session."""
+        with self._lock:
+            return dict(self.by_session.get(session_id, _empty_totals()))
+
+    def day_totals(self, day=None):
+        """Returns a copy of the usage totals for a day (default today)."""
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            return dict(self.by_day.get(day, _empty_totals()))
+
+    def summary(self, per_session=True):
+        """
+        Returns copies of all aggregates.
+
+        Args:
+            per_session (bool): Include the by_session table (otherwise only
+                                the number of sessions metered)
+        """
+        with self._lock:
+            summary = {
+                'by_prompt_type': {key: dict(value) for key, value in self.by_prompt_type.items()},
+                'by_day': {key: dict(value) for key, value in self.by_day.items()},
+                'by_kind': {key: dict(value) for key, value in self.by_kind.items()},
+                'sessions': len(self.by_session)
+            }
+            if per_session:
+                summary['by_session'] = {key: dict(value) for key, value in self.by_session.items()}
+            return summary
+
+    def check_budget(self, session_id):
+        """
+        Decides how to serve the next request given session and daily usage.
+
+        Args:
+            session_id (str): Resident session
+
+        Returns:
+            dict: 'level' ("ok", "degraded" or "exhausted"), whether chat,
+                  follow-ups, TTS and transcription are allowed, the
+                  max_completion_tokens to use, and the reasons
+        """
+        usage = self.budget_usage(session_id)
+        session, today = usage['session'], usage['day']
+
+        def usage_fraction(used, budget):
+            return used / budget if budget else 0.0
+
+        token_fractions = {
+            'session tokens': usage_fraction(session['tokens'], SESSION_TOKEN_BUDGET),
+            'daily tokens': usage_fraction(today['tokens'], DAILY_TOKEN_BUDGET)
+        }
+        tts_fraction = max(usage_fraction(session['tts_characters'], SESSION_TTS_CHAR_BUDGET),
+                           usage_fraction(today['tts_characters'], DAILY_TTS_CHAR_BUDGET))
+        audio_fraction = usage_fraction(today['audio_seconds'], DAILY_AUDIO_SECONDS_BUDGET)
+
+        reasons = [f"{name} at {fraction:.0%} of budget"
+                   for name, fraction in token_fractions.items() if fraction >= DEGRADE_THRESHOLD]
+        worst = max(token_fractions.values())
+        level = 'exhausted' if worst >= 1.0 else 'degraded' if worst >= DEGRADE_THRESHOLD else 'ok'
+        return {
+            'level': level,
+            'chat': level != 'exhausted',
+            'followups': level == 'ok',
+            'tts': level != 'exhausted' and tts_fraction < 1.0,
+            'transcription': audio_fraction < 1.0,
+            'max_completion_tokens': DEGRADED_MAX_COMPLETION_TOKENS if level == 'degraded' else None,
+            'reasons': reasons
+        }
+
+def _chat_usage(response):
+    """Extracts (prompt, completion, cached) tokens from a chat completion response."""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return 0, 0, 0
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return (getattr(usage, 'prompt_tokens', 0) or 0,
+            getattr(usage, 'completion_tokens', 0) or 0,
+            getattr(details, 'cached_tokens', 0) or 0)
+
+def _partial_stream_usage(messages, pieces):
+    """Estimates (prompt, completion, cached) tokens for a stream that failed before its usage chunk."""
+    if not pieces:
+        return 0, 0, 0
+    prompt_tokens = sum(estimate_tokens(str(message.get('content') or '')) for message in messages or [])
+    return prompt_tokens, estimate_tokens(''.join(pieces)), 0
+
+def metered_chat_completion(client, meter, session_id, prompt_type, kind='chat', **kwargs):
+    """
+    Calls client.chat.completions.create and records its usage and latency.
+
+    Args:
+        client: OpenAI client
+        meter (UsageMeter): Meter to record into
+        session_id (str): Resident session
+        prompt_type (str): System prompt key used
+        kind (str): Call category for the aggregates
+        **kwargs: Passed to chat.completions.create
+
+    Returns:
+        The completion response
+    """
+    started = time.perf_counter()
+    try:
+        response = client.chat.completions.create(**kwargs)
+    except Exception as e:
+        meter.record(kind, kwargs.get('model'), session_id, prompt_type,
+                     latency_seconds=time.perf_counter() - started, error=str(e))
+        raise
+    prompt_tokens, completion_tokens, cached_tokens = _chat_usage(response)
+    meter.record(kind, kwargs.get('model'), session_id, prompt_type,
+                 prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cached_tokens=cached_tokens,
+                 latency_seconds=time.perf_counter() - started)
+    return response
+
+def metered_chat_stream(client, meter, session_id, prompt_type, on_delta, kind='chat', **kwargs):
+    """
+    Streams a chat completion, passing each piece of text to on_delta as it
+    arrives, and records its usage (sent in the last chunk) and latency.
+
+    Args:
+        client: OpenAI client
+        meter (UsageMeter): Meter to record into
+        session_id (str): Resident session
+        prompt_type (str): System prompt key used
+        on_delta (callable): Called with each piece of the answer
+        kind (str): Call category for the aggregates
+        **kwargs: Passed to chat.completions.create (stream is set here)
+
+    Returns:
+        str: The complete answer
+    """
+    started = time.perf_counter()
+    pieces = []
+    usage_chunk = None
+    try:
+        stream = client.chat.completions.create(stream=True, stream_options={'include_usage': True}, **kwargs)
+        for chunk in stream:
+            if getattr(chunk, 'usage', None) is not None:
+                usage_chunk = chunk
+            for choice in getattr(chunk, 'choices', None) or []:
+                content = getattr(choice.delta, 'content', None)
+                if content:
+                    pieces.append(content)
+                    on_delta(content)
+    except Exception as e:
+        # Text that already arrived was generated (and billed) even though the stream broke
+        prompt_tokens, completion_tokens, cached_tokens = (
+            _chat_usage(usage_chunk) if usage_chunk is not None
+            else _partial_stream_usage(kwargs.get('messages'), pieces))
+        meter.record(kind, kwargs.get('model'), session_id, prompt_type,
+                     prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cached_tokens=cached_tokens,
+                     latency_seconds=time.perf_counter() - started, error=str(e))
+        raise
+    prompt_tokens, completion_tokens, cached_tokens = _chat_usage(usage_chunk)
+    meter.record(kind, kwargs.get('model'), session_id, prompt_type,
+                 prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cached_tokens=cached_tokens,
+                 latency_seconds=time.perf_counter() - started)
+    return ''.join(pieces)
+
+def metered_transcription(client, meter, session_id, audio_seconds, **kwargs):
+    """Calls client.audio.transcriptions.create and records the audio seconds and latency."""
+    started = time.perf_counter()
+    try:
+        transcript = client.audio.transcriptions.create(**kwargs)
+    except Exception as e:
+        meter.record('transcription', kwargs.get('model'), session_id,
+                     latency_seconds=time.perf_counter() - started, error=str(e))
+        raise
+    meter.record('transcription', kwargs.get('model'), session_id, audio_seconds=audio_seconds,
+                 latency_seconds=time.perf_counter() - started)
+    return transcript
+
+def metered_speech(client, meter, session_id, **kwargs):
+    """Calls client.audio.speech.create and records the characters synthesized and latency."""
+    started = time.perf_counter()
+    characters = len(kwargs.get('input', ''))
+    try:
+        response = client.audio.speech.create(**kwargs)
+    except Exception as e:
+        meter.record('speech', kwargs.get('model'), session_id,
+                     latency_seconds=time.perf_counter() - started, error=str(e))
+        raise
+    meter.record('speech', kwargs.get('model'), session_id, tts_characters=characters,
+                 latency_seconds=time.perf_counter() - started)
+    return response
@@ -0,0 +1,301 @@
+"""
+Hands-free voice turns with overlapping stages.
+A spoken question used to run strictly in sequence: transcribe the whole
+recording, generate the whole answer, then synthesize the whole answer when
+the resident pressed 🔊. In a voice turn the answer is streamed, and each
+sentence is sent to text-to-speech as soon as it is complete, so the first
+sentence is playing while later ones are still being written and
+synthesized.
+
+Transcription still takes the finished recording (Whisper has no streaming
+mode, and the app receives the recording in one piece), so the overlap is
+between the answer and the speech.
+
+VoicePipeline.turn() is a generator of events that the caller consumes in
+its own thread (which Streamlit needs for rendering):
+  {'type': 'transcript', 'text'}             the recognised question
+  {'type': 'delta', 'text'}                  a piece of the answer as it streams
+  {'type': 'audio', 'index', 'text', 'audio', 'format', 'seconds', 'error'}
+                                             one spoken sentence, in order
+  {'type': 'done', 'result', 'timings'}      the reply result and stage timings
+
+timings['mouth_to_ear'] is the time from the end of the recording to the
+first playable audio. Run `python voice_pipeline.py --bench` to compare it
+with the sequential flow against the local mock OpenAI server.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+import re
+import threading
+import time
+
+from audio_delivery import DEFAULT_FORMAT, audio_duration_seconds
+from chat_engine import sanitize_markdown
+from usage_meter import BudgetExceededError
+
+# Sentences synthesized at the same time per voice turn
+VOICE_TTS_WORKERS = int(os.getenv('VOICE_TTS_WORKERS', '2'))
+# Sentences shorter than this are joined to the next one ("Yes." alone would be a clip of its own)
+MIN_SENTENCE_CHARS = 24
+# Speaking rate used when a clip's length cannot be read from its container
+SPOKEN_CHARS_PER_SECOND = 15.0
+
+# Words whose trailing period does not end a sentence
+ABBREVIATIONS = {'dr', 'mr', 'mrs', 'ms', 'st', 'ave', 'rd', 'blvd', 'no', 'vs', 'etc', 'approx', 'bldg', 'rm',
+                 'a.m', 'p.m', 'e.g', 'i.e', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct',
+                 'nov', 'dec', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun'}
+
+# Sentence-ending punctuation (with closing quotes or brackets) followed by a space, or a line break
+_BOUNDARY = re.compile(r'[.!?]+["\')\]]*(?=\s)|\n+')
+
+class SentenceSplitter:
+    """Cuts streamed text into speakable sentences."""
+
+    def __init__(self, min_chars=MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.buffer = ''
+
+    def _ends_sentence(self, match):
+        if not match.group(0).startswith('.'):
+            return True
+        word = self.buffer[:match.start()].rsplit(None, 1)[-1].lower() if self.buffer[:match.start()].strip() else ''
+        word = word.lstrip('("\'')
+        # "Dr." and "8 a.m." do not end a sentence
+        return word not in ABBREVIATIONS
+
+    def feed(self, text):
+        """
+        Adds streamed text.
+
+        Returns:
+            list: Sentences completed by this text (possibly none)
+        """
+        self.buffer += text
+        sentences = []
+        position = 0
+        for match in _BOUNDARY.finditer(self.buffer):
+            if not self._ends_sentence(match):
+                continue
+            sentence = self.buffer[position:match.end()].strip()
+            if len(sentence) >= self.min_chars or (match.group(0).startswith('\n') and sentence):
+                sentences.append(sentence)
+                position = match.end()
+        self.buffer = self.buffer[position:].lstrip() if position else self.buffer
+        return sentences
+
+    def flush(self):
+        """Returns what is left once the stream has ended (as a list of at most one sentence)."""
+        rest, self.buffer = self.buffer.strip(), ''
+        return [rest] if rest else []
+
+def speakable(sentence):
+    """Sentence text for text-to-speech: no Markdown symbols or list bullets."""
+    return sanitize_markdown(re.sub(r'^\s*(?:[-•#>]+|\d+[.)])\s*', '', sentence)).strip()
+
+def clip_seconds(audio, text, audio_format=DEFAULT_FORMAT):
+    """How long a clip plays: from the container of its format, else estimated from the text."""
+    return (audio_duration_seconds(audio, audio_format) if audio else None) or len(text) / SPOKEN_CHARS_PER_SECOND
+
+class VoicePipeline:
+    """Runs voice turns on a chat engine with answer streaming and per-sentence speech."""
+
+    def __init__(self, engine, tts_workers=VOICE_TTS_WORKERS, clock=time.perf_counter):
+        """
+        Args:
+            engine (ChatEngine): Engine that transcribes, answers and speaks
+            tts_workers (int): Sentences synthesized at the same time per turn
+            clock (callable): Monotonic clock in seconds, for the timings
+        """
+        self.engine = engine
+        self.tts_workers = tts_workers
+        self.clock = clock
+
+    def turn(self, session, audio_bytes=None, question=None, started=None, filename="question.wav",
+             audio_format=DEFAULT_FORMAT):
+        """
+        Answers one spoken (or typed) question, yielding events as stages finish.
+
+        Args:
+            session (ChatSession): Resident session (updated like ChatEngine.reply)
+            audio_bytes (bytes): Recorded question, transcribed first
+            question (str): Question text, when there is no recording
+            started (float): Clock time the recording ended (default: now)
+            filename (str): Name sent with the recording
+            audio_format (str): Speech format (see audio_delivery.negotiate_format)
+
+        Yields:
+            dict: Events (see the module docstring)
+        """
+        timings = {'started': self.clock() if started is None else started}
+
+        def mark(stage):
+            timings.setdefault(stage, self.clock())
+
+        if question is None:
+            try:
+                question = self.engine.transcribe(session, audio_bytes, filename)
+            except BudgetExceededError as e:
+                yield {'type': 'done', 'result': {'text': str(e), 'error': 'budget_exceeded'},
+                       'timings': self._summary(timings)}
+                return
+            mark('transcribed')
+            yield {'type': 'transcript', 'text': question}
+            if not question:
+                yield {'type': 'done', 'result': {'text': None, 'error': 'empty_transcript'},
+                       'timings': self._summary(timings)}
+                return
+
+        events = queue.Queue()
+        splitter = SentenceSplitter()
+        clips = []  # (sentence, future) in speaking order
+        executor = ThreadPoolExecutor(max_workers=self.tts_workers, thread_name_prefix='voice-tts')
+        state = {'streamed': False}
+
+        def synthesize(sentence):
+            text = speakable(sentence)
+            if not text:
+                return None
+            audio = self.engine.speak(session, text, audio_format)
+            mark('first_clip_synthesized')
+            return audio
+
+        def submit(sentences):
+            for sentence in sentences:
+                future = executor.submit(synthesize, sentence)
+                clips.append((sentence, future))
+                future.add_done_callback(lambda _: events.put({'type': 'tick'}))
+
+        def on_delta(piece):
+            mark('first_token')
+            state['streamed'] = True
+            events.put({'type': 'delta', 'text': piece})
+            submit(splitter.feed(piece))
+
+        def answer():
+            try:
+                result = self.engine.reply(session, question, on_delta=on_delta)
+            except Exception as e:
+                result = {'text': f"Error: {e}", 'error': 'error'}
+            mark('answered')
+            if not state['streamed'] or result['error']:
+                # Fast-path answers are not streamed, and errors replace what was streamed
+                splitter.flush()
+                submit(splitter.feed((result['text'] or '') + '\n'))
+            submit(splitter.flush())
+            events.put({'type': 'answered', 'result': result})
+
+        threading.Thread(target=answer, name='voice-answer', daemon=True).start()
+        result, delivered = None, 0
+        try:
+            while result is None or delivered < len(clips):
+                event = events.get()
+                if event['type'] == 'delta':
+                    yield event
+                elif event['type'] == 'answered':
+                    result = event['result']
+                while delivered < len(clips) and clips[delivered][1].done():
+                    sentence, future = clips[delivered]
+                    error = future.exception()
+                    audio = None if error else future.result()
+                    if audio:
+                        mark('first_audio')
+                    yield {'type': 'audio', 'index': delivered, 'text': sentence, 'audio': audio,
+                           'format': audio_format,
+                           'seconds': clip_seconds(audio, sentence, audio_format) if audio else 0.0,
+                           'error': str(error) if error else None}
+                    delivered += 1
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        yield {'type': 'done', 'result': result, 'timings': self._summary(timings)}
+
+    def _summary(self, timings):
+        """Stage times in seconds since the recording ended."""
+        started = timings['started']
+        summary = {stage: round(moment - started, 4) for stage, moment in timings.items() if stage != 'started'}
+        summary['mouth_to_ear'] = summary.get('first_audio')
+        return summary
+
+def sequential_turn(engine, session, audio_bytes, clock=time.perf_counter, filename="question.wav"):
+    """
+    The flow voice turns replace: transcribe, answer, then synthesize the whole answer.
+
+    Returns:
+        dict: 'result' (reply result), 'audio' and 'timings' (like VoicePipeline.turn)
+    """
+    started = clock()
+    question = engine.transcribe(session, audio_bytes, filename)
+    transcribed = clock()
+    result = engine.reply(session, question)
+    answered = clock()
+    audio = engine.speak(session, result['text']) if result['text'] else None
+    spoken = clock()
+    return {'result': result, 'audio': audio,
+            'timings': {'transcribed': round(transcribed - started, 4), 'answered': round(answered - started, 4),
+                        'first_audio': round(spoken - started, 4), 'mouth_to_ear': round(spoken - started, 4)}}
+
+def run_benchmark(turns=10, **mock_config):
+    """
+    Times voice turns against sequential turns on the local mock OpenAI server.
+
+    Args:
+        turns (int): Turns per mode
+        **mock_config: Overrides for the mock server (latency_ms, token_delay_ms, ...)
+
+    Returns:
+        dict: Mouth-to-ear and total latencies (p50/p95, seconds) per mode
+    """
+    from chat_engine import build_engine
+    from load_test import _silent_wav, percentile
+    from mock_openai_server import start_mock_server
+
+    server, base_url = start_mock_server(**mock_config)
+    report = {}
+    try:
+        engine = build_engine("mock", base_url=base_url)
+        # Every turn asks the same question; cached speech would hide the synthesis time
+        engine.audio_cache = None
+        pipeline = VoicePipeline(engine)
+        audio = _silent_wav()
+        for mode in ('sequential', 'pipelined'):
+            mouth_to_ear, totals = [], []
+            for turn_number in range(turns):
+                session = engine.new_session()
+                started = time.perf_counter()
+                if mode == 'sequential':
+                    timings = sequential_turn(engine, session, audio)['timings']
+                else:
+                    timings = [event for event in pipeline.turn(session, audio, started=started)
+                               if event['type'] == 'done'][0]['timings']
+                mouth_to_ear.append(timings['mouth_to_ear'] or 0.0)
+                totals.append(time.perf_counter() - started)
+            report[mode] = {
+                'mouth_to_ear_p50': round(percentile(mouth_to_ear, 0.5), 3),
+                'mouth_to_ear_p95': round(percentile(mouth_to_ear, 0.95), 3),
+                'total_p50': round(percentile(totals, 0.5), 3)
+            }
+    finally:
+        server.shutdown()
+    return report
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare pipelined and sequential voice turns on the mock server')
+    parser.add_argument('--bench', action='store_true', help='Run the benchmark')
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--latency-ms', type=int, default=600)
+    parser.add_argument('--token-delay-ms', type=int, default=15)
+    parser.add_argument('--answer-words', type=int, default=60)
+    parser.add_argument('--speech-ms-per-char', type=float, default=1.0)
+    args = parser.parse_args()
+
+    if not args.bench:
+        parser.print_help()
+    else:
+        report = run_benchmark(args.turns, latency_ms=args.latency_ms, token_delay_ms=args.token_delay_ms,
+                               answer_words=args.answer_words, speech_ms_per_char=args.speech_ms_per_char)
+        for mode, stats in report.items():
+            print(f"{mode:11s} mouth-to-ear p50 {stats['mouth_to_ear_p50']:.3f}s  "
+                  f"p95 {stats['mouth_to_ear_p95']:.3f}s  whole turn p50 {stats['total_p50']:.3f}s")
@@ -2,23 +2,30 @@
 Web scraper for retirement community website.
 Extracts daily schedules, menus, and activity information.
 Uses Selenium to handle JavaScript-rendered content.
-Includes caching mechanism to reduce website load (refreshes every 2 weeks).
+Includes caching mechanism to reduce website load (refreshes daily by default).
+Each refresh is diffed section-by-section against the previous snapshot so only
+the days and tables that actually changed are updated and reported.
+
+Selenium, webdriver-manager and BeautifulSoup are imported on first use, so
+importing this module (to read the cache) stays cheap.
 """
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urldefrag, urlsplit, urlunsplit, parse_qsl, urlencode
+import importlib.util
+import shutil
+import threading
 import re
 import json
 import os
 import time
 import glob
+import hashlib
+
+import cache_io
+from event_parser import DAY_HEADER_PATTERN  # "FRIDAY OCT 31, 2025" day headers, shared with the schedule parser
+import shared_store
 
 # Target website URL
 web_link = "https://a.mwapp.net/p/mweb_ws.v?id=82352517&c=82352665&n=Main"
@@ -28,10 +35,239 @@ LOGIN_USER = os.getenv('RETIREMENT_SITE_USER', '')
 LOGIN_PASS = os.getenv('RETIREMENT_SITE_PASS', '')
 
 # Cache settings
-CACHE_FILE = os.path.join(os.path.dirname(__file__), 'community_data_cache.json')
-CACHE_DURATION_DAYS = 14  # 2 weeks
+CACHE_ENCODING = os.getenv('SCRAPER_CACHE_ENCODING', cache_io.ENCODING_JSON).lower()  # 'json' or 'gzip'
+CACHE_FILE = os.path.join(os.path.dirname(__file__),
+                          'community_data_cache.json' + ('.gz' if CACHE_ENCODING == cache_io.ENCODING_GZIP else ''))
+CACHE_DURATION_HOURS = float(os.getenv('SCRAPER_CACHE_HOURS', '24'))  # Schedules change daily
+
+# Only one process scrapes at a time; others wait for its result
+SCRAPE_LOCK_FILE = os.path.join(os.path.dirname(__file__), 'community_data_cache.lock')
+SCRAPE_LOCK_TIMEOUT = 180  # seconds
+
+# Replicas on other hosts share snapshots (and the scrape lease) through the
+# shared store; on one host the cache file already serves every process
+SHARED_SNAPSHOTS = os.getenv('SCRAPER_SHARED_SNAPSHOTS',
+                             'true' if shared_store.STORE_BACKEND != 'sqlite' else 'false').lower() == 'true'
+SNAPSHOT_KEY = 'schedule:snapshot'
+SNAPSHOT_VERSION_KEY = 'schedule:scraped_at'  # Small key checked before fetching the snapshot
+SCRAPE_LEASE_KEY = 'lease:scrape'
+_shared_snapshot = None  # Last snapshot fetched from the shared store
+
+# Change log of what moved between scrapes (one JSON object per line)
+CHANGE_LOG_FILE = os.path.join(os.path.dirname(__file__), 'community_data_changes.jsonl')
+MAX_DIFF_LINES = 20  # Lines kept per changed section in the change log
+
+# Crawler settings: follow whitelisted links from the main page (day, week and
+# menu pages) with a depth limit and a cap on pages loading in parallel
+CRAWL_ENABLED = os.getenv('SCRAPER_CRAWL', 'false').lower() == 'true'
+CRAWL_MAX_DEPTH = int(os.getenv('SCRAPER_CRAWL_DEPTH', '2'))
+CRAWL_MAX_WORKERS = int(os.getenv('SCRAPER_CRAWL_WORKERS', '3'))
+CRAWL_ALLOWED_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in os.getenv('SCRAPER_CRAWL_PATTERNS', r'day|week|month|calendar|schedule|event|menu|dining').split(',')
+    if pattern.strip()
+]
+
+# Each section of the page text (a schedule day or the general block) is cut
+# to this many characters in the prompt; the snapshot itself is kept whole
+PROMPT_SECTION_MAX_CHARS = int(os.getenv('SCRAPER_PROMPT_SECTION_CHARS', '2000'))
+
+# Local chromedriver for offline runs (default: the one on PATH); see create_driver
+CHROMEDRIVER_PATH = os.getenv('CHROMEDRIVER_PATH', '')
+
+# Packages the scraper needs (imported lazily)
+SCRAPER_DEPENDENCIES = ('selenium', 'webdriver_manager', 'bs4')
+
+def scraper_available():
+    """Returns True if the scraping packages are installed, without importing them."""
+    return all(importlib.util.find_spec(name) is not None for name in SCRAPER_DEPENDENCIES)
+
+def create_driver(timeout=20, offline=False):
+    """
+    Starts a headless Chrome driver.
+    
+    Args:
+        timeout (int): Page load timeout in seconds
+        offline (bool): Use a local chromedriver (CHROMEDRIVER_PATH or PATH)
+                        instead of downloading one, and block every host but
+                        127.0.0.1 (for replaying recorded pages)
+        
+    Returns:
+        WebDriver: Configured Chrome driver (caller must quit it)
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
+    # Set up Chrome options for headless browsing
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')  # Run in background
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    
+    if offline:
+        # Fonts, images and trackers on other hosts would make replays depend on the network
+        chrome_options.add_argument('--host-resolver-rules=MAP * ~NOTFOUND, EXCLUDE 127.0.0.1')
+        driver_path = CHROMEDRIVER_PATH or shutil.which('chromedriver')
+        if not driver_path:
+            raise Exception("No local chromedriver found. Set CHROMEDRIVER_PATH or put chromedriver on PATH.")
+        print("  → Initializing browser (offline)...")
+        driver = webdriver.Chrome(service=Service(driver_path), options=chrome_options)
+        driver.set_page_load_timeout(timeout)
+        return driver
+    
+    from webdriver_manager.chrome import ChromeDriverManager
+    
+    # Initialize the Chrome driver with automatic driver management
+    print("  → Initializing browser...")
+    try:
+        # Try to use webdriver-manager
+        driver_path = ChromeDriverManager().install()
+        # Ensure we're using the actual chromedriver executable
+        if 'THIRD_PARTY' in driver_path or not driver_path.endswith('chromedriver'):
+            # Fix the path if it points to the wrong file
+            driver_dir = os.path.dirname(driver_path)
+            # Look for the actual chromedriver executable
+            possible_paths = glob.glob(os.path.join(driver_dir, '**/chromedriver'), recursive=True)
+            if possible_paths:
+                driver_path = possible_paths[0]
+        service = Service(driver_path)
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+    except Exception as e:
+        # If webdriver-manager fails, try to use system chromedriver
+        print(f"  → Webdriver-manager failed ({str(e)}), trying system chromedriver...")
+        try:
+            driver = webdriver.Chrome(options=chrome_options)
+        except:
+            raise Exception(f"Could not initialize Chrome. Please install Chrome and chromedriver. Error: {str(e)}")
+    
+    # Set page load timeout
+    driver.set_page_load_timeout(timeout)
+    return driver
+
+def log_in_if_configured(driver):
+    """Fills in the login form if credentials are provided via environment variables."""
+    if not (LOGIN_USER and LOGIN_PASS):
+        return
+    from selenium.webdriver.common.by import By
+    try:
+        print("  → Attempting to log in...")
+        # Wait for login form
+        time.sleep(2)
+        # Try to find and fill login fields (adjust selectors as needed)
+        try:
+            user_field = driver.find_element(By.NAME, "userid")  # or By.ID, By.CSS_SELECTOR
+            pass_field = driver.find_element(By.NAME, "password")
+            user_field.send_keys(LOGIN_USER)
+            pass_field.send_keys(LOGIN_PASS)
+            # Submit form
+            pass_field.submit()
+            time.sleep(3)
+            print("  → Logged in successfully")
+        except Exception as login_err:
+            print(f"  → Login failed: {str(login_err)}")
+    except:
+        pass
+
+def wait_for_dynamic_content(driver):
+    """Waits for the page body, then scrolls to trigger lazy-loaded content."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
 
-def scrape_retirement_community_info(url=web_link, timeout=20):
+    print("  → Waiting for dynamic content to load...")
+    try:
+        # Wait for body to be present
+        WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.TAG_NAME, "body"))
+        )
+        
+        # Scroll down to trigger lazy-loaded content
+        print("  → Scrolling to load dynamic content...")
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
+        time.sleep(2)
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        time.sleep(2)
+        
+        # Scroll back up
+        driver.execute_script("window.scrollTo(0, 0);")
+        time.sleep(2)
+        
+        # Give JavaScript time to finish loading all content
+        time.sleep(3)
+        
+        print("  → Content loaded")
+    except Exception as e:
+        print(f"  → Warning: {str(e)}")
+        time.sleep(5)
+
+def parse_page_source(page_source, url):
+    """
+    Extracts text, links, headings and tables from a rendered page.
+    
+    Args:
+        page_source (str): Fully rendered HTML
+        url (str): URL the page was loaded from
+        
+    Returns:
+        dict: Dictionary containing scraped information
+    """
+    from bs4 import BeautifulSoup
+
+    # Parse the HTML content with BeautifulSoup
+    soup = BeautifulSoup(page_source, 'html.parser')
+    
+    # Extract all text content
+    text_content = soup.get_text(separator='\n', strip=True)
+    
+    # Extract specific sections if they exist
+    result = {
+        'url': url,
+        'scraped_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'title': soup.title.string if soup.title else "No title found",
+        'full_text': text_content,
+        'links': [],
+        'headings': [],
+        'tables': []
+    }
+    
+    # Extract all links
+    for link in soup.find_all('a', href=True):
+        link_text = link.get_text(strip=True)
+        if link_text:
+            result['links'].append({
+                'text': link_text,
+                'href': link['href']
+            })
+    
+    # Extract all headings
+    for heading_level in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
+        for heading in soup.find_all(heading_level):
+            heading_text = heading.get_text(strip=True)
+            if heading_text:
+                result['headings'].append({
+                    'level': heading_level,
+                    'text': heading_text
+                })
+    
+    # Extract tables (often used for schedules/menus)
+    for table in soup.find_all('table'):
+        table_data = []
+        rows = table.find_all('tr')
+        for row in rows:
+            cells = row.find_all(['td', 'th'])
+            row_data = [cell.get_text(strip=True) for cell in cells]
+            if any(row_data):  # Only add non-empty rows
+                table_data.append(row_data)
+        if table_data:
+            result['tables'].append(table_data)
+    
+    return result
+
+def scrape_retirement_community_info(url=web_link, timeout=20, driver=None):
     """
     Scrapes information from the retirement community website using Selenium.
     This allows us to capture JavaScript-rendered content like event listings.
@@ -39,152 +275,29 @@ def scrape_retirement_community_info(url=web_link, timeout=20):
     Args:
         url (str): The URL to scrape
         timeout (int): Maximum wait time in seconds
+        driver (WebDriver): Existing driver to reuse (left open); a new one is
+                            started and closed if not given
         
     Returns:
         dict: Dictionary containing scraped information
     """
-    driver = None
+    owns_driver = driver is None
     try:
-        # Set up Chrome options for headless browsing
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')  # Run in background
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-        
-        # Initialize the Chrome driver with automatic driver management
-        print("  → Initializing browser...")
-        try:
-            # Try to use webdriver-manager
-            driver_path = ChromeDriverManager().install()
-            # Ensure we're using the actual chromedriver executable
-            if 'THIRD_PARTY' in driver_path or not driver_path.endswith('chromedriver'):
-                # Fix the path if it points to the wrong file
-                import glob
-                driver_dir = os.path.dirname(driver_path)
-                # Look for the actual chromedriver executable
-                possible_paths = glob.glob(os.path.join(driver_dir, '**/chromedriver'), recursive=True)
-                if possible_paths:
-                    driver_path = possible_paths[0]
-            service = Service(driver_path)
-            driver = webdriver.Chrome(service=service, options=chrome_options)
-        except Exception as e:
-            # If webdriver-manager fails, try to use system chromedriver
-            print(f"  → Webdriver-manager failed ({str(e)}), trying system chromedriver...")
-            try:
-                driver = webdriver.Chrome(options=chrome_options)
-            except:
-                raise Exception(f"Could not initialize Chrome. Please install Chrome and chromedriver. Error: {str(e)}")
-        
-        # Set page load timeout
-        driver.set_page_load_timeout(timeout)
+        if owns_driver:
+            driver = create_driver(timeout)
         
         # Navigate to the URL
         print(f"  → Loading {url}...")
         driver.get(url)
         
         # Check if login is required and credentials are provided
-        if LOGIN_USER and LOGIN_PASS:
-            try:
-                print("  → Attempting to log in...")
-                # Wait for login form
-                time.sleep(2)
-                # Try to find and fill login fields (adjust selectors as needed)
-                try:
-                    user_field = driver.find_element(By.NAME, "userid")  # or By.ID, By.CSS_SELECTOR
-                    pass_field = driver.find_element(By.NAME, "password")
-                    user_field.send_keys(LOGIN_USER)
-                    pass_field.send_keys(LOGIN_PASS)
-                    # Submit form
-                    pass_field.submit()
-                    time.sleep(3)
-                    print("  → Logged in successfully")
-                except Exception as login_err:
-                    print(f"  → Login failed: {str(login_err)}")
-            except:
-                pass
+        log_in_if_configured(driver)
         
         # Wait for dynamic content to load
-        print("  → Waiting for dynamic content to load...")
-        try:
-            # Wait for body to be present
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            
-            # Scroll down to trigger lazy-loaded content
-            print("  → Scrolling to load dynamic content...")
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
-            time.sleep(2)
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
-            
-            # Scroll back up
-            driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(2)
-            
-            # Give JavaScript time to finish loading all content
-            time.sleep(3)
-            
-            print("  → Content loaded")
-        except Exception as e:
-            print(f"  → Warning: {str(e)}")
-            time.sleep(5)
+        wait_for_dynamic_content(driver)
         
         # Get the fully rendered page source
-        page_source = driver.page_source
-        
-        # Parse the HTML content with BeautifulSoup
-        soup = BeautifulSoup(page_source, 'html.parser')
-        
-        # Extract all text content
-        text_content = soup.get_text(separator='\n', strip=True)
-        
-        # Extract specific sections if they exist
-        result = {
-            'url': url,
-            'scraped_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'title': soup.title.string if soup.title else "No title found",
-            'full_text': text_content,
-            'links': [],
-            'headings': [],
-            'tables': []
-        }
-        
-        # Extract all links
-        for link in soup.find_all('a', href=True):
-            link_text = link.get_text(strip=True)
-            if link_text:
-                result['links'].append({
-                    'text': link_text,
-                    'href': link['href']
-                })
-        
-        # Extract all headings
-        for heading_level in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-            for heading in soup.find_all(heading_level):
-                heading_text = heading.get_text(strip=True)
-                if heading_text:
-                    result['headings'].append({
-                        'level': heading_level,
-                        'text': heading_text
-                    })
-        
-        # Extract tables (often used for schedules/menus)
-        for table in soup.find_all('table'):
-            table_data = []
-            rows = table.find_all('tr')
-            for row in rows:
-                cells = row.find_all(['td', 'th'])
-                row_data = [cell.get_text(strip=True) for cell in cells]
-                if any(row_data):  # Only add non-empty rows
-                    table_data.append(row_data)
-            if table_data:
-                result['tables'].append(table_data)
-        
-        return result
+        return parse_page_source(driver.page_source, url)
         
     except Exception as e:
         error_msg = f'Scraping failed: {str(e)}'
@@ -195,14 +308,220 @@ def scrape_retirement_community_info(url=web_link, timeout=20):
             'scraped_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
     finally:
-        # Always close the browser
-        if driver:
+        # Always close the browser we started
+        if owns_driver and driver:
             try:
                 driver.quit()
                 print("  → Browser closed")
             except:
                 pass
 
+def canonicalize_url(href, base_url=web_link):
+    """
+    Resolves a link against the page it came from and normalizes it so the
+    same page reached through different links is only fetched once.
+    
+    Args:
+        href (str): Link target, possibly relative
+        base_url (str): URL of the page containing the link
+        
+    Returns:
+        str: Absolute URL with lower-case scheme/host, sorted query
+             parameters and no fragment
+    """
+    absolute, _ = urldefrag(urljoin(base_url, href.strip()))
+    parts = urlsplit(absolute)
+    path = parts.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ''))
+
+def is_crawlable_link(url, link_text, start_url=web_link, allowed_patterns=CRAWL_ALLOWED_PATTERNS):
+    """
+    Checks whether a link should be followed: it must stay on the community
+    site and its URL or text must match one of the whitelisted patterns.
+    
+    Args:
+        url (str): Canonical link URL
+        link_text (str): Visible link text
+        start_url (str): URL the crawl started from
+        allowed_patterns (list): Compiled regular expressions
+        
+    Returns:
+        bool: True if the link should be crawled
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or parts.netloc != urlsplit(start_url).netloc.lower():
+        return False
+    return any(pattern.search(url) or pattern.search(link_text) for pattern in allowed_patterns)
+
+def _day_sort_key(day_key):
+    """Sorts "day:FRIDAY OCT 31, 2025" section keys chronologically (unparseable keys last)."""
+    header = day_key.split(':', 1)[1].replace('.', '').title()
+    for fmt in ("%A %b %d, %Y", "%A %B %d, %Y", "%A %b %d %Y", "%A %B %d %Y"):
+        try:
+            return (0, datetime.strptime(header, fmt))
+        except ValueError:
+            continue
+    return (1, datetime.max)
+
+def merge_crawl_results(pages, start_url=web_link):
+    """
+    Merges the pages of a crawl into one schedule snapshot. Day sections that
+    appear on several pages (e.g. a day page and a week page) are kept once,
+    preferring the most complete copy; tables, headings and links are deduped.
+    
+    Args:
+        pages (list): Successfully scraped page dicts, start page first
+        start_url (str): URL the crawl started from
+        
+    Returns:
+        dict: Snapshot in the same shape as scrape_retirement_community_info
+    """
+    general_blocks = []
+    day_sections = {}
+    tables, headings, links = [], [], []
+    seen_tables, seen_headings, seen_links = set(), set(), set()
+    
+    for page in pages:
+        sections = split_into_sections(page)
+        # Text outside day sections (e.g. a dining menu page) is kept per page
+        if sections.get('general') and sections['general'] not in general_blocks:
+            general_blocks.append(sections['general'])
+        for key, text in sections.items():
+            if key.startswith('day:') and len(text) > len(day_sections.get(key, '')):
+                day_sections[key] = text
+        for table in page.get('tables', []):
+            table_key = json.dumps(table)
+            if table_key not in seen_tables:
+                seen_tables.add(table_key)
+                tables.append(table)
+        for heading in page.get('headings', []):
+            if heading['text'] not in seen_headings:
+                seen_headings.add(heading['text'])
+                headings.append(heading)
+        for link in page.get('links', []):
+            link_key = (link['text'], link['href'])
+            if link_key not in seen_links:
+                seen_links.add(link_key)
+                links.append(link)
+    
+    text_blocks = list(general_blocks)
+    for key in sorted(day_sections, key=_day_sort_key):
+        text_blocks.append(key.split(':', 1)[1] + '\n' + day_sections[key])
+    
+    return {
+        'url': start_url,
+        'scraped_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'title': pages[0].get('title', "No title found") if pages else "No title found",
+        'full_text': '\n'.join(text_blocks),
+        'links': links,
+        'headings': headings,
+        'tables': tables
+    }
+
+def crawl_community_site(start_url=web_link, max_depth=CRAWL_MAX_DEPTH, max_workers=CRAWL_MAX_WORKERS,
+                         allowed_patterns=CRAWL_ALLOWED_PATTERNS, timeout=20, fetch_page=None):
+    """
+    Crawls the community site breadth-first from the start page, following
+    whitelisted links up to `max_depth`, with at most `max_workers` pages
+    loading in parallel (each worker thread reuses its own browser).
+    
+    Args:
+        start_url (str): First page to load
+        max_depth (int): How many links away from the start page to follow
+        max_workers (int): Maximum number of pages fetched concurrently
+        allowed_patterns (list): Compiled regexes a link URL or text must match
+        timeout (int): Page load timeout in seconds
+        fetch_page (callable): Optional fetcher(url, driver) -> page dict,
+                               defaults to scrape_retirement_community_info
+        
+    Returns:
+        dict: Merged snapshot with a 'crawl' report of per-page timings and failures
+    """
+    worker_state = threading.local()
+    drivers = []
+    drivers_lock = threading.Lock()
+    
+    def fetch(url):
+        """Loads one page on this worker thread's browser and times it."""
+        started = time.perf_counter()
+        try:
+            if fetch_page is not None:
+                page = fetch_page(url, None)
+            else:
+                if getattr(worker_state, 'driver', None) is None:
+                    worker_state.driver = create_driver(timeout)
+                    with drivers_lock:
+                        drivers.append(worker_state.driver)
+                page = scrape_retirement_community_info(url, timeout=timeout, driver=worker_state.driver)
+        except Exception as e:
+            page = {'error': f'Scraping failed: {str(e)}', 'url': url}
+        return page, round(time.perf_counter() - started, 3)
+    
+    crawl_started = time.perf_counter()
+    start = canonicalize_url(start_url, start_url)
+    seen = {start}
+    frontier = [start]
+    pages, report = [], []
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for depth in range(max_depth + 1):
+                if not frontier:
+                    break
+                print(f"  → Crawling depth {depth}: {len(frontier)} page(s)")
+                next_frontier = []
+                for url, (page, duration) in zip(frontier, executor.map(fetch, frontier)):
+                    entry = {'url': url, 'depth': depth, 'duration_seconds': duration}
+                    if 'error' in page:
+                        entry.update({'status': 'failed', 'error': page['error']})
+                        report.append(entry)
+                        continue
+                    entry['status'] = 'ok'
+                    report.append(entry)
+                    pages.append(page)
+                    if depth == max_depth:
+                        continue
+                    for link in page.get('links', []):
+                        link_url = canonicalize_url(link['href'], url)
+                        if link_url not in seen and is_crawlable_link(link_url, link['text'], start_url, allowed_patterns):
+                            seen.add(link_url)
+                            next_frontier.append(link_url)
+                frontier = next_frontier
+    finally:
+        for driver in drivers:
+            try:
+                driver.quit()
+            except:
+                pass
+    
+    failures = [entry for entry in report if entry['status'] == 'failed']
+    if not pages:
+        return {
+            'error': f"Crawl failed: no pages could be loaded ({failures[0]['error'] if failures else 'no pages'})",
+            'url': start_url,
+            'scraped_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'crawl': {'pages': report}
+        }
+    
+    snapshot = merge_crawl_results(pages, start_url)
+    snapshot['crawl'] = {
+        'pages': report,
+        'pages_fetched': len(pages),
+        'failures': len(failures),
+        'duration_seconds': round(time.perf_counter() - crawl_started, 3)
+    }
+    print(f"  → Crawled {len(pages)} page(s), {len(failures)} failure(s) in {snapshot['crawl']['duration_seconds']}s")
+    return snapshot
+
+def scrape_community_site():
+    """Scrapes the community site, crawling linked pages when CRAWL_ENABLED is set."""
+    if CRAWL_ENABLED:
+        return crawl_community_site(max_depth=CRAWL_MAX_DEPTH, max_workers=CRAWL_MAX_WORKERS)
+    return scrape_retirement_community_info()
+
 def format_scraped_content_for_prompt(scraped_data):
     """
     Formats scraped data into a readable string for use in system prompts.
@@ -239,42 +558,282 @@ Last Updated: {scraped_data['scraped_at']}
                 formatted_text += " | ".join(row) + "\n"
         formatted_text += "\n"
     
-    # Add main content (truncated for token limits)
+    # Add main content, truncated per section so every day of a crawl is kept
     if scraped_data.get('full_text'):
-        full_text = scraped_data['full_text']
-        # Truncate to reasonable length
-        max_length = 2000
-        if len(full_text) > max_length:
-            full_text = full_text[:max_length] + "..."
-        formatted_text += f"FULL CONTENT:\n{full_text}\n"
+        blocks = []
+        for key, text in split_into_sections({'full_text': scraped_data['full_text']}).items():
+            if len(text) > PROMPT_SECTION_MAX_CHARS:
+                text = text[:PROMPT_SECTION_MAX_CHARS] + "..."
+            blocks.append(text if key == 'general' else key.split(':', 1)[1] + '\n' + text)
+        formatted_text += "FULL CONTENT:\n" + '\n'.join(blocks) + "\n"
     
     formatted_text += "\n=== END OF COMMUNITY INFORMATION ===\n"
     
     return formatted_text
 
-def load_cache():
+def _hash_text(text):
+    """Returns a short, stable content hash for a block of text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+def split_into_sections(scraped_data):
+    """
+    Splits scraped data into independently hashable sections.
+    Each schedule day becomes its own section, as does every table, so a
+    refresh can tell exactly which days or tables changed.
+    
+    Args:
+        scraped_data (dict): Dictionary containing scraped information
+        
+    Returns:
+        dict: Mapping of section key -> section text
+    """
+    section_lines = {'general': []}
+    current_key = 'general'
+    
+    for line in scraped_data.get('full_text', '').split('\n'):
+        stripped = line.strip()
+        if DAY_HEADER_PATTERN.match(stripped):
+            current_key = f"day:{stripped.lstrip('.').upper()}"
+            section_lines.setdefault(current_key, [])
+            continue
+        if stripped:
+            section_lines[current_key].append(stripped)
+    
+    sections = {key: '\n'.join(lines) for key, lines in section_lines.items() if lines}
+    
+    for i, table in enumerate(scraped_data.get('tables', []), 1):
+        sections[f"table:{i}"] = '\n'.join(" | ".join(row) for row in table)
+    
+    headings = [heading['text'] for heading in scraped_data.get('headings', [])]
+    if headings:
+        sections['headings'] = '\n'.join(headings)
+    
+    return sections
+
+def build_section_records(sections, updated_at):
+    """
+    Wraps section texts into records carrying their content hash. The text is
+    only needed for diffing; stored records keep just the hash and timestamp
+    (see stored_section_records).
+    
+    Args:
+        sections (dict): Mapping of section key -> section text
+        updated_at (str): Timestamp to record for the sections
+        
+    Returns:
+        dict: Mapping of section key -> {'hash', 'text', 'updated_at'}
+    """
+    return {
+        key: {'hash': _hash_text(text), 'text': text, 'updated_at': updated_at}
+        for key, text in sections.items()
+    }
+
+def diff_sections(old_records, new_records):
+    """
+    Compares two sets of section records by content hash.
+    
+    Args:
+        old_records (dict): Section records from the previous snapshot
+        new_records (dict): Section records from the fresh scrape
+        
+    Returns:
+        dict: Keys that were added, removed or changed, with the lines that
+              moved inside each changed section
+    """
+    added = [key for key in new_records if key not in old_records]
+    removed = [key for key in old_records if key not in new_records]
+    changed = []
+    
+    for key, record in new_records.items():
+        old_record = old_records.get(key)
+        if old_record is None or old_record['hash'] == record['hash']:
+            continue
+        old_lines = old_record['text'].split('\n')
+        new_lines = record['text'].split('\n')
+        old_set, new_set = set(old_lines), set(new_lines)
+        changed.append({
+            'key': key,
+            'added_lines': [line for line in new_lines if line not in old_set][:MAX_DIFF_LINES],
+            'removed_lines': [line for line in old_lines if line not in new_set][:MAX_DIFF_LINES]
+        })
+    
+    return {
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+        'unchanged': len(new_records) - len(added) - len(changed)
+    }
+
+def has_changes(diff):
+    """Returns True if a section diff contains any added, removed or changed section."""
+    return bool(diff['added'] or diff['removed'] or diff['changed'])
+
+def changed_section_keys(diff):
+    """Returns every section key touched by a diff."""
+    return diff['added'] + diff['removed'] + [entry['key'] for entry in diff['changed']]
+
+def merge_section_records(old_records, new_records, keep_missing=False):
+    """
+    Merges fresh section records into the previous ones.
+    Unchanged sections keep their original record (and 'updated_at'), so only
+    the sections that actually changed are rewritten.
+    
+    Args:
+        old_records (dict): Section records from the previous snapshot
+        new_records (dict): Section records from the fresh scrape
+        keep_missing (bool): Keep previous day sections the fresh scrape does
+                             not have (a crawl page that held them failed)
+        
+    Returns:
+        dict: Merged section records
+    """
+    merged = {}
+    for key, record in new_records.items():
+        old_record = old_records.get(key)
+        if old_record is not None and old_record['hash'] == record['hash']:
+            merged[key] = old_record
+        else:
+            merged[key] = record
+    if keep_missing:
+        for key, record in old_records.items():
+            if key not in merged and key.startswith('day:'):
+                merged[key] = record
+    return merged
+
+def stored_section_records(records):
+    """Returns section records without their text, which the snapshot's full_text, tables and headings already hold."""
+    return {key: {'hash': record['hash'], 'updated_at': record['updated_at']} for key, record in records.items()}
+
+def previous_section_records(previous):
+    """
+    Returns the section records of a cached snapshot with their text, rebuilt
+    from the snapshot's own content.
+    
+    Args:
+        previous (dict or None): Previously cached snapshot
+        
+    Returns:
+        dict: Mapping of section key -> {'hash', 'text', 'updated_at'}
+    """
+    if not previous:
+        return {}
+    texts = split_into_sections(previous)
+    return {
+        key: dict(record, text=texts.get(key, record.get('text', '')))
+        for key, record in previous.get('sections', {}).items()
+    }
+
+def compute_content_hash(records):
+    """Returns a single hash identifying the whole snapshot, derived from its section hashes."""
+    combined = '\n'.join(f"{key}:{records[key]['hash']}" for key in sorted(records))
+    return _hash_text(combined)
+
+def record_changes(diff, scraped_at):
+    """
+    Appends a summary of a refresh to the change log.
+    
+    Args:
+        diff (dict): Section diff produced by diff_sections
+        scraped_at (str): Timestamp of the fresh scrape
+    """
+    entry = {'scraped_at': scraped_at}
+    entry.update(diff)
+    try:
+        with open(CHANGE_LOG_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    except Exception as e:
+        print(f"✗ Error writing change log: {e}")
+
+def load_change_log(limit=10):
     """
-    Loads cached data from file if it exists and is recent enough.
+    Loads the most recent change log entries.
+    
+    Args:
+        limit (int): Maximum number of entries to return
+        
+    Returns:
+        list: Change log entries, oldest first
+    """
+    if not os.path.exists(CHANGE_LOG_FILE):
+        return []
+    try:
+        with open(CHANGE_LOG_FILE, 'r', encoding='utf-8') as f:
+            lines = [line for line in f if line.strip()]
+        return [json.loads(line) for line in lines[-limit:]]
+    except Exception as e:
+        print(f"✗ Error reading change log: {e}")
+        return []
+
+def is_cache_fresh(cache):
+    """Returns True if the cached data is younger than CACHE_DURATION_HOURS."""
+    cached_time = datetime.strptime(cache['scraped_at'], "%Y-%m-%d %H:%M:%S")
+    return datetime.now() - cached_time < timedelta(hours=CACHE_DURATION_HOURS)
+
+def load_shared_snapshot():
+    """
+    Returns the newest snapshot in the shared store (None if there is none or
+    the store is unreachable). The snapshot is only fetched when its
+    scraped_at version changed, so the returned dict is shared and must not
+    be modified.
+    """
+    global _shared_snapshot
+    try:
+        store = shared_store.get_store()
+        version = store.get(SNAPSHOT_VERSION_KEY)
+        if version is None:
+            return None
+        if _shared_snapshot is None or _shared_snapshot.get('scraped_at') != version.decode('utf-8'):
+            _shared_snapshot = store.get_json(SNAPSHOT_KEY)
+        return _shared_snapshot
+    except Exception as e:
+        print(f"✗ Error reading shared snapshot: {e}")
+        return None
+
+def save_shared_snapshot(data):
+    """Publishes a snapshot to the shared store for replicas on other hosts."""
+    try:
+        store = shared_store.get_store()
+        store.set_json(SNAPSHOT_KEY, data, encoding=CACHE_ENCODING)
+        store.set(SNAPSHOT_VERSION_KEY, data['scraped_at'].encode('utf-8'))
+        print("✓ Snapshot shared with other replicas")
+    except Exception as e:
+        print(f"✗ Error sharing snapshot: {e}")
+
+def load_cache(allow_expired=False):
+    """
+    Loads cached data from file (or, with SHARED_SNAPSHOTS, the newer of the
+    file and the shared store) if it exists and is recent enough.
+    The parsed file is kept in memory and only re-read when its mtime changes,
+    so the returned dict is shared and must not be modified.
+    
+    Args:
+        allow_expired (bool): If True, returns the cache even when it is older
+                              than CACHE_DURATION_HOURS (used for diffing)
     
     Returns:
         dict or None: Cached data if valid, None if cache is invalid or doesn't exist
     """
     try:
-        if not os.path.exists(CACHE_FILE):
+        cache = cache_io.read_json(CACHE_FILE)
+        if SHARED_SNAPSHOTS:
+            shared = load_shared_snapshot()
+            if shared is not None and (cache is None or shared['scraped_at'] > cache['scraped_at']):
+                cache = shared
+        if cache is None:
             return None
         
-        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-            cache = json.load(f)
+        if allow_expired:
+            return cache
         
         # Check if cache is still valid
         cached_time = datetime.strptime(cache['scraped_at'], "%Y-%m-%d %H:%M:%S")
         age = datetime.now() - cached_time
         
-        if age.days < CACHE_DURATION_DAYS:
+        if is_cache_fresh(cache):
             print(f"✓ Using cached data (age: {age.days} days, {age.seconds // 3600} hours)")
             return cache
         else:
-            print(f"✗ Cache expired (age: {age.days} days)")
+            print(f"✗ Cache expired (age: {age.days} days, {age.seconds // 3600} hours)")
             return None
             
     except Exception as e:
@@ -283,23 +842,31 @@ def load_cache():
 
 def save_cache(data):
     """
-    Saves scraped data to cache file.
+    Saves scraped data to cache file atomically (write to a temporary file,
+    then rename), using the configured CACHE_ENCODING, and publishes it to
+    the shared store when SHARED_SNAPSHOTS is on.
+    The whole snapshot is rewritten: it is a single file of a few hundred KB
+    at most (section records hold only hashes, not a second copy of the
+    text), written at most once per scrape, and the rename keeps readers
+    from ever seeing a half-written file.
     
     Args:
         data (dict): Scraped data to cache
     """
     try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        cache_io.write_json(CACHE_FILE, data, encoding=CACHE_ENCODING)
         print(f"✓ Data cached to: {CACHE_FILE}")
     except Exception as e:
         print(f"✗ Error saving cache: {e}")
+    if SHARED_SNAPSHOTS:
+        save_shared_snapshot(data)
 
 def clear_cache():
     """
     Deletes the cache file, forcing a fresh scrape on next request.
     """
     try:
+        cache_io.forget(CACHE_FILE)
         if os.path.exists(CACHE_FILE):
             os.remove(CACHE_FILE)
             print("✓ Cache cleared successfully")
@@ -311,6 +878,115 @@ def clear_cache():
         print(f"✗ Error clearing cache: {e}")
         return False
 
+def apply_scrape(scraped_data, previous=None):
+    """
+    Diffs a fresh scrape against the previous snapshot, merges the changed
+    sections, saves the cache and records the change log. Derived data (the
+    compact schedule, the event index) is keyed on the schedule text, so it
+    picks up the new snapshot without being told.
+    
+    Args:
+        scraped_data (dict): Successfully scraped data
+        previous (dict or None): Previously cached snapshot, if any
+        
+    Returns:
+        tuple: (snapshot dict, section diff dict)
+    """
+    old_records = previous_section_records(previous)
+    new_records = build_section_records(split_into_sections(scraped_data), scraped_data['scraped_at'])
+    partial = bool(scraped_data.get('crawl', {}).get('failures'))
+    merged = merge_section_records(old_records, new_records, keep_missing=partial)
+    kept = sorted((key for key in merged if key not in new_records), key=_day_sort_key)
+    if kept:
+        # Days only a failed page had are served from the previous snapshot, not reported as removed
+        new_records = dict(new_records, **{key: merged[key] for key in kept})
+        scraped_data['full_text'] += ''.join(f"\n{key.split(':', 1)[1]}\n{merged[key]['text']}" for key in kept)
+        print(f"  → Kept {len(kept)} day section(s) from the last snapshot after page failures")
+    diff = diff_sections(old_records, new_records)
+    
+    scraped_data['sections'] = stored_section_records(merged)
+    scraped_data['content_hash'] = compute_content_hash(scraped_data['sections'])
+    save_cache(scraped_data)
+    record_changes(diff, scraped_data['scraped_at'])
+    
+    if has_changes(diff):
+        print(f"✓ {len(changed_section_keys(diff))} section(s) changed, {diff['unchanged']} unchanged")
+    else:
+        print(f"✓ No changes since last scrape ({diff['unchanged']} sections)")
+    
+    return scraped_data, diff
+
+def refresh_community_data(force_refresh=True):
+    """
+    Scrapes fresh data while holding the inter-process scrape lock (and, with
+    SHARED_SNAPSHOTS, the scrape lease in the shared store, which covers
+    replicas on other hosts), so only one process scrapes at a time. A process
+    that had to wait reuses the snapshot the holder just wrote instead of
+    scraping again.
+    
+    Args:
+        force_refresh (bool): If False, a fresh cache found after taking the
+                              lock is returned without scraping
+        
+    Returns:
+        tuple: (data dict, section diff dict or None if nothing was applied)
+    """
+    requested_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    lock = cache_io.FileLock(SCRAPE_LOCK_FILE)
+    lease = None
+    if lock.acquire(timeout=SCRAPE_LOCK_TIMEOUT) and SHARED_SNAPSHOTS:
+        lease = _acquire_scrape_lease()
+        if lease is None:
+            lock.release()
+    if not lock.locked:
+        # Another process is still scraping - serve whatever we have
+        previous = load_cache(allow_expired=True)
+        if previous is not None:
+            print("✗ Timed out waiting for another scrape, using last snapshot")
+            return previous, None
+        return {'error': 'Timed out waiting for another process to finish scraping',
+                'url': web_link, 'scraped_at': requested_at}, None
+    
+    try:
+        previous = load_cache(allow_expired=True)
+        if previous is not None:
+            # Someone refreshed while we were waiting for the lock
+            refreshed_meanwhile = previous['scraped_at'] >= requested_at
+            if refreshed_meanwhile or (not force_refresh and is_cache_fresh(previous)):
+                print(f"✓ Using data refreshed by another process ({previous['scraped_at']})")
+                return previous, None
+        
+        print("⟳ Scraping fresh data from website...")
+        scraped_data = scrape_community_site()
+        
+        # Only cache if scraping was successful
+        if 'error' in scraped_data:
+            return scraped_data, None
+        return apply_scrape(scraped_data, previous)
+    finally:
+        if lease:
+            _release_scrape_lease(lease)
+        lock.release()
+
+def _acquire_scrape_lease():
+    """
+    Waits for the cross-replica scrape lease. Returns its token, None on
+    timeout, or '' if the shared store is unreachable (scraping then goes
+    ahead under the local lock only).
+    """
+    try:
+        return shared_store.get_store().acquire_lease(SCRAPE_LEASE_KEY, ttl=SCRAPE_LOCK_TIMEOUT,
+                                                      timeout=SCRAPE_LOCK_TIMEOUT)
+    except Exception as e:
+        print(f"✗ Shared scrape lease unavailable, using the local lock only: {e}")
+        return ''
+
+def _release_scrape_lease(token):
+    try:
+        shared_store.get_store().release_lease(SCRAPE_LEASE_KEY, token)
+    except Exception as e:
+        print(f"✗ Error releasing shared scrape lease: {e}")
+
 def get_cached_data(force_refresh=False):
     """
     Gets community data, using cache if available and valid.
@@ -322,19 +998,16 @@ def get_cached_data(force_refresh=False):
         dict: Scraped community data
     """
     if not force_refresh:
-        cached_data = load_cache()
-        if cached_data is not None:
-            return cached_data
+        previous = load_cache(allow_expired=True)
+        if previous is not None:
+            if is_cache_fresh(previous):
+                print(f"✓ Using cached data (scraped at {previous['scraped_at']})")
+                return previous
+            print(f"✗ Cache expired (scraped at {previous['scraped_at']})")
     
     # Cache miss or force refresh - scrape fresh data
-    print("⟳ Scraping fresh data from website...")
-    scraped_data = scrape_retirement_community_info()
-    
-    # Only cache if scraping was successful
-    if 'error' not in scraped_data:
-        save_cache(scraped_data)
-    
-    return scraped_data
+    data, _ = refresh_community_data(force_refresh=force_refresh)
+    return data
 
 def get_community_context(force_refresh=False):
     """
@@ -357,18 +1030,43 @@ if __name__ == "__main__":
                        help='Force refresh cache, ignoring existing cached data')
     parser.add_argument('--clear-cache', action='store_true',
                        help='Clear the cache and exit')
+    parser.add_argument('--crawl', action='store_true',
+                       help='Crawl linked day/week/menu pages instead of only the main page')
+    parser.add_argument('--depth', type=int, default=CRAWL_MAX_DEPTH,
+                       help=f'Crawl depth limit (default: {CRAWL_MAX_DEPTH})')
+    parser.add_argument('--workers', type=int, default=CRAWL_MAX_WORKERS,
+                       help=f'Pages fetched in parallel while crawling (default: {CRAWL_MAX_WORKERS})')
+    parser.add_argument('--show-changes', type=int, nargs='?', const=10, metavar='N',
+                       help='Print the last N change log entries and exit')
     args = parser.parse_args()
     
     if args.clear_cache:
         clear_cache()
         exit(0)
     
+    if args.show_changes:
+        for entry in load_change_log(limit=args.show_changes):
+            print(f"[{entry['scraped_at']}] added={entry['added']} removed={entry['removed']} "
+                  f"unchanged={entry['unchanged']}")
+            for change in entry['changed']:
+                print(f"  ~ {change['key']}")
+                for line in change['removed_lines']:
+                    print(f"      - {line}")
+                for line in change['added_lines']:
+                    print(f"      + {line}")
+        exit(0)
+    
+    if args.crawl:
+        CRAWL_ENABLED = True
+        CRAWL_MAX_DEPTH = args.depth
+        CRAWL_MAX_WORKERS = args.workers
+    
     # Test the scraper with caching
     print("=" * 60)
     print("RETIREMENT COMMUNITY WEB SCRAPER")
     print("=" * 60)
     print(f"Cache file location: {CACHE_FILE}")
-    print(f"Cache duration: {CACHE_DURATION_DAYS} days (2 weeks)")
+    print(f"Cache duration: {CACHE_DURATION_HOURS:g} hours")
     print("=" * 60)
     print()
     
@@ -385,6 +1083,11 @@ if __name__ == "__main__":
         print(f"  - Number of links: {len(data['links'])}")
         print(f"  - Number of tables: {len(data['tables'])}")
         print(f"  - Total text length: {len(data['full_text'])} characters")
+        if data.get('crawl'):
+            print(f"\n🕸  Crawl ({data['crawl']['duration_seconds']}s):")
+            for page in data['crawl']['pages']:
+                status = '✓' if page['status'] == 'ok' else f"✗ {page['error']}"
+                print(f"  [{page['depth']}] {page['duration_seconds']:6.2f}s {page['url']} {status}")
         print(f"\nFirst 500 characters of content:\n{data['full_text'][:500]}")
         
         print("\n" + "="*60)
@@ -0,0 +1,65 @@
+import io
+import shutil
+import wave
+from types import SimpleNamespace
+
+import pytest
+from audio_delivery import RecentAudio, negotiate_format, transcode
+from chat_engine import ChatEngine
+from tracing import Tracer
+from usage_meter import UsageMeter
+
+CHROME = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36"
+IPAD = "Mozilla/5.0 (iPad; CPU OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/126.0 Mobile"
+MAC_SAFARI = "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari"
+
+class SpeechClient:
+    def __init__(self):
+        self.requests = []
+        self.audio = SimpleNamespace(speech=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return SimpleNamespace(content=f"{kwargs.get('response_format', 'mp3')}:{kwargs['input']}".encode())
+
+def test_format_negotiation():
+    assert negotiate_format(CHROME, preferred="auto") == "opus"
+    assert negotiate_format(IPAD, preferred="auto") == "aac"  # Every iOS browser is WebKit
+    assert negotiate_format(MAC_SAFARI, preferred="auto") == "aac"
+    assert negotiate_format("", preferred="auto") == "mp3"
+    assert negotiate_format(CHROME, preferred="mp3") == "mp3"
+
+def test_speak_requests_format_and_replays_from_memory(monkeypatch):
+    monkeypatch.setattr("audio_delivery.transcoding_available", lambda: False)
+    client = SpeechClient()
+    engine = ChatEngine(client, UsageMeter(), Tracer(), system_prompts={"default": "Default"})
+    session = engine.new_session()
+
+    assert engine.speak(session, "Hello", "opus") == b"opus:Hello"
+    assert engine.speak(session, "Hello", "opus") == b"opus:Hello"
+    assert engine.speak(session, "Hello") == b"mp3:Hello"
+    # MP3 is requested exactly as before; replays are served from memory
+    assert [request.get("response_format") for request in client.requests] == ["opus", None]
+    formats = engine.stats()["audio"]["formats"]
+    assert formats["opus"]["clips"] == 2 and formats["opus"]["sources"] == {"memory": 1, "cache": 0,
+                                                                             "synthesized": 1}
+    assert formats["mp3"]["mean_bytes"] == len(b"mp3:Hello")
+
+def test_recent_audio_is_bounded_by_bytes():
+    recent = RecentAudio(max_bytes=10)
+    recent.set("a", b"12345")
+    recent.set("b", b"12345")
+    recent.get("a")
+    recent.set("c", b"12345")
+    assert recent.get("b") is None and recent.get("a") == b"12345"
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+def test_transcode_to_speech_bitrate():
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(24000)
+        wav_file.writeframes(bytes(24000 * 2 * 2))
+    encoded = transcode(buffer.getvalue(), "opus")
+    assert encoded.startswith(b"OggS") and len(encoded) < len(buffer.getvalue()) / 10
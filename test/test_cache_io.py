@@ -0,0 +1,37 @@
+import os
+
+import pytest
+import cache_io
+
+def test_atomic_write_replaces_the_file_and_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "cache.json"
+    cache_io.write_json(str(path), {"day": "Friday"})
+    cache_io.write_json(str(path), {"day": "Saturday"}, encoding=cache_io.ENCODING_GZIP)
+    assert path.read_bytes()[:2] == cache_io.GZIP_MAGIC
+    assert cache_io.read_json(str(path)) == {"day": "Saturday"}
+
+    with pytest.raises(OSError):
+        cache_io.atomic_write_bytes(str(tmp_path / "missing" / "cache.json"), b"{}")
+    assert os.listdir(tmp_path) == ["cache.json"]
+
+def test_read_json_reuses_the_parsed_copy_until_the_file_changes(tmp_path):
+    path = str(tmp_path / "cache.json")
+    assert cache_io.read_json(path) is None
+    cache_io.write_json(path, {"events": [1, 2]})
+    first = cache_io.read_json(path)
+    assert cache_io.read_json(path) is first
+
+    cache_io.write_json(path, {"events": [1, 2, 3]})
+    assert cache_io.read_json(path) == {"events": [1, 2, 3]}
+    os.remove(path)
+    assert cache_io.read_json(path) is None
+
+def test_file_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / "scrape.lock")
+    holder, other = cache_io.FileLock(path), cache_io.FileLock(path, poll_interval=0.01)
+    with holder:
+        assert holder.locked
+        assert not other.acquire(timeout=0.05) and not other.locked
+    assert other.acquire(timeout=0.05)
+    other.release()
+    assert not other.locked
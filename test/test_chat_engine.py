@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from chat_engine import ChatEngine, ChatSession, UPSTREAM_UNAVAILABLE_MESSAGE
+from resilient_client import UpstreamUnavailableError
+from tracing import Tracer
+from usage_meter import UsageMeter
+
+# Mock SYSTEM_PROMPTS
+mock_system_prompts = {
+    "schedule_menu": "Schedule menu prompt",
+    "retirement_assistant": "Health tech prompt",
+    "default": "Default prompt",
+}
+
+def completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=None)
+
+class FakeClient:
+    """Answers chat calls with canned text and records the requests."""
+
+    def __init__(self, answer="The **menu** is soup.", followups="1. What time?\n2. Where?\n3. Is it free?"):
+        self.requests = []
+        self.answer = answer
+        self.followups = followups
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        is_followup = kwargs["messages"][1]["content"].startswith("Generate three follow-up questions")
+        return completion(self.followups if is_followup else self.answer)
+
+def make_engine(client=None, **kwargs):
+    return ChatEngine(client or FakeClient(), UsageMeter(), Tracer(), system_prompts=dict(mock_system_prompts),
+                      **kwargs)
+
+def test_reply_updates_session():
+    client = FakeClient()
+    engine = make_engine(client, schedule_provider=lambda: "Lunch: soup")
+    session = engine.new_session()
+    answers = []
+
+    result = engine.reply(session, "What's for lunch today?", on_answer=answers.append)
+
+    assert result["error"] is None and result["prompt_key"] == "schedule_menu"
+    assert result["text"] == "The menu is soup."  # Markdown removed
+    assert answers == ["The menu is soup."]
+    assert [message["role"] for message in session.history] == ["user", "assistant"]
+    assert session.followups == result["followups"] == ["What time?", "Where?", "Is it free?"]
+    # Schedule is appended to the schedule prompt; the turn context comes last before the question
+    messages = client.requests[0]["messages"]
+    assert "Lunch: soup" in messages[0]["content"]
+    assert "CURRENT DATE AND TIME" in messages[-2]["content"]
+    assert messages[-1] == {"role": "user", "content": "What's for lunch today?"}
+    assert session.prompt_cache_totals["requests"] == 1
+
+def test_reply_when_upstream_unavailable():
+    engine = make_engine(FakeClient(answer=UpstreamUnavailableError("down")))
+    session = engine.new_session()
+    session.followups = ["old"]
+    result = engine.reply(session, "Hello")
+    assert result["error"] == "upstream_unavailable"
+    assert session.history[-1] == {"role": "assistant", "text": UPSTREAM_UNAVAILABLE_MESSAGE}
+    assert session.followups == []
+
+def test_sessions_are_independent_and_serializable():
+    engine = make_engine()
+    first, second = engine.new_session(), engine.new_session()
+    asyncio.run(engine.areply(first, "Tell me a story"))
+    assert len(first.history) == 2 and second.history == []
+
+    restored = ChatSession.from_dict(first.to_dict())
+    assert restored.history == first.history
+    assert restored.current_conversation_id == first.current_conversation_id
+
+    conversation_id = restored.new_conversation()
+    assert restored.history == [] and conversation_id != first.current_conversation_id
+    with pytest.raises(KeyError):
+        restored.switch_conversation("missing")
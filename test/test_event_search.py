@@ -0,0 +1,72 @@
+from datetime import date
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from chat_engine import ChatEngine
+from event_search import EventIndex, HashingEmbedder
+from tracing import Tracer
+from usage_meter import UsageMeter
+
+SCHEDULE = """FRIDAY OCT 31, 2025
+
+Chair Balance with David
+Gain confidence with balance-focused movements performed beside a chair.
+10:15 AM to 10:45 AM
+Location: Studio X
+
+Duplicate Bridge
+1:00 PM to 3:00 PM
+Location: Game Room
+
+.SATURDAY NOV 01, 2025
+
+Shopping: Costco
+Meet in Lobby
+9:45 AM to 1:00 PM
+"""
+
+MORE = """
+.MONDAY NOV 03, 2025
+
+Watercolor Painting
+Paint landscapes with watercolors.
+1:00 PM to 2:30 PM
+Location: Art Studio
+"""
+
+def test_search_matches_loose_descriptions(tmp_path):
+    index = EventIndex(str(tmp_path), HashingEmbedder())
+    assert index.update(SCHEDULE)
+    assert isinstance(index._matrix, np.memmap)
+    assert index.search("the balance class")[0]['title'] == "Chair Balance with David"
+    bridge = index.search("the bridge game")[0]
+    assert bridge['title'] == "Duplicate Bridge" and bridge['location'] == "Game Room"
+    assert bridge['occurrences'] == [(date(2025, 10, 31), "1:00 PM", "3:00 PM", False)]
+    assert index.search("shopping trip")[0]['title'] == "Shopping: Costco"
+    assert index.search("the bridge game", after=date(2025, 11, 1)) == []
+
+def test_rebuild_embeds_only_new_events(tmp_path):
+    EventIndex(str(tmp_path), HashingEmbedder()).update(SCHEDULE)
+    index = EventIndex(str(tmp_path), HashingEmbedder())  # Another worker: opens the saved index
+    index.update(SCHEDULE)
+    assert index.stats()['builds'] == 0 and index.stats()['events'] == 3
+    index.update(SCHEDULE + MORE)
+    assert index.stats()['embedded'] == 1 and index.stats()['reused'] == 3
+    assert index.search("painting class")[0]['title'] == "Watercolor Painting"
+
+def test_engine_routes_and_hints_matching_events(tmp_path):
+    engine = ChatEngine(object(), UsageMeter(), Tracer(),
+                        system_prompts={"default": "Default", "schedule_menu": "Schedule"},
+                        schedule_provider=lambda: SCHEDULE, event_search=EventIndex(str(tmp_path), HashingEmbedder()))
+    matches = engine.find_events("I'd like to play duplicate bridge")
+    assert matches[0]['title'] == "Duplicate Bridge"
+    context = engine.context_data(engine.new_session(), matches[:1])
+    assert "=== EVENTS THAT MAY MATCH THE QUESTION ===\n- Duplicate Bridge (Game Room)" in context
+
+def test_engine_has_no_index_unless_given_one():
+    # Only build_engine creates the on-disk index, so tests never write into the source tree
+    engine = ChatEngine(object(), UsageMeter(), Tracer(), system_prompts={"schedule_menu": "Schedule"},
+                        schedule_provider=lambda: SCHEDULE)
+    assert engine.event_search is None and engine.find_events("bridge") == []
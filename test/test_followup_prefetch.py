@@ -0,0 +1,105 @@
+import threading
+from types import SimpleNamespace
+
+from chat_engine import ChatEngine
+from followup_prefetch import FollowupPrefetcher
+from tracing import Tracer
+from usage_meter import UsageMeter
+
+PROMPTS = {"schedule_menu": "Schedule prompt", "retirement_assistant": "Tech prompt", "default": "Default prompt"}
+
+class TokenClient:
+    """Answers with the question echoed back and reports 100 prompt + 20 completion tokens per call."""
+
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.questions = []
+        self.started = threading.Event()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20, prompt_tokens_details=None)
+        if kwargs["messages"][1]["content"].startswith("Generate three follow-up questions"):
+            text = "1. Next one?\n2. Another?\n3. Last?"
+        else:
+            question = kwargs["messages"][-1]["content"]
+            self.questions.append(question)
+            self.started.set()
+            if self.gate is not None:
+                self.gate.wait(5)
+            text = f"Answer to: {question}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=usage)
+
+def make_session(engine, followups):
+    session = engine.new_session()
+    session.history.extend([{"role": "user", "text": "Tell me a story"}, {"role": "assistant", "text": "Once..."}])
+    session.followups = list(followups)
+    return session
+
+def test_clicked_followup_uses_prefetched_answer():
+    client = TokenClient()
+    engine = ChatEngine(client, UsageMeter(), Tracer(), system_prompts=dict(PROMPTS))
+    prefetcher = FollowupPrefetcher(engine, token_cap=10000)
+    session = make_session(engine, ["Who wrote it?", "How long is it?"])
+
+    assert prefetcher.start(session) == 2
+    for job in prefetcher._sets[session.session_id].jobs.values():
+        job["future"].result(5)
+    assert len(session.history) == 2  # Prefetching leaves the real session alone
+
+    result = prefetcher.take(session, "Who wrote it?")
+    assert result["prefetched"] and result["text"] == "Answer to: Who wrote it?"
+    assert [message["text"] for message in session.history[2:]] == ["Who wrote it?", "Answer to: Who wrote it?"]
+    assert session.followups == ["Next one?", "Another?", "Last?"]
+
+    stats = prefetcher.stats()
+    assert stats["hits"] == 1 and stats["hit_rate"] == 1.0
+    assert stats["tokens"] == 480 and stats["used_tokens"] == 240 and stats["wasted_tokens"] == 240
+    usage = engine.usage_meter.summary()["by_prompt_type"]
+    assert usage["prefetch:default"]["calls"] == 2 and usage["prefetch:followups"]["calls"] == 2
+    prefetcher.shutdown()
+
+def test_typed_question_cancels_prefetch_and_cap_limits_spend():
+    gate = threading.Event()
+    client = TokenClient(gate)
+    engine = ChatEngine(client, UsageMeter(), Tracer(), system_prompts=dict(PROMPTS))
+    prefetcher = FollowupPrefetcher(engine, token_cap=1000, workers=1)
+    session = make_session(engine, ["First?", "Second?", "Third?"])
+
+    prefetcher.start(session)
+    jobs = list(prefetcher._sets[session.session_id].jobs.values())
+    assert client.started.wait(5)
+    prefetcher.cancel(session)  # The resident typed something else
+    gate.set()
+    jobs[0]["future"].result(5)
+
+    # Only the question already in flight was sent, and its follow-up call was refused
+    assert client.questions == ["First?"]
+    stats = prefetcher.stats()
+    assert stats["cancelled"] == 2 and stats["wasted_tokens"] == 120 and stats["active_sets"] == 0
+    assert prefetcher.take(session, "Second?") is None and prefetcher.stats()["misses"] == 1
+    prefetcher.shutdown()
+
+def test_parallel_jobs_reserve_against_the_cap_before_calling():
+    gate = threading.Event()
+    client = TokenClient(gate)
+    engine = ChatEngine(client, UsageMeter(), Tracer(), system_prompts=dict(PROMPTS))
+    # Room for one answer's reservation (prompt estimate + 500 completion tokens), not two
+    prefetcher = FollowupPrefetcher(engine, token_cap=900, workers=3)
+    session = make_session(engine, ["First?", "Second?", "Third?"])
+
+    prefetcher.start(session)
+    prefetch_set = prefetcher._sets[session.session_id]
+    assert client.started.wait(5)
+    # The other two are refused while the first answer is still in flight
+    for question, job in prefetch_set.jobs.items():
+        if question != client.questions[0]:
+            assert job["future"].result(5) is None
+    gate.set()
+    for job in prefetch_set.jobs.values():
+        job["future"].result(5)
+
+    assert len(client.questions) == 1
+    assert prefetcher.stats()["capped"] == 2
+    assert prefetch_set.tokens <= 900 and prefetch_set.reserved == 0
+    prefetcher.shutdown()
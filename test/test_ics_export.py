@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from chat_engine import ChatEngine
+from event_parser import parse_events
+from ics_export import calendar_entry, calendar_ics, calendar_request, fold_line
+from tracing import Tracer
+from usage_meter import UsageMeter
+
+SCHEDULE = """FRIDAY OCT 31, 2025
+
+Tai Chi with Gene
+8:00 AM to 9:00 AM
+Location: Studio X
+
+Mexican Train
+in Bar/Aqua Vita Lounge
+3:00 PM to 5:00 PM
+
+.MONDAY NOV 03, 2025
+
+Tai Chi with Gene
+8:00 AM to 9:00 AM
+Location: Studio X
+"""
+
+NOW = datetime(2025, 10, 31, 10, 0)
+
+def test_calendar_file():
+    entry = calendar_entry(parse_events(SCHEDULE)[1])
+    ics = calendar_ics([entry])
+    assert ics.startswith("BEGIN:VCALENDAR\r\n") and ics.endswith("END:VCALENDAR\r\n")
+    for line in ["DTSTART:20251031T150000", "DTEND:20251031T170000", "SUMMARY:Mexican Train",
+                 "LOCATION:Bar/Aqua Vita Lounge", "TRIGGER:-PT30M", f"UID:{entry['uid']}@retirenet"]:
+        assert line + "\r\n" in ics
+    assert all(len(line.encode()) <= 75 for line in fold_line("DESCRIPTION:" + "x" * 200).split("\r\n"))
+
+def test_finds_the_event_meant():
+    request = calendar_request("Can you add tai chi to my calendar?", SCHEDULE, now=NOW)
+    assert [(entry['title'], entry['date']) for entry in request['entries']] == [("Tai Chi with Gene", "2025-11-03")]
+    # "the event" is the one in the previous answer
+    request = calendar_request("How to set up phone calendar reminder for the event?", SCHEDULE,
+                               "Mexican Train is today from 3:00 PM to 5:00 PM.", NOW)
+    assert request['entries'][0]['title'] == "Mexican Train"
+    assert calendar_request("How to set up phone calendar reminder for the event?", SCHEDULE, now=NOW) is None
+    assert calendar_request("When is tai chi?", SCHEDULE, now=NOW) is None
+
+def test_engine_answers_calendar_questions_without_the_model():
+    class NoModel:
+        def __getattr__(self, name):
+            raise AssertionError("The model should not be called")
+
+    engine = ChatEngine(NoModel(), UsageMeter(), Tracer(), system_prompts={"default": "Prompt", "tech_help": "Help"},
+                        schedule_provider=lambda: SCHEDULE, clock=lambda: NOW)
+    session = engine.new_session()
+    result = engine.reply(session, "Please remind me about Mexican Train")
+    assert result['fast_path'] and result['calendar'][0]['title'] == "Mexican Train"
+    assert session.history[-1]['calendar'] == result['calendar']
+    entries, ics = engine.calendar_file(datetime(2025, 10, 31).date(), result['calendar'][0]['uid'])
+    assert entries == result['calendar'] and "SUMMARY:Mexican Train" in ics
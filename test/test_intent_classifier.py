@@ -0,0 +1,33 @@
+import pytest
+from intent_classifier import IntentClassifier, classify_intent, load_intent_config
+
+@pytest.mark.parametrize("text, intent", [
+    ("What is the dinner menu?", "dining"),
+    ("When and where is the Yoga class?", "schedule"),
+    ("How do I install the app?", "tech_help"),
+    ("What are some exercises for seniors?", "health"),
+    ("Tell me a story", "default"),
+])
+def test_classify_intent(text, intent):
+    result = classify_intent(text)
+    assert result["intent"] == intent
+    assert 0.0 <= result["confidence"] <= 1.0
+
+def test_word_boundaries():
+    # "app" inside "happy" and a lone "when" must not route anywhere
+    assert classify_intent("I'm happy")["intent"] == "default"
+    assert classify_intent("When did the war end?")["intent"] == "default"
+    # Multi-word phrases match across extra whitespace and case
+    assert "tai chi" in classify_intent("Is  TAI   Chi on today?")["keywords"]
+
+def test_prompt_mapping():
+    result = classify_intent("How do I connect to the wifi?")
+    assert result["prompt"] == "tech_help"
+    assert result["fallback_prompt"] == "retirement_assistant"
+    assert classify_intent("Tell me a joke")["prompt"] == "default"
+
+def test_low_confidence_goes_to_default():
+    config = load_intent_config()
+    config["min_confidence"] = 0.99
+    classifier = IntentClassifier(config)
+    assert classifier.classify("What is the dinner menu?")["intent"] == "default"
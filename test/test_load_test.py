@@ -0,0 +1,28 @@
+import pytest
+from load_test import check_thresholds, run_load_test
+from shared_store import FileBlobStore, SQLiteStore
+
+# The mock server answers at once, so a smoke run takes a few seconds
+FAST_MOCK = dict(latency_ms=0, jitter_ms=0, token_delay_ms=0, transcription_ms_per_kb=0.0, speech_ms_per_char=0.0)
+
+@pytest.fixture
+def mock_environment(monkeypatch):
+    # run_load_test points OPENAI_BASE_URL/OPENAI_API_KEY at the mock server; restore them afterwards
+    monkeypatch.setenv("OPENAI_BASE_URL", "")
+    monkeypatch.setenv("OPENAI_API_KEY", "")
+
+def test_engine_load_test_runs_scripted_sessions(mock_environment, tmp_path):
+    pytest.importorskip("openai")
+    report = run_load_test(2, target="engine", store=SQLiteStore(str(tmp_path / "store.sqlite3")),
+                           audio_store=FileBlobStore(str(tmp_path / "audio")), event_index_dir=str(tmp_path / "index"),
+                           **FAST_MOCK)
+    assert report["turns"] >= 4 and report["failures"] == 0, report["failure_samples"]
+    assert report["mock_requests"]
+    assert check_thresholds(report, max_failure_rate=0) == []
+
+def test_ui_load_test_runs_a_session(mock_environment):
+    pytest.importorskip("openai")
+    pytest.importorskip("streamlit.testing.v1")
+    report = run_load_test(1, scripts=[[("text", "What's for lunch today?"), ("followup", 0)]], timeout=60,
+                           **FAST_MOCK)
+    assert report["turns"] >= 1 and report["failures"] == 0, report["failure_samples"]
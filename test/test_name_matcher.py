@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from chat_engine import ChatEngine
+from event_parser import parse_events
+from name_matcher import NameMatcher, phonetic_key
+from schedule_query import ScheduleQueryEngine
+from tracing import Tracer
+from usage_meter import UsageMeter
+
+SCHEDULE = """FRIDAY OCT 31, 2025
+
+Tai Chi with Gene
+8:00 AM to 9:00 AM
+Location: Studio X
+
+PeelTech
+9:00 AM to 12:00 PM
+Location: Conference Room B
+
+Duplicate Bridge
+1:00 PM to 3:00 PM
+Location: Game Room
+
+.SATURDAY NOV 01, 2025
+
+Mahjongg
+1:00 PM to 3:00 PM
+Location: Game Room
+"""
+
+def test_phonetic_keys():
+    assert phonetic_key("Tai Chi") == phonetic_key("tie chee") == "TAXA"
+    assert phonetic_key("touch") != phonetic_key("Tai Chi")
+
+def test_canonicalizes_mangled_names():
+    matcher = NameMatcher(parse_events(SCHEDULE))
+    cases = {
+        "When is tie chee today?": "When is Tai Chi today?",
+        "Where do they play duplicate bridges?": "Where do they play Duplicate Bridge?",
+        "Is peel tech open?": "Is PeelTech open?",
+        "What time is ma john?": "What time is Mahjongg?",
+        "Can you touch the bread in the game room": "Can you touch the bread in the game room",
+    }
+    for transcript, expected in cases.items():
+        assert matcher.canonicalize(transcript)['text'] == expected, transcript
+    assert matcher.canonicalize("When is tie chee?")['replacements'] == [("tie chee", "Tai Chi")]
+
+def test_engine_routes_the_canonical_question():
+    engine = ChatEngine(object(), UsageMeter(), Tracer(), system_prompts={"schedule_menu": "Prompt"},
+                        schedule_provider=lambda: SCHEDULE,
+                        schedule_query=ScheduleQueryEngine(clock=lambda: datetime(2025, 10, 31, 7, 30)))
+    session = engine.new_session()
+    result = engine.reply(session, "Where is tie chee?")
+    assert result['fast_path']
+    assert result['text'] == "Tai Chi with Gene is today from 8:00 AM to 9:00 AM in Studio X."
+    assert session.history[0]['text'] == "Where is tie chee?"
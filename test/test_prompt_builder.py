@@ -0,0 +1,27 @@
+from prompt_builder import MIN_CACHEABLE_TOKENS, build_chat_prompt, prefix_stats
+
+LONG_PROMPT = "Answer questions about the community schedule. " * 200
+
+def test_prefix_stats_count_the_shared_leading_messages():
+    history = [{"role": "user", "text": "What's for lunch?"}]
+    first = build_chat_prompt(LONG_PROMPT, history, "Current Time: 11:59 AM")
+    assert prefix_stats(first, None)["shared_messages"] == 0
+
+    history += [{"role": "assistant", "text": "Soup"}, {"role": "user", "text": "And dinner?"}]
+    second = build_chat_prompt(LONG_PROMPT, history, "Current Time: 12:00 PM")
+    stats = prefix_stats(second, first["message_hashes"])
+    # The instructions match; the first request had its turn context where the history now starts
+    assert stats["shared_messages"] == 1 and stats["total_messages"] == 5
+    assert stats["cacheable_prefix_tokens"] == second["message_tokens"][0]
+    assert stats["cache_eligible"] and stats["cacheable_prefix_tokens"] >= MIN_CACHEABLE_TOKENS
+
+    # From then on the append-only history is shared too
+    history += [{"role": "assistant", "text": "Roast chicken"}, {"role": "user", "text": "Dessert?"}]
+    third = build_chat_prompt(LONG_PROMPT, history, "Current Time: 12:01 PM")
+    assert prefix_stats(third, second["message_hashes"])["shared_messages"] == 3
+
+def test_short_prefixes_are_not_cache_eligible():
+    prompt = build_chat_prompt("Be brief.", [{"role": "user", "text": "Hi"}], "Now")
+    stats = prefix_stats(prompt, prompt["message_hashes"])
+    assert stats["shared_messages"] == stats["total_messages"] == 3
+    assert not stats["cache_eligible"]
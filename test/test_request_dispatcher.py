@@ -0,0 +1,136 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from request_dispatcher import RequestDispatcher, calls_for, chat_request_key
+from resilient_client import ResilientOpenAI
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = RequestDispatcher(max_concurrency=2, rate_per_second=0)
+    yield dispatcher
+    dispatcher.close()
+
+def test_concurrency_limit(dispatcher):
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+
+    def work(value):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(0.05)
+        with lock:
+            running["now"] -= 1
+        return value * 2
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(lambda value: dispatcher.call(work, {"value": value}), range(6)))
+    assert results == [0, 2, 4, 6, 8, 10]
+    assert running["max"] == 2
+    stats = dispatcher.stats()
+    assert stats["completed"] == 6 and stats["queued"] == 0
+    assert stats["queue_wait"]["count"] == 6 and stats["queue_wait"]["max_ms"] >= 40
+
+def test_identical_requests_are_coalesced(dispatcher):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        time.sleep(0.1)
+        return SimpleNamespace(text="Soup", usage={"prompt_tokens": 10})
+
+    request = {"model": "m", "messages": [{"role": "user", "content": "What's for lunch?"}]}
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        responses = list(pool.map(
+            lambda attempt: dispatcher.call(create, dict(request, timeout=5 + attempt),
+                                            key=chat_request_key(dict(request, timeout=5 + attempt))),
+            range(5)))
+    assert len(calls) == 1
+    assert all(response.text == "Soup" for response in responses)
+    # Only the caller that made the upstream call is billed for it
+    assert sum(response.usage is not None for response in responses) == 1
+    assert dispatcher.stats()["coalesced"] == 4
+
+def test_streaming_requests_are_not_coalesced():
+    assert chat_request_key({"model": "m", "messages": [], "stream": True}) is None
+    assert chat_request_key({"model": "m", "messages": [], "timeout": 1}) == \
+        chat_request_key({"model": "m", "messages": [], "timeout": 2})
+
+def test_token_bucket_paces_calls():
+    dispatcher = RequestDispatcher(max_concurrency=4, rate_per_second=20, burst=2)
+    try:
+        started = time.perf_counter()
+        for _ in range(6):
+            dispatcher.call(lambda: None)
+        # 2 calls from the burst, then 4 more at 20/s
+        assert time.perf_counter() - started >= 0.15
+    finally:
+        dispatcher.close()
+
+def test_call_timeout(dispatcher):
+    with pytest.raises(TimeoutError):
+        dispatcher.call(lambda: time.sleep(0.5), timeout=0.05)
+    assert dispatcher.stats()["timed_out"] == 1
+
+def test_hedge_is_not_coalesced_with_the_call_it_races(dispatcher):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            time.sleep(0.5)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"answer {len(calls)}"))],
+                               usage={"prompt_tokens": 10})
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    resilient = ResilientOpenAI(dispatcher.wrap(client), hedge_after=0.05, sleep=lambda seconds: None)
+    response = resilient.chat.completions.create(model="m", messages=[{"role": "user", "content": "Lunch?"}])
+    assert len(calls) == 2 and response.choices[0].message.content == "answer 2"
+    assert response.usage is not None  # The hedge that won is billed
+    assert dispatcher.stats()["coalesced"] == 0
+
+def test_per_user_limit_leaves_slots_for_other_residents():
+    dispatcher = RequestDispatcher(max_concurrency=4, rate_per_second=0, max_per_user=1)
+    lock = threading.Lock()
+    running = {}
+
+    def work(owner):
+        with lock:
+            running[owner] = running.get(owner, 0) + 1
+            assert running[owner] == 1
+        time.sleep(0.05)
+        with lock:
+            running[owner] -= 1
+
+    client = dispatcher.wrap(SimpleNamespace(audio=SimpleNamespace(speech=SimpleNamespace(create=work),
+                                                                   transcriptions=SimpleNamespace(create=None))))
+
+    def call(owner):
+        with calls_for(owner):
+            client.audio.speech.create(owner=owner)
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(call, ["kiosk-1", "kiosk-1", "kiosk-1", "kiosk-2"]))
+        # kiosk-1's three calls ran one after another, kiosk-2's alongside them
+        assert 0.15 <= time.perf_counter() - started < 0.3
+        assert dispatcher._owners == {}
+    finally:
+        dispatcher.close()
+
+def test_streamed_answer_keeps_its_slot_until_read():
+    dispatcher = RequestDispatcher(max_concurrency=1, rate_per_second=0)
+    try:
+        stream = dispatcher.call(lambda **kwargs: iter(["Soup ", "at noon"]), {"stream": True})
+        with pytest.raises(TimeoutError):
+            dispatcher.call(lambda: None, timeout=0.1)
+        assert "".join(stream) == "Soup at noon"
+        time.sleep(0.05)
+        assert dispatcher.call(lambda: "next", timeout=1) == "next"
+        assert dispatcher.stats()["streaming"] == 0
+    finally:
+        dispatcher.close()
@@ -0,0 +1,134 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from resilient_client import (AnswerCache, CircuitBreaker, ResilientOpenAI, UpstreamUnavailableError,
+                              CACHED_ANSWER_NOTE)
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+def completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=None)
+
+class FakeClient:
+    """Plays back a list of outcomes (exceptions, responses or callables) for chat calls."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.calls.append(kwargs)
+            outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if callable(outcome):
+            outcome = outcome()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+MESSAGES = [{"role": "system", "content": "Be nice"}, {"role": "user", "content": "What's for lunch?"}]
+
+def test_retries_rate_limits_then_succeeds():
+    client = FakeClient([StatusError(429), StatusError(503), completion("Soup")])
+    resilient = ResilientOpenAI(client, sleep=lambda seconds: None)
+    response = resilient.chat.completions.create(model="m", messages=MESSAGES)
+    assert response.choices[0].message.content == "Soup"
+    assert len(client.calls) == 3
+    # Every attempt gets a bounded timeout
+    assert all(0 < call["timeout"] <= 30 for call in client.calls)
+    assert resilient.stats()["counters"]["chat_retries"] == 2
+
+def test_client_errors_are_not_retried():
+    client = FakeClient([StatusError(400)])
+    resilient = ResilientOpenAI(client, sleep=lambda seconds: None)
+    with pytest.raises(StatusError):
+        resilient.chat.completions.create(model="m", messages=MESSAGES)
+    assert len(client.calls) == 1
+    assert resilient.breakers["chat"].state == "closed"
+
+def test_falls_back_to_cached_answer():
+    client = FakeClient([completion("Soup and salad"), StatusError(500)])
+    resilient = ResilientOpenAI(client, max_retries=1, sleep=lambda seconds: None)
+    resilient.chat.completions.create(model="m", messages=MESSAGES)
+    response = resilient.chat.completions.create(model="m", messages=MESSAGES)
+    assert response.choices[0].message.content == "Soup and salad" + CACHED_ANSWER_NOTE
+    with pytest.raises(UpstreamUnavailableError):
+        resilient.chat.completions.create(model="m", messages=[{"role": "user", "content": "Anything new?"}])
+
+def test_falls_back_to_local_model():
+    local = FakeClient([completion("Local answer")])
+    resilient = ResilientOpenAI(FakeClient([StatusError(502)]), fallback_client=local, fallback_model="llama",
+                                max_retries=0, sleep=lambda seconds: None)
+    response = resilient.chat.completions.create(model="m", messages=MESSAGES, max_completion_tokens=100)
+    assert response.choices[0].message.content == "Local answer"
+    assert local.calls[0]["model"] == "llama"
+    assert local.calls[0]["max_tokens"] == 100
+
+def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.06)
+    # Only one probe is let through while half-open
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_open_breaker_skips_upstream():
+    client = FakeClient([StatusError(500)])
+    resilient = ResilientOpenAI(client, max_retries=5, sleep=lambda seconds: None)
+    resilient.breakers["chat"] = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    with pytest.raises(UpstreamUnavailableError):
+        resilient.chat.completions.create(model="m", messages=MESSAGES)
+    assert len(client.calls) == 2
+
+def test_hedged_request_wins_over_slow_primary():
+    def slow():
+        time.sleep(0.5)
+        return completion("slow")
+    client = FakeClient([slow, completion("fast")])
+    resilient = ResilientOpenAI(client, hedge_after=0.05, sleep=lambda seconds: None)
+    started = time.perf_counter()
+    response = resilient.chat.completions.create(model="m", messages=MESSAGES)
+    assert response.choices[0].message.content == "fast"
+    assert time.perf_counter() - started < 0.4
+    assert resilient.stats()["counters"]["hedge_wins"] == 1
+
+def test_answer_cache_keys_on_the_whole_conversation():
+    class MemoryStore(dict):
+        def get(self, key):
+            return dict.get(self, key)
+
+        def set(self, key, value, ttl=None):
+            self[key] = value
+
+    store = MemoryStore()
+    cache = AnswerCache(store=store)
+    # The per-turn context (current time) does not change the key
+    cache.put(MESSAGES + [{"role": "system", "content": "Current Time: 10:01"}], "Soup")
+    assert cache.get(MESSAGES + [{"role": "system", "content": "Current Time: 10:02"}]) == "Soup"
+    assert cache.get([{"role": "system", "content": "Other prompt"}] + MESSAGES[1:]) is None
+
+    personal = [MESSAGES[0], {"role": "user", "content": "I'm diabetic"}, {"role": "assistant", "content": "Noted"},
+                MESSAGES[1]]
+    cache.put(personal, "The sugar-free soup")
+    assert cache.get(personal) == "The sugar-free soup"
+    assert cache.get(MESSAGES) == "Soup"
+    # Only the history-free answer reaches the shared store
+    assert len(store) == 1
+    assert AnswerCache(store=store).get(personal) is None
+
+def test_answer_cache_expires():
+    cache = AnswerCache(max_entries=2, max_age_seconds=0)
+    cache.put(MESSAGES, "Soup")
+    time.sleep(0.01)
+    assert cache.get(MESSAGES) is None
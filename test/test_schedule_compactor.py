@@ -0,0 +1,83 @@
+from chat_engine.prompts import get_schedule_context
+from schedule_compactor import compact_schedule, compaction_report
+
+TAI_CHI = """Tai Chi with Gene
+Tai Chi is effective in preventing falls because it emphasizes core awareness and mindful movement.
+8:00 AM to 9:00 AM
+Location: Studio X
+"""
+
+SCHEDULE = f"""FRIDAY OCT 31, 2025
+
+{TAI_CHI}
+
+HALLOWEEN PARTY!
+2:30 PM to 4:30 PM
+Location: Emerald Hall
+
+.MONDAY NOV 03, 2025
+
+{TAI_CHI}
+
+.WEDNESDAY NOV 05, 2025
+
+Tai Chi with Gene - CANCELLED
+8:00 AM to 9:00 AM
+Location: Studio X
+
+.FRIDAY NOV 07, 2025
+
+{TAI_CHI}
+
+.MONDAY NOV 10, 2025
+
+Bridge
+1:00 PM to 3:00 PM
+Location: Game Room
+
+.WEDNESDAY NOV 12, 2025
+
+{TAI_CHI}
+
+.FRIDAY NOV 14, 2025
+
+{TAI_CHI}
+
+.MONDAY NOV 17, 2025
+
+{TAI_CHI}
+
+.WEDNESDAY NOV 19, 2025
+
+{TAI_CHI}
+"""
+
+def test_folds_descriptions_and_weekly_slots():
+    compact = compact_schedule(SCHEDULE)
+    assert compact.count("Tai Chi is effective") == 1
+    assert ("- Tai Chi with Gene: Mondays, Wednesdays and Fridays, 8:00 AM to 9:00 AM, Studio X [D1] "
+            "(Oct 31 to Nov 19; cancelled Nov 5; not held Nov 10)") in compact
+    assert "FRIDAY OCT 31, 2025\n- 2:30 PM to 4:30 PM: HALLOWEEN PARTY!, Emerald Hall" in compact
+    assert "- 1:00 PM to 3:00 PM: Bridge, Game Room" in compact
+
+    report = compaction_report(SCHEDULE)
+    assert report['compact_tokens'] < report['raw_tokens'] and report['saved_fraction'] > 0
+
+def test_unparsed_schedules_are_sent_as_is():
+    assert get_schedule_context(lambda: "Lunch: soup").endswith("Lunch: soup")
+    assert get_schedule_context(lambda: SCHEDULE, compact=False).endswith(SCHEDULE)
+
+def test_scraped_context_keeps_menus_and_headers():
+    from web_scrapper import format_scraped_content_for_prompt
+    scraped = format_scraped_content_for_prompt({
+        "url": "https://example.org/p/week", "scraped_at": "2025-11-05 06:00:00", "title": "Community",
+        "headings": [{"level": "h1", "text": "This Week at Maple Grove"}], "links": [],
+        "tables": [[["Meal", "Menu"], ["Lunch", "Clam chowder"], ["Dinner", "Roast chicken"]]],
+        "full_text": "Today's lunch special: clam chowder\n" + SCHEDULE.replace("\n\n.", "\n\n")
+    })
+    context = get_schedule_context(lambda: scraped)
+    assert "WEEKLY EVENTS" in context
+    for kept in ("Source: https://example.org/p/week", "Last Updated: 2025-11-05 06:00:00",
+                 "This Week at Maple Grove", "Lunch | Clam chowder", "Dinner | Roast chicken",
+                 "Today's lunch special: clam chowder", "HALLOWEEN PARTY!", "END OF COMMUNITY INFORMATION"):
+        assert kept in context
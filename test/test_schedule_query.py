@@ -0,0 +1,93 @@
+from datetime import date, datetime, time
+
+from chat_engine import ChatEngine
+from event_parser import parse_events
+from schedule_query import ScheduleQueryEngine
+from tracing import Tracer
+from usage_meter import UsageMeter
+
+SCHEDULE = """FRIDAY OCT 31, 2025
+
+Tai Chi with Gene
+Tai Chi is effective in preventing falls.
+8:00 AM to 9:00 AM
+Location: Studio X
+
+
+Mat Stretch - CANCELLED
+This class with resume Nov. 7th.
+9:00 AM to 9:30 AM
+
+
+Mexican Train
+in Bar/Aqua Vita Lounge
+3:00 PM to 5:00 PM
+
+.MONDAY NOV 03, 2025
+
+All-Level Yoga with Dr. Jim
+9:00 AM to 10:00 AM
+Location: Studio X
+
+
+Chair Yoga with Fran
+11:00 AM to 12: PM
+Location: Studio X
+"""
+
+NOW = datetime(2025, 10, 31, 7, 30)
+
+def test_parse_events():
+    events = parse_events(SCHEDULE)
+    assert [event['title'] for event in events] == ["Tai Chi with Gene", "Mat Stretch", "Mexican Train",
+                                                     "All-Level Yoga with Dr. Jim", "Chair Yoga with Fran"]
+    tai_chi, stretch, train, _, chair = events
+    assert tai_chi['date'] == date(2025, 10, 31) and tai_chi['start'] == time(8, 0)
+    assert tai_chi['location'] == "Studio X" and not tai_chi['cancelled']
+    assert stretch['cancelled']
+    assert train['location'] == "Bar/Aqua Vita Lounge"
+    assert chair['date'] == date(2025, 11, 3) and chair['end'] == time(12, 0)
+
+def test_answers_when_and_where():
+    engine = ScheduleQueryEngine()
+    answer = engine.answer("When and where is the Yoga class?", SCHEDULE, NOW)
+    assert answer['kind'] == 'event'
+    assert answer['text'] == ("All-Level Yoga with Dr. Jim is on Monday, November 3 from 9:00 AM to 10:00 AM "
+                              "in Studio X.\nChair Yoga with Fran is on Monday, November 3 from 11:00 AM to "
+                              "12:00 PM in Studio X.")
+    assert answer['followups'] == ["What else is on Monday, November 3?"]
+
+    assert "is cancelled" in engine.answer("What time is mat stretch today?", SCHEDULE, NOW)['text']
+    listing = engine.answer("What is today's community activity schedule?", SCHEDULE, NOW)
+    assert listing['kind'] == 'day' and listing['text'].splitlines()[1:] == [
+        "- 8:00 AM to 9:00 AM: Tai Chi with Gene (Studio X)",
+        "- 9:00 AM to 9:30 AM: Mat Stretch (cancelled)",
+        "- 3:00 PM to 5:00 PM: Mexican Train (Bar/Aqua Vita Lounge)"]
+
+def test_falls_back_when_not_confident():
+    engine = ScheduleQueryEngine()
+    for question in ["How much does Tai Chi cost?",      # Not a when/where question
+                     "What's for lunch today?",          # Menus are not in the events schedule
+                     "When is the pottery class?",       # No such event
+                     "Is yoga good for my back?",        # Mentions an event but asks something else
+                     "What's on next Tuesday?"]:         # Not in the schedule
+        assert engine.answer(question, SCHEDULE, NOW) is None, question
+    assert engine.answer("When is Tai Chi?", SCHEDULE, datetime(2025, 11, 1, 9, 0)) is None  # Already past
+
+    stats = engine.stats()
+    assert stats['questions'] == 6 and stats['hits'] == 0 and stats['hit_rate'] == 0.0
+    assert stats['misses'] == {'unsupported': 3, 'no_match': 1, 'not_scheduled': 2}
+
+def test_engine_answers_schedule_lookups_without_the_model():
+    class NoModel:
+        def __getattr__(self, name):
+            raise AssertionError("The model should not be called")
+
+    engine = ChatEngine(NoModel(), UsageMeter(), Tracer(), system_prompts={"schedule_menu": "Prompt"},
+                        schedule_provider=lambda: SCHEDULE, schedule_query=ScheduleQueryEngine(clock=lambda: NOW))
+    session = engine.new_session()
+    result = engine.reply(session, "Where is Tai Chi?")
+    assert result['fast_path'] and result['error'] is None
+    assert result['text'] == "Tai Chi with Gene is today from 8:00 AM to 9:00 AM in Studio X."
+    assert session.history[-1]['text'] == result['text']
+    assert engine.schedule_query.stats()['hit_rate'] == 1.0
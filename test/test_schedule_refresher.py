@@ -0,0 +1,17 @@
+from datetime import datetime
+
+import pytest
+from schedule_refresher import next_refresh_time, parse_refresh_times
+
+def test_parse_refresh_times_sorts_and_validates():
+    assert parse_refresh_times("16:00, 02:00,06:30,,02:00") == [(2, 0), (6, 30), (16, 0)]
+    with pytest.raises(ValueError):
+        parse_refresh_times("25:00")
+    with pytest.raises(ValueError):
+        parse_refresh_times(" , ")
+
+def test_next_refresh_time_is_strictly_later_and_wraps_to_tomorrow():
+    times = parse_refresh_times("02:00,06:30,16:00")
+    assert next_refresh_time(datetime(2025, 11, 5, 6, 0), times) == datetime(2025, 11, 5, 6, 30)
+    assert next_refresh_time(datetime(2025, 11, 5, 6, 30), times) == datetime(2025, 11, 5, 16, 0)
+    assert next_refresh_time(datetime(2025, 11, 30, 23, 59), times) == datetime(2025, 12, 1, 2, 0)
@@ -0,0 +1,32 @@
+from urllib.request import urlopen
+
+from scraper_bench import find_regressions, serve_snapshots, strip_scripts, summarize
+
+def test_summarize_reports_median_p95_and_max():
+    summary = summarize({"parse": [0.03, 0.01, 0.02]})
+    assert summary["parse"] == {"runs": 3, "median": 0.02, "p95": 0.03, "max": 0.03}
+
+def test_regressions_need_both_the_tolerance_and_the_minimum_slowdown():
+    baseline = {"load": {"median": 1.0}, "parse": {"median": 0.001}, "format": {"median": 0.1}}
+    summary = {
+        "load": {"median": 1.3},       # 30% slower: regressed
+        "parse": {"median": 0.003},    # 3x slower but only 2 ms: noise
+        "format": {"median": 0.12},    # within 25%
+        "waits": {"median": 5.0},      # no baseline
+    }
+    assert find_regressions(summary, baseline) == [("load", 1.0, 1.3)]
+    assert find_regressions(summary, baseline, tolerance=0.5) == []
+
+PAGE = """<html><head><script src="https://cdn.example.com/app.js"></script>
+<SCRIPT type="text/javascript">render({"day": "Friday"});</SCRIPT><script src="/x.js"/></head>
+<body><h1>Friday</h1><p>Bingo 2 PM</p></body></html>"""
+
+def test_replayed_pages_are_served_without_scripts(tmp_path):
+    (tmp_path / "page.html").write_text(PAGE, encoding="utf-8")
+    assert "script" not in strip_scripts(PAGE).lower()
+    server, base_url = serve_snapshots(str(tmp_path))
+    try:
+        body = urlopen(f"{base_url}/page.html").read().decode("utf-8")
+    finally:
+        server.shutdown()
+    assert "<p>Bingo 2 PM</p>" in body and "cdn.example.com" not in body and "render(" not in body
@@ -0,0 +1,59 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+tornado = pytest.importorskip("tornado")
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from chat_engine import ChatEngine
+from chat_engine.server import make_app
+from tracing import Tracer
+from usage_meter import UsageMeter
+
+def fetch_all(app, requests):
+    """Serves the app on a free port and makes the (path, fetch kwargs) requests in order."""
+    async def run():
+        sock, port = bind_unused_port()
+        server = HTTPServer(app)
+        server.add_sockets([sock])
+        responses = []
+        for path, kwargs in requests:
+            responses.append(await AsyncHTTPClient().fetch(f"http://127.0.0.1:{port}{path}", raise_error=False,
+                                                           **kwargs))
+        server.stop()
+        return responses
+    return asyncio.run(run())
+
+def make_engine():
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=None)))
+    return ChatEngine(client, UsageMeter(), Tracer(), system_prompts={"default": "Prompt"})
+
+def test_api_needs_token_and_health_leaks_no_session_ids():
+    engine = make_engine()
+    app = make_app(engine, api_token="s3cret")
+    auth = {"headers": {"Authorization": "Bearer s3cret"}}
+    created, = fetch_all(app, [("/api/sessions", dict(auth, method="POST", body=""))])
+    session_id = json.loads(created.body)["session_id"]
+    engine.usage_meter.record("chat", "gpt-4o-mini", "usage-1", prompt_tokens=10)
+
+    anonymous, wrong, authorized, health = fetch_all(app, [
+        (f"/api/sessions/{session_id}", {}),
+        (f"/api/sessions/{session_id}", {"headers": {"Authorization": "Bearer guess"}}),
+        (f"/api/sessions/{session_id}", auth),
+        ("/healthz", {}),
+    ])
+    assert created.code == 201
+    assert anonymous.code == 401 and wrong.code == 401 and authorized.code == 200
+    assert health.code == 200
+    body = health.body.decode()
+    assert "by_session" not in body and "usage-1" not in body and session_id not in body
+    assert json.loads(body)["stats"]["usage"]["sessions"] == 1
+
+def test_api_is_closed_without_a_configured_token():
+    response, = fetch_all(make_app(make_engine(), api_token=""),
+                          [("/api/sessions", {"method": "POST", "body": "", "headers": {"Authorization": "Bearer "}})])
+    assert response.code == 401
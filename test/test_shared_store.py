@@ -0,0 +1,130 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from chat_engine import ChatEngine, ChatSession, SessionRepository
+from resilient_client import AnswerCache
+from shared_store import FileBlobStore, RedisStore, SQLiteStore
+from tracing import Tracer
+from usage_meter import UsageMeter
+
+class FakeRedis:
+    """In-process stand-in for a Redis server (get, set with ex/nx, delete, incrbyfloat, expire)."""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        value, expires_at = self.values.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.time():
+            del self.values[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self.get(key) is not None:
+            return None
+        self.values[key] = (value, None if ex is None else time.time() + ex)
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def incrbyfloat(self, key, amount):
+        value = float(self.get(key) or 0) + amount
+        expires_at = self.values.get(key, (None, None))[1]
+        self.values[key] = (repr(value).encode(), expires_at)
+        return value
+
+    def expire(self, key, seconds):
+        if key in self.values:
+            self.values[key] = (self.values[key][0], time.time() + seconds)
+
+@pytest.fixture(params=["sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteStore(str(tmp_path / "store.sqlite3"))
+    return RedisStore(client=FakeRedis())
+
+def test_get_set_add_and_expiry(store):
+    assert store.get("a") is None
+    store.set("a", b"1")
+    assert store.get("a") == b"1"
+    assert not store.add("a", b"2")
+    assert store.add("b", b"2", ttl=0.01)
+    time.sleep(1.1 if isinstance(store, RedisStore) else 0.05)  # Redis expiries are whole seconds
+    assert store.get("b") is None
+    assert store.add("b", b"3")
+    store.delete("a")
+    assert store.get("a") is None
+
+    store.set_json("doc", {"x": [1, 2]})
+    assert store.get_json("doc") == {"x": [1, 2]}
+
+def test_counters_add_up_and_budgets_span_replicas(store):
+    assert store.incr("n", 2) == 2.0
+    assert store.incr("n", 0.5, ttl=60) == 2.5
+    assert float(store.get("n")) == 2.5
+
+    first, second = UsageMeter(log_file="", store=store), UsageMeter(log_file="", store=store)
+    first.record("chat", "m", "usage-1", prompt_tokens=100, completion_tokens=20)
+    second.record("chat", "m", "usage-1", prompt_tokens=30)
+    assert second.budget_usage("usage-1")["session"]["tokens"] == 150
+    assert first.budget_usage("usage-2")["day"]["tokens"] == 150
+
+def test_lease_is_exclusive_until_released(store):
+    token = store.acquire_lease("lease:scrape", ttl=60)
+    assert token
+    assert store.acquire_lease("lease:scrape", ttl=60) is None
+    store.release_lease("lease:scrape", "someone-else")
+    assert store.acquire_lease("lease:scrape", ttl=60) is None
+    store.release_lease("lease:scrape", token)
+    assert store.acquire_lease("lease:scrape", ttl=60)
+
+def test_sqlite_store_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    first, second = SQLiteStore(path), SQLiteStore(path)
+    first.set("session:1", b"state")
+    assert second.get("session:1") == b"state"
+    assert first.add("lease", b"x") and not second.add("lease", b"y")
+
+def test_sessions_and_answers_move_between_replicas(store):
+    # Two engines sharing a store stand in for two replicas
+    def replica():
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=None)))
+        return ChatEngine(client, UsageMeter(), Tracer(), system_prompts={"default": "Prompt"},
+                          sessions=SessionRepository(store))
+
+    first, second = replica(), replica()
+    session = first.new_session()
+    session.history.append({"role": "user", "text": "Hello"})
+    first.sessions.save(session)
+    restored = second.sessions.load(session.session_id)
+    assert restored.history == [{"role": "user", "text": "Hello"}]
+    assert restored.usage_session_id == session.usage_session_id != session.session_id
+    assert second.sessions.load("unknown") is None
+
+    messages = [{"role": "user", "content": "What's for lunch?"}]
+    AnswerCache(store=store).put(messages, "Soup")
+    assert AnswerCache(store=store).get([{"role": "user", "content": "what's for  LUNCH?"}]) == "Soup"
+
+def test_legacy_session_gets_a_usage_id_that_is_not_its_credential():
+    legacy = ChatSession.from_dict({"session_id": "secret", "usage_session_id": "secret"})
+    assert legacy.session_id == "secret" and legacy.usage_session_id not in ("", "secret")
+
+def test_speech_audio_is_reused_without_charge(tmp_path):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(content=b"mp3")
+
+    client = SimpleNamespace(audio=SimpleNamespace(speech=SimpleNamespace(create=create)))
+    audio_cache = FileBlobStore(str(tmp_path / "audio"))
+    replicas = [ChatEngine(client, UsageMeter(), Tracer(), system_prompts={"default": "Prompt"},
+                           audio_cache=audio_cache) for _ in range(2)]
+    assert replicas[0].speak(replicas[0].new_session(), "Lunch is at noon.") == b"mp3"
+    session = replicas[1].new_session()
+    assert replicas[1].speak(session, "Lunch is at noon.") == b"mp3"
+    assert len(calls) == 1
+    assert session.usage_session_id not in replicas[1].usage_meter.summary()["by_session"]
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+from chat_engine import ChatEngine
+from startup_bench import DEFERRED_MODULES, parse_importtime
+from tracing import Tracer
+from usage_meter import UsageMeter
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code")
+
+def test_scraper_module_does_not_import_browser_stack():
+    # A fresh interpreter, so modules imported by other tests do not count
+    check = (f"import sys, web_scrapper; assert callable(web_scrapper.load_cache); "
+             f"loaded = {set(DEFERRED_MODULES)!r} & set(sys.modules); assert not loaded, loaded")
+    result = subprocess.run([sys.executable, "-c", check], cwd=CODE_DIR, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+def test_refresher_defers_loading_the_snapshot():
+    import schedule_refresher
+    with patch("web_scrapper.load_cache", return_value=None) as load_cache:
+        refresher = schedule_refresher.CommunityDataRefresher(mode="thread")
+        assert load_cache.call_count == 0
+        assert refresher.get_context() is None
+        refresher.get_snapshot()
+        assert load_cache.call_count == 1
+
+def test_engine_reads_prompt_files_on_first_use():
+    with patch("chat_engine.engine.load_system_prompts", return_value={"default": "Prompt"}) as load:
+        engine = ChatEngine(object(), UsageMeter(), Tracer())
+        assert load.call_count == 0
+        assert engine.select_prompt_by_context("Tell me a story").startswith("Prompt")
+        assert load.call_count == 1
+
+def test_parse_importtime():
+    stderr = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       120 |        120 |   _io\n"
+              "import time:       300 |        420 | os\n")
+    assert parse_importtime(stderr) == [("_io", 120, 120, 1), ("os", 300, 420, 0)]
@@ -0,0 +1,71 @@
+from datetime import date, datetime, time
+from types import SimpleNamespace
+
+from chat_engine import ChatEngine, ChatSession
+from chat_engine.prompts import get_window_context
+from temporal_parser import resolve
+
+NOW = datetime(2025, 11, 5, 10, 0)  # A Wednesday
+
+SCHEDULE = """WEDNESDAY NOV 05, 2025
+
+Tai Chi with Gene
+8:00 AM to 9:00 AM
+Location: Studio X
+
+Water Volleyball
+1:00 PM to 2:00 PM
+
+Movie Night
+7:30 PM to 9:30 PM
+Location: Emerald Hall
+
+.FRIDAY NOV 07, 2025
+
+Line Dancing with Bella
+11:00 AM to 12:00 PM
+Location: Studio X
+"""
+
+def test_resolves_relative_dates():
+    assert resolve("What's on today?", NOW)['days'] == [date(2025, 11, 5)]
+    tonight = resolve("Anything fun tonight?", NOW)
+    assert tonight['days'] == [date(2025, 11, 5)] and tonight['start_time'] == time(17, 0)
+    assert resolve("What's on tomorrow morning?", NOW)['end_time'] == time(12, 0)
+    assert resolve("Is there dancing on Friday?", NOW)['days'] == [date(2025, 11, 7)]
+    assert resolve("What about next Friday?", NOW)['days'] == [date(2025, 11, 14)]
+    assert resolve("Anything this weekend?", NOW)['days'] == [date(2025, 11, 8), date(2025, 11, 9)]
+    assert resolve("Events on Nov 7th", NOW)['label'] == "Friday, November 7, 2025"
+    assert resolve("Is yoga in the morning?", NOW) is None
+    assert resolve("Is there bridge on Mondays?", NOW) is None
+
+def test_window_context_lists_only_the_window():
+    afternoon = get_window_context(lambda: SCHEDULE, window=resolve("What's on this afternoon?", NOW))
+    assert "Water Volleyball" in afternoon
+    assert "Tai Chi" not in afternoon and "Movie Night" not in afternoon and "Line Dancing" not in afternoon
+
+    assert "No events are scheduled for Thursday" in get_window_context(
+        lambda: SCHEDULE, window=resolve("What's on tomorrow?", NOW))
+    assert "only covers Wednesday, November 5 to Friday, November 7, 2025" in get_window_context(
+        lambda: SCHEDULE, window=resolve("What about next Friday?", NOW))
+    # Schedules the event parser cannot read are only in the system prompt
+    assert get_window_context(lambda: "Lunch: soup", window=resolve("today", NOW)) is None
+
+def test_month_names_and_day_counts():
+    assert resolve("Events on September 9", NOW)['days'] == [date(2026, 9, 9)]
+    assert resolve("Events on Sept. 9", NOW)['days'] == [date(2026, 9, 9)]
+    assert resolve("Did mark 3 pages?", NOW) is None
+    assert resolve("Is the junior 5 class full?", NOW) is None
+    assert resolve("What about in 99999999 days?", NOW)['days'] == [date(2026, 11, 6)]
+
+def test_windowed_events_leave_the_system_prompt_unchanged():
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=None)))
+    engine = ChatEngine(client, system_prompts={"schedule_menu": "Schedule prompt", "default": "Prompt"},
+                        schedule_provider=lambda: SCHEDULE, clock=lambda: NOW)
+    system_prompt = engine.system_prompt("schedule_menu")
+    assert "Tai Chi" in system_prompt and "Line Dancing" in system_prompt
+
+    context = engine.context_data(ChatSession(), window=engine.date_window("What's on this afternoon?"))
+    assert "=== EVENTS ON THOSE DATES ===" in context
+    assert "Water Volleyball" in context and "Tai Chi" not in context
+    assert engine.system_prompt("schedule_menu") == system_prompt
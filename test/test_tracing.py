@@ -0,0 +1,22 @@
+from tracing import LatencyHistogram, Tracer
+
+def test_histogram_percentiles_cover_only_the_kept_samples():
+    histogram = LatencyHistogram(max_samples=100)
+    for ms in range(1, 201):
+        histogram.add(ms / 1000, error=ms % 50 == 0)
+    snapshot = histogram.snapshot()
+    # Counts and the mean include every sample; percentiles only the last 100 (101-200 ms)
+    assert snapshot["count"] == 200 and snapshot["errors"] == 4
+    assert snapshot["mean_ms"] == 100.5
+    assert snapshot["p50_ms"] == 151.0 and snapshot["p95_ms"] == 195.0 and snapshot["max_ms"] == 200.0
+
+def test_empty_histogram_reports_zeros():
+    assert LatencyHistogram().snapshot() == {"count": 0, "errors": 0, "mean_ms": 0.0, "p50_ms": 0.0,
+                                             "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+def test_tracer_observe_creates_a_histogram_per_name():
+    tracer = Tracer(log_file="")
+    tracer.observe("tts", 0.2)
+    tracer.observe("tts", 0.4, error=True)
+    assert tracer.histograms["tts"].snapshot()["errors"] == 1
+    assert tracer.histograms["tts"].percentile(1.0) == 0.4
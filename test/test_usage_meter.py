@@ -0,0 +1,67 @@
+import io
+import time
+import wave
+from types import SimpleNamespace
+
+import pytest
+import usage_meter
+from usage_meter import UsageMeter, metered_chat_stream, wav_duration_seconds
+
+def wav_bytes(seconds, rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(bytes(2 * int(seconds * rate)))
+    return buffer.getvalue()
+
+def test_unparseable_audio_is_not_free():
+    assert wav_duration_seconds(wav_bytes(1.5)) == 1.5
+    # 4,000 bytes of WebM or similar: charged as 16 kbps audio
+    assert wav_duration_seconds(b"\x1aE\xdf\xa3" + bytes(3996)) == 2.0
+    assert wav_duration_seconds(b"") == 0.0
+
+def test_failed_stream_records_the_text_it_produced():
+    def stream(**kwargs):
+        yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content="Tai Chi is at 8"))])
+        raise ConnectionError("reset")
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=stream)))
+    meter = UsageMeter(log_file="")
+    with pytest.raises(ConnectionError):
+        metered_chat_stream(client, meter, "usage-1", "schedule_menu", lambda text: None, model="m",
+                            messages=[{"role": "user", "content": "When is Tai Chi?"}])
+    totals = meter.session_totals("usage-1")
+    assert totals["errors"] == 1
+    assert totals["prompt_tokens"] > 0 and totals["completion_tokens"] > 0
+
+def test_idle_session_totals_expire(monkeypatch):
+    monkeypatch.setattr(usage_meter, "SESSION_PRUNE_INTERVAL_SECONDS", 0)
+    meter = UsageMeter(log_file="", session_ttl_seconds=0.05)
+    meter.record("chat", "m", "usage-1", prompt_tokens=10)
+    time.sleep(0.1)
+    meter.record("chat", "m", "usage-2", prompt_tokens=10)
+    summary = meter.summary()
+    assert "usage-1" not in summary["by_session"] and summary["sessions"] == 1
+    assert meter.day_totals()["prompt_tokens"] == 20
+
+def test_budget_levels(monkeypatch):
+    monkeypatch.setattr(usage_meter, "SESSION_TOKEN_BUDGET", 1000)
+    monkeypatch.setattr(usage_meter, "DAILY_TOKEN_BUDGET", 0)  # disabled
+    meter = UsageMeter(log_file="")
+
+    meter.record("chat", "m", "usage-1", prompt_tokens=500, completion_tokens=299)
+    ok = meter.check_budget("usage-1")
+    assert ok["level"] == "ok" and ok["chat"] and ok["followups"] and ok["max_completion_tokens"] is None
+
+    meter.record("chat", "m", "usage-1", completion_tokens=1)
+    degraded = meter.check_budget("usage-1")
+    assert degraded["level"] == "degraded" and degraded["chat"] and not degraded["followups"]
+    assert degraded["max_completion_tokens"] == usage_meter.DEGRADED_MAX_COMPLETION_TOKENS
+    assert degraded["reasons"] == ["session tokens at 80% of budget"]
+
+    meter.record("chat", "m", "usage-1", prompt_tokens=200)
+    exhausted = meter.check_budget("usage-1")
+    assert exhausted["level"] == "exhausted" and not exhausted["chat"] and not exhausted["tts"]
+    # Other residents are unaffected by one session's budget
+    assert meter.check_budget("usage-2")["level"] == "ok"
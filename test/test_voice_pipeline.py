@@ -0,0 +1,106 @@
+import threading
+from types import SimpleNamespace
+
+from audio_delivery import adts_duration_seconds, audio_duration_seconds, mp3_duration_seconds, ogg_opus_duration_seconds
+from chat_engine import ChatEngine
+from tracing import Tracer
+from usage_meter import UsageMeter
+from voice_pipeline import SentenceSplitter, VoicePipeline, clip_seconds
+
+PROMPTS = {"schedule_menu": "Schedule prompt", "retirement_assistant": "Tech prompt", "default": "Default prompt"}
+
+def chunk(content=None, usage=None):
+    choices = [] if content is None else [SimpleNamespace(delta=SimpleNamespace(content=content))]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+class StreamingClient:
+    """Streams a two-sentence answer; the second sentence waits until the first one's audio was delivered."""
+
+    def __init__(self):
+        self.first_audio_delivered = threading.Event()
+        self.overlapped = None
+        self.spoken = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.audio = SimpleNamespace(speech=SimpleNamespace(create=self.speech),
+                                     transcriptions=SimpleNamespace(create=self.transcription))
+
+    def create(self, **kwargs):
+        if kwargs["messages"][1]["content"].startswith("Generate three follow-up questions"):
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="1. More?"))], usage=None)
+        assert kwargs["stream"] and kwargs["stream_options"] == {"include_usage": True}
+        return self.stream()
+
+    def stream(self):
+        for piece in ["Tai Chi is at **8 a.m.** ", "in Studio X. ", "Bring "]:
+            yield chunk(piece)
+        self.overlapped = self.first_audio_delivered.wait(5)
+        yield chunk("comfortable shoes and water.")
+        yield chunk(usage=SimpleNamespace(prompt_tokens=50, completion_tokens=12, prompt_tokens_details=None))
+
+    def speech(self, **kwargs):
+        self.spoken.append(kwargs["input"])
+        return SimpleNamespace(content=kwargs["input"].encode("utf-8"))
+
+    def transcription(self, **kwargs):
+        return SimpleNamespace(text="When is tai chi?")
+
+def test_sentence_splitter_keeps_abbreviations_and_joins_short_sentences():
+    splitter = SentenceSplitter(min_chars=10)
+    sentences = []
+    for piece in "Yes. Dr. Lee teaches at 8 a.m. in Studio X. Bring water!\n- Bingo at 2".split(" "):
+        sentences += splitter.feed(piece + " ")
+    assert sentences == ["Yes. Dr. Lee teaches at 8 a.m. in Studio X.", "Bring water!"]
+    assert splitter.flush() == ["- Bingo at 2"]
+
+def test_voice_turn_speaks_first_sentence_while_answer_streams():
+    client = StreamingClient()
+    engine = ChatEngine(client, UsageMeter(), Tracer(), system_prompts=dict(PROMPTS))
+    session = engine.new_session()
+
+    events = []
+    for event in VoicePipeline(engine).turn(session, audio_bytes=b"RIFF"):
+        events.append(event)
+        if event["type"] == "audio":
+            client.first_audio_delivered.set()
+
+    assert client.overlapped  # The first clip was ready before the answer finished streaming
+    assert events[0] == {"type": "transcript", "text": "When is tai chi?"}
+    clips = [event for event in events if event["type"] == "audio"]
+    assert [clip["index"] for clip in clips] == [0, 1]
+    assert client.spoken == ["Tai Chi is at 8 a.m. in Studio X.", "Bring comfortable shoes and water."]
+    done = events[-1]
+    assert done["type"] == "done" and done["result"]["error"] is None
+    assert done["timings"]["mouth_to_ear"] <= done["timings"]["answered"]
+    assert session.history[-1]["text"] == "Tai Chi is at 8 a.m. in Studio X. Bring comfortable shoes and water."
+    assert engine.usage_meter.session_totals(session.usage_session_id)["completion_tokens"] == 12
+
+def test_mp3_duration_from_frame_header():
+    # MPEG-1 Layer III at 128 kbps: 16,000 bytes play for one second
+    assert mp3_duration_seconds(b"\xff\xfb\x90\x00" + bytes(15996)) == 1.0
+    assert mp3_duration_seconds(b"not audio") is None
+
+def ogg_page(granule, payload):
+    return b"OggS" + bytes(2) + granule.to_bytes(8, "little") + bytes(13) + payload
+
+def test_opus_duration_from_last_granule_position():
+    head = b"OpusHead" + bytes([1, 1]) + (312).to_bytes(2, "little") + bytes(7)
+    # 2 s at 48 kHz after the 312-sample pre-skip; the page body holds bytes that look like an MP3 sync
+    clip = ogg_page(0, head) + ogg_page(48000 + 312, b"\xff\xfb\x90\x00" + bytes(200)) + ogg_page(96000 + 312, b"")
+    assert ogg_opus_duration_seconds(clip) == 2.0
+    assert audio_duration_seconds(clip, "opus") == 2.0
+    assert audio_duration_seconds(clip, "mp3") is None
+
+def adts_frame(length, rate_index=4):
+    return bytes([0xFF, 0xF1, 0x40 | (rate_index << 2), (length >> 11) & 3, (length >> 3) & 0xFF,
+                  ((length & 7) << 5) | 0x1F, 0xFC]) + bytes(length - 7)
+
+def test_aac_duration_counts_adts_frames():
+    # 44.1 kHz (index 4): 1024 samples per frame
+    clip = b"".join(adts_frame(300) for _ in range(441))
+    assert abs(adts_duration_seconds(clip) - 441 * 1024 / 44100) < 1e-9
+    assert adts_duration_seconds(adts_frame(300) + b"not an adts frame") is None
+
+def test_clip_seconds_uses_the_delivered_format():
+    # Unparseable audio falls back to the speaking-rate estimate instead of a header read from the wrong format
+    assert clip_seconds(b"\xff\xfb\x90\x00" + bytes(15996), "x" * 30, "opus") == 2.0
+    assert clip_seconds(b"\xff\xfb\x90\x00" + bytes(15996), "x" * 30, "mp3") == 1.0
@@ -0,0 +1,89 @@
+import web_scrapper
+from web_scrapper import crawl_community_site, format_scraped_content_for_prompt
+
+START = "https://example.org/p/site?id=1"
+
+def page(url, text, links=()):
+    return {"url": url, "scraped_at": "2025-11-05 06:00:00", "title": "Community", "full_text": text,
+            "links": [{"text": name, "href": href} for name, href in links], "headings": [], "tables": []}
+
+SITE = {
+    START: page(START, "Welcome to Maple Grove", [("This week", "/p/week?id=2"), ("Staff login", "/p/login?id=3"),
+                                                   ("Dining menu", "/p/menu?id=4")]),
+    "https://example.org/p/week?id=2": page("https://example.org/p/week?id=2",
+                                            "WEDNESDAY NOV 05, 2025\nTai Chi 8:00 AM\nTHURSDAY NOV 06, 2025\nBingo 2:00 PM"),
+    "https://example.org/p/menu?id=4": page("https://example.org/p/menu?id=4", "THURSDAY NOV 06, 2025\nSoup of the day"),
+}
+
+def fetch_from(site, fetched=None):
+    def fetch_page(url, driver):
+        if fetched is not None:
+            fetched.append(url)
+        if url not in site:
+            raise RuntimeError("timed out")
+        return site[url]
+    return fetch_page
+
+def test_crawl_follows_whitelisted_links_and_merges_days():
+    fetched = []
+    snapshot = crawl_community_site(START, max_depth=1, max_workers=2, fetch_page=fetch_from(SITE, fetched))
+    assert sorted(fetched) == sorted([START, "https://example.org/p/week?id=2", "https://example.org/p/menu?id=4"])
+    assert snapshot["crawl"]["pages_fetched"] == 3 and snapshot["crawl"]["failures"] == 0
+    text = snapshot["full_text"]
+    assert text.index("WEDNESDAY NOV 05, 2025") < text.index("THURSDAY NOV 06, 2025")
+    # The longer copy of a day seen on two pages wins
+    assert "Bingo 2:00 PM" not in text and "Soup of the day" in text
+
+def test_failed_page_keeps_its_days_from_the_last_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(web_scrapper, "CACHE_FILE", str(tmp_path / "cache.json"))
+    monkeypatch.setattr(web_scrapper, "CHANGE_LOG_FILE", str(tmp_path / "changes.jsonl"))
+    monkeypatch.setattr(web_scrapper, "SHARED_SNAPSHOTS", False)
+    previous, _ = web_scrapper.apply_scrape(crawl_community_site(START, max_depth=1, fetch_page=fetch_from(SITE)))
+
+    broken = {url: data for url, data in SITE.items() if "week" not in url}
+    snapshot, diff = web_scrapper.apply_scrape(crawl_community_site(START, max_depth=1, fetch_page=fetch_from(broken)),
+                                               previous)
+    assert snapshot["crawl"]["failures"] == 1
+    assert "day:WEDNESDAY NOV 05, 2025" in snapshot["sections"]
+    assert "day:WEDNESDAY NOV 05, 2025" not in diff["removed"]
+    assert "Tai Chi 8:00 AM" in format_scraped_content_for_prompt(snapshot)
+
+def test_prompt_truncates_each_section_not_the_whole_text(monkeypatch):
+    monkeypatch.setattr(web_scrapper, "PROMPT_SECTION_MAX_CHARS", 50)
+    days = "\n".join(f"FRIDAY NOV {day:02d}, 2025\nEvent on day {day} " + "x" * 80 for day in range(1, 29))
+    prompt = format_scraped_content_for_prompt(page(START, days))
+    assert "FRIDAY NOV 28, 2025\nEvent on day 28" in prompt
+    assert "x" * 60 not in prompt
+
+def test_sections_split_by_day_and_diff_by_hash():
+    old = web_scrapper.build_section_records(web_scrapper.split_into_sections(
+        page(START, "Welcome\n.FRIDAY OCT 31, 2025\nBingo 2 PM\nSATURDAY NOV 01, 2025\nChoir 10 AM")), "t0")
+    assert sorted(old) == ["day:FRIDAY OCT 31, 2025", "day:SATURDAY NOV 01, 2025", "general"]
+    assert old["day:FRIDAY OCT 31, 2025"]["text"] == "Bingo 2 PM"
+
+    new = web_scrapper.build_section_records(web_scrapper.split_into_sections(
+        page(START, "Welcome\nFRIDAY OCT 31, 2025\nBingo 3 PM\nSUNDAY NOV 02, 2025\nBrunch")), "t1")
+    diff = web_scrapper.diff_sections(old, new)
+    assert diff["added"] == ["day:SUNDAY NOV 02, 2025"]
+    assert diff["removed"] == ["day:SATURDAY NOV 01, 2025"]
+    assert diff["changed"] == [{"key": "day:FRIDAY OCT 31, 2025", "added_lines": ["Bingo 3 PM"],
+                                "removed_lines": ["Bingo 2 PM"]}]
+    assert diff["unchanged"] == 1 and web_scrapper.has_changes(diff)
+
+    merged = web_scrapper.merge_section_records(old, new)
+    # Unchanged sections keep their original timestamp; removed ones go unless a crawl page failed
+    assert merged["general"]["updated_at"] == "t0" and merged["day:FRIDAY OCT 31, 2025"]["updated_at"] == "t1"
+    assert "day:SATURDAY NOV 01, 2025" not in merged
+    assert "day:SATURDAY NOV 01, 2025" in web_scrapper.merge_section_records(old, new, keep_missing=True)
+
+def test_cached_sections_hold_hashes_and_diff_against_the_snapshot_text(tmp_path, monkeypatch):
+    monkeypatch.setattr(web_scrapper, "CACHE_FILE", str(tmp_path / "cache.json"))
+    monkeypatch.setattr(web_scrapper, "CHANGE_LOG_FILE", str(tmp_path / "changes.jsonl"))
+    monkeypatch.setattr(web_scrapper, "SHARED_SNAPSHOTS", False)
+    web_scrapper.apply_scrape(page(START, "Welcome\nFRIDAY OCT 31, 2025\nBingo 2 PM"))
+    previous = web_scrapper.load_cache(allow_expired=True)
+    assert all(set(record) == {"hash", "updated_at"} for record in previous["sections"].values())
+
+    _, diff = web_scrapper.apply_scrape(page(START, "Welcome\nFRIDAY OCT 31, 2025\nBingo 3 PM"), previous)
+    assert diff["changed"] == [{"key": "day:FRIDAY OCT 31, 2025", "added_lines": ["Bingo 3 PM"],
+                                "removed_lines": ["Bingo 2 PM"]}]